@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import SRIConfig, PuntoEmision, CertificadoDigital, ComprobanteElectronico
+from .models import SRIConfig, PuntoEmision, CertificadoDigital, ComprobanteElectronico, LoteSRI, TransicionComprobante
 
 @admin.register(SRIConfig)
 class SRIConfigAdmin(admin.ModelAdmin):
@@ -53,7 +53,31 @@ class CertificadoDigitalAdmin(admin.ModelAdmin):
 
 @admin.register(ComprobanteElectronico)
 class ComprobanteElectronicoAdmin(admin.ModelAdmin):
-    list_display = ('id', 'venta', 'estado', 'fecha_registro', 'ambiente')
+    list_display = ('id', 'venta', 'estado', 'fecha_registro', 'ambiente', 'lote')
     list_filter = ('estado', 'ambiente')
     search_fields = ('clave_acceso', 'venta__numero_venta')
     readonly_fields = ('id', 'fecha_registro', 'fecha_actualizacion')
+
+@admin.register(LoteSRI)
+class LoteSRIAdmin(admin.ModelAdmin):
+    list_display = ('clave_acceso', 'estado', 'cantidad', 'ambiente', 'fecha_envio')
+    list_filter = ('estado', 'ambiente')
+    search_fields = ('clave_acceso',)
+    readonly_fields = ('fecha_envio',)
+
+@admin.register(TransicionComprobante)
+class TransicionComprobanteAdmin(admin.ModelAdmin):
+    list_display = ('comprobante', 'etapa', 'estado_anterior', 'estado_nuevo', 'exitosa', 'duracion_ms', 'fecha')
+    list_filter = ('etapa', 'exitosa', 'punto_emision')
+    search_fields = ('comprobante__clave_acceso',)
+    list_select_related = ('comprobante__venta',)
+
+    # Historial solo de inserción: se consulta, no se edita
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
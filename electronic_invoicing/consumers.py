@@ -41,3 +41,10 @@ class SRIMonitorConsumer(AsyncWebsocketConsumer):
         data.pop('type') # Quitamos el tipo de evento interno de channels
         
         await self.send(text_data=json.dumps(data))
+
+    async def sri_status_batch(self, event):
+        """
+        Último estado de varios comprobantes agrupados por MonitorSRIService:
+        se envían al navegador en un solo frame {"actualizaciones": [...]}.
+        """
+        await self.send(text_data=json.dumps({"actualizaciones": event["actualizaciones"]}))
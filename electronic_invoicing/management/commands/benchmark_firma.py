@@ -0,0 +1,110 @@
+"""
+Benchmark de la firma XAdES de comprobantes.
+
+Genera un certificado .p12 autofirmado y N facturas sintéticas en memoria
+(sin tocar la base de datos ni el certificado real) y mide la firma en un
+solo proceso y en el pool de FirmaParalelaService. Reporta documentos por
+segundo en total y por núcleo.
+
+Uso:
+    python manage.py benchmark_firma --documentos 1000 --procesos 4
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.serialization import BestAvailableEncryption, pkcs12
+from cryptography.x509.oid import NameOID
+from django.core.management.base import BaseCommand
+from lxml import etree
+
+from electronic_invoicing.services.firma_paralela import FirmaParalelaService
+from electronic_invoicing.services.signature import SignatureServiceSRI
+
+PASSWORD = 'benchmark'
+
+
+def generar_p12():
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, 'EC'),
+        x509.NameAttribute(NameOID.ORGANIZATION_NAME, 'Benchmark'),
+        x509.NameAttribute(NameOID.COMMON_NAME, 'Firma Benchmark'),
+    ])
+    ahora = datetime.now(timezone.utc)
+    certificado = (
+        x509.CertificateBuilder().subject_name(nombre).issuer_name(nombre)
+        .public_key(clave.public_key()).serial_number(x509.random_serial_number())
+        .not_valid_before(ahora).not_valid_after(ahora + timedelta(days=30))
+        .sign(clave, hashes.SHA256())
+    )
+    return pkcs12.serialize_key_and_certificates(
+        b'benchmark', clave, certificado, None, BestAvailableEncryption(PASSWORD.encode())
+    )
+
+
+def factura_sintetica(secuencial, lineas):
+    """Factura con la estructura del SRI (infoTributaria, infoFactura y detalles)"""
+    factura = etree.Element('factura', id='comprobante', version='1.1.0')
+    info = etree.SubElement(factura, 'infoTributaria')
+    etree.SubElement(info, 'ambiente').text = '1'
+    etree.SubElement(info, 'razonSocial').text = 'VP MOTOS'
+    etree.SubElement(info, 'ruc').text = '1790000000001'
+    etree.SubElement(info, 'claveAcceso').text = f"{secuencial:049d}"
+    etree.SubElement(info, 'secuencial').text = f"{secuencial:09d}"
+    info_factura = etree.SubElement(factura, 'infoFactura')
+    etree.SubElement(info_factura, 'fechaEmision').text = '31/01/2026'
+    etree.SubElement(info_factura, 'importeTotal').text = f"{lineas * 11.5:.2f}"
+    detalles = etree.SubElement(factura, 'detalles')
+    for numero in range(lineas):
+        detalle = etree.SubElement(detalles, 'detalle')
+        etree.SubElement(detalle, 'codigoPrincipal').text = f"REP-{numero:05d}"
+        etree.SubElement(detalle, 'descripcion').text = f"Repuesto sintético {numero}"
+        etree.SubElement(detalle, 'cantidad').text = '1.00'
+        etree.SubElement(detalle, 'precioUnitario').text = '10.00'
+        etree.SubElement(detalle, 'precioTotalSinImpuesto').text = '10.00'
+    return etree.tostring(factura, xml_declaration=True, encoding='UTF-8')
+
+
+class Command(BaseCommand):
+    help = 'Mide la velocidad de firma XAdES en un proceso y en el pool de firma paralela'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documentos', type=int, default=1000)
+        parser.add_argument('--lineas', type=int, default=8, help='Detalles por factura')
+        parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1)
+
+    def medir(self, etiqueta, documentos, procesos, p12):
+        inicio = time.perf_counter()
+        resultados = FirmaParalelaService.firmar(p12, PASSWORD, documentos, procesos=procesos)
+        segundos = time.perf_counter() - inicio
+        errores = [error for _, firmado, error in resultados if firmado is None]
+        if errores:
+            self.stdout.write(self.style.ERROR(f"{len(errores)} errores de firma: {errores[0]}"))
+        por_segundo = len(documentos) / segundos
+        self.stdout.write(
+            f"{etiqueta:<22} {segundos:8.2f} s  {por_segundo:8.1f} docs/s  "
+            f"{por_segundo / procesos:8.1f} docs/s por núcleo"
+        )
+        return por_segundo
+
+    def handle(self, *args, **options):
+        total = options['documentos']
+        procesos = FirmaParalelaService.procesos(options['procesos'])
+        p12 = generar_p12()
+        documentos = [(str(n), factura_sintetica(n, options['lineas'])) for n in range(1, total + 1)]
+
+        inicio = time.perf_counter()
+        for _ in range(20):
+            SignatureServiceSRI.desde_p12(p12, PASSWORD)
+        carga_ms = (time.perf_counter() - inicio) / 20 * 1000
+        self.stdout.write(f"Carga del .p12: {carga_ms:.1f} ms (se hace una vez por proceso)")
+        self.stdout.write(f"Firmando {total} facturas de {options['lineas']} líneas...")
+
+        serie = self.medir('1 proceso', documentos, 1, p12)
+        if procesos > 1:
+            paralelo = self.medir(f'{procesos} procesos', documentos, procesos, p12)
+            self.stdout.write(self.style.SUCCESS(f"Aceleración: x{paralelo / serie:.2f}"))
@@ -0,0 +1,69 @@
+"""
+Envía al SRI, en lotes masivos, los comprobantes firmados pendientes
+(FIRMADO o ERROR de envío), p. ej. al cierre de mes o tras una caída del SRI.
+Con --firmar, antes firma en paralelo (todos los núcleos) los comprobantes
+que tienen XML generado pero quedaron sin firmar.
+
+Uso:
+    python manage.py enviar_lotes_sri --limite 2000
+    python manage.py enviar_lotes_sri --firmar --procesos 4
+    python manage.py enviar_lotes_sri --encolar   # lo ejecuta un worker de Celery
+"""
+from django.core.management.base import BaseCommand
+
+from electronic_invoicing.services.circuito_sri import CircuitoSRIService
+from electronic_invoicing.services.firma_paralela import FirmaParalelaService
+from electronic_invoicing.services.lotes import LoteSRIService
+from electronic_invoicing.tasks import enviar_lotes_pendientes, firmar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Envía en lotes al SRI los comprobantes firmados que aún no fueron recibidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limite', type=int, default=1000,
+                            help='Máximo de comprobantes a enviar en esta ejecución')
+        parser.add_argument('--encolar', action='store_true',
+                            help='Encolar la tarea en Celery en lugar de ejecutarla aquí')
+        parser.add_argument('--firmar', action='store_true',
+                            help='Firmar antes los comprobantes con XML generado sin firma')
+        parser.add_argument('--procesos', type=int, default=None,
+                            help='Procesos para la firma en paralelo (por defecto, uno por núcleo)')
+
+    def handle(self, *args, **options):
+        limite = options['limite']
+
+        if options['firmar']:
+            sin_firma = FirmaParalelaService.pendientes().count()
+            self.stdout.write(f"Comprobantes sin firmar: {sin_firma}")
+            if sin_firma and options['encolar']:
+                # La tarea encola el envío en lotes al terminar de firmar
+                firmar_pendientes.delay(limite, True, options['procesos'])
+                self.stdout.write(self.style.SUCCESS("Firma y envío en lotes encolados"))
+                return
+            if sin_firma:
+                firmados = firmar_pendientes(limite, enviar=False, procesos=options['procesos'])
+                self.stdout.write(self.style.SUCCESS(f"Comprobantes firmados: {firmados}"))
+
+        pendientes = LoteSRIService.pendientes().count()
+        self.stdout.write(f"Comprobantes pendientes de envío: {pendientes}")
+        if not pendientes:
+            return
+        if CircuitoSRIService.abierto():
+            estado = CircuitoSRIService.estado()
+            self.stdout.write(self.style.WARNING(
+                f"SRI no disponible desde {estado['desde']:%H:%M:%S} ({estado['motivo']}); "
+                "los lotes se enviarán cuando el sondeo lo vea recuperado"
+            ))
+            return
+
+        if options['encolar']:
+            enviar_lotes_pendientes.delay(limite)
+            self.stdout.write(self.style.SUCCESS("Envío en lotes encolado"))
+            return
+
+        recibidos = enviar_lotes_pendientes(limite)
+        if recibidos is None:
+            self.stdout.write(self.style.WARNING("Ya hay un envío de lotes en curso"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Comprobantes recibidos por el SRI: {recibidos}"))
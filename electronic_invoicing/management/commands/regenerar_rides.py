@@ -0,0 +1,61 @@
+"""
+Regenera el PDF RIDE de los comprobantes autorizados, p. ej. tras cambiar
+la plantilla o el logo, o para los que quedaron sin PDF por un error de
+WeasyPrint. Por defecto encola la tarea generar_ride (cola "ride") sin
+reenviar el email al cliente.
+
+Uso:
+    python manage.py regenerar_rides --faltantes
+    python manage.py regenerar_rides --desde 2026-01-01 --hasta 2026-01-31
+    python manage.py regenerar_rides --faltantes --sin-encolar   # aquí mismo
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from electronic_invoicing.models import ComprobanteElectronico
+from electronic_invoicing.tasks import generar_ride
+
+
+class Command(BaseCommand):
+    help = 'Regenera (o encola) el PDF RIDE de los comprobantes autorizados'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha de autorización inicial (AAAA-MM-DD)')
+        parser.add_argument('--hasta', help='Fecha de autorización final (AAAA-MM-DD)')
+        parser.add_argument('--faltantes', action='store_true',
+                            help='Solo los comprobantes que no tienen PDF')
+        parser.add_argument('--sin-encolar', action='store_true',
+                            help='Generar aquí en lugar de encolar en Celery')
+        parser.add_argument('--email', action='store_true',
+                            help='Reenviar el email al cliente con el RIDE nuevo')
+
+    def fecha(self, valor, opcion):
+        try:
+            return date.fromisoformat(valor)
+        except ValueError:
+            raise CommandError(f"{opcion} debe tener el formato AAAA-MM-DD")
+
+    def handle(self, *args, **options):
+        comprobantes = ComprobanteElectronico.objects.filter(estado='AUTORIZADO')
+        if options['desde']:
+            comprobantes = comprobantes.filter(
+                fecha_autorizacion__date__gte=self.fecha(options['desde'], '--desde'))
+        if options['hasta']:
+            comprobantes = comprobantes.filter(
+                fecha_autorizacion__date__lte=self.fecha(options['hasta'], '--hasta'))
+        if options['faltantes']:
+            comprobantes = comprobantes.filter(Q(pdf_ride__isnull=True) | Q(pdf_ride=''))
+
+        ids = [str(pk) for pk in comprobantes.order_by('fecha_autorizacion').values_list('id', flat=True)]
+        self.stdout.write(f"Comprobantes a procesar: {len(ids)}")
+
+        if not options['sin_encolar']:
+            for comprobante_id in ids:
+                generar_ride.delay(comprobante_id, options['email'])
+            self.stdout.write(self.style.SUCCESS(f"RIDEs encolados: {len(ids)}"))
+            return
+
+        generados = sum(1 for comprobante_id in ids if generar_ride(comprobante_id, options['email']))
+        self.stdout.write(self.style.SUCCESS(f"RIDEs generados: {generados}/{len(ids)}"))
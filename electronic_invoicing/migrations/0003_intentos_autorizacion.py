@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('electronic_invoicing', '0002_comprobanteelectronico_email_enviado_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comprobanteelectronico',
+            name='intentos_autorizacion',
+            field=models.PositiveIntegerField(default=0, help_text='Consultas de autorización realizadas al SRI'),
+        ),
+        migrations.AddField(
+            model_name='comprobanteelectronico',
+            name='ultimo_intento_autorizacion',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
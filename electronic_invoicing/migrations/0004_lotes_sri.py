@@ -0,0 +1,36 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('electronic_invoicing', '0003_intentos_autorizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoteSRI',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('clave_acceso', models.CharField(blank=True, max_length=49, null=True, unique=True)),
+                ('estado', models.CharField(choices=[('ENVIANDO', 'Enviando'), ('RECIBIDO', 'Recibido por SRI'), ('DEVUELTO', 'Devuelto por SRI (Con errores)'), ('ERROR', 'Error de Envío')], default='ENVIANDO', max_length=20)),
+                ('ambiente', models.IntegerField(choices=[(1, 'Pruebas'), (2, 'Producción')], default=1)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('mensajes_error', models.TextField(blank=True, null=True)),
+                ('fecha_envio', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Lote SRI',
+                'verbose_name_plural': 'Lotes SRI',
+                'ordering': ['-fecha_envio'],
+            },
+        ),
+        migrations.AddField(
+            model_name='comprobanteelectronico',
+            name='lote',
+            field=models.ForeignKey(blank=True, help_text='Último lote en el que se envió al SRI', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='comprobantes', to='electronic_invoicing.lotesri'),
+        ),
+    ]
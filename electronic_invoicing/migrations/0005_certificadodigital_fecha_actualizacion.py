@@ -0,0 +1,20 @@
+# Generated by Django 5.2.1 on 2026-10-17 06:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('electronic_invoicing', '0004_lotes_sri'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificadodigital',
+            name='fecha_actualizacion',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('electronic_invoicing', '0005_certificadodigital_fecha_actualizacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionComprobante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('etapa', models.CharField(choices=[('GENERAR', 'Generación XML'), ('FIRMAR', 'Firma XAdES'), ('RECEPCION', 'Recepción SRI (ida y vuelta)'), ('AUTORIZACION', 'Espera de autorización SRI'), ('RIDE', 'Generación RIDE'), ('EMAIL', 'Envío de email')], max_length=20)),
+                ('estado_anterior', models.CharField(blank=True, max_length=20)),
+                ('estado_nuevo', models.CharField(blank=True, max_length=20)),
+                ('exitosa', models.BooleanField(default=True)),
+                ('duracion_ms', models.PositiveIntegerField(default=0)),
+                ('mensaje', models.TextField(blank=True, null=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('comprobante', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='electronic_invoicing.comprobanteelectronico')),
+                ('punto_emision', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='electronic_invoicing.puntoemision')),
+            ],
+            options={
+                'verbose_name': 'Transición de Comprobante',
+                'verbose_name_plural': 'Transiciones de Comprobantes',
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['fecha', 'etapa'], name='electronic__fecha_b64f41_idx'), models.Index(fields=['comprobante', 'etapa'], name='electronic__comprob_31dfe6_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('electronic_invoicing', '0007_estado_contingencia'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='comprobanteelectronico',
+            name='estado',
+            field=models.CharField(choices=[('CREADO', 'Creado (Pendiente Firma)'), ('FIRMADO', 'Firmado (Pendiente Envío)'), ('CONTINGENCIA', 'En Contingencia (SRI no disponible)'), ('ENVIANDO', 'Enviando al SRI'), ('RECIBIDO', 'Recibido por SRI'), ('DEVUELTO', 'Devuelto por SRI (Error)'), ('AUTORIZADO', 'Autorizado'), ('RECHAZADO', 'Rechazado'), ('ERROR', 'Error Interno')], default='CREADO', max_length=20),
+        ),
+    ]
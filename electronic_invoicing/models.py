@@ -93,6 +93,7 @@ class CertificadoDigital(models.Model):
     
     activo = models.BooleanField(default=True)
     fecha_carga = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name = "Certificado Digital"
@@ -122,11 +123,38 @@ class CertificadoDigital(models.Model):
         except Exception as e:
             return None
 
+class LoteSRI(models.Model):
+    """Envío de varios comprobantes firmados en una sola llamada de recepción (lote masivo)"""
+    ESTADO_CHOICES = [
+        ('ENVIANDO', 'Enviando'),
+        ('RECIBIDO', 'Recibido por SRI'),
+        ('DEVUELTO', 'Devuelto por SRI (Con errores)'),
+        ('ERROR', 'Error de Envío'),
+    ]
+
+    clave_acceso = models.CharField(max_length=49, unique=True, null=True, blank=True)
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='ENVIANDO')
+    ambiente = models.IntegerField(choices=SRIConfig.AMBIENTE_CHOICES, default=1)
+    cantidad = models.PositiveIntegerField(default=0)
+    mensajes_error = models.TextField(null=True, blank=True)
+    fecha_envio = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Lote SRI"
+        verbose_name_plural = "Lotes SRI"
+        ordering = ['-fecha_envio']
+
+    def __str__(self):
+        return f"Lote {self.clave_acceso or self.pk} ({self.cantidad} comprobantes, {self.estado})"
+
+
 class ComprobanteElectronico(models.Model):
     """Registro de cada comprobante electrónico generado y enviado"""
     ESTADO_CHOICES = [
         ('CREADO', 'Creado (Pendiente Firma)'),
         ('FIRMADO', 'Firmado (Pendiente Envío)'),
+        ('CONTINGENCIA', 'En Contingencia (SRI no disponible)'),
+        ('ENVIANDO', 'Enviando al SRI'),
         ('RECIBIDO', 'Recibido por SRI'),
         ('DEVUELTO', 'Devuelto por SRI (Error)'),
         ('AUTORIZADO', 'Autorizado'),
@@ -141,6 +169,10 @@ class ComprobanteElectronico(models.Model):
         related_name='comprobante_electronico'
     )
     punto_emision = models.ForeignKey(PuntoEmision, on_delete=models.PROTECT, null=True, blank=True)
+    lote = models.ForeignKey(
+        LoteSRI, on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='comprobantes', help_text="Último lote en el que se envió al SRI"
+    )
     
     tipo_comprobante = models.CharField(max_length=2, default='01', help_text="01=Factura, 04=Nota de Crédito, etc.")
     clave_acceso = models.CharField(max_length=49, unique=True, null=True, blank=True)
@@ -157,6 +189,8 @@ class ComprobanteElectronico(models.Model):
     
     # Tracking
     mensajes_error = models.TextField(null=True, blank=True)
+    intentos_autorizacion = models.PositiveIntegerField(default=0, help_text="Consultas de autorización realizadas al SRI")
+    ultimo_intento_autorizacion = models.DateTimeField(null=True, blank=True)
     
     # Tracking Email
     email_enviado = models.BooleanField(default=False)
@@ -172,3 +206,47 @@ class ComprobanteElectronico(models.Model):
 
     def __str__(self):
         return f"{self.tipo_comprobante} - {self.venta.numero_factura} ({self.estado})"
+
+
+class TransicionComprobante(models.Model):
+    """
+    Registro inmutable (solo inserción) de cada etapa por la que pasa un
+    comprobante, con su duración. Permite medir si el tiempo se va en
+    nuestro código (generar, firmar, RIDE) o en el SRI (recepción, autorización).
+    """
+    ETAPA_CHOICES = [
+        ('GENERAR', 'Generación XML'),
+        ('FIRMAR', 'Firma XAdES'),
+        ('RECEPCION', 'Recepción SRI (ida y vuelta)'),
+        ('AUTORIZACION', 'Espera de autorización SRI'),
+        ('RIDE', 'Generación RIDE'),
+        ('EMAIL', 'Envío de email'),
+    ]
+
+    comprobante = models.ForeignKey(ComprobanteElectronico, on_delete=models.CASCADE, related_name='transiciones')
+    # Copiado del comprobante para agregar métricas sin JOIN
+    punto_emision = models.ForeignKey(PuntoEmision, on_delete=models.SET_NULL, null=True, blank=True)
+    etapa = models.CharField(max_length=20, choices=ETAPA_CHOICES)
+    estado_anterior = models.CharField(max_length=20, blank=True)
+    estado_nuevo = models.CharField(max_length=20, blank=True)
+    exitosa = models.BooleanField(default=True)
+    duracion_ms = models.PositiveIntegerField(default=0)
+    mensaje = models.TextField(null=True, blank=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Transición de Comprobante"
+        verbose_name_plural = "Transiciones de Comprobantes"
+        ordering = ['fecha', 'id']
+        indexes = [
+            models.Index(fields=['fecha', 'etapa']),
+            models.Index(fields=['comprobante', 'etapa']),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Las transiciones no se modifican, solo se agregan")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_etapa_display()} {self.estado_anterior}→{self.estado_nuevo} ({self.duracion_ms} ms)"
@@ -0,0 +1,142 @@
+"""
+Service layer del circuit breaker del SRI
+Cuenta los fallos de red consecutivos contra los servicios web del SRI (en la
+caché compartida, para todos los workers). Al llegar a UMBRAL_FALLOS el
+circuito se abre: TransporteSRI falla al instante sin esperar timeouts y los
+comprobantes firmados quedan en CONTINGENCIA (cola durable en la base).
+Una tarea de sondeo revisa el SRI y, cuando responde, cierra el circuito y
+drena la contingencia en lotes a ritmo controlado (ver tasks.py).
+"""
+import logging
+
+import requests
+from django.core.cache import cache
+from django.utils import timezone
+from zeep.exceptions import TransportError
+from zeep.transports import Transport
+
+logger = logging.getLogger(__name__)
+
+CLAVE_FALLOS = 'electronic_invoicing:circuito:fallos'
+CLAVE_ABIERTO = 'electronic_invoicing:circuito:abierto'
+
+UMBRAL_FALLOS = 5
+# Aunque el sondeo no llegue a correr, el circuito se vuelve a probar tras este tiempo
+ABIERTO_MAXIMO = 15 * 60
+# Errores de red que cuentan como caída; un 4xx u otro error de requests no
+FALLOS_RED = (requests.ConnectionError, requests.Timeout)
+
+
+def es_caida(status_code, soap=False):
+    """Respuesta 5xx del SRI. En una llamada SOAP un 500 es un SOAP Fault: el SRI respondió."""
+    return status_code is not None and status_code >= 500 and not (soap and status_code == 500)
+
+
+class SRINoDisponible(Exception):
+    """El circuito está abierto: no se intenta la llamada al SRI"""
+
+
+def es_fallo_red(exc):
+    """
+    El error de una llamada al SRI es una caída (red, 5xx o circuito abierto)
+    y el comprobante puede esperar en contingencia. Cualquier otro error
+    (SOAP Fault, XML inválido, 4xx) no se arregla reintentando.
+    """
+    if isinstance(exc, FALLOS_RED + (SRINoDisponible,)):
+        return True
+    if isinstance(exc, requests.HTTPError):
+        return es_caida(getattr(exc.response, 'status_code', None))
+    if isinstance(exc, TransportError):
+        # zeep levanta TransportError cuando el POST SOAP no devuelve 200 ni 500
+        return es_caida(exc.status_code, soap=True)
+    return False
+
+
+class CircuitoSRIService:
+    """Estado del circuit breaker del SRI compartido entre procesos"""
+
+    @staticmethod
+    def abierto():
+        return cache.get(CLAVE_ABIERTO) is not None
+
+    @staticmethod
+    def estado():
+        abierto = cache.get(CLAVE_ABIERTO)
+        return {
+            'abierto': abierto is not None,
+            'desde': abierto['desde'] if abierto else None,
+            'motivo': abierto['motivo'] if abierto else None,
+            'fallos': cache.get(CLAVE_FALLOS, 0),
+        }
+
+    @staticmethod
+    def registrar_exito():
+        # Se lee antes de borrar para no escribir en Redis en cada llamada exitosa
+        if cache.get(CLAVE_FALLOS):
+            cache.delete(CLAVE_FALLOS)
+
+    @staticmethod
+    def registrar_fallo(motivo):
+        """Suma un fallo consecutivo. Devuelve True si este fallo abrió el circuito."""
+        cache.add(CLAVE_FALLOS, 0, ABIERTO_MAXIMO)
+        try:
+            fallos = cache.incr(CLAVE_FALLOS)
+        except ValueError:
+            # La clave expiró entre add e incr
+            cache.set(CLAVE_FALLOS, 1, ABIERTO_MAXIMO)
+            fallos = 1
+        if fallos >= UMBRAL_FALLOS:
+            return CircuitoSRIService.abrir(f"{fallos} fallos seguidos: {motivo}")
+        return False
+
+    @staticmethod
+    def abrir(motivo):
+        abierto = cache.add(CLAVE_ABIERTO, {'desde': timezone.now(), 'motivo': str(motivo)[:500]}, ABIERTO_MAXIMO)
+        if abierto:
+            logger.warning(f"Circuito SRI abierto: {motivo}")
+        return abierto
+
+    @staticmethod
+    def cerrar():
+        if cache.get(CLAVE_ABIERTO) is not None:
+            logger.info("Circuito SRI cerrado: el SRI responde nuevamente")
+        cache.delete_many([CLAVE_ABIERTO, CLAVE_FALLOS])
+
+    @staticmethod
+    def verificar():
+        """Lanza SRINoDisponible si el circuito está abierto"""
+        if CircuitoSRIService.abierto():
+            raise SRINoDisponible("SRI no disponible (circuito abierto), el comprobante queda en contingencia")
+
+
+class TransporteSRI(Transport):
+    """Transporte zeep que consulta y alimenta el circuit breaker en cada llamada al SRI"""
+
+    def _medir(self, llamada, *args, soap=False):
+        CircuitoSRIService.verificar()
+        try:
+            respuesta = llamada(*args)
+        except FALLOS_RED as e:
+            CircuitoSRIService.registrar_fallo(e)
+            raise
+        except requests.HTTPError as e:
+            # Descarga con raise_for_status: solo un 5xx es caída, un 4xx es una respuesta
+            status_code = getattr(e.response, 'status_code', None)
+            if es_caida(status_code, soap):
+                CircuitoSRIService.registrar_fallo(f"HTTP {status_code}")
+            elif status_code is not None:
+                CircuitoSRIService.registrar_exito()
+            raise
+        status_code = getattr(respuesta, 'status_code', None)
+        if es_caida(status_code, soap):
+            CircuitoSRIService.registrar_fallo(f"HTTP {status_code}")
+        else:
+            CircuitoSRIService.registrar_exito()
+        return respuesta
+
+    def post(self, address, message, headers):
+        return self._medir(super().post, address, message, headers, soap=True)
+
+    def _load_remote_data(self, url):
+        # Solo descargas reales: los WSDL en la caché de disco no pasan por aquí
+        return self._medir(super()._load_remote_data, url)
@@ -0,0 +1,141 @@
+"""
+Service layer para firmar comprobantes en paralelo
+La firma XAdES (C14N de lxml, SHA-256 y RSA) usa CPU, así que los pendientes
+se reparten en un ProcessPoolExecutor. Cada proceso del pool carga el .p12
+una sola vez en su inicializador y luego solo firma. Los comprobantes
+firmados quedan en FIRMADO, listos para el envío en lotes (LoteSRIService).
+
+Los workers prefork de Celery son procesos daemon y no pueden crear hijos:
+ahí la firma se hace en el mismo proceso. Para usar todos los núcleos se
+ejecuta desde `manage.py enviar_lotes_sri --firmar`.
+"""
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .signature import SignatureServiceSRI
+from .transiciones import TransicionService
+
+logger = logging.getLogger(__name__)
+
+# Por debajo de esta cantidad no compensa arrancar procesos
+MIN_PARALELO = 20
+CHUNKSIZE = 16
+
+ESTADOS_SIN_FIRMA = ('CREADO', 'GENERADO', 'ERROR')
+
+# Firmador del proceso del pool (se crea en _inicializar_worker)
+_firmador = None
+
+
+def _inicializar_worker(p12_content, password):
+    global _firmador
+    _firmador = SignatureServiceSRI.desde_p12(p12_content, password)
+
+
+def _firmar_con(firmador, documento):
+    clave, xml = documento
+    try:
+        return clave, firmador.firmar_xml(xml), None
+    except Exception as e:
+        return clave, None, str(e)
+
+
+def _firmar_documento(documento):
+    return _firmar_con(_firmador, documento)
+
+
+class FirmaParalelaService:
+    """Etapa de firma por lotes entre la generación del XML y el envío al SRI"""
+
+    @staticmethod
+    def procesos(procesos=None):
+        """Procesos a usar: 1 si este proceso no puede tener hijos (worker daemon)"""
+        if multiprocessing.current_process().daemon:
+            return 1
+        return max(1, procesos or os.cpu_count() or 1)
+
+    @staticmethod
+    def firmar(p12_content, password, documentos, procesos=None, chunksize=CHUNKSIZE):
+        """
+        Firma una lista de (clave, xml_bytes) y devuelve, en el mismo orden,
+        (clave, xml_firmado_bytes o None, error o None).
+        """
+        documentos = list(documentos)
+        procesos = FirmaParalelaService.procesos(procesos)
+        if procesos == 1 or len(documentos) < MIN_PARALELO:
+            firmador = SignatureServiceSRI.desde_p12(p12_content, password)
+            return [_firmar_con(firmador, documento) for documento in documentos]
+
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_worker,
+                                 initargs=(p12_content, password)) as pool:
+            return list(pool.map(_firmar_documento, documentos, chunksize=chunksize))
+
+    @staticmethod
+    def pendientes(limite=None):
+        """Comprobantes con XML generado que quedaron sin firmar (p. ej. sin certificado activo)"""
+        from electronic_invoicing.models import ComprobanteElectronico
+
+        queryset = ComprobanteElectronico.objects.filter(
+            Q(xml_firmado__isnull=True) | Q(xml_firmado=''),
+            estado__in=ESTADOS_SIN_FIRMA,
+            clave_acceso__isnull=False,
+            xml_generado__isnull=False,
+        ).exclude(xml_generado='').select_related('venta').order_by('fecha_registro')
+        return queryset[:limite] if limite else queryset
+
+    @staticmethod
+    def firmar_comprobantes(certificado, comprobantes, procesos=None):
+        """
+        Firma los comprobantes y los guarda en FIRMADO (o ERROR con el motivo)
+        con un solo bulk_update. Devuelve cuántos quedaron firmados.
+        La transición FIRMAR de cada uno lleva el tiempo promedio del lote.
+        """
+        from electronic_invoicing.models import ComprobanteElectronico
+
+        if not comprobantes:
+            return 0
+        p12_content, password = SignatureServiceSRI(certificado).contenido_p12()
+        por_id = {str(comprobante.id): comprobante for comprobante in comprobantes}
+        anteriores = {comprobante_id: comprobante.estado for comprobante_id, comprobante in por_id.items()}
+        inicio = time.perf_counter()
+        resultados = FirmaParalelaService.firmar(
+            p12_content, password,
+            [(comprobante_id, comprobante.xml_generado.encode('utf-8'))
+             for comprobante_id, comprobante in por_id.items()],
+            procesos=procesos,
+        )
+
+        promedio_ms = TransicionService.milisegundos(inicio) // len(resultados)
+
+        ahora = timezone.now()
+        firmados = 0
+        transiciones = []
+        for comprobante_id, xml_firmado, error in resultados:
+            comprobante = por_id[comprobante_id]
+            comprobante.fecha_actualizacion = ahora
+            if xml_firmado is None:
+                comprobante.estado = 'ERROR'
+                comprobante.mensajes_error = f"Error de firma: {error}"
+            else:
+                comprobante.xml_firmado = xml_firmado.decode('utf-8')
+                comprobante.estado = 'FIRMADO'
+                comprobante.mensajes_error = None
+                firmados += 1
+            transiciones.append(TransicionService.nueva(
+                comprobante, 'FIRMAR', anteriores[comprobante_id], duracion_ms=promedio_ms,
+                exitosa=xml_firmado is not None,
+                mensaje=f"Firma por lotes ({len(resultados)} comprobantes). {comprobante.mensajes_error or ''}".strip(),
+            ))
+
+        ComprobanteElectronico.objects.bulk_update(
+            comprobantes, ['xml_firmado', 'estado', 'mensajes_error', 'fecha_actualizacion']
+        )
+        TransicionService.registrar_varias(transiciones)
+        logger.info(f"Firma por lotes: {firmados}/{len(comprobantes)} comprobantes firmados")
+        return firmados
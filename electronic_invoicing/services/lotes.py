@@ -0,0 +1,184 @@
+"""
+Service layer para el envío de comprobantes en lote masivo al SRI
+Agrupa los comprobantes firmados pendientes (FIRMADO o ERROR de envío) en
+lotes del mismo tipo, ambiente y serie (reservados en ENVIANDO mientras dura
+el envío), arma el XML <lote> con cada
+comprobante firmado en CDATA y, con la respuesta de recepción, determina el
+resultado de cada comprobante por su clave de acceso.
+"""
+import random
+from datetime import timedelta
+
+import zeep.helpers
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from lxml import etree
+
+from ..utils import generar_clave_acceso
+
+# Límites del SRI para un lote: número de comprobantes y tamaño del XML
+LOTE_MAX_COMPROBANTES = 50
+LOTE_MAX_BYTES = 500 * 1024
+
+ESTADOS_PENDIENTES = ('FIRMADO', 'CONTINGENCIA', 'ERROR')
+
+# Un ENVIANDO más antiguo que esto quedó de un proceso caído: se vuelve a enviar
+ENVIO_VENCIDO = timedelta(minutes=15)
+
+
+def envio_vencido():
+    """Filtro de los comprobantes que quedaron en ENVIANDO por un proceso caído"""
+    return Q(estado='ENVIANDO', fecha_actualizacion__lt=timezone.now() - ENVIO_VENCIDO)
+
+# "CLAVE ACCESO REGISTRADA": el SRI ya había recibido el comprobante
+# (p. ej. falló la red al esperar la autorización); solo falta autorizarlo.
+ERROR_CLAVE_REGISTRADA = '43'
+
+
+def _partes_clave(clave):
+    """(tipo de comprobante, ambiente, serie) codificados en la clave de acceso"""
+    return clave[8:10], clave[23], clave[24:30]
+
+
+class LoteSRIService:
+    """Servicio para armar lotes y repartir la respuesta del SRI entre sus comprobantes"""
+
+    @staticmethod
+    def pendientes(limite=None, estados=None):
+        """
+        Comprobantes con XML firmado que aún no fueron recibidos por el SRI.
+        'ENVIANDO' en `estados` toma solo los envíos vencidos (ENVIO_VENCIDO);
+        por defecto se incluyen junto con ESTADOS_PENDIENTES.
+        """
+        from electronic_invoicing.models import ComprobanteElectronico
+
+        estados = estados or ESTADOS_PENDIENTES + ('ENVIANDO',)
+        filtro = Q(estado__in=[estado for estado in estados if estado != 'ENVIANDO'])
+        if 'ENVIANDO' in estados:
+            filtro |= envio_vencido()
+        queryset = ComprobanteElectronico.objects.filter(
+            filtro,
+            clave_acceso__isnull=False,
+            xml_firmado__isnull=False,
+        ).exclude(xml_firmado='').select_related('venta').order_by('fecha_registro')
+        return queryset[:limite] if limite else queryset
+
+    @staticmethod
+    def reclamar(limite=None, estados=None):
+        """
+        Reserva pendientes para enviarlos: los bloquea (saltando los que otro
+        proceso tiene tomados) y los pasa a ENVIANDO en la misma transacción,
+        así ni otro lote ni procesar_factura_electronica los envía de nuevo.
+        Los comprobantes devueltos conservan en memoria su estado anterior.
+        """
+        from electronic_invoicing.models import ComprobanteElectronico
+
+        with transaction.atomic():
+            queryset = LoteSRIService.pendientes(estados=estados).select_for_update(skip_locked=True, of=('self',))
+            comprobantes = list(queryset[:limite] if limite else queryset)
+            ComprobanteElectronico.objects.filter(id__in=[c.id for c in comprobantes]).update(
+                estado='ENVIANDO', fecha_actualizacion=timezone.now()
+            )
+        return comprobantes
+
+    @staticmethod
+    def agrupar(comprobantes, maximo=LOTE_MAX_COMPROBANTES, max_bytes=LOTE_MAX_BYTES):
+        """
+        Reparte los comprobantes en lotes homogéneos (mismo tipo, ambiente y
+        serie) que respetan el máximo de comprobantes y de bytes.
+        """
+        grupos = {}
+        for comprobante in comprobantes:
+            grupos.setdefault(_partes_clave(comprobante.clave_acceso), []).append(comprobante)
+
+        lotes = []
+        for grupo in grupos.values():
+            actual, tamano = [], 0
+            for comprobante in grupo:
+                peso = len(comprobante.xml_firmado.encode('utf-8'))
+                if actual and (len(actual) >= maximo or tamano + peso > max_bytes):
+                    lotes.append(actual)
+                    actual, tamano = [], 0
+                actual.append(comprobante)
+                tamano += peso
+            if actual:
+                lotes.append(actual)
+        return lotes
+
+    @staticmethod
+    def clave_lote(config, comprobantes, secuencial):
+        """Clave de acceso del lote: mismo tipo, ambiente y serie de sus comprobantes"""
+        tipo, ambiente, serie = _partes_clave(comprobantes[0].clave_acceso)
+        return generar_clave_acceso(
+            fecha=timezone.localtime(),
+            tipo_comprobante=tipo,
+            ruc=config.ruc,
+            ambiente=ambiente,
+            serie=serie,
+            secuencial=f"{secuencial % 10 ** 9:09d}",
+            codigo_numerico=f"{random.randint(0, 10 ** 8 - 1):08d}",
+            tipo_emision='1',
+        )
+
+    @staticmethod
+    def construir_xml(clave_lote, ruc, comprobantes):
+        """XML <lote> con cada comprobante firmado como CDATA"""
+        lote = etree.Element("lote", version="1.0.0")
+        etree.SubElement(lote, "claveAcceso").text = clave_lote
+        etree.SubElement(lote, "ruc").text = ruc
+        contenedor = etree.SubElement(lote, "comprobantes")
+        for comprobante in comprobantes:
+            etree.SubElement(contenedor, "comprobante").text = etree.CDATA(comprobante.xml_firmado)
+        return etree.tostring(lote, xml_declaration=True, encoding='UTF-8')
+
+    @staticmethod
+    def _texto_mensajes(mensajes):
+        textos = []
+        for mensaje in mensajes:
+            texto = f"[{mensaje.get('identificador') or '?'}] {mensaje.get('mensaje') or ''}"
+            if mensaje.get('informacionAdicional'):
+                texto += f" - Detalles: {mensaje['informacionAdicional']}"
+            textos.append(texto)
+        return " | ".join(textos)
+
+    @staticmethod
+    def mensajes_por_clave(respuesta):
+        """{clave_acceso: [mensajes]} de la respuesta de recepción"""
+        datos = zeep.helpers.serialize_object(respuesta) or {}
+        resultado = {}
+        for comprobante in ((datos.get('comprobantes') or {}).get('comprobante') or []):
+            mensajes = ((comprobante.get('mensajes') or {}).get('mensaje') or [])
+            resultado.setdefault(comprobante.get('claveAcceso') or '', []).extend(mensajes)
+        return resultado
+
+    @staticmethod
+    def resultados(clave_lote, comprobantes, respuesta):
+        """
+        Resultado de cada comprobante del lote: {id: (estado, mensaje)}.
+        - Lote RECIBIDA: todos quedan RECIBIDO.
+        - Mensajes con la clave de un comprobante: RECHAZADO (o RECIBIDO si
+          el SRI indica que la clave ya estaba registrada).
+        - Mensajes del lote en sí (clave del lote o sin clave): los demás
+          comprobantes vuelven a ERROR para un próximo envío.
+        """
+        mensajes = LoteSRIService.mensajes_por_clave(respuesta)
+        claves = {comprobante.clave_acceso for comprobante in comprobantes}
+        generales = [m for clave, lista in mensajes.items() if clave not in claves for m in lista]
+        recibido = respuesta.estado == 'RECIBIDA'
+
+        resultado = {}
+        for comprobante in comprobantes:
+            propios = mensajes.get(comprobante.clave_acceso)
+            if propios:
+                if all(m.get('identificador') == ERROR_CLAVE_REGISTRADA for m in propios):
+                    resultado[comprobante.id] = ('RECIBIDO', None)
+                else:
+                    detalle = LoteSRIService._texto_mensajes(propios)
+                    resultado[comprobante.id] = ('RECHAZADO', f"Recepción SRI lote ({respuesta.estado}): {detalle}")
+            elif recibido or not generales:
+                resultado[comprobante.id] = ('RECIBIDO', None)
+            else:
+                detalle = LoteSRIService._texto_mensajes(generales)
+                resultado[comprobante.id] = ('ERROR', f"Lote {clave_lote} devuelto: {detalle}")
+        return resultado
@@ -0,0 +1,186 @@
+"""
+Service layer para las notificaciones del monitor SRI (WebSocket)
+Las tareas avisan varias veces por comprobante (generando, firmando, cada
+reintento de autorización...). En vez de un group_send bloqueante por aviso,
+cada proceso guarda el último estado de cada comprobante y los envía juntos
+como máximo una vez por ventana (SRI_MONITOR_VENTANA segundos) en un solo
+mensaje "sri_status_batch". Los avisos intermedios de la misma ventana se
+descartan: el monitor solo necesita el estado más reciente.
+Lo que quede pendiente al terminar el proceso (comando de gestión, proceso
+hijo de Celery) se envía antes de salir: el hilo del envío es daemon y no
+llegaría a ejecutarse.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from celery.signals import worker_process_shutdown
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+GRUPO_MONITOR = "sri_monitor"
+VENTANA_DEFECTO = 0.5
+MAX_POR_ENVIO = 200
+MAX_NUMEROS_CACHE = 5000
+
+# Estado del proceso: último aviso por comprobante y número de factura ya conocido
+_pendientes = {}
+_numeros = {}
+_lock = threading.Lock()
+_timer = None
+_ultimo_envio = 0.0
+
+
+class MonitorSRIService:
+    """Servicio para avisar al monitor SRI agrupando y limitando los envíos"""
+
+    @staticmethod
+    def ventana():
+        return getattr(settings, 'SRI_MONITOR_VENTANA', VENTANA_DEFECTO)
+
+    @staticmethod
+    def limpiar():
+        """Descarta avisos pendientes, el envío programado y los números conocidos"""
+        global _timer
+        with _lock:
+            if _timer is not None:
+                _timer.cancel()
+            _timer = None
+            _pendientes.clear()
+            _numeros.clear()
+
+    @staticmethod
+    def vaciar(**kwargs):
+        """Cancela el envío programado y envía ya todo lo pendiente (al terminar el proceso)"""
+        global _timer
+        with _lock:
+            if _timer is not None:
+                _timer.cancel()
+            _timer = None
+        enviados = 0
+        while _pendientes:
+            lote = MonitorSRIService.enviar_pendientes()
+            if not lote:
+                break
+            enviados += lote
+        return enviados
+
+    @staticmethod
+    def numero_factura(comprobante):
+        """Número de la venta sin consultar la base: de la venta ya cargada o del caché del proceso"""
+        comprobante_id = str(comprobante.pk)
+        if type(comprobante).venta.is_cached(comprobante):
+            numero = comprobante.venta.numero_factura
+            if len(_numeros) >= MAX_NUMEROS_CACHE:
+                _numeros.clear()
+            _numeros[comprobante_id] = numero
+            return numero
+        return _numeros.get(comprobante_id)
+
+    @staticmethod
+    def payload(comprobante, mensaje=None):
+        return {
+            "comprobante_id": str(comprobante.id),
+            "venta_numero": MonitorSRIService.numero_factura(comprobante),
+            "estado": comprobante.estado,
+            "clave_acceso": comprobante.clave_acceso,
+            "numero_autorizacion": comprobante.numero_autorizacion,
+            "mensaje": mensaje,
+            "mensajes_error": comprobante.mensajes_error,
+            "email_enviado": comprobante.email_enviado,
+            "email_mensaje": comprobante.email_mensaje,
+        }
+
+    @staticmethod
+    def notificar(comprobante, mensaje=None):
+        """Encola el estado actual del comprobante (reemplaza el aviso anterior aún no enviado)"""
+        global _timer
+        with _lock:
+            payload = MonitorSRIService.payload(comprobante, mensaje)
+            _pendientes[payload["comprobante_id"]] = payload
+            ventana = MonitorSRIService.ventana()
+            if ventana > 0 and _timer is None:
+                # Respeta la ventana también respecto del último envío
+                espera = max(ventana - (time.monotonic() - _ultimo_envio), 0.05)
+                _timer = threading.Timer(espera, MonitorSRIService._enviar_en_hilo)
+                _timer.daemon = True
+                _timer.start()
+        if ventana <= 0:
+            MonitorSRIService.enviar_pendientes()
+
+    @staticmethod
+    def _enviar_en_hilo():
+        global _timer
+        try:
+            MonitorSRIService.enviar_pendientes()
+        finally:
+            # Conexiones abiertas por este hilo al resolver números de factura
+            connections.close_all()
+            with _lock:
+                _timer = None
+                quedan = bool(_pendientes)
+            if quedan:
+                MonitorSRIService._reprogramar()
+
+    @staticmethod
+    def _reprogramar():
+        global _timer
+        with _lock:
+            if _timer is None and _pendientes:
+                _timer = threading.Timer(MonitorSRIService.ventana(), MonitorSRIService._enviar_en_hilo)
+                _timer.daemon = True
+                _timer.start()
+
+    @staticmethod
+    def completar_numeros(actualizaciones):
+        """Una sola consulta para los comprobantes cuyo número de factura no estaba cargado"""
+        faltantes = [a["comprobante_id"] for a in actualizaciones if a["venta_numero"] is None]
+        if not faltantes:
+            return
+        from electronic_invoicing.models import ComprobanteElectronico
+
+        numeros = {
+            str(pk): numero for pk, numero in
+            ComprobanteElectronico.objects.filter(pk__in=faltantes).values_list('id', 'venta__numero_factura')
+        }
+        with _lock:
+            _numeros.update(numeros)
+        for actualizacion in actualizaciones:
+            if actualizacion["venta_numero"] is None:
+                actualizacion["venta_numero"] = numeros.get(actualizacion["comprobante_id"])
+
+    @staticmethod
+    def enviar_pendientes():
+        """Envía en un solo group_send el último estado de hasta MAX_POR_ENVIO comprobantes"""
+        global _ultimo_envio
+        with _lock:
+            claves = list(_pendientes)[:MAX_POR_ENVIO]
+            actualizaciones = [_pendientes.pop(clave) for clave in claves]
+            _ultimo_envio = time.monotonic()
+        if not actualizaciones:
+            return 0
+
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return 0
+        try:
+            MonitorSRIService.completar_numeros(actualizaciones)
+            async_to_sync(channel_layer.group_send)(
+                GRUPO_MONITOR,
+                {"type": "sri_status_batch", "actualizaciones": actualizaciones},
+            )
+        except Exception as e:
+            # El monitor es informativo: nunca debe romper la facturación
+            logger.warning(f"No se pudo notificar al monitor SRI: {e}")
+            return 0
+        return len(actualizaciones)
+
+
+# Los procesos hijos de Celery salen con os._exit y no ejecutan atexit
+atexit.register(MonitorSRIService.vaciar)
+worker_process_shutdown.connect(MonitorSRIService.vaciar, weak=False)
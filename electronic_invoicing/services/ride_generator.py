@@ -1,28 +1,75 @@
 import logging
 import os
 import base64
+import threading
+import time
 from io import BytesIO
-from django.template.loader import render_to_string
+from django.template.loader import get_template
 from django.conf import settings
 from weasyprint import HTML
+from weasyprint.text.fonts import FontConfiguration
 from barcode import Code128
 from barcode.writer import ImageWriter
 from core.models import Sucursal
 from ..models import SRIConfig
+from .snapshot_factura import FacturaSnapshotService
 
 logger = logging.getLogger(__name__)
 
+# Recursos del RIDE cargados una vez por proceso (worker de la cola "ride").
+# Los datos del emisor se releen cada DATOS_EMISOR_TTL segundos por si cambia la configuración.
+DATOS_EMISOR_TTL = 300
+TEMPLATE_RIDE = 'electronic_invoicing/ride_pdf.html'
+
+_recursos = {}
+_lock = threading.Lock()
+
 class RIDEGenerator:
     """
     Servicio para generar el RIDE (Representación Impresa de Documento Electrónico)
     en formato PDF utilizando WeasyPrint y plantillas HTML.
     """
 
-    def __init__(self, comprobante):
+    def __init__(self, comprobante, snapshot=None):
         self.comprobante = comprobante
-        self.venta = comprobante.venta
+        # Venta con cliente, usuario y detalles cargados en una sola pasada
+        self.snapshot = snapshot or FacturaSnapshotService.cargar(comprobante.venta_id)
+        self.venta = self.snapshot.venta
+
+    @staticmethod
+    def _recurso(nombre, cargar):
+        """Devuelve el recurso del proceso, cargándolo la primera vez"""
+        with _lock:
+            if nombre not in _recursos:
+                _recursos[nombre] = cargar()
+            return _recursos[nombre]
+
+    @staticmethod
+    def limpiar_recursos():
+        """Olvida logo, plantilla, fuentes y datos del emisor (se recargan en el próximo RIDE)"""
+        with _lock:
+            _recursos.clear()
+
+    def _datos_emisor(self):
+        """SRIConfig y sucursal principal, cacheados por DATOS_EMISOR_TTL segundos"""
+        with _lock:
+            datos = _recursos.get('emisor')
+        if datos is None or time.monotonic() - datos['cargado'] > DATOS_EMISOR_TTL:
+            datos = {
+                'sri_config': SRIConfig.objects.first(),
+                'sucursal': Sucursal.get_sucursal_principal(),
+                'cargado': time.monotonic(),
+            }
+            with _lock:
+                _recursos['emisor'] = datos
+        return datos['sri_config'], datos['sucursal']
 
     def _get_logo_base64(self):
+        """Logo de la empresa en base64 (se lee del disco una vez por proceso)"""
+        return self._recurso('logo', self._leer_logo_base64)
+
+    @staticmethod
+    def _leer_logo_base64():
         """Intenta cargar el logo de la empresa y devolverlo en base64"""
         logo_path = os.path.join(settings.BASE_DIR, 'static', 'logo_vp.png')
         if not os.path.exists(logo_path):
@@ -59,39 +106,29 @@ class RIDEGenerator:
     def generar_pdf(self):
         """Genera el contenido del PDF y lo devuelve en BytesIO"""
         try:
-            # 1. Preparar datos de empresa y configuración
-            sucursal = Sucursal.get_sucursal_principal()
-            sri_config = SRIConfig.objects.first()
+            # 1. Preparar datos de empresa y configuración (cacheados por proceso)
+            sri_config, sucursal = self._datos_emisor()
             
             # Datos de la Empresa
             razon_social = sri_config.razon_social if (sri_config and sri_config.razon_social) else (sucursal.nombre if sucursal else "VPMOTOS")
             ruc_emisor = sri_config.ruc if (sri_config and sri_config.ruc) else (sucursal.ruc if sucursal else "0000000000001")
             
-            # 2. Preparar detalles de productos
-            detalles_pdf = []
-            for det in self.venta.detalleventa_set.all():
-                if det.producto:
-                    codigo = det.producto.codigo_unico or det.producto.codigo
-                    nombre = det.producto.nombre
-                elif det.tipo_servicio:
-                    codigo = det.tipo_servicio.codigo if hasattr(det.tipo_servicio, 'codigo') else "SERV"
-                    nombre = det.tipo_servicio.nombre
-                else:
-                    codigo = "GEN"
-                    nombre = det.nombre_personalizado or "ITEM"
-                
-                detalles_pdf.append({
-                    'codigo': codigo,
-                    'nombre': nombre,
-                    'cantidad': det.cantidad,
-                    'precio_unitario': det.precio_unitario,
-                    'total': det.total
-                })
-
-            # 3. Datos de impuestos
-            total_iva_15 = self.venta.get_base_iva_standard()
-            total_iva_0 = self.venta.get_base_iva_0()
-            valor_iva = self.venta.get_total_iva_standard()
+            # 2. Preparar detalles de productos (mismos códigos que el XML)
+            detalles_pdf = [
+                {
+                    'codigo': linea.codigo,
+                    'nombre': linea.descripcion,
+                    'cantidad': linea.cantidad,
+                    'precio_unitario': linea.precio_unitario,
+                    'total': linea.total,
+                }
+                for linea in self.snapshot.lineas
+            ]
+
+            # 3. Datos de impuestos (calculados en memoria en el snapshot)
+            total_iva_15 = self.snapshot.base_iva_standard
+            total_iva_0 = self.snapshot.base_iva_0
+            valor_iva = self.snapshot.total_iva_standard
 
             # 4. Generar elementos visuales
             logo_b64 = self._get_logo_base64()
@@ -119,9 +156,11 @@ class RIDEGenerator:
             }
 
             # 6. Generar PDF con WeasyPrint
-            html_string = render_to_string('electronic_invoicing/ride_pdf.html', context)
+            plantilla = self._recurso('template', lambda: get_template(TEMPLATE_RIDE))
+            html_string = plantilla.render(context)
             buffer = BytesIO()
-            HTML(string=html_string).write_pdf(target=buffer)
+            font_config = self._recurso('fuentes', FontConfiguration)
+            HTML(string=html_string).write_pdf(target=buffer, font_config=font_config)
             
             buffer.seek(0)
             return buffer
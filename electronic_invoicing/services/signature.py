@@ -1,8 +1,10 @@
 import copy
 import logging
+import threading
 import uuid
 import base64
 import hashlib
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from lxml import etree
 from cryptography.hazmat.primitives.serialization import pkcs12, Encoding
@@ -12,6 +14,21 @@ from cryptography.hazmat.primitives.asymmetric import padding as asymmetric_padd
 logger = logging.getLogger(__name__)
 
 
+@dataclass(frozen=True)
+class MaterialFirma:
+    """Clave privada y datos del certificado ya extraídos del .p12"""
+    private_key: object
+    cert_b64: str
+    cert_digest: str
+    issuer: str
+    serial: str
+
+
+# Caché por proceso: {certificado_id: (fecha_actualizacion, MaterialFirma)}
+_materiales = {}
+_lock = threading.Lock()
+
+
 class SignatureServiceSRI:
     """
     Firma XAdES-BES compatible con SRI Ecuador.
@@ -28,6 +45,75 @@ class SignatureServiceSRI:
 
     def __init__(self, certificado_obj):
         self.certificado_obj = certificado_obj
+        self._material = None
+
+    @classmethod
+    def desde_p12(cls, p12_content: bytes, password: str):
+        """Firmador sin modelo ni base de datos (p. ej. en un proceso del pool de firma)"""
+        firmador = cls(None)
+        firmador._material = firmador._material_de_p12(p12_content, password)
+        return firmador
+
+    # ── Material criptográfico (caché por proceso) ───────────────────────────
+
+    def _material_de_p12(self, p12_content: bytes, password: str) -> MaterialFirma:
+        """Extrae clave privada y datos del certificado del contenido .p12."""
+        private_key, certificate, _ = pkcs12.load_key_and_certificates(
+            p12_content, password.encode()
+        )
+        cert_der = certificate.public_bytes(Encoding.DER)
+        return MaterialFirma(
+            private_key=private_key,
+            cert_b64=base64.b64encode(cert_der).decode(),
+            cert_digest=self._sha256_base64(cert_der),
+            # ✅ FIX CRÍTICO: incluir 2.5.4.97 (ORGANIZATIONIDENTIFIER) para UANATACA
+            issuer=self._build_issuer_string(certificate.issuer),
+            serial=str(certificate.serial_number),
+        )
+
+    def contenido_p12(self):
+        """(.p12 en bytes, contraseña descifrada) del certificado del modelo."""
+        if not self.certificado_obj or not hasattr(self.certificado_obj, 'archivo'):
+            raise ValueError("Objeto de certificado inválido.")
+        with self.certificado_obj.archivo.open('rb') as archivo:
+            p12_content = archivo.read()
+        password = self.certificado_obj.get_password()
+        if not password:
+            raise ValueError("No se pudo recuperar la contraseña del certificado.")
+        return p12_content, password
+
+    def material(self) -> MaterialFirma:
+        """
+        Material de firma del certificado, cargado una sola vez por proceso.
+        La clave incluye la fecha de modificación: si el certificado (o su
+        contraseña) cambia, el siguiente uso vuelve a leer el .p12.
+        """
+        if self._material is not None:
+            return self._material
+
+        certificado = self.certificado_obj
+        marca = getattr(certificado, 'fecha_actualizacion', None)
+        if getattr(certificado, 'pk', None) is None:
+            return self._material_de_p12(*self.contenido_p12())
+
+        with _lock:
+            guardado = _materiales.get(certificado.pk)
+        if guardado and guardado[0] == marca:
+            return guardado[1]
+
+        material = self._material_de_p12(*self.contenido_p12())
+        with _lock:
+            _materiales[certificado.pk] = (marca, material)
+        return material
+
+    @staticmethod
+    def invalidar_cache(certificado_id=None):
+        """Descarta el material cargado de un certificado (o de todos)"""
+        with _lock:
+            if certificado_id is None:
+                _materiales.clear()
+            else:
+                _materiales.pop(certificado_id, None)
 
     # ── Utilidades ────────────────────────────────────────────────────────────
 
@@ -72,17 +158,8 @@ class SignatureServiceSRI:
 
     def firmar_xml(self, xml_content: bytes) -> bytes:
         try:
-            # 1. Cargar certificado .p12
-            if not self.certificado_obj or not hasattr(self.certificado_obj, 'archivo'):
-                raise ValueError("Objeto de certificado inválido.")
-            p12_content = self.certificado_obj.archivo.read()
-            password    = self.certificado_obj.get_password()
-            if not password:
-                raise ValueError("No se pudo recuperar la contraseña del certificado.")
-
-            private_key, certificate, _ = pkcs12.load_key_and_certificates(
-                p12_content, password.encode()
-            )
+            # 1. Clave y certificado (cacheados por proceso)
+            material = self.material()
 
             # 2. Parsear XML
             parser = etree.XMLParser(remove_blank_text=True)
@@ -93,7 +170,7 @@ class SignatureServiceSRI:
             sig_id          = f"Signature{uuid.uuid4().hex[:8]}"
             key_info_id     = f"KeyInfo{uuid.uuid4().hex[:8]}"
             signed_props_id = f"SignedProperties{uuid.uuid4().hex[:8]}"
-            cert_b64        = base64.b64encode(certificate.public_bytes(Encoding.DER)).decode()
+            cert_b64        = material.cert_b64
             signing_time    = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
             NS_DS    = "http://www.w3.org/2000/09/xmldsig#"
@@ -179,15 +256,11 @@ class SignatureServiceSRI:
             cert_digest = etree.SubElement(cert_node, f"{{{NS_XADES}}}CertDigest")
             etree.SubElement(cert_digest, f"{{{NS_DS}}}DigestMethod",
                              Algorithm="http://www.w3.org/2001/04/xmlenc#sha256")
-            etree.SubElement(cert_digest, f"{{{NS_DS}}}DigestValue").text = \
-                self._sha256_base64(certificate.public_bytes(Encoding.DER))
+            etree.SubElement(cert_digest, f"{{{NS_DS}}}DigestValue").text = material.cert_digest
 
             issuer_serial = etree.SubElement(cert_node, f"{{{NS_XADES}}}IssuerSerial")
-            # ✅ FIX CRÍTICO: incluir 2.5.4.97 (ORGANIZATIONIDENTIFIER) para UANATACA
-            etree.SubElement(issuer_serial, f"{{{NS_DS}}}X509IssuerName").text = \
-                self._build_issuer_string(certificate.issuer)
-            etree.SubElement(issuer_serial, f"{{{NS_DS}}}X509SerialNumber").text = \
-                str(certificate.serial_number)
+            etree.SubElement(issuer_serial, f"{{{NS_DS}}}X509IssuerName").text = material.issuer
+            etree.SubElement(issuer_serial, f"{{{NS_DS}}}X509SerialNumber").text = material.serial
 
             # Digest SignedProperties ya está completo
             digest_sp_elem.text = self._sha256_base64(self._canonicalize(signed_props))
@@ -207,7 +280,7 @@ class SignatureServiceSRI:
             # 7. Firmar SignedInfo con el digest correcto ya puesto
             signed_info_node = root.find(f"{{{NS_DS}}}Signature/{{{NS_DS}}}SignedInfo")
             signed_info_c14n = self._canonicalize(signed_info_node)
-            raw_sig = private_key.sign(
+            raw_sig = material.private_key.sign(
                 signed_info_c14n,
                 asymmetric_padding.PKCS1v15(),
                 hashes.SHA256()
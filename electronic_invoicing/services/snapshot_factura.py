@@ -0,0 +1,102 @@
+"""
+Service layer para cargar una factura completa en una sola pasada
+Trae la venta con cliente y usuario (select_related) y sus detalles con
+producto y tipo de servicio (prefetch_related): dos consultas en total.
+El desglose de IVA se calcula en memoria sobre esos detalles, así el XML
+(XMLGeneratorSRI) y el RIDE (RIDEGenerator) no repiten agregados ni
+cargan perezosamente cada línea.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from django.db.models import Prefetch
+
+
+@dataclass(frozen=True)
+class LineaFactura:
+    """Detalle de la venta con su código y descripción ya resueltos"""
+    codigo: str
+    descripcion: str
+    cantidad: Decimal
+    precio_unitario: Decimal
+    descuento: Decimal
+    subtotal: Decimal
+    iva_porcentaje: Decimal
+    iva: Decimal
+    total: Decimal
+
+
+@dataclass
+class FacturaSnapshot:
+    """Venta (con cliente y usuario cargados), sus líneas y el desglose de IVA"""
+    venta: object
+    lineas: list = field(default_factory=list)
+    base_iva_standard: Decimal = Decimal('0.00')
+    total_iva_standard: Decimal = Decimal('0.00')
+    base_iva_0: Decimal = Decimal('0.00')
+
+    @property
+    def cliente(self):
+        return self.venta.cliente
+
+
+class FacturaSnapshotService:
+    """Servicio para obtener el snapshot de una factura"""
+
+    @staticmethod
+    def queryset():
+        from ventas.models import Venta, DetalleVenta
+
+        return Venta.objects.select_related('cliente', 'usuario').prefetch_related(
+            Prefetch(
+                'detalleventa_set',
+                queryset=DetalleVenta.objects.select_related('producto', 'tipo_servicio').order_by('id'),
+            )
+        )
+
+    @staticmethod
+    def cargar(venta):
+        """Snapshot a partir de una venta o su id (dos consultas)"""
+        venta_id = getattr(venta, 'pk', venta)
+        return FacturaSnapshotService.desde_venta(FacturaSnapshotService.queryset().get(pk=venta_id))
+
+    @staticmethod
+    def linea(detalle):
+        """Código y descripción según lo que se vendió (producto, servicio o ítem libre)"""
+        if detalle.producto:
+            codigo = str(detalle.producto.codigo_unico[:25] if detalle.producto.codigo_unico else "COD-001")
+            descripcion = str(detalle.producto.nombre[:300])
+        elif detalle.tipo_servicio:
+            codigo = str(detalle.tipo_servicio.codigo[:25] if hasattr(detalle.tipo_servicio, 'codigo') else "SERV-001")
+            descripcion = str(detalle.tipo_servicio.nombre[:300])
+        else:
+            codigo = "GENERICO"
+            descripcion = str(detalle.nombre_personalizado[:300] if detalle.nombre_personalizado else "PRODUCTO/SERVICIO")
+
+        return LineaFactura(
+            codigo=codigo,
+            descripcion=descripcion,
+            cantidad=detalle.cantidad,
+            precio_unitario=detalle.precio_unitario,
+            descuento=detalle.descuento,
+            subtotal=detalle.subtotal,
+            iva_porcentaje=detalle.iva_porcentaje,
+            iva=detalle.iva,
+            total=detalle.total,
+        )
+
+    @staticmethod
+    def desde_venta(venta):
+        """
+        Arma el snapshot de una venta ya cargada con FacturaSnapshotService.queryset().
+        Mismo desglose que Venta.get_base_iva_standard/get_total_iva_standard/get_base_iva_0.
+        """
+        snapshot = FacturaSnapshot(venta=venta)
+        for detalle in venta.detalleventa_set.all():
+            snapshot.lineas.append(FacturaSnapshotService.linea(detalle))
+            if detalle.iva_porcentaje > 0:
+                snapshot.base_iva_standard += detalle.subtotal
+                snapshot.total_iva_standard += detalle.iva
+            elif detalle.iva_porcentaje == 0:
+                snapshot.base_iva_0 += detalle.subtotal
+        return snapshot
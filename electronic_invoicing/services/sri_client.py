@@ -0,0 +1,112 @@
+"""
+Fábrica de clientes SOAP (zeep) para los servicios web del SRI
+Cada worker reutiliza un único requests.Session con pool de conexiones
+(keep-alive TLS) y un cliente zeep por URL de WSDL. Los WSDL/XSD descargados
+se guardan en una caché SQLite en disco, compartida entre procesos, para no
+volver a descargarlos y parsearlos en cada factura. El transporte alimenta
+el circuit breaker del SRI (CircuitoSRIService).
+"""
+import logging
+import os
+import tempfile
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from zeep import Client
+from zeep.cache import SqliteCache
+
+from .circuito_sri import TransporteSRI
+
+logger = logging.getLogger(__name__)
+
+# Vigencia de los WSDL en la caché de disco (el SRI casi nunca los cambia)
+WSDL_CACHE_TTL = 24 * 60 * 60
+# Segundos para descargar el WSDL / para cada llamada SOAP
+TIMEOUT_WSDL = 30
+TIMEOUT_OPERACION = 60
+POOL_CONEXIONES = 10
+
+_lock = threading.Lock()
+_estado = {'pid': None, 'session': None, 'clientes': {}}
+
+
+class SRIClientFactory:
+    """Clientes zeep reutilizables por proceso para recepción y autorización"""
+
+    @staticmethod
+    def ruta_cache():
+        return getattr(settings, 'SRI_WSDL_CACHE_PATH',
+                       os.path.join(tempfile.gettempdir(), 'sri_wsdl_cache.db'))
+
+    @staticmethod
+    def _crear_session():
+        session = requests.Session()
+        # Solo se reintentan las descargas de WSDL (GET); un POST al SRI
+        # reenviado a ciegas podría duplicar la recepción del comprobante.
+        reintentos = Retry(total=2, connect=2, read=0, backoff_factor=0.5,
+                           allowed_methods=frozenset(['GET']))
+        adaptador = HTTPAdapter(pool_connections=POOL_CONEXIONES, pool_maxsize=POOL_CONEXIONES,
+                                max_retries=reintentos)
+        session.mount('https://', adaptador)
+        session.mount('http://', adaptador)
+        return session
+
+    @staticmethod
+    def _verificar_proceso():
+        """Tras un fork (worker prefork de Celery) no se heredan sockets del padre"""
+        pid = os.getpid()
+        if _estado['pid'] != pid:
+            _estado['pid'] = pid
+            _estado['session'] = None
+            _estado['clientes'] = {}
+
+    @staticmethod
+    def session():
+        with _lock:
+            SRIClientFactory._verificar_proceso()
+            if _estado['session'] is None:
+                _estado['session'] = SRIClientFactory._crear_session()
+            return _estado['session']
+
+    @staticmethod
+    def cliente(url):
+        """Cliente zeep para la URL de WSDL indicada (se crea una vez por proceso)"""
+        session = SRIClientFactory.session()
+        with _lock:
+            cliente = _estado['clientes'].get(url)
+            if cliente is None:
+                try:
+                    cache = SqliteCache(path=SRIClientFactory.ruta_cache(), timeout=WSDL_CACHE_TTL)
+                except Exception as e:
+                    logger.warning(f"Caché de WSDL no disponible, se descargará cada vez: {e}")
+                    cache = None
+                transport = TransporteSRI(cache=cache, session=session, timeout=TIMEOUT_WSDL,
+                                          operation_timeout=TIMEOUT_OPERACION)
+                cliente = Client(url, transport=transport)
+                _estado['clientes'][url] = cliente
+            return cliente
+
+    @staticmethod
+    def url_recepcion(config):
+        return config.wsdl_recepcion_pruebas if config.ambiente == 1 else config.wsdl_recepcion_produccion
+
+    @staticmethod
+    def recepcion(config):
+        return SRIClientFactory.cliente(SRIClientFactory.url_recepcion(config))
+
+    @staticmethod
+    def autorizacion(config):
+        url = config.wsdl_autorizacion_pruebas if config.ambiente == 1 else config.wsdl_autorizacion_produccion
+        return SRIClientFactory.cliente(url)
+
+    @staticmethod
+    def limpiar():
+        """Descarta los clientes y cierra las conexiones de este proceso"""
+        with _lock:
+            if _estado['session'] is not None:
+                _estado['session'].close()
+            _estado['session'] = None
+            _estado['clientes'] = {}
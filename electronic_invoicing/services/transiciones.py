@@ -0,0 +1,142 @@
+"""
+Service layer para el historial de etapas de los comprobantes
+Cada etapa (generar, firmar, recepción, espera de autorización, RIDE y email)
+deja una TransicionComprobante con su duración, y de ahí salen las métricas
+p50/p95 por etapa, día y punto de emisión.
+"""
+import math
+import time
+from collections import defaultdict
+
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+# Etapas cuyo tiempo depende del SRI; el resto es código propio
+ETAPAS_SRI = ('RECEPCION', 'AUTORIZACION')
+
+
+class TransicionService:
+    """Servicio para registrar transiciones y calcular métricas por etapa"""
+
+    @staticmethod
+    def milisegundos(inicio):
+        """Milisegundos desde inicio (un time.perf_counter())"""
+        return max(0, round((time.perf_counter() - inicio) * 1000))
+
+    @staticmethod
+    def nueva(comprobante, etapa, estado_anterior, inicio=None, duracion_ms=0, exitosa=True, mensaje=None):
+        """Transición sin guardar (para bulk_create); el estado nuevo es el actual del comprobante"""
+        from electronic_invoicing.models import TransicionComprobante
+
+        if inicio is not None:
+            duracion_ms = TransicionService.milisegundos(inicio)
+        return TransicionComprobante(
+            comprobante_id=comprobante.pk,
+            punto_emision_id=comprobante.punto_emision_id,
+            etapa=etapa,
+            estado_anterior=estado_anterior or '',
+            estado_nuevo=comprobante.estado or '',
+            exitosa=exitosa,
+            duracion_ms=duracion_ms,
+            mensaje=mensaje,
+        )
+
+    @staticmethod
+    def registrar(comprobante, etapa, estado_anterior, inicio=None, duracion_ms=0, exitosa=True, mensaje=None):
+        transicion = TransicionService.nueva(comprobante, etapa, estado_anterior, inicio=inicio,
+                                             duracion_ms=duracion_ms, exitosa=exitosa, mensaje=mensaje)
+        transicion.save()
+        return transicion
+
+    @staticmethod
+    def registrar_varias(transiciones):
+        from electronic_invoicing.models import TransicionComprobante
+
+        return TransicionComprobante.objects.bulk_create(transiciones)
+
+    @staticmethod
+    def espera_autorizacion_ms(comprobante):
+        """Tiempo desde la última recepción exitosa (el SRI decide entre medio)"""
+        from electronic_invoicing.models import TransicionComprobante
+
+        recibido = TransicionComprobante.objects.filter(
+            comprobante_id=comprobante.pk, etapa='RECEPCION', exitosa=True,
+        ).order_by('-fecha').values_list('fecha', flat=True).first()
+        if recibido is None:
+            return 0
+        return max(0, round((timezone.now() - recibido).total_seconds() * 1000))
+
+    @staticmethod
+    def percentil(valores, porcentaje):
+        """Percentil por rango más cercano sobre una lista ya ordenada"""
+        if not valores:
+            return None
+        posicion = max(1, math.ceil(porcentaje / 100 * len(valores)))
+        return valores[posicion - 1]
+
+    @staticmethod
+    def _filas(desde, hasta, punto_emision_id=None):
+        from electronic_invoicing.models import TransicionComprobante
+
+        transiciones = TransicionComprobante.objects.filter(fecha__date__gte=desde, fecha__date__lte=hasta)
+        if punto_emision_id:
+            transiciones = transiciones.filter(punto_emision_id=punto_emision_id)
+        return transiciones.annotate(dia=TruncDate('fecha')).values_list(
+            'dia', 'punto_emision__establecimiento', 'punto_emision__punto_emision',
+            'etapa', 'duracion_ms', 'exitosa',
+        ).iterator()
+
+    @staticmethod
+    def _agregar(filas, agrupar):
+        """Agrupa (clave, etapa) -> duraciones y devuelve p50/p95 de cada grupo en orden de etapa"""
+        from electronic_invoicing.models import TransicionComprobante
+
+        grupos = defaultdict(list)
+        errores = defaultdict(int)
+        for dia, establecimiento, punto, etapa, duracion, exitosa in filas:
+            clave = agrupar(dia, f"{establecimiento}-{punto}" if establecimiento else "Sin punto") + (etapa,)
+            grupos[clave].append(duracion)
+            if not exitosa:
+                errores[clave] += 1
+
+        orden_etapas = {etapa: n for n, (etapa, _) in enumerate(TransicionComprobante.ETAPA_CHOICES)}
+        nombres = dict(TransicionComprobante.ETAPA_CHOICES)
+        resultado = []
+        for clave in sorted(grupos, key=lambda c: c[:-1] + (orden_etapas.get(c[-1], 99),)):
+            duraciones = sorted(grupos[clave])
+            resultado.append({
+                'clave': clave[:-1],
+                'etapa': clave[-1],
+                'etapa_nombre': nombres.get(clave[-1], clave[-1]),
+                'origen': 'SRI' if clave[-1] in ETAPAS_SRI else 'Interno',
+                'cantidad': len(duraciones),
+                'errores': errores[clave],
+                'p50_ms': TransicionService.percentil(duraciones, 50),
+                'p95_ms': TransicionService.percentil(duraciones, 95),
+                'max_ms': duraciones[-1],
+            })
+        return resultado
+
+    @staticmethod
+    def metricas(desde, hasta, punto_emision_id=None):
+        """
+        p50/p95 de duración por día, punto de emisión y etapa entre dos fechas
+        (inclusive). Los percentiles se calculan aquí para no depender de
+        percentile_cont de PostgreSQL.
+        """
+        filas = TransicionService._agregar(
+            TransicionService._filas(desde, hasta, punto_emision_id), lambda dia, punto: (dia, punto)
+        )
+        for fila in filas:
+            fila['dia'], fila['punto_emision'] = fila.pop('clave')
+        return filas
+
+    @staticmethod
+    def resumen(desde, hasta, punto_emision_id=None):
+        """p50/p95 por etapa para todo el rango: dónde se va el tiempo"""
+        filas = TransicionService._agregar(
+            TransicionService._filas(desde, hasta, punto_emision_id), lambda dia, punto: ()
+        )
+        for fila in filas:
+            fila.pop('clave')
+        return filas
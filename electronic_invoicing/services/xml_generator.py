@@ -4,6 +4,7 @@ from datetime import datetime
 from decimal import Decimal
 from django.utils import timezone
 from ..utils import obtener_codigo_sri_identificacion, generar_clave_acceso
+from .snapshot_factura import FacturaSnapshot, FacturaSnapshotService
 
 class XMLGeneratorSRI:
     """Servicio para generar archivos XML bajo el estándar del SRI Ecuador (v1.1.0)"""
@@ -13,7 +14,12 @@ class XMLGeneratorSRI:
         self.punto_emision = punto_emision
 
     def generar_xml_factura(self, venta):
-        """Genera el XML para una factura específica"""
+        """
+        Genera el XML para una factura específica. Acepta la venta (o su id)
+        o un FacturaSnapshot ya cargado; todo se arma sin consultas por línea.
+        """
+        snapshot = venta if isinstance(venta, FacturaSnapshot) else FacturaSnapshotService.cargar(venta)
+        venta = snapshot.venta
         
         punto_emision = self.punto_emision
         secuencial_num = punto_emision.ultimo_secuencial + 1
@@ -89,17 +95,17 @@ class XMLGeneratorSRI:
         total_con_impuestos = etree.SubElement(info_factura, "totalConImpuestos")
         
         # Tarifa Estándar (15% u otro según item)
-        base_iva_any = venta.get_base_iva_standard()
+        base_iva_any = snapshot.base_iva_standard
         if base_iva_any > 0:
             total_impuesto_standard = etree.SubElement(total_con_impuestos, "totalImpuesto")
             total_impuesto_standard.find("codigo") # Just to check structure if needed, but SubElement is direct
             etree.SubElement(total_impuesto_standard, "codigo").text = "2" # 2 = IVA
             etree.SubElement(total_impuesto_standard, "codigoPorcentaje").text = "4" # 4 = 15% (SRI Code) 
             etree.SubElement(total_impuesto_standard, "baseImponible").text = f"{base_iva_any:.2f}"
-            etree.SubElement(total_impuesto_standard, "valor").text = f"{venta.get_total_iva_standard():.2f}"
+            etree.SubElement(total_impuesto_standard, "valor").text = f"{snapshot.total_iva_standard:.2f}"
             
         # Tarifa 0%
-        base_iva_0 = venta.get_base_iva_0()
+        base_iva_0 = snapshot.base_iva_0
         if base_iva_0 > 0:
             total_impuesto_0 = etree.SubElement(total_con_impuestos, "totalImpuesto")
             etree.SubElement(total_impuesto_0, "codigo").text = "2" # 2 = IVA
@@ -125,22 +131,12 @@ class XMLGeneratorSRI:
 
         # --- detalles ---
         detalles_xml = etree.SubElement(root, "detalles")
-        for detalle in venta.detalleventa_set.all():
+        for detalle in snapshot.lineas:
             det_xml = etree.SubElement(detalles_xml, "detalle")
             
-            # Identificadores del producto o servicio
-            if detalle.producto:
-                codigo_principal = str(detalle.producto.codigo_unico[:25] if detalle.producto.codigo_unico else "COD-001")
-                descripcion = str(detalle.producto.nombre[:300])
-            elif detalle.tipo_servicio:
-                codigo_principal = str(detalle.tipo_servicio.codigo[:25] if hasattr(detalle.tipo_servicio, 'codigo') else "SERV-001")
-                descripcion = str(detalle.tipo_servicio.nombre[:300])
-            else:
-                codigo_principal = "GENERICO"
-                descripcion = str(detalle.nombre_personalizado[:300] if detalle.nombre_personalizado else "PRODUCTO/SERVICIO")
-
-            etree.SubElement(det_xml, "codigoPrincipal").text = codigo_principal
-            etree.SubElement(det_xml, "descripcion").text = descripcion
+            # Identificadores del producto o servicio (resueltos en el snapshot)
+            etree.SubElement(det_xml, "codigoPrincipal").text = detalle.codigo
+            etree.SubElement(det_xml, "descripcion").text = detalle.descripcion
             
             cantidad = detalle.cantidad
             etree.SubElement(det_xml, "cantidad").text = f"{cantidad:.2f}"
@@ -0,0 +1,343 @@
+"""
+Servidor SOAP local que imita los servicios web offline del SRI
+(RecepcionComprobantesOffline y AutorizacionComprobantesOffline).
+Sirve WSDL mínimos compatibles con zeep y responde validarComprobante
+(comprobante individual o <lote>) y autorizacionComprobante sin salir a
+internet. Solo para pruebas y para probar el flujo de facturación en
+desarrollo: no forma parte de los servicios de la aplicación.
+
+    with ServidorSRISimulado(estados_autorizacion=['EN PROCESO', 'AUTORIZADO']) as sri:
+        config.wsdl_recepcion_pruebas = sri.url_recepcion
+        ...
+"""
+import base64
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from lxml import etree
+
+SOAP_ENV = 'http://schemas.xmlsoap.org/soap/envelope/'
+NS_RECEPCION = 'http://ec.gob.sri.ws.recepcion'
+NS_AUTORIZACION = 'http://ec.gob.sri.ws.autorizacion'
+
+_TIPOS_MENSAJE = """
+   <xsd:complexType name="mensaje"><xsd:sequence>
+    <xsd:element name="identificador" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="mensaje" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="informacionAdicional" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="tipo" type="xsd:string" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType>
+   <xsd:complexType name="mensajes"><xsd:sequence>
+    <xsd:element name="mensaje" type="tns:mensaje" minOccurs="0" maxOccurs="unbounded"/>
+   </xsd:sequence></xsd:complexType>
+"""
+
+WSDL_RECEPCION = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="http://ec.gob.sri.ws.recepcion"
+ targetNamespace="http://ec.gob.sri.ws.recepcion" name="RecepcionComprobantesOfflineService">
+ <types>
+  <xsd:schema targetNamespace="http://ec.gob.sri.ws.recepcion">
+   <xsd:element name="validarComprobante"><xsd:complexType><xsd:sequence>
+    <xsd:element name="xml" type="xsd:base64Binary" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType></xsd:element>
+   <xsd:element name="validarComprobanteResponse"><xsd:complexType><xsd:sequence>
+    <xsd:element name="RespuestaRecepcionComprobante" type="tns:respuestaSolicitud" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType></xsd:element>
+   <xsd:complexType name="respuestaSolicitud"><xsd:sequence>
+    <xsd:element name="estado" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="comprobantes" minOccurs="0"><xsd:complexType><xsd:sequence>
+     <xsd:element name="comprobante" type="tns:comprobante" minOccurs="0" maxOccurs="unbounded"/>
+    </xsd:sequence></xsd:complexType></xsd:element>
+   </xsd:sequence></xsd:complexType>
+   <xsd:complexType name="comprobante"><xsd:sequence>
+    <xsd:element name="claveAcceso" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="mensajes" type="tns:mensajes" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType>
+   {tipos_mensaje}
+  </xsd:schema>
+ </types>
+ <message name="validarComprobante"><part name="parameters" element="tns:validarComprobante"/></message>
+ <message name="validarComprobanteResponse"><part name="parameters" element="tns:validarComprobanteResponse"/></message>
+ <portType name="RecepcionComprobantesOffline">
+  <operation name="validarComprobante">
+   <input message="tns:validarComprobante"/><output message="tns:validarComprobanteResponse"/>
+  </operation>
+ </portType>
+ <binding name="RecepcionComprobantesOfflinePortBinding" type="tns:RecepcionComprobantesOffline">
+  <soap:binding transport="http://schemas.xmlsoap.org/soap/http" style="document"/>
+  <operation name="validarComprobante"><soap:operation soapAction=""/>
+   <input><soap:body use="literal"/></input><output><soap:body use="literal"/></output>
+  </operation>
+ </binding>
+ <service name="RecepcionComprobantesOfflineService">
+  <port name="RecepcionComprobantesOfflinePort" binding="tns:RecepcionComprobantesOfflinePortBinding">
+   <soap:address location="{location}"/>
+  </port>
+ </service>
+</definitions>
+"""
+
+WSDL_AUTORIZACION = """<?xml version="1.0" encoding="UTF-8"?>
+<definitions xmlns="http://schemas.xmlsoap.org/wsdl/" xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="http://ec.gob.sri.ws.autorizacion"
+ targetNamespace="http://ec.gob.sri.ws.autorizacion" name="AutorizacionComprobantesOfflineService">
+ <types>
+  <xsd:schema targetNamespace="http://ec.gob.sri.ws.autorizacion">
+   <xsd:element name="autorizacionComprobante"><xsd:complexType><xsd:sequence>
+    <xsd:element name="claveAccesoComprobante" type="xsd:string" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType></xsd:element>
+   <xsd:element name="autorizacionComprobanteResponse"><xsd:complexType><xsd:sequence>
+    <xsd:element name="RespuestaAutorizacionComprobante" type="tns:respuestaComprobante" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType></xsd:element>
+   <xsd:complexType name="respuestaComprobante"><xsd:sequence>
+    <xsd:element name="claveAccesoConsultada" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="numeroComprobantes" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="autorizaciones" type="tns:autorizaciones" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType>
+   <xsd:complexType name="autorizaciones"><xsd:sequence>
+    <xsd:element name="autorizacion" type="tns:autorizacion" minOccurs="0" maxOccurs="unbounded"/>
+   </xsd:sequence></xsd:complexType>
+   <xsd:complexType name="autorizacion"><xsd:sequence>
+    <xsd:element name="estado" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="numeroAutorizacion" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="fechaAutorizacion" type="xsd:dateTime" minOccurs="0"/>
+    <xsd:element name="ambiente" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="comprobante" type="xsd:string" minOccurs="0"/>
+    <xsd:element name="mensajes" type="tns:mensajes" minOccurs="0"/>
+   </xsd:sequence></xsd:complexType>
+   {tipos_mensaje}
+  </xsd:schema>
+ </types>
+ <message name="autorizacionComprobante"><part name="parameters" element="tns:autorizacionComprobante"/></message>
+ <message name="autorizacionComprobanteResponse"><part name="parameters" element="tns:autorizacionComprobanteResponse"/></message>
+ <portType name="AutorizacionComprobantesOffline">
+  <operation name="autorizacionComprobante">
+   <input message="tns:autorizacionComprobante"/><output message="tns:autorizacionComprobanteResponse"/>
+  </operation>
+ </portType>
+ <binding name="AutorizacionComprobantesOfflinePortBinding" type="tns:AutorizacionComprobantesOffline">
+  <soap:binding transport="http://schemas.xmlsoap.org/soap/http" style="document"/>
+  <operation name="autorizacionComprobante"><soap:operation soapAction=""/>
+   <input><soap:body use="literal"/></input><output><soap:body use="literal"/></output>
+  </operation>
+ </binding>
+ <service name="AutorizacionComprobantesOfflineService">
+  <port name="AutorizacionComprobantesOfflinePort" binding="tns:AutorizacionComprobantesOfflinePortBinding">
+   <soap:address location="{location}"/>
+  </port>
+ </service>
+</definitions>
+"""
+
+
+def _sub(padre, nombre, texto=None):
+    """Elemento hijo sin namespace (elementFormDefault="unqualified", como el SRI)"""
+    elemento = etree.SubElement(padre, nombre)
+    if texto is not None:
+        elemento.text = str(texto)
+    return elemento
+
+
+def _agregar_mensajes(padre, mensajes):
+    contenedor = _sub(padre, 'mensajes')
+    for identificador, texto in mensajes:
+        mensaje = _sub(contenedor, 'mensaje')
+        _sub(mensaje, 'identificador', identificador)
+        _sub(mensaje, 'mensaje', texto)
+        _sub(mensaje, 'tipo', 'ERROR')
+
+
+def _clave_del_xml(xml_bytes):
+    try:
+        raiz = etree.fromstring(xml_bytes)
+    except etree.XMLSyntaxError:
+        return None
+    clave = raiz.find('.//claveAcceso')
+    return clave.text.strip() if clave is not None and clave.text else None
+
+
+class ServidorSRISimulado:
+    """
+    estado_recepcion: 'RECIBIDA' o 'DEVUELTA' para todos los envíos individuales.
+    devolver: {clave_acceso: (identificador, mensaje)} comprobantes que se
+    devuelven con ese error, también dentro de un <lote>.
+    estados_autorizacion: estados que devuelve cada consulta sucesiva de una
+    misma clave ('EN PROCESO', 'AUTORIZADO', 'NO AUTORIZADO'); el último se repite.
+    `llamadas` cuenta las peticiones recibidas ('wsdl', 'validarComprobante', ...).
+    """
+    RUTA_RECEPCION = '/comprobantes-electronicos-ws/RecepcionComprobantesOffline'
+    RUTA_AUTORIZACION = '/comprobantes-electronicos-ws/AutorizacionComprobantesOffline'
+
+    def __init__(self, host='127.0.0.1', puerto=0, estado_recepcion='RECIBIDA',
+                 estados_autorizacion=('AUTORIZADO',), devolver=None):
+        self.estado_recepcion = estado_recepcion
+        self.devolver = dict(devolver or {})
+        self.estados_autorizacion = list(estados_autorizacion)
+        self.llamadas = Counter()
+        self.recibidos = {}
+        self.consultas = defaultdict(int)
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, puerto), self._handler())
+        self.httpd.daemon_threads = True
+        self.hilo = None
+
+    @property
+    def base(self):
+        host, puerto = self.httpd.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    @property
+    def url_recepcion(self):
+        return f"{self.base}{self.RUTA_RECEPCION}?wsdl"
+
+    @property
+    def url_autorizacion(self):
+        return f"{self.base}{self.RUTA_AUTORIZACION}?wsdl"
+
+    def iniciar(self):
+        self.hilo = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.hilo.start()
+        return self
+
+    def detener(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *args):
+        self.detener()
+
+    # ------------------------------------------------------------------
+    # Respuestas
+    # ------------------------------------------------------------------
+
+    def wsdl(self, ruta):
+        if ruta == self.RUTA_RECEPCION:
+            plantilla = WSDL_RECEPCION
+        elif ruta == self.RUTA_AUTORIZACION:
+            plantilla = WSDL_AUTORIZACION
+        else:
+            return None
+        return plantilla.format(location=f"{self.base}{ruta}", tipos_mensaje=_TIPOS_MENSAJE)
+
+    def responder(self, cuerpo):
+        """Recibe el sobre SOAP y devuelve el elemento de respuesta de la operación"""
+        sobre = etree.fromstring(cuerpo)
+        operacion = sobre.find(f'{{{SOAP_ENV}}}Body')[0]
+        nombre = etree.QName(operacion).localname
+        with self.lock:
+            self.llamadas[nombre] += 1
+        metodo = getattr(self, f'_op_{nombre}', None)
+        if metodo is None:
+            raise ValueError(f"Operación no soportada: {nombre}")
+        return metodo(operacion)
+
+    def _op_validarComprobante(self, operacion):
+        xml_bytes = base64.b64decode(operacion.findtext('xml') or '')
+        raiz = etree.fromstring(xml_bytes)
+        if raiz.tag == 'lote':
+            documentos = [c.text.encode('utf-8') for c in raiz.iterfind('comprobantes/comprobante')]
+        else:
+            documentos = [xml_bytes]
+
+        errores = []
+        for documento in documentos:
+            clave = _clave_del_xml(documento)
+            if clave in self.devolver:
+                errores.append((clave, self.devolver[clave]))
+            elif clave:
+                with self.lock:
+                    self.recibidos[clave] = documento.decode('utf-8')
+        if raiz.tag != 'lote' and self.estado_recepcion != 'RECIBIDA' and not errores:
+            errores.append((_clave_del_xml(xml_bytes) or '', ('35', 'ARCHIVO NO CUMPLE ESTRUCTURA XML')))
+
+        respuesta = etree.Element(f'{{{NS_RECEPCION}}}validarComprobanteResponse', nsmap={'ns2': NS_RECEPCION})
+        resultado = _sub(respuesta, 'RespuestaRecepcionComprobante')
+        _sub(resultado, 'estado', 'DEVUELTA' if errores else 'RECIBIDA')
+        comprobantes = _sub(resultado, 'comprobantes')
+        for clave, mensaje in errores:
+            comprobante = _sub(comprobantes, 'comprobante')
+            _sub(comprobante, 'claveAcceso', clave)
+            _agregar_mensajes(comprobante, [mensaje])
+        return respuesta
+
+    def _estado_para(self, clave):
+        with self.lock:
+            indice = min(self.consultas[clave], len(self.estados_autorizacion) - 1)
+            self.consultas[clave] += 1
+        return self.estados_autorizacion[indice]
+
+    def _agregar_autorizacion(self, autorizaciones, clave, estado):
+        autorizacion = _sub(autorizaciones, 'autorizacion')
+        _sub(autorizacion, 'estado', estado)
+        if estado == 'AUTORIZADO':
+            _sub(autorizacion, 'numeroAutorizacion', clave)
+            _sub(autorizacion, 'fechaAutorizacion', datetime.now().astimezone().isoformat(timespec='seconds'))
+        _sub(autorizacion, 'ambiente', 'PRUEBAS')
+        _sub(autorizacion, 'comprobante', self.recibidos.get(clave, ''))
+        if estado == 'NO AUTORIZADO':
+            _agregar_mensajes(autorizacion, [('39', 'FIRMA INVALIDA')])
+
+    def _op_autorizacionComprobante(self, operacion):
+        clave = (operacion.findtext('claveAccesoComprobante') or '').strip()
+        estado = self._estado_para(clave)
+
+        respuesta = etree.Element(f'{{{NS_AUTORIZACION}}}autorizacionComprobanteResponse',
+                                  nsmap={'ns2': NS_AUTORIZACION})
+        resultado = _sub(respuesta, 'RespuestaAutorizacionComprobante')
+        _sub(resultado, 'claveAccesoConsultada', clave)
+        # El SRI responde sin autorizaciones mientras el comprobante está en cola
+        en_cola = estado == 'EN PROCESO'
+        _sub(resultado, 'numeroComprobantes', 0 if en_cola else 1)
+        autorizaciones = _sub(resultado, 'autorizaciones')
+        if not en_cola:
+            self._agregar_autorizacion(autorizaciones, clave, estado)
+        return respuesta
+
+    # ------------------------------------------------------------------
+    # HTTP
+    # ------------------------------------------------------------------
+
+    def _handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _enviar(self, codigo, contenido):
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'text/xml; charset=utf-8')
+                self.send_header('Content-Length', str(len(contenido)))
+                self.end_headers()
+                self.wfile.write(contenido)
+
+            def do_GET(self):
+                documento = servidor.wsdl(self.path.split('?')[0])
+                if documento is None:
+                    self._enviar(404, b'')
+                    return
+                with servidor.lock:
+                    servidor.llamadas['wsdl'] += 1
+                self._enviar(200, documento.encode('utf-8'))
+
+            def do_POST(self):
+                cuerpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                sobre = etree.Element(f'{{{SOAP_ENV}}}Envelope', nsmap={'soap': SOAP_ENV})
+                body = etree.SubElement(sobre, f'{{{SOAP_ENV}}}Body')
+                try:
+                    body.append(servidor.responder(cuerpo))
+                    codigo = 200
+                except Exception as e:
+                    fault = etree.SubElement(body, f'{{{SOAP_ENV}}}Fault')
+                    _sub(fault, 'faultcode', 'soap:Server')
+                    _sub(fault, 'faultstring', str(e))
+                    codigo = 500
+                self._enviar(codigo, etree.tostring(sobre, xml_declaration=True, encoding='utf-8'))
+
+        return Handler
@@ -1,41 +1,28 @@
 import logging
+import time
+import requests
 from celery import shared_task
+from django.core.cache import cache
+from django.db.models import Q
 from django.utils import timezone
-from .models import ComprobanteElectronico, SRIConfig, PuntoEmision, CertificadoDigital
+from .models import ComprobanteElectronico, SRIConfig, PuntoEmision, CertificadoDigital, LoteSRI
 from .services.xml_generator import XMLGeneratorSRI
 from .services.signature import SignatureServiceSRI
-from zeep import Client
-from zeep.transports import Transport
-import requests
+from .services.sri_client import SRIClientFactory
+from .services.lotes import LoteSRIService, envio_vencido
+from .services.firma_paralela import FirmaParalelaService
+from .services.transiciones import TransicionService
+from .services.monitor import MonitorSRIService
+from .services.circuito_sri import CircuitoSRIService, es_fallo_red
 
 import base64
-from asgiref.sync import async_to_sync
 from django.core.files.base import ContentFile
-from channels.layers import get_channel_layer
 
 logger = logging.getLogger(__name__)
 
 def notificar_monitor(comprobante, mensaje=None):
-    """Auxiliar para notificar al WebSocket monitor"""
-    channel_layer = get_channel_layer()
-    if not channel_layer:
-        return
-        
-    async_to_sync(channel_layer.group_send)(
-        "sri_monitor",
-        {
-            "type": "sri_status_update",
-            "comprobante_id": str(comprobante.id),
-            "venta_numero": comprobante.venta.numero_factura,
-            "estado": comprobante.estado,
-            "clave_acceso": comprobante.clave_acceso,
-            "numero_autorizacion": comprobante.numero_autorizacion,
-            "mensaje": mensaje,
-            "mensajes_error": comprobante.mensajes_error,
-            "email_enviado": comprobante.email_enviado,
-            "email_mensaje": comprobante.email_mensaje,
-        }
-    )
+    """Auxiliar para notificar al WebSocket monitor (agrupado por ventana, ver MonitorSRIService)"""
+    MonitorSRIService.notificar(comprobante, mensaje)
 
 def to_list(obj):
     if obj is None: return []
@@ -74,7 +61,10 @@ def extraer_errores_sri(respuesta):
 def procesar_factura_electronica(comprobante_id):
     """
     Tarea asíncrona para procesar una factura completa ante el SRI con reintentos asíncronos.
+    Cada etapa (generar, firmar, recepción) deja su TransicionComprobante.
     """
+    # Etapa en curso, para registrar su falla si algo explota
+    etapa, estado_anterior, inicio = None, None, None
     try:
         comprobante = ComprobanteElectronico.objects.get(pk=comprobante_id)
         venta = comprobante.venta
@@ -89,6 +79,7 @@ def procesar_factura_electronica(comprobante_id):
 
         # 1. GENERAR XML (Solo si no existe clave de acceso aún)
         if not comprobante.clave_acceso or not comprobante.xml_firmado:
+            etapa, estado_anterior, inicio = 'GENERAR', comprobante.estado, time.perf_counter()
             comprobante.estado = 'GENERADO'
             comprobante.save()
             notificar_monitor(comprobante, "Generando XML...")
@@ -106,8 +97,10 @@ def procesar_factura_electronica(comprobante_id):
 
             comprobante.clave_acceso = clave_acceso
             comprobante.xml_generado = xml_bruto.decode('utf-8')
+            TransicionService.registrar(comprobante, etapa, estado_anterior, inicio=inicio)
             
             # 2. FIRMAR XML
+            etapa, estado_anterior, inicio = 'FIRMAR', comprobante.estado, time.perf_counter()
             notificar_monitor(comprobante, "Firmando XML...")
             certificado = CertificadoDigital.objects.filter(activo=True).first()
             if not certificado:
@@ -121,6 +114,8 @@ def procesar_factura_electronica(comprobante_id):
             comprobante.xml_firmado = xml_firmado_str
             comprobante.estado = 'FIRMADO'
             comprobante.save()
+            TransicionService.registrar(comprobante, etapa, estado_anterior, inicio=inicio)
+            etapa = None
             notificar_monitor(comprobante, "XML Firmado Exitosamente")
         else:
             xml_firmado_str = comprobante.xml_firmado
@@ -128,27 +123,51 @@ def procesar_factura_electronica(comprobante_id):
 
         # 3. ENVIAR AL SRI (RECEPCIÓN)
         if comprobante.estado != 'RECIBIDO' and comprobante.estado != 'AUTORIZADO':
+            # Reserva el envío: si un lote ya lo tomó (ENVIANDO) no se manda dos veces,
+            # salvo que esa reserva haya vencido (proceso caído a mitad del envío)
+            estado_anterior = comprobante.estado
+            reservado = ComprobanteElectronico.objects.filter(pk=comprobante.pk).filter(
+                (Q(estado=estado_anterior) & ~Q(estado='ENVIANDO')) | envio_vencido()
+            ).update(estado='ENVIANDO', fecha_actualizacion=timezone.now())
+            if not reservado:
+                logger.info(f"Comprobante {comprobante.pk} ya se está enviando al SRI")
+                return None
+            comprobante.estado = 'ENVIANDO'
+
+            # SRI caído: no se gasta el worker en timeouts, queda firmado en contingencia
+            if CircuitoSRIService.abierto():
+                estacionar(comprobante, "SRI no disponible (circuito abierto)")
+                return None
+
             notificar_monitor(comprobante, "Enviando al SRI (Recepción)...")
-            ambiente = config.ambiente
-            url_recepcion = config.wsdl_recepcion_pruebas if ambiente == 1 else config.wsdl_recepcion_produccion
-            client_recepcion = Client(url_recepcion)
-            
             xml_raw_bytes = xml_firmado_str.encode('utf-8')
+            inicio = time.perf_counter()
             
             try:
+                client_recepcion = SRIClientFactory.recepcion(config)
                 respuesta_recepcion = client_recepcion.service.validarComprobante(xml_raw_bytes)
+                duracion_recepcion = TransicionService.milisegundos(inicio)
                 notificar_monitor(comprobante, "Respuesta SRI recibida")
             except Exception as e:
-                logger.error(f"Error de conexión con SRI (Recepción): {e}")
-                comprobante.estado = 'ERROR'
-                comprobante.mensajes_error = f"No hay conexión con SRI: {str(e)}"
-                comprobante.save()
-                notificar_monitor(comprobante, "Fallo red SRI")
+                if es_fallo_red(e):
+                    logger.error(f"Error de conexión con SRI (Recepción): {e}")
+                    estacionar(comprobante, f"No hay conexión con SRI: {str(e)}")
+                else:
+                    # El SRI respondió con un error (o la llamada es inválida): reintentar no lo arregla
+                    logger.error(f"Error en Recepción SRI: {e}")
+                    comprobante.estado = 'ERROR'
+                    comprobante.mensajes_error = f"Recepción SRI: {str(e)}"
+                    comprobante.save()
+                    notificar_monitor(comprobante, f"Error: {e}")
+                TransicionService.registrar(comprobante, 'RECEPCION', estado_anterior, inicio=inicio,
+                                            exitosa=False, mensaje=comprobante.mensajes_error)
                 return False
 
             if respuesta_recepcion.estado == 'RECIBIDA':
                 comprobante.estado = 'RECIBIDO'
                 comprobante.save()
+                TransicionService.registrar(comprobante, 'RECEPCION', estado_anterior,
+                                            duracion_ms=duracion_recepcion)
                 notificar_monitor(comprobante, "Recibido por SRI")
             else:
                 comprobante.estado = 'RECHAZADO'
@@ -156,103 +175,463 @@ def procesar_factura_electronica(comprobante_id):
                 comprobante.mensajes_error = f"Recepción SRI ({respuesta_recepcion.estado}): {error_detalles}"
                 
                 comprobante.save()
+                TransicionService.registrar(comprobante, 'RECEPCION', estado_anterior, duracion_ms=duracion_recepcion,
+                                            exitosa=False, mensaje=comprobante.mensajes_error)
                 notificar_monitor(comprobante, "Rechazo SRI")
                 return False
 
-        # 4. SOLICITAR AUTORIZACIÓN
+        # 4. SOLICITAR AUTORIZACIÓN (tarea aparte: el worker no espera al SRI)
         if comprobante.estado == 'RECIBIDO':
-            ambiente = config.ambiente
-            url_autorizacion = config.wsdl_autorizacion_pruebas if ambiente == 1 else config.wsdl_autorizacion_produccion
-            client_autorizacion = Client(url_autorizacion)
-            import time
-            max_intentos = 10
-            delay_segundos = 5
-            
-            for intento_actual in range(1, max_intentos + 1):
-                time.sleep(delay_segundos)
-                
-                try:
-                    respuesta_aut = client_autorizacion.service.autorizacionComprobante(clave_acceso)
-                    
-                    if hasattr(respuesta_aut, 'autorizaciones') and respuesta_aut.autorizaciones and respuesta_aut.autorizaciones.autorizacion:
-                        autorizacion = respuesta_aut.autorizaciones.autorizacion[0]
-                        estado_sri = autorizacion.estado
-                        
-                        if estado_sri in ['AUTORIZADA', 'AUTORIZADO']:
-                            comprobante.estado = 'AUTORIZADO'
-                            comprobante.numero_autorizacion = autorizacion.numeroAutorizacion
-                            comprobante.fecha_autorizacion = autorizacion.fechaAutorizacion
-                            comprobante.xml_autorizado = autorizacion.comprobante
-                            comprobante.mensajes_error = None
-                            comprobante.save()
-                            
-                            # Generar RIDE
-                            try:
-                                from .services.ride_generator import RIDEGenerator
-                                ride_gen = RIDEGenerator(comprobante)
-                                pdf_buffer = ride_gen.generar_pdf()
-                                filename = f"RIDE_{comprobante.clave_acceso}.pdf"
-                                comprobante.pdf_ride.save(filename, ContentFile(pdf_buffer.getvalue()), save=True)
-                            except Exception as e:
-                                logger.error(f"Error generando RIDE: {e}")
-
-                            # ENVIAR POR EMAIL
-                            try:
-                                notificar_monitor(comprobante, "Enviando email al cliente...")
-                                from .services.resend_service import ResendInvoicingService
-                                if ResendInvoicingService.enviar_comprobante(comprobante):
-                                    notificar_monitor(comprobante, "Email enviado con éxito")
-                                else:
-                                    notificar_monitor(comprobante, "Fallo al enviar email (Verificar Resend)")
-                            except Exception as e:
-                                logger.error(f"Error al disparar envío por Resend: {e}")
-                                notificar_monitor(comprobante, "Error técnico en envío de email")
-
-                            notificar_monitor(comprobante, "¡Proceso finalizado!")
-                            return True
-                        
-                        elif estado_sri in ['EN PROCESO', 'PENDIENTE'] or not estado_sri:
-                            if intento_actual < max_intentos:
-                                notificar_monitor(comprobante, f"SRI procesando ({intento_actual}/{max_intentos})")
-                                continue
-                            else:
-                                comprobante.estado = 'ERROR'
-                                comprobante.mensajes_error = "SRI indicó que sigue en proceso y nunca finalizó."
-                                comprobante.save()
-                                notificar_monitor(comprobante, "SRI colapsado")
-                                return False
-                        else:
-                            error_detalles = extraer_errores_sri(respuesta_aut)
-                            comprobante.estado = 'RECHAZADO'
-                            comprobante.mensajes_error = f"SRI {estado_sri}: {error_detalles}"
-                            comprobante.save()
-                            notificar_monitor(comprobante, "SRI Rechazado")
-                            return False
-                    else:
-                        if intento_actual < max_intentos:
-                            notificar_monitor(comprobante, f"Esperando SRI ({intento_actual}/{max_intentos})")
-                            continue
-                        else:
-                            comprobante.estado = 'RECHAZADO'
-                            comprobante.mensajes_error = "Rechazo Silencioso del SRI."
-                            comprobante.save()
-                            notificar_monitor(comprobante, "SRI Rechazo Silencioso")
-                            return False
-
-                except Exception as e:
-                    logger.error(f"Falla red autorización: {e}")
-                    if intento_actual < max_intentos:
-                        continue
-                    else:
-                        comprobante.estado = 'ERROR'
-                        comprobante.mensajes_error = "Error red SRI."
-                        comprobante.save()
-                        return False
+            comprobante.intentos_autorizacion = 0
+            comprobante.save(update_fields=['intentos_autorizacion'])
+            programar_autorizacion(comprobante.id, 0)
+            notificar_monitor(comprobante, "Autorización programada")
+            return True
 
     except Exception as exc:
         if 'comprobante' in locals():
             comprobante.estado = 'ERROR'
             comprobante.mensajes_error = str(exc)
             comprobante.save()
+            if etapa:
+                TransicionService.registrar(comprobante, etapa, estado_anterior, inicio=inicio,
+                                            exitosa=False, mensaje=str(exc))
             notificar_monitor(comprobante, f"Error: {exc}")
         return False
+
+
+# ============================================================================
+# AUTORIZACIÓN SRI CON REINTENTOS PROGRAMADOS
+# ============================================================================
+
+# El SRI suele autorizar en segundos, pero bajo carga puede tardar minutos.
+# Espera antes de cada consulta: 5s, 10s, 20s... hasta 5 min (≈20 min en total).
+AUTORIZACION_ESPERA_INICIAL = 5
+AUTORIZACION_ESPERA_MAXIMA = 300
+AUTORIZACION_MAX_INTENTOS = 10
+
+
+def espera_autorizacion(intentos):
+    """Backoff exponencial según las consultas ya realizadas"""
+    return min(AUTORIZACION_ESPERA_INICIAL * (2 ** intentos), AUTORIZACION_ESPERA_MAXIMA)
+
+
+def programar_autorizacion(comprobante_id, intentos):
+    autorizar_comprobante.apply_async(args=[str(comprobante_id)], countdown=espera_autorizacion(intentos))
+
+
+def registrar_autorizacion(comprobante, exitosa):
+    """Transición de la espera de autorización: desde la recepción hasta la respuesta final del SRI"""
+    TransicionService.registrar(
+        comprobante, 'AUTORIZACION', 'RECIBIDO',
+        duracion_ms=TransicionService.espera_autorizacion_ms(comprobante), exitosa=exitosa,
+        mensaje=f"{comprobante.intentos_autorizacion} consultas. {comprobante.mensajes_error or ''}".strip(),
+    )
+
+
+def finalizar_autorizado(comprobante):
+    """
+    El comprobante ya está AUTORIZADO: el RIDE (cola "ride") y el email
+    siguen en sus propias tareas, la autorización no espera a WeasyPrint.
+    """
+    generar_ride.delay(str(comprobante.id), True)
+    notificar_monitor(comprobante, "Autorizado. RIDE y email en cola")
+
+
+@shared_task
+def generar_ride(comprobante_id, enviar_email=True):
+    """
+    Genera y guarda el PDF RIDE de un comprobante autorizado. Se enruta a la
+    cola "ride" (CELERY_TASK_ROUTES); al terminar encola el email.
+    """
+    try:
+        comprobante = ComprobanteElectronico.objects.select_related('venta').get(pk=comprobante_id)
+    except ComprobanteElectronico.DoesNotExist:
+        return False
+    if comprobante.estado != 'AUTORIZADO':
+        return False
+
+    generado = False
+    inicio = time.perf_counter()
+    try:
+        from .services.ride_generator import RIDEGenerator
+        pdf_buffer = RIDEGenerator(comprobante).generar_pdf()
+        if comprobante.pdf_ride:
+            comprobante.pdf_ride.delete(save=False)
+        filename = f"RIDE_{comprobante.clave_acceso}.pdf"
+        comprobante.pdf_ride.save(filename, ContentFile(pdf_buffer.getvalue()), save=False)
+        comprobante.save(update_fields=['pdf_ride', 'fecha_actualizacion'])
+        generado = True
+        TransicionService.registrar(comprobante, 'RIDE', comprobante.estado, inicio=inicio)
+    except Exception as e:
+        logger.error(f"Error generando RIDE: {e}")
+        TransicionService.registrar(comprobante, 'RIDE', comprobante.estado, inicio=inicio,
+                                    exitosa=False, mensaje=str(e))
+        notificar_monitor(comprobante, "Error generando RIDE")
+
+    # Sin PDF el email igual lleva el XML autorizado
+    if enviar_email:
+        enviar_email_comprobante.delay(str(comprobante.id))
+    return generado
+
+
+@shared_task
+def enviar_email_comprobante(comprobante_id):
+    """Envía el RIDE y el XML autorizado al cliente"""
+    try:
+        comprobante = ComprobanteElectronico.objects.select_related('venta__cliente').get(pk=comprobante_id)
+    except ComprobanteElectronico.DoesNotExist:
+        return False
+
+    enviado = False
+    inicio = time.perf_counter()
+    try:
+        notificar_monitor(comprobante, "Enviando email al cliente...")
+        from .services.resend_service import ResendInvoicingService
+        enviado = ResendInvoicingService.enviar_comprobante(comprobante)
+        TransicionService.registrar(comprobante, 'EMAIL', comprobante.estado, inicio=inicio,
+                                    exitosa=bool(enviado), mensaje=comprobante.email_mensaje)
+        if enviado:
+            notificar_monitor(comprobante, "Email enviado con éxito")
+        else:
+            notificar_monitor(comprobante, "Fallo al enviar email (Verificar Resend)")
+    except Exception as e:
+        logger.error(f"Error al disparar envío por Resend: {e}")
+        TransicionService.registrar(comprobante, 'EMAIL', comprobante.estado, inicio=inicio,
+                                    exitosa=False, mensaje=str(e))
+        notificar_monitor(comprobante, "Error técnico en envío de email")
+
+    notificar_monitor(comprobante, "¡Proceso finalizado!")
+    return enviado
+
+
+@shared_task
+def autorizar_comprobante(comprobante_id):
+    """
+    Hace UNA consulta de autorización al SRI. Si el comprobante sigue en
+    proceso (o falla la red) guarda el intento y se vuelve a programar con
+    countdown, dejando libre el worker entre consultas.
+    """
+    try:
+        comprobante = ComprobanteElectronico.objects.select_related('venta').get(pk=comprobante_id)
+    except ComprobanteElectronico.DoesNotExist:
+        return False
+
+    # Un reintento manual o una ejecución duplicada ya lo resolvió
+    if comprobante.estado != 'RECIBIDO':
+        return comprobante.estado == 'AUTORIZADO'
+
+    config = SRIConfig.objects.first()
+    if not config:
+        comprobante.estado = 'ERROR'
+        comprobante.mensajes_error = "Configuración SRI no encontrada."
+        comprobante.save()
+        return False
+
+    # Con el SRI caído la consulta se pospone sin gastar intentos
+    if CircuitoSRIService.abierto():
+        programar_autorizacion(comprobante.id, comprobante.intentos_autorizacion)
+        return None
+
+    comprobante.intentos_autorizacion += 1
+    comprobante.ultimo_intento_autorizacion = timezone.now()
+    comprobante.save(update_fields=['intentos_autorizacion', 'ultimo_intento_autorizacion'])
+    intento = comprobante.intentos_autorizacion
+    quedan_intentos = intento < AUTORIZACION_MAX_INTENTOS
+
+    try:
+        client_autorizacion = SRIClientFactory.autorizacion(config)
+        respuesta_aut = client_autorizacion.service.autorizacionComprobante(comprobante.clave_acceso)
+    except Exception as e:
+        logger.error(f"Falla red autorización: {e}")
+        if quedan_intentos:
+            notificar_monitor(comprobante, f"Sin respuesta del SRI, reintento {intento}/{AUTORIZACION_MAX_INTENTOS}")
+            programar_autorizacion(comprobante.id, intento)
+            return None
+        comprobante.estado = 'ERROR'
+        comprobante.mensajes_error = "Error red SRI."
+        comprobante.save()
+        registrar_autorizacion(comprobante, exitosa=False)
+        notificar_monitor(comprobante, "Fallo red SRI")
+        return False
+
+    if not (hasattr(respuesta_aut, 'autorizaciones') and respuesta_aut.autorizaciones and respuesta_aut.autorizaciones.autorizacion):
+        if quedan_intentos:
+            notificar_monitor(comprobante, f"Esperando SRI ({intento}/{AUTORIZACION_MAX_INTENTOS})")
+            programar_autorizacion(comprobante.id, intento)
+            return None
+        comprobante.estado = 'RECHAZADO'
+        comprobante.mensajes_error = "Rechazo Silencioso del SRI."
+        comprobante.save()
+        registrar_autorizacion(comprobante, exitosa=False)
+        notificar_monitor(comprobante, "SRI Rechazo Silencioso")
+        return False
+
+    autorizacion = respuesta_aut.autorizaciones.autorizacion[0]
+    estado_sri = autorizacion.estado
+
+    if estado_sri in ['AUTORIZADA', 'AUTORIZADO']:
+        comprobante.estado = 'AUTORIZADO'
+        comprobante.numero_autorizacion = autorizacion.numeroAutorizacion
+        comprobante.fecha_autorizacion = autorizacion.fechaAutorizacion
+        comprobante.xml_autorizado = autorizacion.comprobante
+        comprobante.mensajes_error = None
+        comprobante.save()
+        registrar_autorizacion(comprobante, exitosa=True)
+        finalizar_autorizado(comprobante)
+        return True
+
+    if estado_sri in ['EN PROCESO', 'PENDIENTE'] or not estado_sri:
+        if quedan_intentos:
+            notificar_monitor(comprobante, f"SRI procesando ({intento}/{AUTORIZACION_MAX_INTENTOS})")
+            programar_autorizacion(comprobante.id, intento)
+            return None
+        comprobante.estado = 'ERROR'
+        comprobante.mensajes_error = "SRI indicó que sigue en proceso y nunca finalizó."
+        comprobante.save()
+        registrar_autorizacion(comprobante, exitosa=False)
+        notificar_monitor(comprobante, "SRI colapsado")
+        return False
+
+    error_detalles = extraer_errores_sri(respuesta_aut)
+    comprobante.estado = 'RECHAZADO'
+    comprobante.mensajes_error = f"SRI {estado_sri}: {error_detalles}"
+    comprobante.save()
+    registrar_autorizacion(comprobante, exitosa=False)
+    notificar_monitor(comprobante, "SRI Rechazado")
+    return False
+
+
+# ============================================================================
+# ENVÍO EN LOTE MASIVO
+# ============================================================================
+
+LOTES_BLOQUEO = 'electronic_invoicing:lotes:bloqueo'
+LOTES_BLOQUEO_TTL = 15 * 60
+
+
+def enviar_lote(config, comprobantes):
+    """
+    Envía un grupo homogéneo de comprobantes firmados en una sola llamada de
+    recepción y aplica el resultado a cada uno. Los recibidos siguen el mismo
+    camino de autorización que un envío individual.
+    Devuelve cuántos comprobantes quedaron RECIBIDO.
+    """
+    lote = LoteSRI.objects.create(ambiente=config.ambiente, cantidad=len(comprobantes))
+    lote.clave_acceso = LoteSRIService.clave_lote(config, comprobantes, lote.pk)
+    lote.save(update_fields=['clave_acceso'])
+    ids = [comprobante.id for comprobante in comprobantes]
+    anteriores = {comprobante.id: comprobante.estado for comprobante in comprobantes}
+
+    xml_lote = LoteSRIService.construir_xml(lote.clave_acceso, config.ruc, comprobantes)
+    inicio = time.perf_counter()
+    try:
+        respuesta = SRIClientFactory.recepcion(config).service.validarComprobante(xml_lote)
+    except Exception as e:
+        # Solo una caída deja el lote en contingencia; otro error no se arregla reintentando
+        fallo_red = es_fallo_red(e)
+        estado = 'CONTINGENCIA' if fallo_red else 'ERROR'
+        mensaje = f"No hay conexión con SRI: {e}" if fallo_red else f"Recepción SRI (lote): {e}"
+        logger.error(f"Error en Recepción SRI (lote {lote.clave_acceso}): {e}")
+        lote.estado = 'ERROR'
+        lote.mensajes_error = str(e)
+        lote.save(update_fields=['estado', 'mensajes_error'])
+        ComprobanteElectronico.objects.filter(id__in=ids, estado='ENVIANDO').update(
+            lote=lote, estado=estado, mensajes_error=mensaje, fecha_actualizacion=timezone.now(),
+        )
+        duracion = TransicionService.milisegundos(inicio)
+        for comprobante in comprobantes:
+            comprobante.estado = estado
+        TransicionService.registrar_varias([
+            TransicionService.nueva(comprobante, 'RECEPCION', anteriores[comprobante.id], duracion_ms=duracion,
+                                    exitosa=False, mensaje=f"Lote {lote.pk}: {e}")
+            for comprobante in comprobantes
+        ])
+        for comprobante in comprobantes:
+            notificar_monitor(comprobante, "Fallo red SRI (lote): en cola de contingencia" if fallo_red
+                              else f"Error: {e}")
+        if fallo_red:
+            programar_contingencia()
+        return 0
+
+    # El tiempo de ida y vuelta del lote es el de cada uno de sus comprobantes
+    duracion = TransicionService.milisegundos(inicio)
+    resultados = LoteSRIService.resultados(lote.clave_acceso, comprobantes, respuesta)
+    lote.estado = 'RECIBIDO' if respuesta.estado == 'RECIBIDA' else 'DEVUELTO'
+    lote.mensajes_error = extraer_errores_sri(respuesta) if lote.estado == 'DEVUELTO' else None
+    lote.save(update_fields=['estado', 'mensajes_error'])
+
+    # Solo se escribe sobre los que siguen reservados por este envío
+    ahora = timezone.now()
+    aplicados = []
+    for comprobante in comprobantes:
+        estado, mensaje = resultados[comprobante.id]
+        campos = {'estado': estado, 'mensajes_error': mensaje, 'lote': lote, 'fecha_actualizacion': ahora}
+        if estado == 'RECIBIDO':
+            campos['intentos_autorizacion'] = 0
+        if ComprobanteElectronico.objects.filter(id=comprobante.id, estado='ENVIANDO').update(**campos):
+            for campo, valor in campos.items():
+                setattr(comprobante, campo, valor)
+            aplicados.append(comprobante)
+        else:
+            logger.warning(f"Comprobante {comprobante.pk} cambió de estado durante el lote {lote.pk}; "
+                           f"no se aplica su resultado")
+    comprobantes = aplicados
+    TransicionService.registrar_varias([
+        TransicionService.nueva(comprobante, 'RECEPCION', anteriores[comprobante.id], duracion_ms=duracion,
+                                exitosa=comprobante.estado == 'RECIBIDO',
+                                mensaje=f"Lote {lote.pk}. {comprobante.mensajes_error or ''}".strip())
+        for comprobante in comprobantes
+    ])
+
+    recibidos = 0
+    for comprobante in comprobantes:
+        if comprobante.estado == 'RECIBIDO':
+            recibidos += 1
+            programar_autorizacion(comprobante.id, 0)
+            notificar_monitor(comprobante, f"Recibido por SRI (lote {lote.pk})")
+        elif comprobante.estado == 'RECHAZADO':
+            notificar_monitor(comprobante, "Rechazo SRI (lote)")
+        else:
+            notificar_monitor(comprobante, "Lote devuelto, se reenviará")
+    return recibidos
+
+
+@shared_task
+def enviar_lotes_pendientes(limite=1000, estados=None):
+    """
+    Envía en lotes los comprobantes firmados que no llegaron al SRI (cierre de
+    mes, caída del SRI) en vez de una llamada SOAP por comprobante.
+    Cada comprobante se reserva en ENVIANDO antes de armar los lotes, así no
+    viaja en dos lotes ni a la vez por procesar_factura_electronica.
+    `estados` limita los pendientes tomados (por defecto ESTADOS_PENDIENTES).
+    """
+    if CircuitoSRIService.abierto():
+        logger.info("Circuito SRI abierto; los lotes esperan al sondeo")
+        programar_contingencia()
+        return 0
+    if not cache.add(LOTES_BLOQUEO, 1, LOTES_BLOQUEO_TTL):
+        logger.info("Ya hay un envío de lotes en curso")
+        return None
+
+    try:
+        config = SRIConfig.objects.first()
+        if not config:
+            logger.error("Configuración SRI no encontrada; no se envían lotes.")
+            return 0
+
+        comprobantes = LoteSRIService.reclamar(limite, estados)
+        recibidos = 0
+        for grupo in LoteSRIService.agrupar(comprobantes):
+            recibidos += enviar_lote(config, grupo)
+        logger.info(f"Lotes SRI: {recibidos}/{len(comprobantes)} comprobantes recibidos")
+        return recibidos
+    finally:
+        cache.delete(LOTES_BLOQUEO)
+
+
+@shared_task
+def firmar_pendientes(limite=1000, enviar=True, procesos=None):
+    """
+    Etapa de firma por lotes: firma los comprobantes con XML generado que
+    quedaron sin firmar y, si enviar=True, encola su envío en lotes al SRI.
+    """
+    certificado = CertificadoDigital.objects.filter(activo=True).first()
+    if not certificado:
+        logger.error("No hay certificado digital (firma) activo; no se firman pendientes.")
+        return 0
+
+    comprobantes = list(FirmaParalelaService.pendientes(limite))
+    firmados = FirmaParalelaService.firmar_comprobantes(certificado, comprobantes, procesos=procesos)
+    for comprobante in comprobantes:
+        notificar_monitor(comprobante, "XML Firmado Exitosamente" if comprobante.estado == 'FIRMADO'
+                          else "Fallo al firmar XML")
+
+    if enviar and firmados:
+        enviar_lotes_pendientes.delay(limite)
+    return firmados
+
+
+# ============================================================================
+# CONTINGENCIA: SRI CAÍDO (CIRCUIT BREAKER)
+# ============================================================================
+
+SONDEO_BLOQUEO = 'electronic_invoicing:circuito:sondeo'
+DRENAJE_BLOQUEO = 'electronic_invoicing:contingencia:drenaje'
+SONDEO_INTERVALO = 30
+SONDEO_TIMEOUT = 10
+# Ritmo de drenaje: hasta CONTINGENCIA_POR_CICLO comprobantes cada CONTINGENCIA_INTERVALO segundos
+CONTINGENCIA_POR_CICLO = 100
+CONTINGENCIA_INTERVALO = 10
+
+
+def programar_contingencia():
+    """Deja programado (una sola vez) el sondeo del SRI si el circuito está abierto, o el drenaje si no"""
+    if CircuitoSRIService.abierto():
+        if cache.add(SONDEO_BLOQUEO, 1, SONDEO_INTERVALO * 3):
+            sondear_sri.apply_async(countdown=SONDEO_INTERVALO)
+    elif cache.add(DRENAJE_BLOQUEO, 1, CONTINGENCIA_INTERVALO * 3):
+        drenar_contingencia.apply_async(countdown=CONTINGENCIA_INTERVALO)
+
+
+def estacionar(comprobante, motivo):
+    """El comprobante firmado espera en CONTINGENCIA a que el SRI vuelva (lo envía drenar_contingencia)"""
+    comprobante.estado = 'CONTINGENCIA'
+    comprobante.mensajes_error = motivo
+    comprobante.save()
+    notificar_monitor(comprobante, "SRI no disponible: en cola de contingencia")
+    programar_contingencia()
+
+
+def sri_responde(config):
+    """Chequeo liviano: el WSDL de recepción contesta (sin pasar por el circuito)"""
+    try:
+        respuesta = SRIClientFactory.session().get(SRIClientFactory.url_recepcion(config), timeout=SONDEO_TIMEOUT)
+        return respuesta.status_code == 200
+    except requests.RequestException as e:
+        logger.info(f"Sondeo SRI sin respuesta: {e}")
+        return False
+
+
+@shared_task
+def sondear_sri():
+    """
+    Mientras el circuito está abierto revisa el SRI cada SONDEO_INTERVALO
+    segundos. Cuando responde cierra el circuito y empieza el drenaje.
+    """
+    cache.delete(SONDEO_BLOQUEO)
+    if CircuitoSRIService.abierto():
+        config = SRIConfig.objects.first()
+        if not config or not sri_responde(config):
+            programar_contingencia()
+            return False
+        CircuitoSRIService.cerrar()
+
+    cache.delete(DRENAJE_BLOQUEO)
+    programar_contingencia()
+    return True
+
+
+@shared_task
+def drenar_contingencia(limite=CONTINGENCIA_POR_CICLO):
+    """
+    Envía en lotes hasta `limite` comprobantes en CONTINGENCIA y, si quedan,
+    se vuelve a programar: así la cola se vacía a ritmo controlado en vez de
+    golpear al SRI recién recuperado. Los FIRMADO y ERROR siguen su propio
+    camino (procesar_factura_electronica o enviar_lotes_pendientes).
+    """
+    cache.delete(DRENAJE_BLOQUEO)
+    recibidos = enviar_lotes_pendientes(limite, estados=('CONTINGENCIA',))
+    if recibidos is None or ComprobanteElectronico.objects.filter(estado='CONTINGENCIA').exists():
+        programar_contingencia()
+    return recibidos
+
+
+@shared_task(ignore_result=True)
+def recuperar_envios_vencidos():
+    """
+    Tarea periódica (CELERY_BEAT_SCHEDULE): vuelve a enviar en lotes los
+    comprobantes que quedaron en ENVIANDO más de ENVIO_VENCIDO porque el
+    proceso que los reservó se cayó a mitad del envío.
+    """
+    return enviar_lotes_pendientes(estados=('ENVIANDO',))
@@ -0,0 +1,558 @@
+import base64
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO
+from types import SimpleNamespace
+from unittest import mock
+
+import requests
+import zeep.exceptions
+from celery.signals import worker_process_shutdown
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.hazmat.primitives.serialization import BestAvailableEncryption, pkcs12
+from cryptography.x509.oid import NameOID
+from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from lxml import etree
+
+from clientes.models import Cliente
+from inventario.models import CategoriaProducto, Marca, Producto
+from usuarios.models import Usuario
+from ventas.models import DetalleVenta, Venta
+
+from . import tasks
+from .models import CertificadoDigital, ComprobanteElectronico, PuntoEmision, SRIConfig, TransicionComprobante
+from .services import circuito_sri, firma_paralela, signature
+from .services.circuito_sri import CircuitoSRIService, SRINoDisponible, TransporteSRI
+from .services.firma_paralela import FirmaParalelaService
+from .services.lotes import ENVIO_VENCIDO, LoteSRIService
+from .services.monitor import MonitorSRIService
+from .services.signature import SignatureServiceSRI
+from .services.snapshot_factura import FacturaSnapshotService
+from .services.sri_client import SRIClientFactory
+from .services.xml_generator import XMLGeneratorSRI
+from .services.transiciones import TransicionService
+from .sri_simulado import ServidorSRISimulado
+from .utils import generar_clave_acceso
+
+def p12_prueba(password):
+    """Certificado autofirmado en formato .p12 para pruebas de firma"""
+    clave = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    nombre = x509.Name([
+        x509.NameAttribute(NameOID.COUNTRY_NAME, 'EC'),
+        x509.NameAttribute(NameOID.COMMON_NAME, 'VP Motos Pruebas'),
+    ])
+    ahora = datetime.now(dt_timezone.utc)
+    certificado = (
+        x509.CertificateBuilder().subject_name(nombre).issuer_name(nombre)
+        .public_key(clave.public_key()).serial_number(x509.random_serial_number())
+        .not_valid_before(ahora).not_valid_after(ahora + timedelta(days=365))
+        .sign(clave, hashes.SHA256())
+    )
+    return pkcs12.serialize_key_and_certificates(
+        b'prueba', clave, certificado, None, BestAvailableEncryption(password.encode())
+    ), certificado
+
+
+def clave_prueba(secuencial):
+    return generar_clave_acceso(date(2026, 1, 31), '01', '1790000000001', 1, '001001',
+                                f"{secuencial:09d}", '12345678', '1')
+
+
+class SRISimuladoMixin:
+    """SRI simulado local, caché de WSDL temporal, configuración SRI y un usuario para crear ventas"""
+    opciones_sri = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cache_dir = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        ajustes = override_settings(SRI_WSDL_CACHE_PATH=os.path.join(cache_dir, 'wsdl.db'))
+        ajustes.enable()
+        cls.addClassCleanup(ajustes.disable)
+        cls.sri = ServidorSRISimulado(**cls.opciones_sri).iniciar()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.sri.detener()
+        SRIClientFactory.limpiar()
+        super().tearDownClass()
+
+    def setUp(self):
+        SRIClientFactory.limpiar()
+        CircuitoSRIService.cerrar()
+        cache.delete_many([tasks.SONDEO_BLOQUEO, tasks.DRENAJE_BLOQUEO])
+        self.config = SRIConfig.objects.create(
+            ruc='1790000000001', razon_social='VP Motos', direccion_matriz='Quito',
+            wsdl_recepcion_pruebas=self.sri.url_recepcion,
+            wsdl_autorizacion_pruebas=self.sri.url_autorizacion,
+        )
+        self.usuario = Usuario.objects.create_user('cajero', 'cajero@example.com', 'testpass123',
+                                                   nombre='Caja', apellido='Uno')
+
+    def nueva_venta(self):
+        return Venta.objects.create(usuario=self.usuario, subtotal=10, iva=0, total=10, tipo_pago='EFECTIVO')
+
+
+class SRIClientFactoryTest(SRISimuladoMixin, TestCase):
+    """Recepción y autorización contra el SRI simulado reutilizando clientes y WSDL"""
+    opciones_sri = {'estados_autorizacion': ['EN PROCESO', 'AUTORIZADO']}
+
+    def test_clientes_reutilizados_y_wsdl_en_cache(self):
+        clave = clave_prueba(1)
+        xml = f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>'
+        respuesta = SRIClientFactory.recepcion(self.config).service.validarComprobante(xml.encode('utf-8'))
+        self.assertEqual(respuesta.estado, 'RECIBIDA')
+        self.assertIs(SRIClientFactory.recepcion(self.config), SRIClientFactory.recepcion(self.config))
+
+        # Un proceso nuevo (sin clientes en memoria) toma el WSDL de la caché en disco
+        SRIClientFactory.limpiar()
+        descargas = self.sri.llamadas['wsdl']
+        SRIClientFactory.recepcion(self.config)
+        self.assertEqual(self.sri.llamadas['wsdl'], descargas)
+
+        comprobante = ComprobanteElectronico.objects.create(venta=self.nueva_venta(), estado='RECIBIDO',
+                                                            clave_acceso=clave)
+        with mock.patch.object(tasks, 'programar_autorizacion') as programar, \
+                mock.patch.object(tasks, 'finalizar_autorizado'):
+            self.assertIsNone(tasks.autorizar_comprobante(str(comprobante.id)))
+            programar.assert_called_once_with(comprobante.id, 1)
+            self.assertTrue(tasks.autorizar_comprobante(str(comprobante.id)))
+
+        comprobante.refresh_from_db()
+        self.assertEqual(comprobante.estado, 'AUTORIZADO')
+        self.assertEqual(comprobante.numero_autorizacion, clave)
+        self.assertIn(clave, comprobante.xml_autorizado)
+
+
+class LoteSRITest(SRISimuladoMixin, TestCase):
+    """Un solo envío de recepción para todo el lote y resultado individual por comprobante"""
+    opciones_sri = {'devolver': {
+        clave_prueba(2): ('45', 'ERROR SECUENCIAL REGISTRADO'),
+        clave_prueba(3): ('43', 'CLAVE ACCESO REGISTRADA'),
+    }}
+
+    def test_lote_reparte_resultados(self):
+        comprobantes = {}
+        for secuencial, estado in [(1, 'FIRMADO'), (2, 'FIRMADO'), (3, 'ERROR'), (4, 'ERROR')]:
+            clave = clave_prueba(secuencial)
+            comprobantes[secuencial] = ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado=estado, clave_acceso=clave,
+                xml_firmado=f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            )
+
+        llamadas = self.sri.llamadas['validarComprobante']
+        with mock.patch.object(tasks, 'programar_autorizacion') as programar:
+            self.assertEqual(tasks.enviar_lotes_pendientes(), 3)
+
+        self.assertEqual(self.sri.llamadas['validarComprobante'] - llamadas, 1)
+        self.assertEqual(programar.call_count, 3)
+        estados = {n: ComprobanteElectronico.objects.get(pk=c.pk) for n, c in comprobantes.items()}
+        self.assertEqual({n: c.estado for n, c in estados.items()},
+                         {1: 'RECIBIDO', 2: 'RECHAZADO', 3: 'RECIBIDO', 4: 'RECIBIDO'})
+        self.assertIn('[45] ERROR SECUENCIAL REGISTRADO', estados[2].mensajes_error)
+        self.assertEqual(estados[1].lote.estado, 'DEVUELTO')
+        self.assertEqual(estados[1].lote.cantidad, 4)
+
+        # Una transición de recepción por comprobante, con el tiempo del lote
+        transiciones = TransicionComprobante.objects.filter(etapa='RECEPCION')
+        self.assertEqual(sorted(transiciones.values_list('estado_nuevo', 'exitosa')),
+                         [('RECHAZADO', False), ('RECIBIDO', True), ('RECIBIDO', True), ('RECIBIDO', True)])
+        self.assertEqual(len(set(transiciones.values_list('duracion_ms', flat=True))), 1)
+
+    def test_reserva_evita_doble_envio(self):
+        PuntoEmision.objects.create(establecimiento='001', punto_emision='001', direccion_establecimiento='Quito')
+        comprobantes = []
+        for secuencial in (5, 6):
+            clave = clave_prueba(secuencial)
+            comprobantes.append(ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado='ERROR', clave_acceso=clave,
+                xml_firmado=f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            ))
+
+        reservados = LoteSRIService.reclamar()
+        self.assertEqual([c.estado for c in reservados], ['ERROR', 'ERROR'])
+        self.assertEqual(LoteSRIService.reclamar(), [])
+
+        # Reservado por el lote: el proceso individual no lo envía otra vez
+        llamadas = self.sri.llamadas['validarComprobante']
+        self.assertIsNone(tasks.procesar_factura_electronica(str(comprobantes[0].id)))
+        self.assertEqual(self.sri.llamadas['validarComprobante'], llamadas)
+
+        # Lo que otro proceso cambió mientras tanto no se pisa con el resultado del lote
+        ComprobanteElectronico.objects.filter(pk=comprobantes[1].pk).update(estado='AUTORIZADO')
+        with mock.patch.object(tasks, 'programar_autorizacion') as programar:
+            self.assertEqual(tasks.enviar_lote(self.config, reservados), 1)
+        programar.assert_called_once_with(comprobantes[0].id, 0)
+        self.assertEqual(sorted(ComprobanteElectronico.objects.values_list('estado', flat=True)),
+                         ['AUTORIZADO', 'RECIBIDO'])
+
+    def test_envio_vencido_se_recupera(self):
+        PuntoEmision.objects.create(establecimiento='001', punto_emision='001', direccion_establecimiento='Quito')
+        ids = []
+        for secuencial in (7, 8):
+            clave = clave_prueba(secuencial)
+            ids.append(ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado='ENVIANDO', clave_acceso=clave,
+                xml_firmado=f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            ).id)
+        vencer = lambda pk: ComprobanteElectronico.objects.filter(pk=pk).update(
+            fecha_actualizacion=timezone.now() - ENVIO_VENCIDO - timedelta(minutes=1))
+
+        # Un envío en curso se respeta; uno de un proceso caído se vuelve a tomar
+        with mock.patch.object(tasks, 'programar_autorizacion'):
+            self.assertIsNone(tasks.procesar_factura_electronica(str(ids[0])))
+            self.assertEqual(tasks.recuperar_envios_vencidos(), 0)
+            vencer(ids[0])
+            self.assertTrue(tasks.procesar_factura_electronica(str(ids[0])))
+            vencer(ids[1])
+            self.assertEqual(tasks.recuperar_envios_vencidos(), 1)
+        self.assertEqual(list(ComprobanteElectronico.objects.filter(pk__in=ids).values_list('estado', flat=True)),
+                         ['RECIBIDO', 'RECIBIDO'])
+
+
+class FirmaTest(SRISimuladoMixin, TestCase):
+    """Caché del material de firma y etapa de firma en paralelo"""
+
+    def setUp(self):
+        super().setUp()
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        SignatureServiceSRI.invalidar_cache()
+
+        contenido, self.x509 = p12_prueba('clave123')
+        self.certificado = CertificadoDigital(activo=True)
+        self.certificado.set_password('clave123')
+        self.certificado.archivo.save('firma.p12', ContentFile(contenido), save=True)
+
+    def test_material_cacheado_y_firma_valida(self):
+        xml = f'<factura id="comprobante"><infoTributaria><claveAcceso>{clave_prueba(1)}</claveAcceso></infoTributaria></factura>'
+        carga = signature.pkcs12.load_key_and_certificates
+        with mock.patch.object(signature.pkcs12, 'load_key_and_certificates', side_effect=carga) as cargar:
+            SignatureServiceSRI(self.certificado).firmar_xml(xml.encode())
+            firmado = SignatureServiceSRI(CertificadoDigital.objects.get(pk=self.certificado.pk)).firmar_xml(xml.encode())
+            self.assertEqual(cargar.call_count, 1)
+
+            self.certificado.save()
+            SignatureServiceSRI(self.certificado).firmar_xml(xml.encode())
+            self.assertEqual(cargar.call_count, 2)
+
+        ds = '{http://www.w3.org/2000/09/xmldsig#}'
+        raiz = etree.fromstring(firmado)
+        signed_info = raiz.find(f'{ds}Signature/{ds}SignedInfo')
+        valor = raiz.findtext(f'{ds}Signature/{ds}SignatureValue')
+        self.x509.public_key().verify(
+            base64.b64decode(valor), etree.tostring(signed_info, method='c14n'),
+            padding.PKCS1v15(), hashes.SHA256(),
+        )
+
+    def test_firma_en_pool_deja_comprobantes_listos_para_lote(self):
+        comprobantes = []
+        for secuencial in range(1, 4):
+            clave = clave_prueba(secuencial)
+            comprobantes.append(ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado='ERROR', clave_acceso=clave,
+                xml_generado=f'<factura id="comprobante"><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            ))
+        comprobantes[2].xml_generado = '<factura>'
+        comprobantes[2].save()
+
+        pendientes = list(FirmaParalelaService.pendientes())
+        with mock.patch.object(firma_paralela, 'MIN_PARALELO', 1):
+            firmados = FirmaParalelaService.firmar_comprobantes(self.certificado, pendientes, procesos=2)
+
+        self.assertEqual(firmados, 2)
+        estados = [ComprobanteElectronico.objects.get(pk=c.pk) for c in comprobantes]
+        self.assertEqual([c.estado for c in estados], ['FIRMADO', 'FIRMADO', 'ERROR'])
+        self.assertIn('<ds:SignatureValue>', estados[0].xml_firmado)
+        self.assertEqual(list(LoteSRIService.pendientes()), estados[:2])
+
+
+class FacturaSnapshotTest(TestCase):
+    """El XML de la factura se arma con dos consultas, sin agregados ni cargas por línea"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        usuario = Usuario.objects.create_user('cajero', 'cajero@example.com', 'testpass123',
+                                              nombre='Caja', apellido='Uno')
+        self.venta = Venta.objects.create(usuario=usuario, cliente=Cliente.get_consumidor_final(),
+                                          subtotal=0, iva=0, total=0, tipo_pago='EFECTIVO')
+        categoria = CategoriaProducto.objects.create(nombre='Repuestos', codigo='REP',
+                                                     porcentaje_ganancia=Decimal('30.00'))
+        marca = Marca.objects.create(nombre='Genérica')
+        for numero in range(3):
+            producto = Producto.objects.create(
+                categoria=categoria, marca=marca, codigo_unico=f'REP-{numero}', nombre=f'Repuesto {numero}',
+                precio_compra=Decimal('5.00'), precio_venta=Decimal('10.00'),
+            )
+            DetalleVenta.objects.create(venta=self.venta, producto=producto, cantidad=2,
+                                        precio_unitario=Decimal('10.00'))
+        DetalleVenta.objects.create(venta=self.venta, nombre_personalizado='Mano de obra', es_servicio=True,
+                                    cantidad=1, precio_unitario=Decimal('15.00'))
+
+        self.config = SRIConfig.objects.create(ruc='1790000000001', razon_social='VP Motos',
+                                               direccion_matriz='Quito')
+        self.punto = PuntoEmision.objects.create(establecimiento='001', punto_emision='001',
+                                                 direccion_establecimiento='Quito')
+
+    def test_snapshot_en_dos_consultas_con_el_mismo_desglose(self):
+        with self.assertNumQueries(2):
+            snapshot = FacturaSnapshotService.cargar(self.venta.pk)
+        self.assertEqual(snapshot.base_iva_standard, self.venta.get_base_iva_standard())
+        self.assertEqual(snapshot.total_iva_standard, self.venta.get_total_iva_standard())
+        self.assertEqual(snapshot.base_iva_0, self.venta.get_base_iva_0())
+
+        with self.assertNumQueries(0):
+            xml, _ = XMLGeneratorSRI(self.config, self.punto).generar_xml_factura(snapshot)
+        raiz = etree.fromstring(xml)
+        self.assertEqual(raiz.findtext('infoFactura/identificacionComprador'), self.venta.cliente.identificacion)
+        self.assertEqual([d.findtext('codigoPrincipal') for d in raiz.iterfind('detalles/detalle')],
+                         ['REP-0', 'REP-1', 'REP-2', 'GENERICO'])
+
+
+class RIDEAsincronoTest(TestCase):
+    """La autorización solo encola el RIDE; el RIDE (cola "ride") encola el email"""
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        usuario = Usuario.objects.create_user('cajero', 'cajero@example.com', 'testpass123',
+                                              nombre='Caja', apellido='Uno')
+        venta = Venta.objects.create(usuario=usuario, subtotal=10, iva=0, total=10, tipo_pago='EFECTIVO')
+        self.comprobante = ComprobanteElectronico.objects.create(venta=venta, estado='AUTORIZADO',
+                                                                 clave_acceso=clave_prueba(1))
+
+        # WeasyPrint no se importa en las pruebas: generador de RIDE simulado
+        generador = mock.Mock()
+        generador.return_value.generar_pdf.side_effect = lambda: BytesIO(b'%PDF-1.4 prueba')
+        modulo = SimpleNamespace(RIDEGenerator=generador)
+        parche = mock.patch.dict(sys.modules, {'electronic_invoicing.services.ride_generator': modulo})
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.generador = generador
+
+    def test_ride_en_su_cola_y_email_despues(self):
+        self.assertEqual(settings.CELERY_TASK_ROUTES['electronic_invoicing.tasks.generar_ride'], {'queue': 'ride'})
+        with mock.patch.object(tasks.generar_ride, 'delay') as encolar_ride:
+            tasks.finalizar_autorizado(self.comprobante)
+        encolar_ride.assert_called_once_with(str(self.comprobante.id), True)
+        self.generador.assert_not_called()
+
+        with mock.patch.object(tasks.enviar_email_comprobante, 'delay') as encolar_email:
+            self.assertTrue(tasks.generar_ride(str(self.comprobante.id)))
+            self.assertTrue(tasks.generar_ride(str(self.comprobante.id), enviar_email=False))
+        encolar_email.assert_called_once_with(str(self.comprobante.id))
+
+        self.comprobante.refresh_from_db()
+        self.assertEqual(self.comprobante.pdf_ride.read(), b'%PDF-1.4 prueba')
+        self.assertEqual(len(os.listdir(os.path.join(settings.MEDIA_ROOT, 'sri', 'rides'))), 1)
+
+        ComprobanteElectronico.objects.filter(pk=self.comprobante.pk).update(estado='RECHAZADO')
+        self.assertFalse(tasks.generar_ride(str(self.comprobante.id)))
+
+
+class TransicionesTest(TestCase):
+    """Historial de etapas solo de inserción y percentiles por etapa y punto de emisión"""
+
+    def test_metricas_por_etapa_y_punto(self):
+        usuario = Usuario.objects.create_user('cajero', 'cajero@example.com', 'testpass123',
+                                              nombre='Caja', apellido='Uno')
+        punto = PuntoEmision.objects.create(establecimiento='001', punto_emision='002',
+                                            direccion_establecimiento='Quito')
+        venta = Venta.objects.create(usuario=usuario, subtotal=10, iva=0, total=10, tipo_pago='EFECTIVO')
+        comprobante = ComprobanteElectronico.objects.create(venta=venta, punto_emision=punto, estado='RECIBIDO')
+        TransicionService.registrar_varias([
+            TransicionService.nueva(comprobante, 'RECEPCION', 'FIRMADO', duracion_ms=ms, exitosa=ms < 1000)
+            for ms in [100, 200, 300, 400, 500, 600, 700, 800, 900, 5000]
+        ])
+        TransicionService.registrar(comprobante, 'FIRMAR', 'GENERADO', duracion_ms=12)
+
+        transicion = TransicionComprobante.objects.first()
+        transicion.duracion_ms = 1
+        with self.assertRaises(ValueError):
+            transicion.save()
+
+        hoy = timezone.localdate()
+        recepcion, firma = TransicionService.resumen(hoy, hoy)[::-1]
+        self.assertEqual((firma['etapa'], firma['origen'], firma['p50_ms']), ('FIRMAR', 'Interno', 12))
+        self.assertEqual((recepcion['origen'], recepcion['cantidad'], recepcion['errores']), ('SRI', 10, 1))
+        self.assertEqual((recepcion['p50_ms'], recepcion['p95_ms']), (500, 5000))
+        self.assertEqual(TransicionService.metricas(hoy, hoy, punto.pk)[0]['punto_emision'], '001-002')
+        self.assertEqual(TransicionService.metricas(hoy, hoy, punto.pk + 1), [])
+
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('electronic_invoicing:metricas'), {'punto': punto.pk})
+        self.assertContains(respuesta, '001-002')
+
+
+@override_settings(SRI_MONITOR_VENTANA=60)
+class MonitorSRITest(TestCase):
+    """Los avisos al monitor se agrupan: un solo group_send con el último estado de cada comprobante"""
+
+    def setUp(self):
+        MonitorSRIService.limpiar()
+        self.addCleanup(MonitorSRIService.limpiar)
+        usuario = Usuario.objects.create_user('cajero', 'cajero@example.com', 'testpass123',
+                                              nombre='Caja', apellido='Uno')
+        self.ventas = [Venta.objects.create(usuario=usuario, subtotal=10, iva=0, total=10, tipo_pago='EFECTIVO')
+                       for _ in range(2)]
+        self.ids = [ComprobanteElectronico.objects.create(venta=venta).pk for venta in self.ventas]
+
+    def test_ultimo_estado_por_comprobante_en_un_envio(self):
+        con_venta = ComprobanteElectronico.objects.select_related('venta').get(pk=self.ids[0])
+        sin_venta = ComprobanteElectronico.objects.get(pk=self.ids[1])
+        with self.assertNumQueries(0):
+            for estado in ['GENERADO', 'FIRMADO', 'RECIBIDO']:
+                con_venta.estado = sin_venta.estado = estado
+                tasks.notificar_monitor(con_venta, f"Paso {estado}")
+                tasks.notificar_monitor(sin_venta, f"Paso {estado}")
+
+        canal = mock.Mock()
+        with mock.patch('electronic_invoicing.services.monitor.get_channel_layer', return_value=canal), \
+                mock.patch('electronic_invoicing.services.monitor.async_to_sync', side_effect=lambda f: f), \
+                self.assertNumQueries(1):
+            self.assertEqual(MonitorSRIService.enviar_pendientes(), 2)
+
+        canal.group_send.assert_called_once()
+        grupo, evento = canal.group_send.call_args.args
+        self.assertEqual((grupo, evento['type']), ('sri_monitor', 'sri_status_batch'))
+        self.assertEqual([(a['venta_numero'], a['estado'], a['mensaje']) for a in evento['actualizaciones']],
+                         [(venta.numero_factura, 'RECIBIDO', 'Paso RECIBIDO') for venta in self.ventas])
+
+        # El número resuelto queda en el caché del proceso
+        with self.assertNumQueries(0):
+            self.assertEqual(MonitorSRIService.numero_factura(sin_venta), self.ventas[1].numero_factura)
+
+    def test_vaciar_al_terminar_el_proceso(self):
+        comprobante = ComprobanteElectronico.objects.select_related('venta').get(pk=self.ids[0])
+        tasks.notificar_monitor(comprobante, "Autorizado")
+
+        canal = mock.Mock()
+        with mock.patch('electronic_invoicing.services.monitor.get_channel_layer', return_value=canal), \
+                mock.patch('electronic_invoicing.services.monitor.async_to_sync', side_effect=lambda f: f):
+            worker_process_shutdown.send(sender=None, pid=0, exitcode=0)
+
+        canal.group_send.assert_called_once()
+        self.assertEqual(MonitorSRIService.vaciar(), 0)
+
+
+class CircuitoSRITest(SRISimuladoMixin, TestCase):
+    """Con el SRI caído los comprobantes esperan en contingencia y se drenan en lotes al volver"""
+
+    def test_circuito_contingencia_y_drenaje(self):
+        # Fallos de red seguidos abren el circuito; luego se falla sin tocar la red
+        transporte = TransporteSRI(session=requests.Session(), timeout=2)
+        with mock.patch.object(circuito_sri, 'UMBRAL_FALLOS', 2):
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    transporte.load('http://127.0.0.1:9/recepcion.wsdl')
+        self.assertTrue(CircuitoSRIService.abierto())
+        with mock.patch.object(transporte.session, 'get') as get, self.assertRaises(SRINoDisponible):
+            transporte.load('http://127.0.0.1:9/recepcion.wsdl')
+        get.assert_not_called()
+
+        PuntoEmision.objects.create(establecimiento='001', punto_emision='001', direccion_establecimiento='Quito')
+        comprobantes = []
+        for secuencial in (1, 2):
+            clave = clave_prueba(secuencial)
+            comprobantes.append(ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado='FIRMADO', clave_acceso=clave,
+                xml_firmado=f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            ))
+
+        with mock.patch.object(tasks.sondear_sri, 'apply_async') as sondeo:
+            self.assertIsNone(tasks.procesar_factura_electronica(str(comprobantes[0].id)))
+            self.assertEqual(tasks.enviar_lotes_pendientes(), 0)
+        sondeo.assert_called_once_with(countdown=tasks.SONDEO_INTERVALO)
+        self.assertEqual(self.sri.llamadas['validarComprobante'], 0)
+        comprobantes[0].refresh_from_db()
+        self.assertEqual(comprobantes[0].estado, 'CONTINGENCIA')
+
+        # El SRI simulado responde: el sondeo cierra el circuito y programa el drenaje
+        with mock.patch.object(tasks.drenar_contingencia, 'apply_async') as drenaje:
+            self.assertTrue(tasks.sondear_sri())
+        self.assertFalse(CircuitoSRIService.abierto())
+        drenaje.assert_called_once_with(countdown=tasks.CONTINGENCIA_INTERVALO)
+
+        # El drenaje solo toma la contingencia; el FIRMADO sigue su camino normal
+        with mock.patch.object(tasks, 'programar_autorizacion'):
+            self.assertEqual(tasks.drenar_contingencia(), 1)
+        self.assertEqual(self.sri.llamadas['validarComprobante'], 1)
+        self.assertEqual(sorted(ComprobanteElectronico.objects.values_list('estado', flat=True)),
+                         ['FIRMADO', 'RECIBIDO'])
+
+    def test_solo_caidas_quedan_en_contingencia(self):
+        # Un SOAP Fault es una respuesta del SRI: va a ERROR con su mensaje, no a contingencia
+        PuntoEmision.objects.create(establecimiento='001', punto_emision='001', direccion_establecimiento='Quito')
+        errores = {
+            'red': requests.ConnectionError('sin ruta'),
+            'caida': zeep.exceptions.TransportError('Server Error', status_code=503),
+            'fault': zeep.exceptions.Fault('Estructura de XML inválida'),
+        }
+        comprobantes = {}
+        for secuencial, caso in enumerate(errores, start=1):
+            clave = clave_prueba(secuencial)
+            comprobantes[caso] = ComprobanteElectronico.objects.create(
+                venta=self.nueva_venta(), estado='FIRMADO', clave_acceso=clave,
+                xml_firmado=f'<factura><infoTributaria><claveAcceso>{clave}</claveAcceso></infoTributaria></factura>',
+            )
+
+        for caso, error in errores.items():
+            cliente = SimpleNamespace(service=SimpleNamespace(validarComprobante=mock.Mock(side_effect=error)))
+            with mock.patch.object(tasks.SRIClientFactory, 'recepcion', return_value=cliente), \
+                    mock.patch.object(tasks, 'programar_contingencia') as contingencia:
+                self.assertFalse(tasks.procesar_factura_electronica(str(comprobantes[caso].id)))
+            self.assertEqual(contingencia.called, caso != 'fault')
+
+        estados = {caso: ComprobanteElectronico.objects.get(pk=comprobante.pk)
+                   for caso, comprobante in comprobantes.items()}
+        self.assertEqual(estados['red'].estado, 'CONTINGENCIA')
+        self.assertEqual(estados['caida'].estado, 'CONTINGENCIA')
+        self.assertEqual(estados['fault'].estado, 'ERROR')
+        self.assertIn('Estructura de XML inválida', estados['fault'].mensajes_error)
+
+    def test_solo_caidas_cuentan_como_fallo(self):
+        transporte = TransporteSRI(session=requests.Session(), timeout=2)
+
+        def respuesta(status_code):
+            resultado = requests.Response()
+            resultado.status_code, resultado._content, resultado.raw = status_code, b'<error/>', BytesIO()
+            return resultado
+
+        with mock.patch.object(circuito_sri, 'UMBRAL_FALLOS', 2), \
+                mock.patch.object(transporte.session, 'get', return_value=respuesta(404)), \
+                mock.patch.object(transporte.session, 'post', return_value=respuesta(500)):
+            for _ in range(3):
+                with self.assertRaises(requests.HTTPError):
+                    transporte.load('http://127.0.0.1:9/recepcion.wsdl')
+                transporte.post('http://127.0.0.1:9/recepcion', '<soap/>', {})
+        self.assertFalse(CircuitoSRIService.abierto())
+
+        with mock.patch.object(circuito_sri, 'UMBRAL_FALLOS', 2), \
+                mock.patch.object(transporte.session, 'post', return_value=respuesta(503)):
+            for _ in range(2):
+                transporte.post('http://127.0.0.1:9/recepcion', '<soap/>', {})
+        self.assertTrue(CircuitoSRIService.abierto())
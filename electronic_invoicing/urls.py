@@ -6,6 +6,7 @@ app_name = 'electronic_invoicing'
 urlpatterns = [
     path('monitor/', views.monitor_sri, name='monitor'),
     path('gestion/', views.gestion_facturacion, name='gestion'),
+    path('metricas/', views.metricas_sri, name='metricas'),
     path('api/config/guardar/', views.guardar_config_sri, name='guardar_config'),
     path('descargar/xml/<uuid:pk>/', views.descargar_xml_sri, name='descargar_xml'),
     path('descargar/pdf/<uuid:pk>/', views.descargar_pdf_sri, name='descargar_pdf'),
@@ -3,6 +3,7 @@ from django.shortcuts import get_object_or_404, render
 from django.contrib.auth.decorators import login_required
 from .models import ComprobanteElectronico, SRIConfig, PuntoEmision, CertificadoDigital
 from .services.ride_generator import RIDEGenerator
+from .services.circuito_sri import CircuitoSRIService
 from django.core.files.base import ContentFile
 import logging
 from lxml import etree
@@ -151,6 +152,8 @@ def monitor_sri(request):
         errores=Count('id', filter=models.Q(estado='ERROR')),
         recibidos=Count('id', filter=models.Q(estado='RECIBIDO')),
     )
+    # La contingencia puede venir de días anteriores
+    stats_dia['contingencia'] = ComprobanteElectronico.objects.filter(estado='CONTINGENCIA').count()
     
     template_name = 'electronic_invoicing/monitor_facturacion.html'
     if request.GET.get('embed') == 'true':
@@ -159,6 +162,30 @@ def monitor_sri(request):
     return render(request, template_name, {
         'comprobantes': comprobantes_recientes,
         'stats': stats_dia,
+        'circuito': CircuitoSRIService.estado(),
+    })
+
+@login_required
+def metricas_sri(request):
+    """Duración p50/p95 de cada etapa del comprobante por día y punto de emisión"""
+    from datetime import timedelta
+    from django.utils import timezone
+    from django.utils.dateparse import parse_date
+    from .services.transiciones import TransicionService
+
+    hoy = timezone.localdate()
+    hasta = parse_date(request.GET.get('hasta') or '') or hoy
+    desde = parse_date(request.GET.get('desde') or '') or hasta - timedelta(days=6)
+    punto_id = request.GET.get('punto')
+    punto_id = int(punto_id) if punto_id and punto_id.isdigit() else None
+
+    return render(request, 'electronic_invoicing/metricas_sri.html', {
+        'resumen': TransicionService.resumen(desde, hasta, punto_id),
+        'filas': TransicionService.metricas(desde, hasta, punto_id),
+        'puntos': PuntoEmision.objects.all(),
+        'desde': desde,
+        'hasta': hasta,
+        'punto_id': punto_id,
     })
 
 @login_required
@@ -238,6 +265,11 @@ def subir_certificado_sri(request):
             
             cert.activo = True
             cert.save()
+
+            # Los workers cargan el material por (id, fecha_actualizacion); aquí
+            # se libera el del certificado anterior en este proceso.
+            from .services.signature import SignatureServiceSRI
+            SignatureServiceSRI.invalidar_cache()
             
             return JsonResponse({
                 'status': 'success', 
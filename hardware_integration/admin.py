@@ -359,15 +359,11 @@ class ImpresoraAdmin(admin.ModelAdmin):
                 )
                 return redirect('admin:hardware_integration_impresora_change', impresora_id)
             
-            # Convertir a hexadecimal
-            comandos_hex = comandos.hex()
-            
             # Crear trabajo en la cola para el agente
-            trabajo = TrabajoImpresion.objects.create(
+            trabajo = TrabajoImpresion(
                 tipo='PRUEBA',
                 estado='PENDIENTE',
                 impresora=impresora,
-                datos_impresion=comandos_hex,
                 formato='ESC_POS',
                 usuario=request.user,
                 prioridad=1,
@@ -378,6 +374,8 @@ class ImpresoraAdmin(admin.ModelAdmin):
                     'accion': 'prueba_impresora_directa'
                 }
             )
+            trabajo.asignar_comandos(comandos)
+            trabajo.save()
             
             # Actualizar fecha de última prueba
             impresora.fecha_ultima_prueba = timezone.now()
@@ -516,15 +514,11 @@ class ImpresoraAdmin(admin.ModelAdmin):
                 )
                 return redirect('admin:hardware_integration_impresora_change', impresora_id)
             
-            # Convertir a hexadecimal
-            comandos_hex = comandos.hex()
-            
             # Crear trabajo en la cola para el agente
-            trabajo = TrabajoImpresion.objects.create(
+            trabajo = TrabajoImpresion(
                 tipo='PRUEBA',
                 estado='PENDIENTE',
                 impresora=impresora,
-                datos_impresion=comandos_hex,
                 formato='ESC_POS',
                 usuario=request.user,
                 prioridad=1,
@@ -535,6 +529,8 @@ class ImpresoraAdmin(admin.ModelAdmin):
                     'accion': 'prueba_codigos_barras'
                 }
             )
+            trabajo.asignar_comandos(comandos)
+            trabajo.save()
             
             # Actualizar fecha de última prueba
             impresora.fecha_ultima_prueba = timezone.now()
@@ -790,7 +786,8 @@ class TrabajoImpresionAdmin(admin.ModelAdmin):
     search_fields = ['id', 'mensaje_error']
     readonly_fields = [
         'id', 'fecha_creacion', 'fecha_asignacion', 'fecha_completado',
-        'tiempo_procesamiento', 'intentos', 'historial_errores'
+        'tiempo_procesamiento', 'intentos', 'historial_errores', 'reserva_expira', 'agente',
+        'tamano_bytes', 'payload_comprimido'
     ]
     ordering = ['-fecha_creacion']
     
@@ -802,14 +799,15 @@ class TrabajoImpresionAdmin(admin.ModelAdmin):
             'fields': ('impresora', 'venta', 'producto')
         }),
         ('Datos de Impresión', {
-            'fields': ('datos_impresion', 'formato', 'copias', 'abrir_gaveta'),
+            'fields': ('tamano_bytes', 'payload_comprimido', 'formato', 'copias', 'abrir_gaveta'),
             'classes': ('collapse',)
         }),
         ('Control y Reintentos', {
             'fields': ('intentos', 'max_intentos', 'mensaje_error', 'historial_errores')
         }),
         ('Auditoría', {
-            'fields': ('usuario', 'fecha_creacion', 'fecha_asignacion', 'fecha_completado', 'tiempo_procesamiento')
+            'fields': ('usuario', 'agente', 'fecha_creacion', 'fecha_asignacion', 'reserva_expira',
+                       'fecha_completado', 'tiempo_procesamiento')
         }),
         ('Metadatos', {
             'fields': ('metadata',),
@@ -8,7 +8,10 @@ from rest_framework.throttling import BaseThrottle
 from django.utils import timezone
 from django.core.cache import cache
 from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.urls import reverse
 from ..models import Impresora, RegistroImpresion, TrabajoImpresion
+from ..printers.cola_impresion_service import ColaImpresionService, ReservaPerdida
 import logging
 
 logger = logging.getLogger(__name__)
@@ -59,15 +62,17 @@ def es_usuario_sistema(user):
     return nombre_user == USUARIO_SISTEMA
 
 
-def normalizar_nombre_impresora(nombre_solicitado):
+def normalizar_nombre_impresora(nombre_solicitado, impresoras_bd=None):
     """
     Normaliza el nombre de la impresora para que coincida con el sistema Windows.
+    impresoras_bd: pares (nombre, nombre_driver) ya cargados, para no consultar por trabajo
     """
     try:
         nombre_solicitado = nombre_solicitado.strip()
         
         # Buscar en BD
-        impresoras_bd = Impresora.objects.filter(estado='ACTIVA').values_list('nombre', 'nombre_driver')
+        if impresoras_bd is None:
+            impresoras_bd = list(Impresora.objects.filter(estado='ACTIVA').values_list('nombre', 'nombre_driver'))
         
         # Coincidencia exacta
         for nombre_bd, driver_bd in impresoras_bd:
@@ -92,6 +97,65 @@ def normalizar_nombre_impresora(nombre_solicitado):
         return nombre_solicitado
 
 
+def serializar_trabajos(trabajos, incluir_comandos=True):
+    """
+    Arma la respuesta del agente para los trabajos reservados.
+    Las impresoras activas (y la predeterminada) se leen una sola vez por consulta.
+    Sin incluir_comandos, el agente descarga los bytes desde payload_url.
+    """
+    if not trabajos:
+        return []
+
+    impresoras = list(
+        Impresora.objects.filter(estado='ACTIVA').values_list('nombre', 'nombre_driver', 'es_principal_tickets')
+    )
+    impresoras_bd = [(nombre, driver) for nombre, driver, _ in impresoras]
+    # Si el trabajo no tiene impresora asignada se usa la predeterminada
+    impresora_default = next((driver for _, driver, principal in impresoras if principal), "PrinterPOS-80")
+    normalizados = {}
+
+    trabajos_list = []
+    for trabajo in trabajos:
+        if trabajo.impresora and trabajo.impresora.nombre_driver:
+            nombre_impresora = trabajo.impresora.nombre_driver
+        elif trabajo.impresora:
+            nombre_impresora = trabajo.impresora.nombre
+        else:
+            nombre_impresora = impresora_default
+
+        if nombre_impresora not in normalizados:
+            normalizados[nombre_impresora] = normalizar_nombre_impresora(nombre_impresora, impresoras_bd)
+        nombre_normalizado = normalizados[nombre_impresora]
+
+        # Obtener información del usuario que creó el trabajo
+        usuario_creador = "Sistema"
+        if trabajo.usuario:
+            usuario_creador = trabajo.usuario.get_full_name()
+            if not usuario_creador or usuario_creador.strip() == "":
+                usuario_creador = trabajo.usuario.username
+
+        datos = {
+            'id': str(trabajo.id),
+            'impresora': nombre_normalizado,
+            'tipo': trabajo.tipo,
+            'prioridad': trabajo.prioridad,
+            'fecha_creacion': trabajo.fecha_creacion.isoformat(),
+            'copias': trabajo.copias,
+            'abrir_gaveta': trabajo.abrir_gaveta,
+            'usuario': usuario_creador,
+            'tamano': trabajo.tamano_bytes,
+            'payload_url': reverse('hardware_api:agente_trabajo_payload', args=[trabajo.id]),
+        }
+        if incluir_comandos:
+            # El agente actual espera los comandos en hexadecimal dentro del JSON
+            datos['comandos'] = trabajo.comandos.hex()
+        trabajos_list.append(datos)
+
+        logger.debug(f"📤 Trabajo {trabajo.id} ({trabajo.tipo}) de {usuario_creador} → {nombre_normalizado}")
+
+    return trabajos_list
+
+
 def obtener_usuario_para_impresion():
     """
     Obtiene un usuario válido para crear trabajos de impresión
@@ -155,6 +219,12 @@ def registrar_agente(request):
             for idx, imp in enumerate(impresoras, 1):
                 logger.info(f"      {idx}. {imp.get('nombre', 'Sin nombre')} - {imp.get('driver', 'Sin driver')}")
         
+        # 🔀 Rutas: las impresoras que atiende + su sucursal, para avisarle solo sus trabajos
+        rutas = ColaImpresionService.rutas_agente(
+            ColaImpresionService.resolver_impresoras(impresoras),
+            data.get('sucursal_id') or getattr(request.user, 'sucursal_id', None),
+        )
+        
         # Guardar info en cache (para estado)
         cache_key = f"agente_{request.user.id}_{computadora}"
         agente_info = {
@@ -165,6 +235,7 @@ def registrar_agente(request):
             'es_sistema': es_sistema,  # 🔥 NUEVO
             'version': version_agente,
             'impresoras': impresoras,
+            'rutas': rutas,
             'ultima_conexion': timezone.now().isoformat(),
             'estado': 'ACTIVO'
         }
@@ -177,7 +248,8 @@ def registrar_agente(request):
             'usuario': request.user.username,
             'usuario_id': request.user.id,
             'es_sistema': es_sistema,  # 🔥 NUEVO
-            'impresoras_registradas': len(impresoras)
+            'impresoras_registradas': len(impresoras),
+            'impresoras_enrutadas': len(rutas['impresora_ids']) if rutas else 0
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
@@ -218,79 +290,33 @@ def obtener_trabajos_pendientes(request):
                 'cache_hit': True
             }, status=status.HTTP_200_OK)
         
-        if es_sistema:
-            # ✅ Usuario de sistema → Ve TODOS los trabajos pendientes
-            trabajos_query = TrabajoImpresion.objects.filter(
-                estado='PENDIENTE'
-            ).select_related('impresora', 'venta', 'producto', 'usuario').order_by(
-                'prioridad',
-                'fecha_creacion'
-            )[:10]
-            
-            # logger.debug(f"🔓 Usuario SISTEMA '{request.user.username}' consultando TODOS los trabajos")
-        else:
-            # ✅ Usuario normal → Solo sus propios trabajos
-            trabajos_query = TrabajoImpresion.objects.filter(
-                estado='PENDIENTE',
-                usuario=request.user
-            ).select_related('impresora', 'venta', 'producto').order_by(
-                'prioridad',
-                'fecha_creacion'
-            )[:10]
-            
+        # ✅ Reserva atómica: usuario de sistema → TODOS los trabajos, usuario normal → solo los suyos.
+        # Los trabajos salen ya en PROCESANDO, así dos agentes nunca imprimen el mismo ticket
+        # ?payload=url → los comandos no viajan en el JSON, se descargan en binario
+        incluir_comandos = request.query_params.get('payload') != 'url'
+        agente = request.query_params.get('agente') or request.user.username
+        # Agente registrado con sus impresoras → solo los trabajos que puede imprimir
+        rutas = (cache.get(f"agente_{request.user.id}_{agente}") or {}).get('rutas')
+        trabajos_query = ColaImpresionService.reclamar(
+            usuario=None if es_sistema else request.user,
+            agente=agente,
+            sin_comandos=not incluir_comandos,
+            rutas=rutas,
+        )
+        if not es_sistema:
             logger.debug(f"🔒 Usuario '{request.user.username}' consultando sus trabajos")
         
-        trabajos_list = []
-        
-        for trabajo in trabajos_query:
-            # Normalizar nombre de impresora
-            if trabajo.impresora and trabajo.impresora.nombre_driver:
-                nombre_impresora = trabajo.impresora.nombre_driver
-            elif trabajo.impresora:
-                nombre_impresora = trabajo.impresora.nombre
-            else:
-                # Si no tiene impresora asignada, buscar la predeterminada
-                impresora_default = Impresora.objects.filter(
-                    es_principal_tickets=True,
-                    estado='ACTIVA'
-                ).first()
-                nombre_impresora = impresora_default.nombre_driver if impresora_default else "PrinterPOS-80"
-            
-            nombre_normalizado = normalizar_nombre_impresora(nombre_impresora)
-            
-            # Obtener información del usuario que creó el trabajo
-            usuario_creador = "Sistema"
-            if trabajo.usuario:
-                usuario_creador = trabajo.usuario.get_full_name()
-                if not usuario_creador or usuario_creador.strip() == "":
-                    usuario_creador = trabajo.usuario.username
-            
-            trabajos_list.append({
-                'id': str(trabajo.id),
-                'impresora': nombre_normalizado,
-                'comandos': trabajo.datos_impresion,  # Ya está en formato hex
-                'tipo': trabajo.tipo,
-                'prioridad': trabajo.prioridad,
-                'fecha_creacion': trabajo.fecha_creacion.isoformat(),
-                'copias': trabajo.copias,
-                'abrir_gaveta': trabajo.abrir_gaveta,
-                'usuario': usuario_creador,  # 🔥 NUEVO: Info del usuario creador
-            })
-            
-            # Marcar como EN PROCESO
-            trabajo.marcar_procesando()
-            
-            logger.info(f"📤 Trabajo {trabajo.id} enviado al agente")
-            logger.info(f"   Creado por: {usuario_creador}")
-            logger.info(f"   Impresora: {nombre_normalizado}")
-            logger.info(f"   Tipo: {trabajo.tipo}")
+        trabajos_list = serializar_trabajos(trabajos_query, incluir_comandos)
+        # Un solo aviso al frontend por consulta (la reserva en bloque no dispara post_save)
+        ColaImpresionService.notificar_reclamados(trabajos_query)
         
         if trabajos_list:
             tipo_busqueda = "TODOS" if es_sistema else f"usuario {request.user.username}"
             logger.info(f"📋 Enviados {len(trabajos_list)} trabajo(s) [{tipo_busqueda}]")
-        else:
+        elif rutas is None:
             # 🔥 MARCAR VACÍO: Si no hay nada, guardar en Redis por 60s
             # Esto evitará que 1000 preguntas por segundo toquen la DB
+            # (solo si se consultó toda la cola, no únicamente las impresoras del agente)
             cache.set(cache_key_vacio, True, 60)
             logger.debug(f"📋 Sin trabajos pendientes para {request.user.username} (Marcado en caché)")
         
@@ -311,6 +337,40 @@ def obtener_trabajos_pendientes(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@throttle_classes([NoThrottle])
+def descargar_payload_trabajo(request, trabajo_id):
+    """
+    Endpoint para que el agente descargue los comandos de un trabajo en binario
+    
+    GET /api/hardware/agente/trabajos/<trabajo_id>/payload/
+    
+    - Con "Accept-Encoding: deflate" y payload comprimido → se envía tal cual está guardado
+    - Si no → bytes crudos, descomprimidos en bloques (streaming)
+    """
+    try:
+        trabajo = TrabajoImpresion.objects.only(
+            'id', 'usuario_id', 'payload', 'payload_comprimido', 'tamano_bytes', 'datos_impresion'
+        ).get(id=trabajo_id)
+    except TrabajoImpresion.DoesNotExist:
+        return Response({'error': 'Trabajo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    # Usuario normal → solo sus propios trabajos
+    if not es_usuario_sistema(request.user) and trabajo.usuario_id != request.user.id:
+        return Response({'error': 'Trabajo no encontrado'}, status=status.HTTP_404_NOT_FOUND)
+
+    if trabajo.payload_comprimido and 'deflate' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = HttpResponse(bytes(trabajo.payload), content_type='application/octet-stream')
+        response['Content-Encoding'] = 'deflate'
+    else:
+        response = StreamingHttpResponse(trabajo.iter_comandos(), content_type='application/octet-stream')
+        if trabajo.payload is not None:
+            response['Content-Length'] = trabajo.tamano_bytes
+    response['Vary'] = 'Accept-Encoding'
+    return response
+
+
 @api_view(['POST'])
 @permission_classes([])
 @throttle_classes([NoThrottle])
@@ -339,36 +399,36 @@ def reportar_resultado(request):
         logger.info(f"   Mensaje: {mensaje}")
         logger.info(f"   Usuario agente: {request.user.username}")
         
+        # Completado o error (con reintento) según el resultado, solo si el agente conserva la reserva
+        agente = data.get('agente') or request.query_params.get('agente') or request.user.username
         try:
-            trabajo = TrabajoImpresion.objects.get(id=trabajo_id)
-            
-            # 🔥 NUEVO: Loguear usuario creador
-            if trabajo.usuario:
-                logger.info(f"   Creado por: {trabajo.usuario.username}")
-            
-            if success:
-                # Marcar como completado
-                trabajo.marcar_completado(tiempo_ms=int(tiempo_ms * 1000) if tiempo_ms else None)
-                logger.info(f"   ✅ Trabajo completado exitosamente")
-            else:
-                # Marcar con error
-                trabajo.marcar_error(mensaje)
-                logger.warning(f"   ❌ Trabajo marcado con error")
-            
+            trabajo = ColaImpresionService.registrar_resultado(trabajo_id, success, mensaje, tiempo_ms, agente)
+        except ReservaPerdida as e:
+            logger.warning(f"⚠️ Resultado de {agente} ignorado para el trabajo {trabajo_id}: {e}")
             return Response({
-                'success': True,
-                'mensaje': 'Resultado registrado correctamente',
-                'trabajo_id': str(trabajo.id),
-                'usuario_creador': trabajo.usuario.username if trabajo.usuario else None
-            }, status=status.HTTP_200_OK)
-            
-        except TrabajoImpresion.DoesNotExist:
+                'success': False,
+                'error': str(e),
+                'mensaje': 'El agente ya no tiene la reserva de este trabajo'
+            }, status=status.HTTP_409_CONFLICT)
+        if trabajo is None:
             logger.warning(f"⚠️ Trabajo {trabajo_id} no encontrado en BD")
             return Response({
                 'success': False,
                 'error': 'Trabajo no encontrado'
             }, status=status.HTTP_404_NOT_FOUND)
         
+        # 🔥 NUEVO: Loguear usuario creador
+        if trabajo.usuario:
+            logger.info(f"   Creado por: {trabajo.usuario.username}")
+        logger.info(f"   {'✅ Trabajo completado exitosamente' if success else '❌ Trabajo marcado con error'}")
+        
+        return Response({
+            'success': True,
+            'mensaje': 'Resultado registrado correctamente',
+            'trabajo_id': str(trabajo.id),
+            'usuario_creador': trabajo.usuario.username if trabajo.usuario else None
+        }, status=status.HTTP_200_OK)
+        
     except Exception as e:
         logger.error(f"❌ Error reportando resultado: {e}", exc_info=True)
         return Response({
@@ -499,17 +559,19 @@ def obtener_estado_agente(request):
 # FUNCIONES AUXILIARES PARA CREAR TRABAJOS (COMPATIBILIDAD)
 # ============================================================================
 
-def crear_trabajo_impresion(usuario, impresora_nombre, comandos_hex, tipo='ticket', prioridad=1, abrir_gaveta=None):
+def crear_trabajo_impresion(usuario, impresora_nombre, comandos_hex=None, tipo='ticket', prioridad=1, abrir_gaveta=None,
+                            comandos=None):
     """
     Crea un trabajo de impresión en la BD para que el agente lo procese
     
     Args:
         usuario: Instancia del modelo de Usuario
         impresora_nombre: Nombre del driver de la impresora
-        comandos_hex: Comandos ESC/POS en formato hexadecimal
+        comandos_hex: Comandos en hexadecimal (compatibilidad; preferir `comandos`)
         tipo: Tipo de documento (ticket, factura, test, etc)
         prioridad: 1=Alta, 2=Media, 3=Baja
         abrir_gaveta: True/False o None (None = detectar automáticamente)
+        comandos: Comandos ESC/POS, ZPL, etc en bytes (se guardan en binario)
     
     Returns:
         str: ID del trabajo creado
@@ -556,7 +618,9 @@ def crear_trabajo_impresion(usuario, impresora_nombre, comandos_hex, tipo='ticke
                 logger.info(f"🆕 Impresora temporal creada: {impresora_nombre}")
         
         # Validar comandos
-        if not comandos_hex or len(comandos_hex) < 10:
+        if comandos is None:
+            comandos = bytes.fromhex(comandos_hex or '')
+        if len(comandos) < 5:
             raise ValueError("Los comandos de impresión están vacíos o son demasiado cortos")
         
         # Detectar si debe abrir gaveta
@@ -572,18 +636,19 @@ def crear_trabajo_impresion(usuario, impresora_nombre, comandos_hex, tipo='ticke
                 abrir_gaveta = gaveta is not None
         
         # Crear en base de datos
-        trabajo = TrabajoImpresion.objects.create(
+        trabajo = TrabajoImpresion(
             tipo=tipo.upper(),
             prioridad=prioridad,
             estado='PENDIENTE',
             impresora=impresora,
-            datos_impresion=comandos_hex,
             formato='ESC_POS',
             usuario=usuario,
             copias=1,
             abrir_gaveta=abrir_gaveta,
             max_intentos=3
         )
+        trabajo.asignar_comandos(comandos)
+        trabajo.save()
         
         # 4. INVALIDAR ESCUDO DE RAM: Avisar que ya no está vacío
         cache_key_vacio = f"print_queue_empty_{usuario.id}"
@@ -598,7 +663,7 @@ def crear_trabajo_impresion(usuario, impresora_nombre, comandos_hex, tipo='ticke
         logger.info(f"   Tipo: {tipo}")
         logger.info(f"   Prioridad: {prioridad}")
         logger.info(f"   Abrir gaveta: {'✅ Sí' if abrir_gaveta else '❌ No'}")
-        logger.info(f"   Tamaño comandos: {len(comandos_hex)} caracteres")
+        logger.info(f"   Tamaño comandos: {trabajo.tamano_bytes} bytes{' (comprimido)' if trabajo.payload_comprimido else ''}")
         
         return str(trabajo.id)
         
@@ -726,14 +791,11 @@ def imprimir_codigo_barras(request):
         comandos += b'\n\n\n'
         comandos += b'\x1D\x56\x00'
         
-        # Convertir a hexadecimal
-        comandos_hex = comandos.hex()
-        
         # Crear trabajo de impresión
         trabajo_id = crear_trabajo_impresion(
             usuario=request.user,
             impresora_nombre=impresora.nombre_driver or impresora.nombre,
-            comandos_hex=comandos_hex,
+            comandos=comandos,
             tipo='CODIGO_BARRAS',
             prioridad=2,
             abrir_gaveta=False
@@ -845,14 +907,11 @@ def imprimir_etiqueta_producto(request):
             incluir_moneda=True
         )
         
-        # Convertir a hexadecimal
-        comandos_hex = comandos.hex()
-        
         # Crear trabajo de impresión
         trabajo_id = crear_trabajo_impresion(
             usuario=request.user,
             impresora_nombre=impresora.nombre_driver or impresora.nombre,
-            comandos_hex=comandos_hex,
+            comandos=comandos,
             tipo='ETIQUETA',
             prioridad=2,
             abrir_gaveta=False
@@ -935,14 +994,11 @@ def imprimir_prueba_codigos(request):
         # Generar página de prueba
         comandos = PrinterService.generar_pagina_prueba_codigos()
         
-        # Convertir a hexadecimal
-        comandos_hex = comandos.hex()
-        
         # Crear trabajo
         trabajo_id = crear_trabajo_impresion(
             usuario=request.user,
             impresora_nombre=impresora.nombre_driver or impresora.nombre,
-            comandos_hex=comandos_hex,
+            comandos=comandos,
             tipo='PRUEBA',
             prioridad=1,
             abrir_gaveta=False
@@ -989,50 +1045,13 @@ def obtener_trabajos_sin_auth(request):
         # Obtener trabajos directamente
         es_sistema = es_usuario_sistema(user)
 
-        if es_sistema:
-            trabajos_query = TrabajoImpresion.objects.filter(
-                estado='PENDIENTE'
-            ).select_related('impresora', 'venta', 'producto', 'usuario').order_by(
-                'prioridad', 'fecha_creacion'
-            )[:10]
-        else:
-            trabajos_query = TrabajoImpresion.objects.filter(
-                estado='PENDIENTE',
-                usuario=user
-            ).select_related('impresora', 'venta', 'producto').order_by(
-                'prioridad', 'fecha_creacion'
-            )[:10]
-
-        trabajos_list = []
-        for trabajo in trabajos_query:
-            if trabajo.impresora and trabajo.impresora.nombre_driver:
-                nombre_impresora = trabajo.impresora.nombre_driver
-            elif trabajo.impresora:
-                nombre_impresora = trabajo.impresora.nombre
-            else:
-                impresora_default = Impresora.objects.filter(
-                    es_principal_tickets=True, estado='ACTIVA'
-                ).first()
-                nombre_impresora = impresora_default.nombre_driver if impresora_default else "PrinterPOS-80"
-
-            nombre_normalizado = normalizar_nombre_impresora(nombre_impresora)
-            
-            usuario_creador = "Sistema"
-            if trabajo.usuario:
-                usuario_creador = trabajo.usuario.get_full_name() or trabajo.usuario.username
+        trabajos_query = ColaImpresionService.reclamar(
+            usuario=None if es_sistema else user,
+            agente=request.query_params.get('agente') or user.username,
+        )
 
-            trabajos_list.append({
-                'id': str(trabajo.id),
-                'impresora': nombre_normalizado,
-                'comandos': trabajo.datos_impresion,
-                'tipo': trabajo.tipo,
-                'prioridad': trabajo.prioridad,
-                'fecha_creacion': trabajo.fecha_creacion.isoformat(),
-                'copias': trabajo.copias,
-                'abrir_gaveta': trabajo.abrir_gaveta,
-                'usuario': usuario_creador,
-            })
-            trabajo.marcar_procesando()
+        trabajos_list = serializar_trabajos(trabajos_query)
+        ColaImpresionService.notificar_reclamados(trabajos_query)
 
         return Response({
             'trabajos': trabajos_list,
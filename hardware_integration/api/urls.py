@@ -13,6 +13,7 @@ urlpatterns = [
     path('agente/resultado/', agente_views.reportar_resultado, name='agente_resultado'),
     path('agente/estado/', agente_views.obtener_estado_agente, name='agente_estado'),
     path('agente/trabajos/<uuid:trabajo_id>/estado/', agente_views.actualizar_estado_trabajo, name='actualizar_estado_trabajo'),
+    path('agente/trabajos/<uuid:trabajo_id>/payload/', agente_views.descargar_payload_trabajo, name='agente_trabajo_payload'),
 
     # ─── ENDPOINT SIN AUTH (solo para debugging/agente .exe) ─────────────────
     # ⚠️  Usar solo durante desarrollo. Reemplazar por el autenticado en producción.
@@ -1,47 +1,69 @@
+import base64
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from django.core.cache import cache
 import logging
 
+from .printers.cola_impresion_service import (
+    GRUPO_AGENTES_GLOBAL, LIMITE_POR_CONSULTA, RESERVA_SIN_CONFIRMAR, ColaImpresionService, ReservaPerdida
+)
+
 logger = logging.getLogger(__name__)
 
 class HardwareAgentConsumer(AsyncWebsocketConsumer):
     """
     Consumidor para el Agente de Hardware local (Windows).
     Permite notificaciones push para impresión y otros periféricos.
+
+    Protocolo de entrega directa (opcional, el agente lo activa al registrarse):
+      agente → {"action": "registrar", "agente": "PC-CAJA-01", "token": "...", "entrega": true,
+                "impresoras": [{"nombre": "...", "driver": "..."}]}
+      server → {"type": "print_jobs", "trabajos": [{..., "comandos_b64": "..."}]}
+      agente → {"action": "ack", "trabajos": ["<id>", ...]}
+      agente → {"action": "resultado", "trabajo_id": "<id>", "success": true, "mensaje": "...",
+                "detalles": {"tiempo_impresion": 1.2}}
+      agente → {"action": "pedir_trabajos"}
+    Sin registrar solo recibe el aviso "new_print_job" y sigue usando los endpoints HTTP.
+
+    Enrutamiento: al registrar impresoras (aquí o antes en registrar_agente por HTTP
+    con el mismo nombre de agente) deja el grupo global y escucha solo los grupos de
+    esas impresoras y de su sucursal.
     """
     async def connect(self):
         # El grupo depende del usuario o puede ser global para el sistema
         self.user = self.scope.get('user')
-        
-        # Grupo global para todos los agentes (útil para sistemas pequeños)
-        # O grupo por usuario: f"hardware_agent_{self.user.id}" si está autenticado
-        self.group_name = "hardware_agent_global"
-        
+        self.agente = ''
+        self.entrega_directa = False
+        self.rutas = None
+
+        # Grupo global hasta que el agente registre sus impresoras
+        self.grupos = [GRUPO_AGENTES_GLOBAL]
+
         # Aceptar la conexión
         await self.accept()
-        
+
         # Unirse al grupo de avisos de impresión
         await self.channel_layer.group_add(
-            self.group_name,
+            GRUPO_AGENTES_GLOBAL,
             self.channel_name
         )
-        
+
         logger.info(f"🔌 [WEB-SOCKET] Agente de hardware CONECTADO exitosamente: {self.channel_name}")
-        
+
         # Enviar mensaje de bienvenida con estatus
         await self.send(text_data=json.dumps({
             'type': 'connection_established',
             'message': '✅ Conexión establecida con el servidor ASGI CommerceBox',
-            'polling_reduction': True
+            'polling_reduction': True,
+            'entrega_directa_disponible': True
         }))
 
     async def disconnect(self, close_code):
-        # Salir del grupo
-        await self.channel_layer.group_discard(
-            self.group_name,
-            self.channel_name
-        )
+        # Salir de los grupos
+        for grupo in self.grupos:
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+        # Lo reservado y no confirmado vuelve a la cola al vencer su reserva
         logger.warning(f"🔌 [WEB-SOCKET] Agente de hardware DESCONECTADO (código: {close_code})")
 
     async def receive(self, text_data):
@@ -50,21 +72,154 @@ class HardwareAgentConsumer(AsyncWebsocketConsumer):
         """
         try:
             data = json.loads(text_data)
-            action = data.get('action')
-            
-            if action == 'ping':
-                await self.send(text_data=json.dumps({'type': 'pong'}))
-                
         except json.JSONDecodeError:
-            pass
+            return
+        action = data.get('action')
+
+        if action == 'ping':
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+        elif action == 'registrar':
+            await self.registrar(data)
+        elif action in ('ack', 'resultado', 'pedir_trabajos') and not self.entrega_directa:
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'error': 'Registre el agente con entrega directa antes de usar esta acción'
+            }))
+        elif action == 'pedir_trabajos':
+            await self.entregar_trabajos()
+        elif action == 'ack':
+            ids = data.get('trabajos') or [data.get('trabajo_id')]
+            await database_sync_to_async(self._confirmar)([i for i in ids if i])
+        elif action == 'resultado':
+            await self.reportar_resultado(data)
+
+    async def registrar(self, data):
+        """Identifica al agente (sesión o token DRF) y activa la entrega directa de trabajos"""
+        if data.get('token'):
+            self.user = await database_sync_to_async(self._usuario_por_token)(data['token'])
+        if not (self.user and self.user.is_authenticated):
+            await self.send(text_data=json.dumps({
+                'type': 'error',
+                'error': 'Se requiere autenticación para la entrega directa'
+            }))
+            return
+
+        self.agente = str(data.get('agente') or self.user.username)[:100]
+        self.entrega_directa = bool(data.get('entrega', True))
+        self.rutas = await database_sync_to_async(self._rutas)(data)
+        await self.cambiar_grupos(ColaImpresionService.grupos_agente(self.rutas))
+        logger.info(f"📝 [WEB-SOCKET] Agente {self.agente} registrado (entrega directa: {self.entrega_directa}, "
+                    f"grupos: {', '.join(self.grupos)})")
+
+        await self.send(text_data=json.dumps({
+            'type': 'registrado',
+            'agente': self.agente,
+            'entrega_directa': self.entrega_directa,
+            'impresoras_enrutadas': len(self.rutas['impresora_ids']) if self.rutas else 0
+        }))
+        if self.entrega_directa:
+            # Lo que ya estaba en cola al conectarse
+            await self.entregar_trabajos()
+
+    async def cambiar_grupos(self, grupos):
+        for grupo in set(grupos) - set(self.grupos):
+            await self.channel_layer.group_add(grupo, self.channel_name)
+        for grupo in set(self.grupos) - set(grupos):
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+        self.grupos = list(grupos)
+
+    async def entregar_trabajos(self):
+        """Reserva trabajos para este agente y los envía con sus comandos por el socket"""
+        while True:
+            trabajos = await database_sync_to_async(self._reclamar)()
+            if not trabajos:
+                return
+            await self.send(text_data=json.dumps({'type': 'print_jobs', 'trabajos': trabajos}))
+            logger.info(f"🚀 [PUSH] {len(trabajos)} trabajo(s) entregados a {self.agente} vía WebSocket")
+            if len(trabajos) < LIMITE_POR_CONSULTA:
+                return
+
+    async def reportar_resultado(self, data):
+        trabajo_id = data.get('trabajo_id')
+        exito = bool(data.get('success', False))
+        error = None
+        try:
+            trabajo = await database_sync_to_async(self._registrar_resultado)(
+                trabajo_id, exito, data.get('mensaje', 'Sin mensaje'),
+                (data.get('detalles') or {}).get('tiempo_impresion')
+            )
+        except ReservaPerdida as e:
+            # La reserva venció y el trabajo lo tomó otro agente (o ya se reportó)
+            logger.warning(f"⚠️ [WEB-SOCKET] Resultado de {self.agente} ignorado para {trabajo_id}: {e}")
+            trabajo, error = None, str(e)
+        except Exception as e:
+            logger.error(f"❌ [WEB-SOCKET] Error registrando resultado de {trabajo_id}: {e}", exc_info=True)
+            trabajo = None
+
+        respuesta = {
+            'type': 'resultado_registrado',
+            'trabajo_id': trabajo_id,
+            'success': trabajo is not None,
+            'estado': trabajo.estado if trabajo else None
+        }
+        if error:
+            respuesta.update(conflicto=True, error=error)
+        await self.send(text_data=json.dumps(respuesta))
+
+    def _usuario_por_token(self, key):
+        from rest_framework.exceptions import AuthenticationFailed
+        from .auth import CustomTokenAuthentication
+
+        try:
+            return CustomTokenAuthentication().authenticate_credentials(key)[0]
+        except AuthenticationFailed:
+            return None
+
+    def _rutas(self, data):
+        """Impresoras enviadas al registrar o, si no, las del último registrar_agente por HTTP"""
+        impresoras = data.get('impresoras')
+        if impresoras is None:
+            registro = cache.get(f"agente_{self.user.id}_{self.agente}") or {}
+            return registro.get('rutas')
+        return ColaImpresionService.rutas_agente(
+            ColaImpresionService.resolver_impresoras(impresoras),
+            data.get('sucursal_id') or getattr(self.user, 'sucursal_id', None),
+        )
+
+    def _reclamar(self):
+        from .api.agente_views import es_usuario_sistema, serializar_trabajos
+
+        trabajos = ColaImpresionService.reclamar(
+            usuario=None if es_usuario_sistema(self.user) else self.user,
+            agente=self.agente,
+            duracion=RESERVA_SIN_CONFIRMAR,
+            rutas=self.rutas,
+        )
+        datos = serializar_trabajos(trabajos, incluir_comandos=False)
+        for trabajo, dato in zip(trabajos, datos):
+            dato['comandos_b64'] = base64.b64encode(trabajo.comandos).decode('ascii')
+        ColaImpresionService.notificar_reclamados(trabajos)
+        return datos
+
+    def _confirmar(self, trabajo_ids):
+        return ColaImpresionService.confirmar_recepcion(trabajo_ids, self.agente)
+
+    def _registrar_resultado(self, trabajo_id, exito, mensaje, tiempo_s):
+        return ColaImpresionService.registrar_resultado(trabajo_id, exito, mensaje, tiempo_s, self.agente)
 
     async def new_print_job(self, event):
         """
         Handler para eventos de nuevo trabajo de impresión (enviados desde signals.py)
         """
         job_id = event.get('data', {}).get('id', 'N/A')
+
+        if self.entrega_directa:
+            # El trabajo viaja completo por el socket: sin ida y vuelta HTTP
+            await self.entregar_trabajos()
+            return
+
         logger.info(f"🚀 [PUSH-NOTIFY] Enviando señal de nuevo trabajo {job_id} al Agente vía WebSocket")
-        
+
         # Enviamos la notificación al Agente local
         await self.send(text_data=json.dumps({
             'type': 'new_print_job',
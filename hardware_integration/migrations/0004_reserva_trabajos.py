@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hardware_integration', '0003_remove_trabajoimpresion_creado_por_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimpresion',
+            name='agente',
+            field=models.CharField(blank=True, help_text='Agente (computadora) que reservó el trabajo', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='trabajoimpresion',
+            name='reserva_expira',
+            field=models.DateTimeField(blank=True, help_text='Si el agente no reporta antes de esta hora, el trabajo vuelve a PENDIENTE', null=True),
+        ),
+        migrations.AddIndex(
+            model_name='trabajoimpresion',
+            index=models.Index(fields=['estado', 'reserva_expira'], name='hw_trabajo__estado_83d4e9_idx'),
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:39
+
+import zlib
+
+from django.db import migrations, models
+
+UMBRAL_COMPRESION = 512
+LOTE = 500
+
+
+def convertir_hex_a_binario(apps, schema_editor):
+    """Pasa los trabajos guardados en hexadecimal al payload binario (comprimido si conviene)"""
+    TrabajoImpresion = apps.get_model('hardware_integration', 'TrabajoImpresion')
+    pendientes = TrabajoImpresion.objects.filter(payload__isnull=True).exclude(datos_impresion='')
+    lote = []
+    for trabajo in pendientes.only('id', 'datos_impresion').iterator(chunk_size=LOTE):
+        try:
+            comandos = bytes.fromhex(trabajo.datos_impresion)
+        except ValueError:
+            continue
+        trabajo.payload, trabajo.payload_comprimido = comandos, False
+        if len(comandos) >= UMBRAL_COMPRESION:
+            comprimido = zlib.compress(comandos, 6)
+            if len(comprimido) < len(comandos):
+                trabajo.payload, trabajo.payload_comprimido = comprimido, True
+        trabajo.tamano_bytes = len(comandos)
+        trabajo.datos_impresion = ''
+        lote.append(trabajo)
+        if len(lote) >= LOTE:
+            TrabajoImpresion.objects.bulk_update(
+                lote, ['payload', 'payload_comprimido', 'tamano_bytes', 'datos_impresion']
+            )
+            lote = []
+    if lote:
+        TrabajoImpresion.objects.bulk_update(lote, ['payload', 'payload_comprimido', 'tamano_bytes', 'datos_impresion'])
+
+
+def convertir_binario_a_hex(apps, schema_editor):
+    """Devuelve el payload binario a datos_impresion en hexadecimal antes de quitar las columnas"""
+    TrabajoImpresion = apps.get_model('hardware_integration', 'TrabajoImpresion')
+    binarios = TrabajoImpresion.objects.filter(payload__isnull=False)
+    lote = []
+    for trabajo in binarios.only('id', 'payload', 'payload_comprimido').iterator(chunk_size=LOTE):
+        comandos = bytes(trabajo.payload)
+        if trabajo.payload_comprimido:
+            comandos = zlib.decompress(comandos)
+        trabajo.datos_impresion = comandos.hex()
+        lote.append(trabajo)
+        if len(lote) >= LOTE:
+            TrabajoImpresion.objects.bulk_update(lote, ['datos_impresion'])
+            lote = []
+    if lote:
+        TrabajoImpresion.objects.bulk_update(lote, ['datos_impresion'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('hardware_integration', '0004_reserva_trabajos'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajoimpresion',
+            name='payload',
+            field=models.BinaryField(blank=True, help_text='Comandos ESC/POS, ZPL, etc en binario (zlib si payload_comprimido)', null=True),
+        ),
+        migrations.AddField(
+            model_name='trabajoimpresion',
+            name='payload_comprimido',
+            field=models.BooleanField(default=False, help_text='El payload está comprimido con zlib'),
+        ),
+        migrations.AddField(
+            model_name='trabajoimpresion',
+            name='tamano_bytes',
+            field=models.PositiveIntegerField(default=0, help_text='Tamaño de los comandos sin comprimir'),
+        ),
+        migrations.AlterField(
+            model_name='trabajoimpresion',
+            name='datos_impresion',
+            field=models.TextField(blank=True, default='', help_text='Formato anterior: comandos en hexadecimal (los trabajos nuevos usan payload)'),
+        ),
+        migrations.RunPython(convertir_hex_a_binario, convertir_binario_a_hex),
+    ]
@@ -4,8 +4,10 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
+from datetime import timedelta
 import uuid
 import json
+import zlib
 
 
 # ============================================================================
@@ -896,6 +898,12 @@ class EscanerCodigoBarras(models.Model):
 # COLA DE TRABAJOS DE IMPRESIÓN
 # ============================================================================
 
+# Tiempo que un agente tiene para imprimir y reportar un trabajo reservado
+DURACION_RESERVA_IMPRESION = timedelta(minutes=2)
+# Los comandos desde este tamaño se guardan comprimidos con zlib (si realmente se reducen)
+UMBRAL_COMPRESION_IMPRESION = 512
+
+
 class TrabajoImpresion(models.Model):
     """
     Cola de trabajos de impresión pendientes para el agente
@@ -974,7 +982,22 @@ class TrabajoImpresion(models.Model):
     # Datos de impresión
     datos_impresion = models.TextField(
         default='',
-        help_text="Contenido a imprimir (comandos ESC/POS, ZPL, etc)"
+        blank=True,
+        help_text="Formato anterior: comandos en hexadecimal (los trabajos nuevos usan payload)"
+    )
+    payload = models.BinaryField(
+        null=True,
+        blank=True,
+        editable=False,
+        help_text="Comandos ESC/POS, ZPL, etc en binario (zlib si payload_comprimido)"
+    )
+    payload_comprimido = models.BooleanField(
+        default=False,
+        help_text="El payload está comprimido con zlib"
+    )
+    tamano_bytes = models.PositiveIntegerField(
+        default=0,
+        help_text="Tamaño de los comandos sin comprimir"
     )
     formato = models.CharField(
         max_length=20,
@@ -1035,6 +1058,16 @@ class TrabajoImpresion(models.Model):
         blank=True,
         help_text="Cuando el agente tomó el trabajo"
     )
+    reserva_expira = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="Si el agente no reporta antes de esta hora, el trabajo vuelve a PENDIENTE"
+    )
+    agente = models.CharField(
+        max_length=100,
+        blank=True,
+        help_text="Agente (computadora) que reservó el trabajo"
+    )
     fecha_completado = models.DateTimeField(
         null=True,
         blank=True,
@@ -1057,17 +1090,51 @@ class TrabajoImpresion(models.Model):
             models.Index(fields=['estado', 'prioridad', 'fecha_creacion']),
             models.Index(fields=['impresora', 'estado']),
             models.Index(fields=['venta']),
+            models.Index(fields=['estado', 'reserva_expira']),
         ]
     
     def __str__(self):
         return f"{self.get_tipo_display()} - {self.estado} - {self.fecha_creacion}"
     
+    def asignar_comandos(self, comandos):
+        """Guarda los comandos en binario, comprimidos si superan el umbral y se reducen"""
+        comandos = bytes(comandos)
+        self.payload, self.payload_comprimido = comandos, False
+        if len(comandos) >= UMBRAL_COMPRESION_IMPRESION:
+            comprimido = zlib.compress(comandos, 6)
+            if len(comprimido) < len(comandos):
+                self.payload, self.payload_comprimido = comprimido, True
+        self.tamano_bytes = len(comandos)
+        self.datos_impresion = ''
+    
+    @property
+    def comandos(self):
+        """Bytes listos para la impresora (también de trabajos antiguos guardados en hex)"""
+        if self.payload is None:
+            return bytes.fromhex(self.datos_impresion or '')
+        datos = bytes(self.payload)
+        return zlib.decompress(datos) if self.payload_comprimido else datos
+    
+    def iter_comandos(self, tamano_bloque=64 * 1024):
+        """Comandos en bloques, descomprimiendo de a poco (para respuestas en streaming)"""
+        if self.payload is None:
+            yield self.comandos
+            return
+        datos = memoryview(self.payload)
+        descompresor = zlib.decompressobj() if self.payload_comprimido else None
+        for inicio in range(0, len(datos), tamano_bloque):
+            bloque = bytes(datos[inicio:inicio + tamano_bloque])
+            yield descompresor.decompress(bloque) if descompresor else bloque
+        if descompresor:
+            yield descompresor.flush()
+    
     def marcar_procesando(self):
-        """Marca el trabajo como en proceso"""
+        """Marca el trabajo como en proceso (con una reserva nueva para el agente)"""
         self.estado = 'PROCESANDO'
         self.fecha_asignacion = timezone.now()
+        self.reserva_expira = self.fecha_asignacion + DURACION_RESERVA_IMPRESION
         self.intentos += 1
-        self.save(update_fields=['estado', 'fecha_asignacion', 'intentos'])
+        self.save(update_fields=['estado', 'fecha_asignacion', 'reserva_expira', 'intentos'])
     
     def marcar_completado(self, tiempo_ms=None):
         """Marca el trabajo como completado"""
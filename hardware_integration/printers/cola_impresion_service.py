@@ -0,0 +1,312 @@
+# apps/hardware_integration/printers/cola_impresion_service.py
+"""
+Cola de trabajos de impresión para los agentes locales.
+
+Varios agentes (y varias impresoras) pueden consultar la cola al mismo
+tiempo: cada consulta reserva sus trabajos con SELECT ... FOR UPDATE SKIP
+LOCKED y los pasa a PROCESANDO en un solo UPDATE, así dos agentes nunca
+reciben el mismo ticket. La reserva vence a los DURACION_RESERVA_IMPRESION;
+si el agente no reporta a tiempo, liberar_vencidos() devuelve el trabajo a
+PENDIENTE (o a ERROR si ya agotó sus intentos) y avisa a los agentes que
+pueden tomarlo. Corre periódicamente (tarea liberar_trabajos_vencidos en
+CELERY_BEAT_SCHEDULE) y, con un límite de frecuencia, al reservar.
+
+La reserva es un UPDATE en bloque y no dispara post_save: el frontend recibe
+un único mensaje "print_jobs_batch" por consulta (notificar_reclamados).
+
+Un resultado solo se acepta del agente que tiene la reserva y mientras el
+trabajo sigue en PROCESANDO: un agente cuya reserva venció (y el trabajo ya
+lo tomó otro) recibe un conflicto (ReservaPerdida) en lugar de pisarlo.
+
+Los trabajos entregados por WebSocket se reservan por RESERVA_SIN_CONFIRMAR;
+cuando el agente confirma la recepción (ack) la reserva pasa a la normal.
+
+Enrutamiento: un agente que registra sus impresoras (registrar_agente o la
+acción "registrar" del socket) escucha solo los grupos de esas impresoras y
+de su sucursal, y solo reserva esos trabajos. Los agentes sin impresoras
+registradas siguen en el grupo global y atienden toda la cola.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import DURACION_RESERVA_IMPRESION, Impresora, TrabajoImpresion
+
+logger = logging.getLogger(__name__)
+
+LIMITE_POR_CONSULTA = 10
+# Si el agente no confirma un trabajo enviado por WebSocket, se libera pronto
+RESERVA_SIN_CONFIRMAR = timedelta(seconds=30)
+# Las reservas vencidas se revisan como máximo cada tantos segundos
+REVISION_VENCIDOS_BLOQUEO = 'print_queue_revision_vencidos'
+REVISION_VENCIDOS_INTERVALO = 30
+
+GRUPO_AGENTES_GLOBAL = "hardware_agent_global"
+
+
+class ReservaPerdida(Exception):
+    """El agente ya no tiene la reserva del trabajo: su resultado no se aplica"""
+
+
+class ColaImpresionService:
+    """Reserva atómica de trabajos para los agentes y liberación de reservas vencidas"""
+
+    @staticmethod
+    def reclamar(usuario=None, agente='', limite=LIMITE_POR_CONSULTA, duracion=DURACION_RESERVA_IMPRESION,
+                 sin_comandos=False, rutas=None):
+        """
+        Reserva hasta `limite` trabajos PENDIENTE (los de `usuario`, o todos si
+        es None) para `agente` y los devuelve ya en PROCESANDO, por prioridad.
+        Con sin_comandos no se cargan los payloads (el agente los descarga aparte).
+        Con rutas (ver rutas_agente) solo toma los trabajos de sus impresoras.
+        """
+        ColaImpresionService.revisar_vencidos()
+
+        with transaction.atomic():
+            pendientes = TrabajoImpresion.objects.filter(estado='PENDIENTE')
+            if usuario is not None:
+                pendientes = pendientes.filter(usuario=usuario)
+            if rutas:
+                # Sin impresora asignada: lo imprime un agente de la sucursal de quien lo creó
+                pendientes = pendientes.filter(
+                    Q(impresora_id__in=rutas['impresora_ids'])
+                    | Q(impresora__isnull=True, usuario__sucursal_id=rutas['sucursal_id'])
+                )
+            # Las filas que otro agente está reservando se saltan en lugar de esperar
+            # (of=self: no bloquear las filas de usuario unidas por la sucursal)
+            ids = list(
+                pendientes.order_by('prioridad', 'fecha_creacion')
+                .select_for_update(skip_locked=True, of=('self',))
+                .values_list('id', flat=True)[:limite]
+            )
+            if not ids:
+                return []
+
+            ahora = timezone.now()
+            TrabajoImpresion.objects.filter(id__in=ids).update(
+                estado='PROCESANDO',
+                fecha_asignacion=ahora,
+                reserva_expira=ahora + duracion,
+                agente=(agente or '')[:100],
+                intentos=F('intentos') + 1,
+            )
+
+        trabajos = (
+            TrabajoImpresion.objects.filter(id__in=ids)
+            .select_related('impresora', 'venta', 'producto', 'usuario')
+            .order_by('prioridad', 'fecha_creacion')
+        )
+        if sin_comandos:
+            trabajos = trabajos.defer('payload', 'datos_impresion')
+        return list(trabajos)
+
+    @staticmethod
+    def confirmar_recepcion(trabajo_ids, agente):
+        """El agente confirmó que recibió los trabajos: extiende su reserva a la duración normal"""
+        return TrabajoImpresion.objects.filter(
+            id__in=trabajo_ids, estado='PROCESANDO', agente=(agente or '')[:100],
+        ).update(reserva_expira=timezone.now() + DURACION_RESERVA_IMPRESION)
+
+    @staticmethod
+    @transaction.atomic
+    def registrar_resultado(trabajo_id, exito, mensaje='', tiempo_s=None, agente=''):
+        """
+        Resultado de impresión reportado por el agente (HTTP o WebSocket).
+        Devuelve el trabajo, o None si no existe. Lanza ReservaPerdida si el
+        trabajo ya no está en PROCESANDO a nombre de `agente` (reserva vencida
+        y tomada por otro, o resultado repetido).
+        """
+        trabajo = (
+            TrabajoImpresion.objects.select_for_update(of=('self',)).select_related('usuario')
+            .filter(id=trabajo_id).first()
+        )
+        if trabajo is None:
+            return None
+        if trabajo.estado != 'PROCESANDO' or trabajo.agente != (agente or '')[:100]:
+            raise ReservaPerdida(
+                f"El trabajo está en {trabajo.estado} y reservado por '{trabajo.agente or '-'}'"
+            )
+        if exito:
+            trabajo.marcar_completado(tiempo_ms=int(tiempo_s * 1000) if tiempo_s else None)
+        else:
+            trabajo.marcar_error(mensaje)
+        return trabajo
+
+    @staticmethod
+    def liberar_vencidos():
+        """
+        Devuelve a PENDIENTE los trabajos cuya reserva venció sin reporte del
+        agente y avisa a sus grupos de agentes; los que ya agotaron sus
+        intentos pasan a ERROR. Devuelve (liberados, agotados).
+        """
+        ahora = timezone.now()
+        vencidos = list(
+            TrabajoImpresion.objects.filter(estado='PROCESANDO', reserva_expira__lt=ahora)
+            .values_list('id', 'usuario_id', 'intentos', 'max_intentos')
+        )
+        if not vencidos:
+            return 0, 0
+
+        mensaje = "Reserva vencida: el agente no reportó el resultado"
+        agotados = [id_ for id_, _, intentos, maximo in vencidos if intentos >= maximo]
+        reintentar = [id_ for id_, _, intentos, maximo in vencidos if intentos < maximo]
+        # Misma condición de vencimiento otra vez: si el agente reportó entre medio, o
+        # el trabajo se liberó y otro agente lo reservó de nuevo, no se toca
+        aun_vencidos = {'estado': 'PROCESANDO', 'reserva_expira__lt': ahora}
+        if agotados:
+            agotados = TrabajoImpresion.objects.filter(id__in=agotados, **aun_vencidos).update(
+                estado='ERROR', reserva_expira=None, mensaje_error=mensaje,
+            )
+        liberados = 0
+        if reintentar:
+            liberados = TrabajoImpresion.objects.filter(id__in=reintentar, **aun_vencidos).update(
+                estado='PENDIENTE', reserva_expira=None, agente='', mensaje_error=mensaje,
+            )
+        agotados = agotados or 0
+
+        # Hay trabajos nuevamente disponibles: invalidar el escudo de RAM de la cola vacía
+        claves = {"print_queue_empty_agente_impresion"}
+        claves.update(f"print_queue_empty_{usuario_id}" for _, usuario_id, _, _ in vencidos if usuario_id)
+        cache.delete_many(list(claves))
+
+        # El UPDATE en bloque no dispara post_save: los agentes se enteran aquí
+        if liberados:
+            ColaImpresionService.avisar_agentes(
+                TrabajoImpresion.objects.filter(id__in=reintentar, estado='PENDIENTE').select_related('usuario')
+            )
+
+        logger.warning(f"♻️ Reservas vencidas: {liberados} trabajo(s) a PENDIENTE, {agotados} a ERROR")
+        return liberados, agotados
+
+    @staticmethod
+    def revisar_vencidos():
+        """liberar_vencidos() como máximo una vez cada REVISION_VENCIDOS_INTERVALO segundos"""
+        if cache.add(REVISION_VENCIDOS_BLOQUEO, True, REVISION_VENCIDOS_INTERVALO):
+            return ColaImpresionService.liberar_vencidos()
+        return None
+
+    @staticmethod
+    def datos_notificacion(trabajo):
+        """Datos de un trabajo para el frontend (grupo ventas_<schema>)"""
+        return {
+            'id': str(trabajo.id),
+            'tipo': trabajo.tipo,
+            'estado': trabajo.estado,
+            'prioridad': trabajo.prioridad,
+            'venta_id': trabajo.venta_id,
+            'timestamp': trabajo.fecha_creacion.isoformat() if trabajo.fecha_creacion else None
+        }
+
+    @staticmethod
+    def notificar_reclamados(trabajos):
+        """Un solo group_send al frontend con todos los trabajos reservados en la consulta"""
+        if not trabajos:
+            return 0
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return 0
+        schema_name = getattr(connection, 'schema_name', 'public')
+        try:
+            async_to_sync(channel_layer.group_send)(
+                f"ventas_{schema_name}",
+                {
+                    'type': 'print_jobs_batch',
+                    'data': [ColaImpresionService.datos_notificacion(trabajo) for trabajo in trabajos]
+                }
+            )
+        except Exception as e:
+            # La notificación es informativa: nunca debe impedir la entrega al agente
+            logger.warning(f"No se pudo notificar la cola de impresión: {e}")
+            return 0
+        return len(trabajos)
+
+    # ------------------------------------------------------------------
+    # Enrutamiento de avisos a los agentes
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def grupo_impresora(impresora_id):
+        return f"hardware_impresora_{impresora_id}"
+
+    @staticmethod
+    def grupo_sucursal(sucursal_id):
+        return f"hardware_sucursal_{sucursal_id or 'sin'}"
+
+    @staticmethod
+    def resolver_impresoras(impresoras):
+        """
+        IDs de las impresoras activas que el agente reporta, por nombre o driver
+        (dicts {'nombre', 'driver'} como los envía el agente, o nombres sueltos).
+        """
+        nombres = set()
+        for impresora in impresoras or []:
+            if isinstance(impresora, dict):
+                nombres.update(str(impresora.get(campo) or '').strip().lower() for campo in ('nombre', 'driver'))
+            else:
+                nombres.add(str(impresora).strip().lower())
+        nombres.discard('')
+        if not nombres:
+            return []
+        return [
+            str(impresora_id)
+            for impresora_id, nombre, driver in
+            Impresora.objects.filter(estado='ACTIVA').values_list('id', 'nombre', 'nombre_driver')
+            if nombre.lower() in nombres or (driver or '').lower() in nombres
+        ]
+
+    @staticmethod
+    def rutas_agente(impresora_ids, sucursal_id=None):
+        """Rutas de un agente, o None si no atiende impresoras concretas (queda en el grupo global)"""
+        if not impresora_ids:
+            return None
+        return {'impresora_ids': [str(i) for i in impresora_ids], 'sucursal_id': sucursal_id}
+
+    @staticmethod
+    def grupos_agente(rutas):
+        """Grupos de channels a los que se une un agente con esas rutas"""
+        if not rutas:
+            return [GRUPO_AGENTES_GLOBAL]
+        return [ColaImpresionService.grupo_impresora(i) for i in rutas['impresora_ids']] + [
+            ColaImpresionService.grupo_sucursal(rutas['sucursal_id'])
+        ]
+
+    @staticmethod
+    def avisar_agentes(trabajos):
+        """Un aviso "new_print_job" por cada grupo de agentes que puede tomar alguno de los trabajos"""
+        grupos = {}
+        for trabajo in trabajos:
+            for grupo in ColaImpresionService.grupos_destino(trabajo):
+                grupos.setdefault(grupo, str(trabajo.id))
+        channel_layer = get_channel_layer()
+        if not grupos or not channel_layer:
+            return 0
+        try:
+            for grupo, trabajo_id in grupos.items():
+                async_to_sync(channel_layer.group_send)(grupo, {
+                    'type': 'new_print_job',
+                    'data': {'id': trabajo_id, 'mensaje': 'Trabajo de impresión disponible nuevamente'}
+                })
+        except Exception as e:
+            # Sin aviso los agentes lo toman en su próxima consulta
+            logger.warning(f"No se pudo avisar a los agentes de impresión: {e}")
+            return 0
+        return len(grupos)
+
+    @staticmethod
+    def grupos_destino(trabajo):
+        """
+        Grupos que deben enterarse de un trabajo nuevo: el de su impresora (o la
+        sucursal de quien lo creó si no tiene) y el global de los agentes sin rutas.
+        """
+        if trabajo.impresora_id:
+            grupo = ColaImpresionService.grupo_impresora(trabajo.impresora_id)
+        else:
+            sucursal_id = trabajo.usuario.sucursal_id if trabajo.usuario_id else None
+            grupo = ColaImpresionService.grupo_sucursal(sucursal_id)
+        return [grupo, GRUPO_AGENTES_GLOBAL]
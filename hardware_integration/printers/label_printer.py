@@ -88,11 +88,10 @@ class LabelPrinter:
                 zpl = zpl.replace("^XZ", f"^PQ{cantidad}^XZ")
             
             from ..api.agente_views import crear_trabajo_impresion
-            zpl_hex = zpl.encode('utf-8').hex()
             trabajo_id = crear_trabajo_impresion(
                 usuario=usuario,
                 impresora_nombre=impresora.nombre_driver or impresora.nombre,
-                comandos_hex=zpl_hex,
+                comandos=zpl.encode('utf-8'),
                 tipo='ETIQUETA',
                 prioridad=2,
                 abrir_gaveta=False
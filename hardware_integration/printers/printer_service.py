@@ -563,10 +563,7 @@ class PrinterService:
             # Los comandos YA incluyen el pulso de gaveta si está configurada
             comandos = PrinterService.generar_comando_raw_test(impresora)
             
-            # Convertir bytes a hexadecimal para transmisión
-            comandos_hex = comandos.hex()
-            
-            logger.debug(f"   Comandos generados: {len(comandos)} bytes ({len(comandos_hex)} chars hex)")
+            logger.debug(f"   Comandos generados: {len(comandos)} bytes")
             
             # ===========================================================
             # PASO 2: MÉTODO PREFERIDO - USAR AGENTE LOCAL
@@ -600,7 +597,7 @@ class PrinterService:
                     trabajo_id = crear_trabajo_impresion(
                         usuario=usuario,
                         impresora_nombre=impresora.nombre_driver,
-                        comandos_hex=comandos_hex,
+                        comandos=comandos,
                         tipo='PRUEBA'
                     )
                     
@@ -1072,9 +1069,6 @@ class PrinterService:
             comandos += b'\n\n\n'
             comandos += b'\x1D\x56\x00'
             
-            # Convertir a hex
-            comandos_hex = comandos.hex()
-            
             # Usar agente si está disponible
             if usar_agente and impresora.nombre_driver:
                 from ..api.agente_views import crear_trabajo_impresion, obtener_usuario_para_impresion
@@ -1083,7 +1077,7 @@ class PrinterService:
                 trabajo_id = crear_trabajo_impresion(
                     usuario=usuario,
                     impresora_nombre=impresora.nombre_driver,
-                    comandos_hex=comandos_hex,
+                    comandos=comandos,
                     tipo='CODIGO_BARRAS',
                     prioridad=2,
                     abrir_gaveta=False
@@ -177,7 +177,7 @@ class TicketPrinter:
             if impresora_obj.tiene_gaveta:
                 c += b"\x10\x14\x01\x00\x05"
 
-            return c.hex()
+            return c
 
         except Exception as e:
             logger.error("Error generando ticket: " + str(e), exc_info=True)
@@ -186,12 +186,12 @@ class TicketPrinter:
     @staticmethod
     def imprimir_ticket(venta, impresora_obj):
         try:
-            hex_data = TicketPrinter.generar_comandos_ticket(venta, impresora_obj)
+            comandos = TicketPrinter.generar_comandos_ticket(venta, impresora_obj)
             from ..api.agente_views import crear_trabajo_impresion
             crear_trabajo_impresion(
                 usuario=venta.usuario,
                 impresora_nombre=impresora_obj.nombre_driver or impresora_obj.nombre,
-                comandos_hex=hex_data, tipo="ticket", prioridad=1
+                comandos=comandos, tipo="ticket", prioridad=1
             )
             return True
         except Exception as e:
@@ -218,7 +218,7 @@ class TicketPrinter:
             crear_trabajo_impresion(
                 usuario=obtener_usuario_para_impresion(),
                 impresora_nombre=impresora_obj.nombre_driver or impresora_obj.nombre,
-                comandos_hex=c.hex(), tipo="test", prioridad=1
+                comandos=c, tipo="test", prioridad=1
             )
             return True
         except Exception as e:
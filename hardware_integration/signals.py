@@ -4,6 +4,7 @@ from django.db import connection
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from .models import TrabajoImpresion, Impresora
+from .printers.cola_impresion_service import ColaImpresionService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -56,14 +57,7 @@ def notify_print_job_update(sender, instance, created, **kwargs):
     group_name = f"ventas_{schema_name}"
     
     # Datos a enviar al frontend
-    data = {
-        'id': str(instance.id),
-        'tipo': instance.tipo,
-        'estado': instance.estado,
-        'prioridad': instance.prioridad,
-        'venta_id': instance.venta_id,
-        'timestamp': instance.fecha_creacion.isoformat() if instance.fecha_creacion else None
-    }
+    data = ColaImpresionService.datos_notificacion(instance)
     
     # 1. Enviar al grupo del FRONTEND (Navegador)
     async_to_sync(channel_layer.group_send)(
@@ -74,15 +68,21 @@ def notify_print_job_update(sender, instance, created, **kwargs):
         }
     )
 
-    # 2. Enviar al grupo del AGENTE LOCAL (Windows)
+    # 2. Enviar a los AGENTES LOCALES (Windows) que pueden imprimirlo
     # ⚡ Esto es lo que permite la impresión instantánea sin polling
-    async_to_sync(channel_layer.group_send)(
-        "hardware_agent_global",
-        {
-            'type': 'new_print_job',
-            'data': {
-                'id': str(instance.id),
-                'mensaje': 'Nuevo trabajo de impresión disponible'
+    # Solo si hay algo que tomar: completar un trabajo no debe despertar a los agentes
+    # (los que tienen entrega directa reservan y reciben el trabajo al instante)
+    if instance.estado != 'PENDIENTE':
+        return
+    # Grupo de su impresora (o sucursal) + global para agentes sin impresoras registradas
+    for grupo in ColaImpresionService.grupos_destino(instance):
+        async_to_sync(channel_layer.group_send)(
+            grupo,
+            {
+                'type': 'new_print_job',
+                'data': {
+                    'id': str(instance.id),
+                    'mensaje': 'Nuevo trabajo de impresión disponible'
+                }
             }
-        }
-    )
+        )
@@ -0,0 +1,23 @@
+import logging
+
+from celery import shared_task
+
+from .printers.cola_impresion_service import ColaImpresionService
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(ignore_result=True)
+def liberar_trabajos_vencidos():
+    """
+    Tarea periódica (CELERY_BEAT_SCHEDULE): libera las reservas de impresión
+    vencidas aunque ningún agente esté consultando la cola, y avisa a los
+    agentes de los trabajos que vuelven a PENDIENTE. Usa el mismo bloqueo de
+    caché que las consultas de los agentes: si alguna ya revisó hace menos
+    de REVISION_VENCIDOS_INTERVALO segundos, no hace nada.
+    """
+    resultado = ColaImpresionService.revisar_vencidos()
+    if resultado is None:
+        return 0
+    liberados, agotados = resultado
+    return liberados
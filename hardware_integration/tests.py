@@ -1,3 +1,224 @@
-from django.test import TestCase
+import base64
+import zlib
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from usuarios.models import Usuario
+
+from .api.agente_views import crear_trabajo_impresion
+from .consumers import HardwareAgentConsumer
+from .models import Impresora, TrabajoImpresion
+from .printers.cola_impresion_service import REVISION_VENCIDOS_BLOQUEO, ColaImpresionService, ReservaPerdida
+from .tasks import liberar_trabajos_vencidos
+
+
+class ColaImpresionTest(TestCase):
+    """Reserva de trabajos por los agentes y liberación de reservas vencidas"""
+
+    def setUp(self):
+        cache.clear()
+        self.trabajos = [TrabajoImpresion.objects.create(datos_impresion='1b40') for _ in range(3)]
+
+    def test_dos_agentes_no_reciben_el_mismo_trabajo(self):
+        primero = ColaImpresionService.reclamar(agente='PC-CAJA-01', limite=2)
+        segundo = ColaImpresionService.reclamar(agente='PC-CAJA-02', limite=2)
+
+        self.assertEqual(len(primero), 2)
+        self.assertEqual(len(segundo), 1)
+        self.assertFalse({t.id for t in primero} & {t.id for t in segundo})
+        self.assertEqual(ColaImpresionService.reclamar(agente='PC-CAJA-03'), [])
+
+        trabajo = TrabajoImpresion.objects.get(id=segundo[0].id)
+        self.assertEqual(trabajo.estado, 'PROCESANDO')
+        self.assertEqual(trabajo.agente, 'PC-CAJA-02')
+        self.assertEqual(trabajo.intentos, 1)
+        self.assertIsNotNone(trabajo.reserva_expira)
+
+    def test_reserva_vencida_vuelve_a_pendiente_o_a_error(self):
+        ColaImpresionService.reclamar(agente='PC-CAJA-01')
+        agotado = self.trabajos[0]
+        TrabajoImpresion.objects.filter(id=agotado.id).update(intentos=agotado.max_intentos)
+        TrabajoImpresion.objects.update(reserva_expira=timezone.now() - timedelta(seconds=1))
+
+        capa = mock.MagicMock(group_send=mock.AsyncMock())
+        with mock.patch('hardware_integration.printers.cola_impresion_service.get_channel_layer',
+                        return_value=capa):
+            # La reserva de recién ya revisó los vencidos: la tarea periódica respeta el bloqueo
+            self.assertEqual(liberar_trabajos_vencidos(), 0)
+            cache.delete(REVISION_VENCIDOS_BLOQUEO)
+            self.assertEqual(liberar_trabajos_vencidos(), 2)
+        # Un aviso por grupo de agentes (sucursal del creador y global), no uno por trabajo
+        self.assertEqual(sorted(c.args[0] for c in capa.group_send.call_args_list),
+                         ['hardware_agent_global', 'hardware_sucursal_sin'])
+        self.assertEqual(capa.group_send.call_args.args[1]['type'], 'new_print_job')
+        self.assertEqual(TrabajoImpresion.objects.get(id=agotado.id).estado, 'ERROR')
+        self.assertEqual(TrabajoImpresion.objects.filter(estado='PENDIENTE', agente='').count(), 2)
+        self.assertEqual(len(ColaImpresionService.reclamar(agente='PC-CAJA-02')), 2)
+
+    def test_resultado_solo_del_agente_con_la_reserva(self):
+        trabajo = ColaImpresionService.reclamar(agente='PC-CAJA-01', limite=1)[0]
+        TrabajoImpresion.objects.filter(id=trabajo.id).update(reserva_expira=timezone.now() - timedelta(seconds=1))
+        with mock.patch('hardware_integration.printers.cola_impresion_service.get_channel_layer',
+                        return_value=None):
+            ColaImpresionService.liberar_vencidos()
+        self.assertEqual(ColaImpresionService.reclamar(agente='PC-CAJA-02', limite=1)[0].id, trabajo.id)
+
+        # El primer agente llega tarde: no puede cerrar el trabajo que ahora tiene el segundo
+        with self.assertRaises(ReservaPerdida):
+            ColaImpresionService.registrar_resultado(trabajo.id, True, agente='PC-CAJA-01')
+        self.assertEqual(TrabajoImpresion.objects.get(id=trabajo.id).estado, 'PROCESANDO')
+
+        ColaImpresionService.registrar_resultado(trabajo.id, True, agente='PC-CAJA-02')
+        # Un resultado repetido no convierte el COMPLETADO en error
+        with self.assertRaises(ReservaPerdida):
+            ColaImpresionService.registrar_resultado(trabajo.id, False, 'Sin papel', agente='PC-CAJA-02')
+        self.assertEqual(TrabajoImpresion.objects.get(id=trabajo.id).estado, 'COMPLETADO')
+
+
+class ConsultaAgenteTest(TestCase):
+    """Consulta de la cola y descarga de comandos por el agente"""
+
+    def setUp(self):
+        cache.clear()
+        self.impresora = Impresora.objects.create(
+            codigo='IMP-01', nombre='Caja 1', marca='Epson', modelo='TM-T20',
+            tipo_impresora='TERMICA_TICKET', tipo_conexion='USB',
+            nombre_driver='EPSON TM-T20', es_principal_tickets=True,
+        )
+        self.agente = Usuario.objects.create_user('agente_impresion', 'agente@example.com', 'testpass123',
+                                                  nombre='Agente', apellido='Impresion')
+        self.client.force_login(self.agente)
+
+    def drenar(self, cantidad):
+        # La mitad sin impresora asignada: usan la predeterminada
+        for n in range(cantidad):
+            TrabajoImpresion.objects.create(datos_impresion='1b40', impresora=self.impresora if n % 2 else None)
+        cache.clear()
+        capa = mock.MagicMock(group_send=mock.AsyncMock())
+        with mock.patch('hardware_integration.printers.cola_impresion_service.get_channel_layer',
+                        return_value=capa), CaptureQueriesContext(connection) as consultas:
+            respuesta = self.client.get(reverse('hardware_api:agente_trabajos'), {'agente': 'PC-CAJA-01'})
+        self.assertEqual(respuesta.json()['count'], cantidad)
+        self.assertEqual({t['impresora'] for t in respuesta.json()['trabajos']}, {'EPSON TM-T20'})
+        return len(consultas), capa.group_send.call_count
+
+    def test_costo_fijo_por_consulta(self):
+        consultas_pocos, mensajes_pocos = self.drenar(2)
+        consultas_rafaga, mensajes_rafaga = self.drenar(10)
+
+        self.assertEqual(consultas_rafaga, consultas_pocos)
+        self.assertEqual((mensajes_pocos, mensajes_rafaga), (1, 1))
+        self.assertFalse(TrabajoImpresion.objects.exclude(estado='PROCESANDO').exists())
+
+    def test_payload_binario_comprimido(self):
+        comandos = b'\x1b@' + b'Producto de prueba    1 x 10.00\n' * 200 + b'\x1dV\x00'
+        trabajo_id = crear_trabajo_impresion(self.agente, 'EPSON TM-T20', comandos=comandos)
+        trabajo = TrabajoImpresion.objects.get(id=trabajo_id)
+        self.assertTrue(trabajo.payload_comprimido)
+        self.assertLess(len(trabajo.payload), len(comandos) // 4)
+        self.assertEqual((trabajo.tamano_bytes, trabajo.datos_impresion), (len(comandos), ''))
+
+        respuesta = self.client.get(reverse('hardware_api:agente_trabajos'), {'payload': 'url'}).json()
+        self.assertNotIn('comandos', respuesta['trabajos'][0])
+        url = respuesta['trabajos'][0]['payload_url']
+
+        self.assertEqual(b''.join(self.client.get(url).streaming_content), comandos)
+        comprimida = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(comprimida['Content-Encoding'], 'deflate')
+        self.assertEqual(zlib.decompress(comprimida.content), comandos)
+
+    def test_trabajo_antiguo_en_hexadecimal(self):
+        TrabajoImpresion.objects.create(datos_impresion='1b400a1d5600', impresora=self.impresora)
+        trabajo = self.client.get(reverse('hardware_api:agente_trabajos')).json()['trabajos'][0]
+        self.assertEqual(trabajo['comandos'], '1b400a1d5600')
+        self.assertEqual(b''.join(self.client.get(trabajo['payload_url']).streaming_content), b'\x1b@\n\x1dV\x00')
+
+
+class EntregaWebSocketTest(TransactionTestCase):
+    """Entrega de trabajos y reporte de resultados por el socket del agente"""
+
+    def setUp(self):
+        cache.clear()
+        self.impresora = impresora = Impresora.objects.create(
+            codigo='IMP-01', nombre='Caja 1', marca='Epson', modelo='TM-T20',
+            tipo_impresora='TERMICA_TICKET', tipo_conexion='USB', nombre_driver='EPSON TM-T20',
+        )
+        agente = Usuario.objects.create_user('agente_impresion', 'agente@example.com', 'testpass123',
+                                             nombre='Agente', apellido='Impresion')
+        self.token = Token.objects.create(user=agente).key
+        self.comandos = b'\x1b@Ticket 001\n\x1dV\x00'
+        self.trabajo_id = crear_trabajo_impresion(agente, impresora.nombre_driver, comandos=self.comandos)
+
+    async def conversar(self):
+        socket = WebsocketCommunicator(HardwareAgentConsumer.as_asgi(), '/ws/hardware/agente/')
+        await socket.connect()
+        await socket.receive_json_from()
+
+        await socket.send_json_to({'action': 'pedir_trabajos'})
+        self.assertEqual((await socket.receive_json_from())['type'], 'error')
+
+        await socket.send_json_to({'action': 'registrar', 'agente': 'PC-CAJA-01', 'token': self.token})
+        self.assertEqual((await socket.receive_json_from())['type'], 'registrado')
+        entrega = await socket.receive_json_from()
+        await socket.send_json_to({'action': 'ack', 'trabajos': [t['id'] for t in entrega['trabajos']]})
+        await socket.send_json_to({'action': 'resultado', 'trabajo_id': self.trabajo_id, 'success': True,
+                                   'detalles': {'tiempo_impresion': 0.4}})
+        resultado = await socket.receive_json_from()
+        await socket.disconnect()
+        return entrega, resultado
+
+    def test_entrega_directa_y_resultado(self):
+        entrega, resultado = async_to_sync(self.conversar)()
+
+        self.assertEqual(entrega['type'], 'print_jobs')
+        self.assertEqual([t['id'] for t in entrega['trabajos']], [self.trabajo_id])
+        self.assertEqual(base64.b64decode(entrega['trabajos'][0]['comandos_b64']), self.comandos)
+        self.assertEqual((resultado['success'], resultado['estado']), (True, 'COMPLETADO'))
+
+        trabajo = TrabajoImpresion.objects.get(id=self.trabajo_id)
+        self.assertEqual((trabajo.agente, trabajo.tiempo_procesamiento), ('PC-CAJA-01', 400))
+
+    async def escuchar(self, otra):
+        socket = WebsocketCommunicator(HardwareAgentConsumer.as_asgi(), '/ws/hardware/agente/')
+        await socket.connect()
+        await socket.receive_json_from()
+        await socket.send_json_to({'action': 'registrar', 'agente': 'PC-BODEGA', 'token': self.token,
+                                   'entrega': False, 'impresoras': [{'nombre': 'Bodega', 'driver': 'ZEBRA'}]})
+        registrado = await socket.receive_json_from()
+
+        recibidos = []
+        capa = get_channel_layer()
+        for grupo in (ColaImpresionService.grupo_impresora(self.impresora.id), 'hardware_agent_global',
+                      ColaImpresionService.grupo_impresora(otra.id)):
+            await capa.group_send(grupo, {'type': 'new_print_job', 'data': {'id': grupo}})
+            if not await socket.receive_nothing():
+                recibidos.append((await socket.receive_json_from())['data']['id'])
+        await socket.disconnect()
+        return registrado, recibidos
+
+    def test_avisos_solo_a_los_agentes_de_la_impresora(self):
+        otra = Impresora.objects.create(
+            codigo='IMP-02', nombre='Bodega', marca='Zebra', modelo='ZD220',
+            tipo_impresora='ETIQUETAS', tipo_conexion='USB', nombre_driver='ZEBRA',
+        )
+        rutas = ColaImpresionService.rutas_agente(ColaImpresionService.resolver_impresoras(['zebra']))
+        self.assertEqual(ColaImpresionService.reclamar(agente='PC-BODEGA', rutas=rutas), [])
+
+        registrado, recibidos = async_to_sync(self.escuchar)(otra)
+
+        self.assertEqual(registrado['impresoras_enrutadas'], 1)
+        self.assertEqual(recibidos, [ColaImpresionService.grupo_impresora(otra.id)])
+        trabajo = TrabajoImpresion.objects.get(id=self.trabajo_id)
+        self.assertEqual(ColaImpresionService.grupos_destino(trabajo)[0],
+                         ColaImpresionService.grupo_impresora(self.impresora.id))
@@ -1,3 +1,11 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CodigoAlternoProducto
+
+
+@admin.register(CodigoAlternoProducto)
+class CodigoAlternoProductoAdmin(admin.ModelAdmin):
+    list_display = ['codigo', 'tipo', 'producto']
+    list_filter = ['tipo']
+    search_fields = ['codigo', 'producto__codigo_unico', 'producto__nombre']
+    raw_id_fields = ['producto']
@@ -0,0 +1,121 @@
+"""
+Benchmark de la búsqueda de productos.
+
+Siembra (opcionalmente) un catálogo sintético dentro de una transacción que
+se revierte al final, y compara la búsqueda anterior (icontains sobre
+nombre/código/descripción, escaneo secuencial) con BusquedaProductosService
+(índices pg_trgm y texto completo). Reporta latencia p50/p95 por término.
+
+Uso:
+    python manage.py benchmark_busqueda --sembrar --productos 50000
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from inventario.models import Producto, CategoriaProducto, Marca
+from inventario.services.busqueda_productos import BusquedaProductosService
+
+PIEZAS = ['Filtro de aceite', 'Pastilla de freno', 'Cadena', 'Piñón', 'Bujía', 'Llanta',
+          'Cámara', 'Batería', 'Espejo retrovisor', 'Manigueta', 'Kit de arrastre',
+          'Amortiguador', 'Carburador', 'Faro delantero', 'Guardafango', 'Embrague']
+MODELOS = ['GN125', 'AX100', 'CG150', 'XR150', 'FZ16', 'Pulsar 200', 'NKD125', 'Titan 150',
+           'Boxer CT100', 'Discover 125', 'YBR125', 'DT175']
+TERMINOS = ['filtro', 'pastilla freno', 'bujia', 'piñon cg150', 'camara', 'amortiguadr',
+            'REP-01234', 'kit arrastre gn125', 'bateria']
+
+
+class Rollback(Exception):
+    """Fuerza la reversión de los datos sembrados"""
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia de la búsqueda de productos (icontains vs. índices trigram)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', action='store_true',
+                            help='Sembrar productos sintéticos (se revierten al terminar)')
+        parser.add_argument('--productos', type=int, default=50000)
+        parser.add_argument('--repeticiones', type=int, default=20)
+        parser.add_argument('--limite', type=int, default=50, help='Resultados por búsqueda')
+
+    def handle(self, *args, **options):
+        if not BusquedaProductosService.es_postgres():
+            self.stdout.write(self.style.WARNING(
+                'La base no es PostgreSQL: se medirá la búsqueda simple sin índices'
+            ))
+        try:
+            with transaction.atomic():
+                if options['sembrar']:
+                    self._sembrar(options['productos'])
+                with connection.cursor() as cursor:
+                    if BusquedaProductosService.es_postgres():
+                        # Estadísticas frescas para que el planificador elija los índices GIN
+                        cursor.execute('ANALYZE inventario_producto')
+                self._medir(options['repeticiones'], options['limite'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write('Datos sembrados revertidos')
+
+    def _sembrar(self, cantidad):
+        categoria, _ = CategoriaProducto.objects.get_or_create(
+            codigo='BENCH', defaults={'nombre': 'Benchmark', 'porcentaje_ganancia': Decimal('30')}
+        )
+        marca, _ = Marca.objects.get_or_create(nombre='Benchmark')
+
+        inicio = time.perf_counter()
+        lote = []
+        for n in range(cantidad):
+            pieza = random.choice(PIEZAS)
+            modelo = random.choice(MODELOS)
+            lote.append(Producto(
+                categoria=categoria, marca=marca,
+                codigo_unico=f'REP-{n:05d}',
+                nombre=f'{pieza} {modelo}',
+                descripcion=f'{pieza} compatible con {modelo}, repuesto alternativo',
+                precio_compra=Decimal('5.00'), precio_venta=Decimal('8.50'),
+                stock_actual=Decimal(random.randint(0, 40)),
+            ))
+            if len(lote) == 5000:
+                # bulk_create no llama a save() ni genera códigos de barras
+                Producto.objects.bulk_create(lote)
+                lote = []
+        Producto.objects.bulk_create(lote)
+        self.stdout.write(f'Sembrados {cantidad} productos en {time.perf_counter() - inicio:.1f}s')
+
+    def _medir(self, repeticiones, limite):
+        def anterior(termino):
+            return list(Producto.objects.filter(activo=True).filter(
+                Q(nombre__icontains=termino) |
+                Q(codigo_unico__icontains=termino) |
+                Q(descripcion__icontains=termino)
+            )[:limite])
+
+        def actual(termino):
+            return list(BusquedaProductosService.buscar(
+                termino, Producto.objects.filter(activo=True)
+            )[:limite])
+
+        for nombre, buscar in (('anterior', anterior), ('actual', actual)):
+            latencias = []
+            for termino in TERMINOS:
+                for _ in range(repeticiones):
+                    inicio = time.perf_counter()
+                    resultados = buscar(termino)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+            latencias.sort()
+            p95 = latencias[int(len(latencias) * 0.95) - 1]
+            self.stdout.write(
+                f'[{nombre}] p50 {statistics.median(latencias):.2f} ms, p95 {p95:.2f} ms '
+                f'({len(latencias)} búsquedas)'
+            )
+
+        for termino in TERMINOS:
+            primeros = [p.nombre for p in actual(termino)[:3]]
+            self.stdout.write(f"  '{termino}': {len(anterior(termino))} vs {len(actual(termino))} "
+                              f"resultados, primeros: {primeros}")
@@ -0,0 +1,54 @@
+from django.contrib.postgres.operations import TrigramExtension, UnaccentExtension
+from django.db import migrations
+
+CREAR = [
+    # unaccent() es STABLE; el envoltorio IMMUTABLE permite usarlo en índices
+    """
+    CREATE OR REPLACE FUNCTION inventario_unaccent(text) RETURNS text AS $$
+        SELECT public.unaccent('public.unaccent'::regdictionary, $1)
+    $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS inventario_producto_nombre_trgm
+    ON inventario_producto USING gin (inventario_unaccent(lower(nombre)) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS inventario_producto_codigo_trgm
+    ON inventario_producto USING gin (upper(codigo_unico) gin_trgm_ops)
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS inventario_producto_texto_fts
+    ON inventario_producto USING gin (to_tsvector('spanish', inventario_unaccent(
+        coalesce(nombre, '') || ' ' || coalesce(descripcion, ''))))
+    """,
+]
+
+ELIMINAR = [
+    "DROP INDEX IF EXISTS inventario_producto_texto_fts",
+    "DROP INDEX IF EXISTS inventario_producto_codigo_trgm",
+    "DROP INDEX IF EXISTS inventario_producto_nombre_trgm",
+    "DROP FUNCTION IF EXISTS inventario_unaccent(text)",
+]
+
+
+def ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        # Índices específicos de PostgreSQL; otras bases usan la búsqueda simple
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for sql in sentencias:
+            schema_editor.execute(sql)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_producto_es_editable'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        UnaccentExtension(),
+        migrations.RunPython(ejecutar(CREAR), ejecutar(ELIMINAR)),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_busqueda_productos_indices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoAlternoProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo', models.CharField(max_length=50, unique=True, verbose_name='Código')),
+                ('tipo', models.CharField(choices=[('EAN', 'EAN/UPC'), ('PROVEEDOR', 'Código de proveedor'), ('OTRO', 'Otro')], default='EAN', max_length=20)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='codigos_alternos', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'Código Alterno',
+                'verbose_name_plural': 'Códigos Alternos',
+            },
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 import uuid
 import barcode
@@ -119,6 +119,30 @@ class Producto(models.Model):
             print(f"Error al generar cÃ³digo de barras: {e}")
             return False
 
+class CodigoAlternoProducto(models.Model):
+    """Códigos adicionales (EAN del fabricante, códigos de proveedor) que identifican un producto al escanear"""
+    TIPO_CHOICES = [
+        ('EAN', 'EAN/UPC'),
+        ('PROVEEDOR', 'Código de proveedor'),
+        ('OTRO', 'Otro'),
+    ]
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name='codigos_alternos')
+    codigo = models.CharField(max_length=50, unique=True, verbose_name=_('Código'))
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, default='EAN')
+
+    class Meta:
+        verbose_name = _('Código Alterno')
+        verbose_name_plural = _('Códigos Alternos')
+
+    def __str__(self):
+        return f"{self.codigo} → {self.producto.codigo_unico}"
+
+    def save(self, *args, **kwargs):
+        # Los escáneres y el POS buscan en mayúsculas
+        self.codigo = self.codigo.strip().upper()
+        super().save(*args, **kwargs)
+
 class InventarioAjuste(models.Model):
     """Ajustes manuales al inventario"""
     TIPO_CHOICES = [
@@ -405,8 +429,9 @@ def track_stock_change(sender, instance, **kwargs):
     if instance.pk:
         try:
             # Usar .only para eficiencia
-            old_instance = Producto.objects.filter(pk=instance.pk).only('stock_actual').first()
+            old_instance = Producto.objects.filter(pk=instance.pk).only('stock_actual', 'codigo_unico').first()
             instance._old_stock = old_instance.stock_actual if old_instance else 0
+            instance._old_codigo = old_instance.codigo_unico if old_instance else None
         except Exception:
             instance._old_stock = 0
     else:
@@ -432,3 +457,39 @@ def create_movement_on_stock_change(sender, instance, created, **kwargs):
             stock_nuevo=new_stock,
             motivo=f"Ajuste automático por edición/creación de producto (Cambio: {diferencia})"
         )
+
+        from reportes.services.eventos_dashboard import EventosDashboardService
+        EventosDashboardService.stock_actualizado([(instance.pk, old_stock, new_stock)])
+
+        # Contador de stock del escaneo en el POS
+        from .services.lookup_codigos import CodigoProductoService
+        CodigoProductoService.ajustar_stock({instance.pk: diferencia})
+
+
+# ============================================================================
+# SIGNALS PARA LA CACHÉ DE CÓDIGOS DEL POS
+# ============================================================================
+
+@receiver(post_save, sender=Producto)
+def invalidar_cache_codigos_producto(sender, instance, **kwargs):
+    """Quita de la caché de escaneo el código actual, el anterior y los alternos"""
+    from .services.lookup_codigos import CodigoProductoService
+    codigos = [instance.codigo_unico, getattr(instance, '_old_codigo', None)]
+    codigos += list(instance.codigos_alternos.values_list('codigo', flat=True))
+    CodigoProductoService.invalidar(codigos)
+
+
+@receiver(pre_save, sender=CodigoAlternoProducto)
+def guardar_codigo_alterno_anterior(sender, instance, **kwargs):
+    instance._old_codigo = None
+    if instance.pk:
+        instance._old_codigo = CodigoAlternoProducto.objects.filter(
+            pk=instance.pk
+        ).values_list('codigo', flat=True).first()
+
+
+@receiver(post_save, sender=CodigoAlternoProducto)
+@receiver(post_delete, sender=CodigoAlternoProducto)
+def invalidar_cache_codigo_alterno(sender, instance, **kwargs):
+    from .services.lookup_codigos import CodigoProductoService
+    CodigoProductoService.invalidar([instance.codigo, getattr(instance, '_old_codigo', None)])
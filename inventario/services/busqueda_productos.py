@@ -0,0 +1,124 @@
+"""
+Service layer para la búsqueda de productos (POS, inventario, etiquetas, taller)
+En PostgreSQL usa los índices de la migración 0008: GIN pg_trgm sobre
+inventario_unaccent(lower(nombre)) y upper(codigo_unico) para LIKE '%...%',
+y un índice GIN de texto completo (español) sobre nombre + descripción.
+Los resultados se ordenan por coincidencia de código, prefijo y similitud.
+"""
+import unicodedata
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connection, models
+from django.db.models import Q, Case, When, Value, Func
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower, Upper
+
+from inventario.models import Producto
+
+# Umbral de tokens: por debajo de esta longitud no se usa tolerancia a errores
+MIN_TOLERANCIA = 4
+
+# Debe coincidir con la expresión del índice inventario_producto_texto_fts
+VECTOR_TEXTO = (
+    "to_tsvector('spanish', inventario_unaccent("
+    "coalesce(\"inventario_producto\".\"nombre\", '') || ' ' || "
+    "coalesce(\"inventario_producto\".\"descripcion\", '')))"
+)
+
+
+class SinAcentos(Func):
+    """inventario_unaccent(): envoltorio IMMUTABLE de unaccent() creado en la migración 0008"""
+    function = 'inventario_unaccent'
+    output_field = models.TextField()
+
+
+class BusquedaProductosService:
+    """Servicio de búsqueda de productos compartido por las vistas"""
+
+    @staticmethod
+    def normalizar(texto):
+        """Minúsculas, sin tildes y con espacios colapsados (como inventario_unaccent(lower()))"""
+        texto = unicodedata.normalize('NFKD', texto or '')
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return ' '.join(texto.lower().split())
+
+    @staticmethod
+    def es_postgres():
+        return connection.vendor == 'postgresql'
+
+    @staticmethod
+    def buscar(termino, queryset=None, descripcion=True, tolerante=True):
+        """
+        Filtra y ordena por relevancia. Cada palabra del término debe aparecer
+        en el nombre o en el código; con descripcion=True también se aceptan
+        coincidencias de texto completo en la descripción y, con tolerante=True,
+        nombres parecidos (errores de tipeo) por similitud de trigramas.
+        Devuelve un queryset sin cortar para poder paginar.
+        """
+        if queryset is None:
+            queryset = Producto.objects.all()
+
+        termino = (termino or '').strip()
+        normalizado = BusquedaProductosService.normalizar(termino)
+        if not normalizado:
+            return queryset
+
+        if not BusquedaProductosService.es_postgres():
+            return BusquedaProductosService._buscar_simple(termino, queryset, descripcion)
+
+        codigo = termino.upper()
+        queryset = queryset.annotate(
+            nombre_normalizado=SinAcentos(Lower('nombre')),
+            codigo_normalizado=Upper('codigo_unico'),
+        )
+
+        # Todas las palabras deben aparecer en el nombre o en el código
+        coincidencia = Q()
+        for palabra in normalizado.split():
+            coincidencia &= (
+                Q(nombre_normalizado__contains=palabra) |
+                Q(codigo_normalizado__contains=palabra.upper())
+            )
+
+        if descripcion:
+            coincidencia |= Q(RawSQL(
+                f"{VECTOR_TEXTO} @@ plainto_tsquery('spanish', inventario_unaccent(%s))",
+                [normalizado], output_field=models.BooleanField()
+            ))
+        if tolerante and len(normalizado) >= MIN_TOLERANCIA:
+            coincidencia |= Q(nombre_normalizado__trigram_word_similar=normalizado)
+
+        return queryset.filter(coincidencia).annotate(
+            prioridad=BusquedaProductosService._prioridad(codigo, normalizado, 'codigo_normalizado',
+                                                          'nombre_normalizado'),
+            similitud=TrigramWordSimilarity(Value(normalizado), 'nombre_normalizado'),
+        ).order_by('prioridad', '-similitud', 'nombre')
+
+    @staticmethod
+    def _prioridad(codigo, normalizado, campo_codigo, campo_nombre):
+        """0: código exacto, 1: prefijo de código, 2: prefijo de nombre, 3: resto"""
+        return Case(
+            When(**{campo_codigo: codigo}, then=Value(0)),
+            When(**{f'{campo_codigo}__startswith': codigo}, then=Value(1)),
+            When(**{f'{campo_nombre}__startswith': normalizado}, then=Value(2)),
+            default=Value(3),
+            output_field=models.IntegerField(),
+        )
+
+    @staticmethod
+    def _buscar_simple(termino, queryset, descripcion):
+        """Búsqueda sin índices para bases distintas de PostgreSQL (desarrollo y pruebas)"""
+        coincidencia = Q()
+        for palabra in termino.split():
+            coincidencia &= Q(nombre__icontains=palabra) | Q(codigo_unico__icontains=palabra)
+        if descripcion:
+            coincidencia |= Q(descripcion__icontains=termino)
+
+        return queryset.filter(coincidencia).annotate(
+            codigo_normalizado=Upper('codigo_unico'),
+            nombre_normalizado=Lower('nombre'),
+        ).annotate(
+            prioridad=BusquedaProductosService._prioridad(
+                termino.upper(), termino.lower(), 'codigo_normalizado', 'nombre_normalizado'
+            ),
+        ).order_by('prioridad', 'nombre')
@@ -0,0 +1,240 @@
+"""
+Service layer para resolver códigos escaneados en el POS
+Índice exacto código → registro compacto del producto con dos niveles de caché:
+un LRU en memoria por proceso (microsegundos) y Redis compartido entre workers.
+El stock va aparte, en un contador de Redis por producto (en centésimas,
+para usar INCRBY atómico): se carga de la base cuando falta y quien cambia el
+stock lo ajusta al confirmar la transacción (ajustar_stock), así vender no
+invalida el registro. Un escaneo repetido no toca PostgreSQL; la base solo
+se consulta cuando el código o el contador no están en caché.
+
+Invalidación: al editar un Producto (o un código alterno) se borran sus claves
+en Redis y se incrementa una generación global; cada worker compara su
+generación como máximo una vez por INTERVALO_GENERACION y vacía su LRU si cambió.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+MAX_LOCAL = 5000
+TTL_REDIS = 3600
+TTL_NO_ENCONTRADO = 60
+# Acota la deriva del contador si el stock se cambia por fuera de la aplicación
+TTL_STOCK = 300
+INTERVALO_GENERACION = 1.0
+
+# Marca de "código inexistente" (evita consultar la base en cada escaneo erróneo)
+NO_ENCONTRADO = 0
+
+
+class _LRU:
+    """LRU mínimo y seguro entre hilos para el primer nivel de caché"""
+
+    def __init__(self, maximo):
+        self.maximo = maximo
+        self.datos = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, clave):
+        with self.lock:
+            valor = self.datos.get(clave)
+            if valor is not None:
+                self.datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor):
+        with self.lock:
+            self.datos[clave] = valor
+            self.datos.move_to_end(clave)
+            while len(self.datos) > self.maximo:
+                self.datos.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.datos.clear()
+
+
+_local = _LRU(MAX_LOCAL)
+_estado = {'generacion': None, 'verificado': 0.0}
+
+
+class CodigoProductoService:
+    """Búsqueda exacta de productos por código_unico o código alterno (EAN)"""
+
+    @staticmethod
+    def normalizar(codigo):
+        return (codigo or '').strip().upper()
+
+    @staticmethod
+    def schema():
+        return getattr(connection, 'schema_name', 'public')
+
+    @staticmethod
+    def clave(codigo, schema=None):
+        return f"codigo_producto:{schema or CodigoProductoService.schema()}:{codigo}"
+
+    @staticmethod
+    def clave_generacion():
+        return f"codigo_producto:{CodigoProductoService.schema()}:generacion"
+
+    @staticmethod
+    def clave_stock(producto_id, schema=None):
+        return f"codigo_producto:{schema or CodigoProductoService.schema()}:stock:{producto_id}"
+
+    @staticmethod
+    def registro(producto):
+        """Registro compacto que necesita el POS al escanear (sin stock, ver stock())"""
+        return {
+            'id': producto.id,
+            'codigo': producto.codigo_unico,
+            'nombre': producto.nombre,
+            'precio': float(producto.precio_venta),
+            'categoria': producto.categoria.nombre if producto.categoria_id else None,
+            'activo': producto.activo,
+            'incluye_iva': producto.incluye_iva,
+            'es_editable': producto.es_editable,
+        }
+
+    @staticmethod
+    def _verificar_generacion():
+        """Vacía el LRU local si otro worker invalidó productos (máx. una consulta a Redis por segundo)"""
+        ahora = time.monotonic()
+        if ahora - _estado['verificado'] < INTERVALO_GENERACION:
+            return
+        _estado['verificado'] = ahora
+        try:
+            generacion = cache.get(CodigoProductoService.clave_generacion())
+        except Exception as e:
+            logger.warning(f"Redis no disponible para la caché de códigos: {e}")
+            _local.clear()
+            return
+        if generacion != _estado['generacion']:
+            _local.clear()
+            _estado['generacion'] = generacion
+
+    @staticmethod
+    def buscar(codigo):
+        """Devuelve el registro del producto activo con ese código y su stock actual, o None"""
+        codigo = CodigoProductoService.normalizar(codigo)
+        if not codigo:
+            return None
+
+        CodigoProductoService._verificar_generacion()
+        clave = CodigoProductoService.clave(codigo)
+
+        registro = _local.get(clave)
+        if registro is None:
+            try:
+                registro = cache.get(clave)
+            except Exception as e:
+                logger.warning(f"Redis no disponible para la caché de códigos: {e}")
+            if registro is None:
+                registro = CodigoProductoService.consultar(codigo)
+                try:
+                    cache.set(clave, registro, TTL_REDIS if registro else TTL_NO_ENCONTRADO)
+                except Exception as e:
+                    logger.warning(f"No se pudo guardar el código {codigo} en Redis: {e}")
+            _local.set(clave, registro)
+
+        if not registro:
+            return None
+        return dict(registro, stock=CodigoProductoService.stock(registro['id']))
+
+    @staticmethod
+    def stock(producto_id):
+        """Stock actual desde el contador de Redis; si falta se carga de la base por clave primaria"""
+        from inventario.models import Producto
+
+        clave = CodigoProductoService.clave_stock(producto_id)
+        try:
+            centesimas = cache.get(clave)
+        except Exception as e:
+            logger.warning(f"Redis no disponible para el stock de códigos: {e}")
+            centesimas = None
+        if centesimas is not None:
+            return centesimas / 100
+
+        stock = Producto.objects.filter(pk=producto_id).values_list('stock_actual', flat=True).first() or 0
+        centesimas = int(round(stock * 100))
+        try:
+            # add: no pisa un contador que otro worker cargó y ya se ajustó
+            cache.add(clave, centesimas, TTL_STOCK)
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el stock del producto {producto_id} en Redis: {e}")
+        return centesimas / 100
+
+    @staticmethod
+    def ajustar_stock(cambios):
+        """
+        Suma a los contadores de stock {producto_id: diferencia} al confirmar la
+        transacción. Un contador ausente no se crea: se carga en el próximo escaneo.
+        """
+        schema = CodigoProductoService.schema()
+        cambios = {
+            CodigoProductoService.clave_stock(producto_id, schema): int(round(diferencia * 100))
+            for producto_id, diferencia in cambios.items() if diferencia
+        }
+
+        def ejecutar():
+            for clave, centesimas in cambios.items():
+                try:
+                    cache.incr(clave, centesimas)
+                except ValueError:
+                    pass
+                except Exception as e:
+                    logger.warning(f"No se pudo ajustar el stock en Redis, se descarta el contador: {e}")
+                    try:
+                        cache.delete(clave)
+                    except Exception:
+                        pass
+
+        if cambios:
+            transaction.on_commit(ejecutar)
+
+    @staticmethod
+    def consultar(codigo):
+        """Consulta a la base: código único o cualquier código alterno"""
+        from inventario.models import Producto
+
+        producto = Producto.objects.filter(
+            Q(codigo_unico=codigo) | Q(codigos_alternos__codigo=codigo),
+            activo=True
+        ).select_related('categoria').first()
+        return CodigoProductoService.registro(producto) if producto else NO_ENCONTRADO
+
+    @staticmethod
+    def invalidar(codigos):
+        """Borra los códigos de Redis y avisa a todos los workers (al confirmar la transacción)"""
+        schema = CodigoProductoService.schema()
+        claves = [
+            CodigoProductoService.clave(CodigoProductoService.normalizar(codigo), schema)
+            for codigo in codigos if codigo
+        ]
+        clave_generacion = CodigoProductoService.clave_generacion()
+
+        def ejecutar():
+            try:
+                cache.delete_many(claves)
+                if not cache.add(clave_generacion, 1, None):
+                    cache.incr(clave_generacion)
+            except Exception as e:
+                logger.warning(f"No se pudo invalidar la caché de códigos: {e}")
+            # El worker que hizo el cambio no espera al siguiente intervalo
+            _local.clear()
+            _estado['verificado'] = 0.0
+
+        transaction.on_commit(ejecutar)
+
+    @staticmethod
+    def vaciar_local():
+        """Vacía el LRU de este proceso (p. ej. en pruebas o tras restaurar la base)"""
+        _local.clear()
+        _estado['generacion'] = None
+        _estado['verificado'] = 0.0
@@ -1,3 +1,94 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .models import Producto, CategoriaProducto, Marca, CodigoAlternoProducto
+from .services.busqueda_productos import BusquedaProductosService
+from .services.lookup_codigos import CodigoProductoService
+
+MEDIA_ROOT_TEST = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TEST)
+class BusquedaProductosTest(TestCase):
+    """Pruebas del orden de relevancia de la búsqueda de productos"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TEST, ignore_errors=True)
+
+    def setUp(self):
+        categoria = CategoriaProducto.objects.create(
+            nombre='Repuestos', codigo='REP', porcentaje_ganancia=Decimal('30.00')
+        )
+        marca = Marca.objects.create(nombre='Genérica')
+        for codigo, nombre in [
+            ('FIL-002', 'Kit de arrastre con filtro'),
+            ('FIL-001', 'Filtro de aceite GN125'),
+            ('FIL-0011', 'Filtro de aire GN125'),
+        ]:
+            Producto.objects.create(
+                categoria=categoria, marca=marca, codigo_unico=codigo, nombre=nombre,
+                precio_compra=Decimal('2.00'), precio_venta=Decimal('4.00'),
+            )
+
+    def test_codigo_exacto_primero_y_prefijo_de_nombre_antes_que_el_resto(self):
+        codigos = list(BusquedaProductosService.buscar('fil-001').values_list('codigo_unico', flat=True))
+        self.assertEqual(codigos, ['FIL-001', 'FIL-0011'])
+
+        nombres = list(BusquedaProductosService.buscar('filtro').values_list('nombre', flat=True))
+        self.assertEqual(nombres[-1], 'Kit de arrastre con filtro')
+
+    def test_todas_las_palabras_deben_coincidir(self):
+        nombres = list(BusquedaProductosService.buscar('aceite gn125').values_list('nombre', flat=True))
+        self.assertEqual(nombres, ['Filtro de aceite GN125'])
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TEST)
+class CodigoProductoCacheTest(TestCase):
+    """Los escaneos repetidos no consultan la base y se invalidan al guardar"""
+
+    def setUp(self):
+        cache.clear()
+        CodigoProductoService.vaciar_local()
+        self.producto = Producto.objects.create(
+            categoria=CategoriaProducto.objects.create(
+                nombre='Lubricantes', codigo='LUB', porcentaje_ganancia=Decimal('30.00')
+            ),
+            marca=Marca.objects.create(nombre='Motul'),
+            codigo_unico='ACE-10W40', nombre='Aceite 10W40',
+            precio_compra=Decimal('6.00'), precio_venta=Decimal('9.50'), stock_actual=Decimal('10.00'),
+        )
+        CodigoAlternoProducto.objects.create(producto=self.producto, codigo='7791234567890 ')
+
+    def test_escaneo_por_ean_desde_cache_e_invalidacion(self):
+        self.assertEqual(CodigoProductoService.buscar('7791234567890')['stock'], 10.0)
+        # Una venta descuenta con un UPDATE masivo y ajusta el contador al confirmar
+        with self.captureOnCommitCallbacks(execute=True):
+            Producto.objects.filter(pk=self.producto.pk).update(stock_actual=F('stock_actual') - Decimal('2.50'))
+            CodigoProductoService.ajustar_stock({self.producto.pk: -Decimal('2.50')})
+        with CaptureQueriesContext(connection) as consultas:
+            registro = CodigoProductoService.buscar('7791234567890')
+        self.assertEqual(len(consultas), 0)
+        self.assertEqual((registro['precio'], registro['stock']), (9.5, 7.5))
+
+        # Un guardado del producto ajusta el contador por la diferencia (señal)
+        self.producto.refresh_from_db()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.stock_actual = Decimal('12.00')
+            self.producto.save()
+        self.assertEqual(CodigoProductoService.stock(self.producto.pk), 12.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.precio_venta = Decimal('10.00')
+            self.producto.save()
+
+        self.assertEqual(CodigoProductoService.buscar('7791234567890')['precio'], 10.0)
+        self.assertIsNone(CodigoProductoService.buscar('NO-EXISTE'))
@@ -53,6 +53,7 @@ from .forms import (
 )
 
 from .services.transferencias import TransferenciaService
+from .services.busqueda_productos import BusquedaProductosService
 
 from core.models import Sucursal
 from usuarios.models import Usuario
@@ -115,11 +116,7 @@ def lista_productos(request):
     if form.is_valid():
         # Filtro por texto
         if busqueda := form.cleaned_data.get('busqueda'):
-            productos = productos.filter(
-                Q(nombre__icontains=busqueda) | 
-                Q(codigo_unico__icontains=busqueda) |
-                Q(descripcion__icontains=busqueda)
-            )
+            productos = BusquedaProductosService.buscar(busqueda, productos)
         
         # Filtro por categoría
         if categoria := form.cleaned_data.get('categoria'):
@@ -171,9 +168,8 @@ def buscar_productos_etiquetas(request):
         return JsonResponse({'products': []})
     
     # Buscar productos que coincidan con la consulta
-    productos = Producto.objects.filter(
-        Q(nombre__icontains=query) | 
-        Q(codigo_unico__icontains=query)
+    productos = BusquedaProductosService.buscar(
+        query, descripcion=False
     ).select_related('categoria', 'marca')[:20]
     
     # Formatear resultados
@@ -873,11 +869,7 @@ def api_buscar_productos_etiquetas(request):
         
         # Aplicar filtros
         if termino:
-            productos = productos.filter(
-                Q(nombre__icontains=termino) |
-                Q(codigo_unico__icontains=termino) |
-                Q(descripcion__icontains=termino)
-            )
+            productos = BusquedaProductosService.buscar(termino, productos)
         
         if categoria_id:
             productos = productos.filter(categoria_id=categoria_id)
@@ -947,10 +939,7 @@ def api_productos(request):
         productos = Producto.objects.filter(activo=True)
         
         if search:
-            productos = productos.filter(
-                Q(nombre__icontains=search) |
-                Q(codigo_unico__icontains=search)
-            )
+            productos = BusquedaProductosService.buscar(search, productos, descripcion=False)
         
         productos = productos.select_related('categoria', 'marca')[:limit]
         
@@ -1767,10 +1756,7 @@ def api_buscar_productos_transferencia(request):
         productos = Producto.objects.filter(activo=True, stock_actual__gt=0)
         
         if termino:
-            productos = productos.filter(
-                Q(nombre__icontains=termino) |
-                Q(codigo_unico__icontains=termino)
-            )
+            productos = BusquedaProductosService.buscar(termino, productos, descripcion=False)
         
         productos = productos.select_related('categoria', 'marca')[:20]
         
@@ -1,3 +1,16 @@
 from django.contrib import admin
+from .models import ResumenVentaDiaria
 
-# Register your models here.
+
+@admin.register(ResumenVentaDiaria)
+class ResumenVentaDiariaAdmin(admin.ModelAdmin):
+    list_display = ('fecha', 'sucursal', 'cantidad_ventas', 'total_ventas', 'total_productos',
+                    'total_servicios', 'total_reembolsos', 'fecha_actualizacion')
+    list_filter = ('sucursal',)
+    date_hierarchy = 'fecha'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
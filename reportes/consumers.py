@@ -0,0 +1,53 @@
+import json
+from channels.generic.websocket import AsyncWebsocketConsumer
+
+from .services.eventos_dashboard import EventosDashboardService
+
+
+class DashboardConsumer(AsyncWebsocketConsumer):
+    """
+    Consumidor que empuja al navegador los deltas de ventas, caja y stock
+    de la sucursal, en lugar de que cada pestaña consulte las APIs JSON.
+    Los eventos los publica EventosDashboardService al confirmarse cada transacción;
+    el usuario recibe los de su sucursal, o los de todas si es administrador general.
+    """
+    async def connect(self):
+        self.user = self.scope["user"]
+
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_names = EventosDashboardService.grupos_usuario(
+            self.user, self.scope.get('schema_name', 'public')
+        )
+        for grupo in self.group_names:
+            await self.channel_layer.group_add(grupo, self.channel_name)
+
+        await self.accept()
+
+        await self.send(text_data=json.dumps({
+            'type': 'connection_established',
+            'canales': ['ventas', 'caja', 'stock', 'recalcular'],
+        }))
+
+    async def disconnect(self, close_code):
+        for grupo in getattr(self, 'group_names', []):
+            await self.channel_layer.group_discard(grupo, self.channel_name)
+
+    async def receive(self, text_data):
+        # El dashboard solo recibe eventos; responde al ping para mantener viva la conexión
+        try:
+            data = json.loads(text_data)
+        except ValueError:
+            return
+        if data.get('type') == 'ping':
+            await self.send(text_data=json.dumps({'type': 'pong'}))
+
+    async def dashboard_delta(self, event):
+        """Reenvía un delta de ventas/caja/stock al navegador"""
+        await self.send(text_data=json.dumps({
+            'type': 'delta',
+            'canal': event['canal'],
+            'data': event['data'],
+        }))
@@ -0,0 +1,157 @@
+"""
+Benchmark de CierreDiario.calcular_totales.
+
+Siembra (opcionalmente) un año de ventas dentro de una transacción que se
+revierte al final, y compara el cálculo anterior (una consulta por total,
+filtros fecha_hora__date) con el actual (agregación condicional por
+rango de fecha_hora). Reporta consultas y tiempo por día calculado.
+
+Uso:
+    python manage.py benchmark_cierre --sembrar --dias 365 --ventas-por-dia 40
+"""
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, models
+from django.db.models import Sum, F
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reportes.models import CierreDiario
+
+
+class Rollback(Exception):
+    """Fuerza la reversión de los datos sembrados"""
+
+
+def calcular_totales_anterior(fecha):
+    """Reproduce el cálculo previo (una consulta por cada total)"""
+    from ventas.models import Venta, DetalleVenta
+    from clientes.models import PedidoOnline
+    from taller.models import OrdenTrabajo
+
+    ventas_pos = Venta.objects.filter(fecha_hora__date=fecha, estado='COMPLETADA')
+    resultado = {
+        'cantidad_ventas': ventas_pos.count(),
+        'total': ventas_pos.aggregate(total=Sum('total'))['total'] or Decimal('0.00'),
+        'productos': DetalleVenta.objects.filter(
+            venta__fecha_hora__date=fecha, venta__estado='COMPLETADA', es_servicio=False
+        ).aggregate(total=Sum(F('subtotal') + F('iva') - F('descuento'),
+                              output_field=models.DecimalField()))['total'] or Decimal('0.00'),
+        'servicios': DetalleVenta.objects.filter(
+            venta__fecha_hora__date=fecha, venta__estado='COMPLETADA', es_servicio=True
+        ).aggregate(total=Sum(F('subtotal') - F('descuento'),
+                              output_field=models.DecimalField()))['total'] or Decimal('0.00'),
+        'iva': ventas_pos.aggregate(total=Sum('iva'))['total'] or Decimal('0.00'),
+    }
+    for tipo_pago in ('EFECTIVO', 'TARJETA', 'TRANSFERENCIA', 'CREDITO'):
+        resultado[tipo_pago] = ventas_pos.filter(tipo_pago=tipo_pago).aggregate(
+            total=Sum('total'))['total'] or Decimal('0.00')
+    resultado['online'] = PedidoOnline.objects.filter(
+        fecha_entrega__date=fecha, estado='ENTREGADO'
+    ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    resultado['taller'] = OrdenTrabajo.objects.filter(
+        estado__in=['COMPLETADO', 'ENTREGADO'], fecha_completado__date=fecha
+    ).aggregate(total=Sum('precio_total'))['total'] or Decimal('0.00')
+    return resultado
+
+
+class Command(BaseCommand):
+    help = 'Compara consultas y tiempo del cálculo de CierreDiario (anterior vs. agregación condicional)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sembrar', action='store_true',
+                            help='Sembrar ventas sintéticas (se revierten al terminar)')
+        parser.add_argument('--dias', type=int, default=365)
+        parser.add_argument('--ventas-por-dia', type=int, default=40)
+        parser.add_argument('--muestras', type=int, default=30, help='Días a calcular en cada escenario')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                if options['sembrar']:
+                    self._sembrar(options['dias'], options['ventas_por_dia'])
+                self._medir(options['dias'], options['muestras'])
+                raise Rollback()
+        except Rollback:
+            self.stdout.write('Datos sembrados revertidos')
+
+    def _sembrar(self, dias, ventas_por_dia):
+        from clientes.models import Cliente
+        from usuarios.models import Usuario
+        from ventas.models import Venta, DetalleVenta
+
+        usuario = Usuario.objects.first()
+        if usuario is None:
+            self.stderr.write('Se necesita al menos un usuario para sembrar ventas')
+            raise Rollback()
+        cliente = Cliente.get_consumidor_final()
+        hoy = timezone.localdate()
+        tipos_pago = ['EFECTIVO', 'TARJETA', 'TRANSFERENCIA', 'CREDITO']
+
+        inicio = time.perf_counter()
+        for dia in range(dias):
+            fecha = hoy - datetime.timedelta(days=dia)
+            ventas = [
+                Venta(
+                    cliente=cliente,
+                    usuario=usuario,
+                    numero_factura=f"BENCH-{dia:03d}{n:04d}",
+                    subtotal=Decimal('100.00'),
+                    iva=Decimal('15.00'),
+                    total=Decimal('115.00'),
+                    tipo_pago=random.choice(tipos_pago),
+                )
+                for n in range(ventas_por_dia)
+            ]
+            # bulk_create no llama a save() ni a las señales de Venta
+            Venta.objects.bulk_create(ventas)
+            # fecha_hora es auto_now_add: se corrige después de insertar
+            Venta.objects.filter(pk__in=[v.pk for v in ventas]).update(
+                fecha_hora=timezone.make_aware(datetime.datetime.combine(fecha, datetime.time(12)))
+            )
+            detalles = []
+            for venta in ventas:
+                detalles.append(DetalleVenta(
+                    venta=venta, nombre_personalizado='Repuesto', cantidad=Decimal('1'),
+                    precio_unitario=Decimal('80.00'), subtotal=Decimal('80.00'),
+                    iva_porcentaje=Decimal('15.00'), iva=Decimal('12.00'), total=Decimal('92.00')
+                ))
+                detalles.append(DetalleVenta(
+                    venta=venta, nombre_personalizado='Mano de obra', cantidad=Decimal('1'),
+                    precio_unitario=Decimal('20.00'), subtotal=Decimal('20.00'),
+                    iva_porcentaje=Decimal('0.00'), iva=Decimal('0.00'), total=Decimal('20.00'),
+                    es_servicio=True
+                ))
+            DetalleVenta.objects.bulk_create(detalles)
+        self.stdout.write(
+            f"Sembradas {dias * ventas_por_dia} ventas en {time.perf_counter() - inicio:.1f}s"
+        )
+
+    def _medir(self, dias, muestras):
+        hoy = timezone.localdate()
+        fechas = [hoy - datetime.timedelta(days=d) for d in range(0, dias, max(1, dias // muestras))][:muestras]
+
+        resultados = {}
+        for nombre in ('anterior', 'actual'):
+            inicio = time.perf_counter()
+            with CaptureQueriesContext(connection) as consultas:
+                for fecha in fechas:
+                    if nombre == 'anterior':
+                        calcular_totales_anterior(fecha)
+                    else:
+                        CierreDiario(fecha=fecha).calcular_totales()
+            duracion = time.perf_counter() - inicio
+            resultados[nombre] = (len(consultas) / len(fechas), duracion * 1000 / len(fechas))
+
+        for nombre, (consultas, ms) in resultados.items():
+            self.stdout.write(f"[{nombre}] {consultas:.1f} consultas/día, {ms:.2f} ms/día")
+
+        anterior, actual = resultados['anterior'], resultados['actual']
+        if actual[1] > 0:
+            self.stdout.write(self.style.SUCCESS(
+                f"Reducción: {anterior[0] / actual[0]:.1f}x consultas, {anterior[1] / actual[1]:.1f}x tiempo"
+            ))
@@ -0,0 +1,61 @@
+"""
+Reconstruye ResumenVentaDiaria desde Venta/DetalleVenta/Devolucion.
+
+Uso:
+    python manage.py reconstruir_resumen_ventas                  # todo el historial
+    python manage.py reconstruir_resumen_ventas --desde 2025-01-01 --hasta 2025-12-31
+"""
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from reportes.services.resumen_ventas import ResumenVentasService
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye el resumen diario de ventas (backfill)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--desde', help='Fecha inicial YYYY-MM-DD (por defecto, la primera venta)')
+        parser.add_argument('--hasta', help='Fecha final YYYY-MM-DD (por defecto, hoy)')
+        parser.add_argument('--dias-por-lote', type=int, default=31,
+                            help='Días reconstruidos por transacción')
+
+    def handle(self, *args, **options):
+        from ventas.models import Venta
+
+        try:
+            desde = self._fecha(options['desde'])
+            hasta = self._fecha(options['hasta']) or timezone.localdate()
+        except ValueError as e:
+            raise CommandError(f'Fecha inválida: {e}')
+
+        if desde is None:
+            primera = Venta.objects.order_by('fecha_hora').values_list('fecha_hora', flat=True).first()
+            if primera is None:
+                self.stdout.write('No hay ventas registradas')
+                return
+            desde = timezone.localtime(primera).date()
+
+        if desde > hasta:
+            raise CommandError('--desde debe ser anterior o igual a --hasta')
+
+        lote = datetime.timedelta(days=max(1, options['dias_por_lote']))
+        total_filas = 0
+        inicio = desde
+        while inicio <= hasta:
+            fin = min(inicio + lote - datetime.timedelta(days=1), hasta)
+            total_filas += ResumenVentasService.reconstruir(inicio, fin)
+            self.stdout.write(f'  {inicio} → {fin}')
+            inicio = fin + datetime.timedelta(days=1)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Resumen reconstruido: {total_filas} filas (día y sucursal) con movimiento entre {desde} y {hasta}'
+        ))
+
+    @staticmethod
+    def _fecha(valor):
+        if not valor:
+            return None
+        return datetime.datetime.strptime(valor, '%Y-%m-%d').date()
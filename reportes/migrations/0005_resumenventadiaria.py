@@ -0,0 +1,43 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0004_remove_cierrediario_total_gastos_dia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True)),
+                ('cantidad_ventas', models.IntegerField(default=0)),
+                ('total_ventas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('subtotal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('iva', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('descuento', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_productos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_servicios', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('base_iva', models.DecimalField(decimal_places=2, default=0, help_text='Base imponible con IVA', max_digits=14)),
+                ('base_iva_0', models.DecimalField(decimal_places=2, default=0, help_text='Base imponible IVA 0%', max_digits=14)),
+                ('efectivo', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('tarjeta', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('transferencia', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cheque', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('credito', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cantidad_devoluciones', models.IntegerField(default=0)),
+                ('total_reembolsos', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_ingresos_extra', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Resumen de Ventas Diario',
+                'verbose_name_plural': 'Resúmenes de Ventas Diarios',
+                'ordering': ['-fecha'],
+            },
+        ),
+    ]
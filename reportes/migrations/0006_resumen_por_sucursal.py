@@ -0,0 +1,33 @@
+# Generated by Django 5.2.1 on 2026-10-17 05:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_dominiosucursal_domain_and_more'),
+        ('reportes', '0005_resumenventadiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='resumenventadiaria',
+            name='sucursal',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='resumenes_ventas', to='core.sucursal'),
+        ),
+        migrations.AlterField(
+            model_name='resumenventadiaria',
+            name='fecha',
+            field=models.DateField(),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiaria',
+            constraint=models.UniqueConstraint(fields=('fecha', 'sucursal'), name='resumen_venta_dia_sucursal'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenventadiaria',
+            constraint=models.UniqueConstraint(condition=models.Q(('sucursal__isnull', True)), fields=('fecha',), name='resumen_venta_dia_sin_sucursal'),
+        ),
+    ]
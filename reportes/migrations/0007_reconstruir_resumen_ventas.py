@@ -0,0 +1,48 @@
+import datetime
+
+from django.db import migrations
+from django.utils import timezone
+
+# Historial que se reconstruye al desplegar (el resto con reconstruir_resumen_ventas)
+DIAS_RECIENTES = 400
+DIAS_POR_LOTE = 31
+
+
+def reconstruir_resumen(apps, schema_editor):
+    """
+    Llena ResumenVentaDiaria para los días recientes y los días aún abiertos:
+    el cierre de caja, los dashboards y ResumenMensual leen solo el resumen y
+    sin esto registrarían ceros hasta reconstruirlo a mano.
+    """
+    Venta = apps.get_model('ventas', 'Venta')
+    CierreDiario = apps.get_model('reportes', 'CierreDiario')
+    if not Venta.objects.exists():
+        # Base nueva: no hay nada que reconstruir
+        return
+
+    from reportes.services.resumen_ventas import ResumenVentasService
+
+    hoy = timezone.localdate()
+    desde = hoy - datetime.timedelta(days=DIAS_RECIENTES)
+    abierto = CierreDiario.objects.filter(estado='ABIERTO').order_by('fecha').values_list('fecha', flat=True).first()
+    if abierto and abierto < desde:
+        desde = abierto
+
+    lote = datetime.timedelta(days=DIAS_POR_LOTE)
+    inicio = desde
+    while inicio <= hoy:
+        fin = min(inicio + lote - datetime.timedelta(days=1), hoy)
+        ResumenVentasService.reconstruir(inicio, fin)
+        inicio = fin + datetime.timedelta(days=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reportes', '0006_resumen_por_sucursal'),
+        ('ventas', '0008_venta_estado_fecha_hora_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(reconstruir_resumen, migrations.RunPython.noop),
+    ]
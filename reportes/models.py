@@ -1,11 +1,18 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Sum, Count, Q, F
+from django.db.models import Sum, Count, Q, F, Value
+from django.db.models.functions import Coalesce
 from decimal import Decimal
 import datetime
 
 
+def rango_dia(fecha):
+    """Devuelve (inicio, fin) aware del día local, para filtrar con gte/lt"""
+    inicio = timezone.make_aware(datetime.datetime.combine(fecha, datetime.time.min))
+    return inicio, inicio + datetime.timedelta(days=1)
+
+
 class TipoMovimiento(models.Model):
     TIPO_CHOICES = [
         ('INGRESO', 'Ingreso'),
@@ -252,64 +259,68 @@ class CierreDiario(models.Model):
         from clientes.models import PedidoOnline
         from taller.models import OrdenTrabajo
 
-        # ── Ventas POS ────────────────────────────────────────────
-        ventas_pos = Venta.objects.filter(
-            fecha_hora__date=self.fecha,
-            estado='COMPLETADA'
-        )
-        self.cantidad_ventas = ventas_pos.count()
+        # Rango [inicio, fin) del día local: permite usar los índices de
+        # fecha_hora (fecha_hora__date aplica una función a la columna)
+        inicio, fin = rango_dia(self.fecha)
+        cero = Value(Decimal('0.00'))
+        decimal_field = models.DecimalField(max_digits=12, decimal_places=2)
 
+        # ── Ventas POS (una sola pasada por ventas_venta) ─────────
         # Total real cobrado = Venta.total (subtotal + iva - descuento)
-        total_pos_real = ventas_pos.aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
-
-        # Desglose informativo por tipo (para mostrar en tarjetas)
-        detalles_productos = DetalleVenta.objects.filter(
-            venta__fecha_hora__date=self.fecha,
-            venta__estado='COMPLETADA',
-            es_servicio=False
-        ).aggregate(
-            total=Sum(F('subtotal') + F('iva') - F('descuento'), output_field=models.DecimalField())
-        )['total'] or Decimal('0.00')
-
-        detalles_servicios = DetalleVenta.objects.filter(
-            venta__fecha_hora__date=self.fecha,
-            venta__estado='COMPLETADA',
-            es_servicio=True
+        ventas_pos = Venta.objects.filter(
+            fecha_hora__gte=inicio,
+            fecha_hora__lt=fin,
+            estado='COMPLETADA'
         ).aggregate(
-            total=Sum(F('subtotal') - F('descuento'), output_field=models.DecimalField())
-        )['total'] or Decimal('0.00')
-
-        self.total_ventas_productos = detalles_productos
-        self.total_ventas_servicios = detalles_servicios
-        self.total_iva_cobrado = ventas_pos.aggregate(
-            total=Sum('iva'))['total'] or Decimal('0.00')
+            cantidad=Count('id'),
+            total_cobrado=Coalesce(Sum('total'), cero),
+            total_iva=Coalesce(Sum('iva'), cero),
+            efectivo=Coalesce(Sum('total', filter=Q(tipo_pago='EFECTIVO')), cero),
+            tarjeta=Coalesce(Sum('total', filter=Q(tipo_pago='TARJETA')), cero),
+            transferencia=Coalesce(Sum('total', filter=Q(tipo_pago='TRANSFERENCIA')), cero),
+            credito=Coalesce(Sum('total', filter=Q(tipo_pago='CREDITO')), cero),
+        )
+        self.cantidad_ventas = ventas_pos['cantidad']
+        total_pos_real = ventas_pos['total_cobrado']
+        self.total_iva_cobrado = ventas_pos['total_iva']
 
         # Métodos de pago POS
-        self.efectivo_ventas = ventas_pos.filter(tipo_pago='EFECTIVO').aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
-        self.tarjeta_ventas = ventas_pos.filter(tipo_pago='TARJETA').aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
-        self.transferencia_ventas = ventas_pos.filter(tipo_pago='TRANSFERENCIA').aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
-        self.credito_ventas = ventas_pos.filter(tipo_pago='CREDITO').aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
+        self.efectivo_ventas = ventas_pos['efectivo']
+        self.tarjeta_ventas = ventas_pos['tarjeta']
+        self.transferencia_ventas = ventas_pos['transferencia']
+        self.credito_ventas = ventas_pos['credito']
+
+        # Desglose informativo por tipo (una sola pasada por los detalles)
+        detalles = DetalleVenta.objects.filter(
+            venta__fecha_hora__gte=inicio,
+            venta__fecha_hora__lt=fin,
+            venta__estado='COMPLETADA'
+        ).aggregate(
+            productos=Coalesce(Sum(
+                F('subtotal') + F('iva') - F('descuento'),
+                filter=Q(es_servicio=False), output_field=decimal_field
+            ), cero),
+            servicios=Coalesce(Sum(
+                F('subtotal') - F('descuento'),
+                filter=Q(es_servicio=True), output_field=decimal_field
+            ), cero),
+        )
+        self.total_ventas_productos = detalles['productos']
+        self.total_ventas_servicios = detalles['servicios']
 
         # ── Pedidos Online entregados ese día ─────────────────────
-        pedidos_online = PedidoOnline.objects.filter(
-            fecha_entrega__date=self.fecha,
+        self.total_ventas_online = PedidoOnline.objects.filter(
+            fecha_entrega__gte=inicio,
+            fecha_entrega__lt=fin,
             estado='ENTREGADO'
-        )
-        self.total_ventas_online = pedidos_online.aggregate(
-            total=Sum('total'))['total'] or Decimal('0.00')
+        ).aggregate(total=Coalesce(Sum('total'), cero))['total']
 
         # ── Órdenes de taller completadas/entregadas ese día ──────
-        ordenes = OrdenTrabajo.objects.filter(
+        self.total_ordenes_taller = OrdenTrabajo.objects.filter(
             estado__in=['COMPLETADO', 'ENTREGADO'],
-            fecha_completado__date=self.fecha
-        )
-        self.total_ordenes_taller = ordenes.aggregate(
-            total=Sum('precio_total'))['total'] or Decimal('0.00')
+            fecha_completado__gte=inicio,
+            fecha_completado__lt=fin
+        ).aggregate(total=Coalesce(Sum('precio_total'), cero))['total']
 
         # ── Gastos (eliminados del alcance de la caja física) ─────
 
@@ -335,8 +346,10 @@ class CierreDiario(models.Model):
         self.efectivo_contado = total
         if self.efectivo_contado is not None:
             from ventas.models import Venta
+            inicio, fin = rango_dia(self.fecha)
             ventas_efectivo = Venta.objects.filter(
-                fecha_hora__date=self.fecha,
+                fecha_hora__gte=inicio,
+                fecha_hora__lt=fin,
                 estado='COMPLETADA',
                 tipo_pago='EFECTIVO'
             ).aggregate(total=Sum('total'))['total'] or Decimal('0.00')
@@ -408,21 +421,20 @@ class ResumenMensual(models.Model):
     def calcular_resumen(self):
         from datetime import date
         import calendar
+        from reportes.services.resumen_ventas import ResumenVentasService
         primer_dia = date(self.año, self.mes, 1)
         ultimo_dia = date(self.año, self.mes, calendar.monthrange(self.año, self.mes)[1])
 
+        # Solo días cerrados, como online, taller y dias_operacion (que solo constan
+        # en los cierres); las ventas POS de esos días salen del resumen diario
         cierres = CierreDiario.objects.filter(
             fecha__range=[primer_dia, ultimo_dia],
             estado='CERRADO'
         )
+        pos = ResumenVentasService.totales(primer_dia, ultimo_dia, fecha__in=cierres.values('fecha'))
         totales = cierres.aggregate(
-            ventas=Sum('total_ingresos'),
-            productos=Sum('total_ventas_productos'),
-            servicios=Sum('total_ventas_servicios'),
             online=Sum('total_ventas_online'),
             taller=Sum('total_ordenes_taller'),
-            iva=Sum('total_iva_cobrado'),
-            cant_ventas=Sum('cantidad_ventas'),
         )
         
         # Gastos independientes sumados por mes
@@ -431,14 +443,14 @@ class ResumenMensual(models.Model):
             aprobado=True
         ).aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
 
-        self.total_ventas = totales['ventas'] or Decimal('0.00')
-        self.total_ventas_productos = totales['productos'] or Decimal('0.00')
-        self.total_ventas_servicios = totales['servicios'] or Decimal('0.00')
+        self.total_ventas_productos = pos['total_productos']
+        self.total_ventas_servicios = pos['total_servicios']
         self.total_ventas_online = totales['online'] or Decimal('0.00')
         self.total_ordenes_taller = totales['taller'] or Decimal('0.00')
+        self.total_ventas = pos['total_ventas'] + self.total_ventas_online + self.total_ordenes_taller
         self.total_gastos = gastos_mes
-        self.total_iva = totales['iva'] or Decimal('0.00')
-        self.cantidad_ventas = totales['cant_ventas'] or 0
+        self.total_iva = pos['iva']
+        self.cantidad_ventas = pos['cantidad_ventas']
         self.dias_operacion = cierres.count()
 
         if self.dias_operacion > 0:
@@ -451,6 +463,67 @@ class ResumenMensual(models.Model):
         self.save()
 
 
+class ResumenVentaDiaria(models.Model):
+    """
+    Totales de ventas por día mantenidos de forma incremental en la misma
+    transacción de la venta, anulación o devolución (ver ResumenVentasService).
+    Los reportes leen una fila por día en lugar de recorrer Venta/DetalleVenta.
+    Hay una fila por día y sucursal: cada movimiento cuenta en la sucursal del
+    usuario que lo registró (sin sucursal si el usuario no tiene una).
+    """
+    fecha = models.DateField()
+    sucursal = models.ForeignKey(
+        'core.Sucursal', on_delete=models.PROTECT, null=True, blank=True,
+        related_name='resumenes_ventas'
+    )
+
+    cantidad_ventas = models.IntegerField(default=0)
+    total_ventas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    subtotal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    iva = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    descuento = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Desglose de detalles
+    total_productos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_servicios = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    base_iva = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                   help_text="Base imponible con IVA")
+    base_iva_0 = models.DecimalField(max_digits=14, decimal_places=2, default=0,
+                                     help_text="Base imponible IVA 0%")
+
+    # Métodos de pago
+    efectivo = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    tarjeta = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transferencia = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cheque = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    credito = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    # Devoluciones
+    cantidad_devoluciones = models.IntegerField(default=0)
+    total_reembolsos = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_ingresos_extra = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Resumen de Ventas Diario'
+        verbose_name_plural = 'Resúmenes de Ventas Diarios'
+        ordering = ['-fecha']
+        constraints = [
+            models.UniqueConstraint(fields=['fecha', 'sucursal'], name='resumen_venta_dia_sucursal'),
+            # NULL no se compara en un UNIQUE: la fila sin sucursal necesita su propia restricción
+            models.UniqueConstraint(fields=['fecha'], condition=Q(sucursal__isnull=True),
+                                    name='resumen_venta_dia_sin_sucursal'),
+        ]
+
+    def __str__(self):
+        return f"Ventas {self.fecha}: ${self.total_ventas} ({self.cantidad_ventas})"
+
+    @property
+    def ventas_netas(self):
+        return self.total_ventas + self.total_ingresos_extra - self.total_reembolsos
+
+
 # ── Señal para crear movimiento de caja al completar una venta ────────
 from django.db.models.signals import post_save
 from django.dispatch import receiver
@@ -472,3 +545,32 @@ def crear_movimiento_venta(sender, instance, created, **kwargs):
             venta=instance,
             usuario=instance.usuario,
         )
+
+
+# ── Señal para registrar devoluciones en el resumen diario ────────────
+@receiver(post_save, sender='ventas.Devolucion')
+def registrar_devolucion_resumen(sender, instance, created, **kwargs):
+    if created and instance.estado == 'COMPLETADA':
+        from reportes.services.resumen_ventas import ResumenVentasService
+        ResumenVentasService.registrar_devolucion(instance)
+
+
+# ── Señales para invalidar la caché de las APIs del dashboard ─────────
+from django.db.models.signals import post_delete
+
+DEPENDENCIAS_DASHBOARD = (
+    'ventas.Venta', 'ventas.Devolucion', 'taller.OrdenTrabajo',
+    'inventario.Producto', 'reportes.CierreDiario',
+)
+
+
+def invalidar_cache_dashboard(sender, **kwargs):
+    from reportes.services.cache_dashboard import DashboardCacheService
+    DashboardCacheService.invalidar_al_confirmar()
+
+
+for _modelo in DEPENDENCIAS_DASHBOARD:
+    post_save.connect(invalidar_cache_dashboard, sender=_modelo,
+                      dispatch_uid=f'invalidar_dashboard_save_{_modelo}')
+    post_delete.connect(invalidar_cache_dashboard, sender=_modelo,
+                        dispatch_uid=f'invalidar_dashboard_delete_{_modelo}')
@@ -0,0 +1,133 @@
+"""
+Service layer para cachear los payloads de las APIs del dashboard
+Los payloads se guardan en CACHES['default'] (django_redis) por schema, con
+TTL corto. La invalidación es por versión: las señales de Venta, Devolucion,
+OrdenTrabajo, Producto y CierreDiario incrementan la versión del schema al
+confirmarse la transacción, y las claves antiguas simplemente expiran.
+"""
+import logging
+
+from django.core.cache import cache
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+PREFIJO = 'dashboard'
+
+# TTL en segundos por payload
+TTLS = {
+    'stats': 15,
+    'dashboard_data': 60,
+    'caja_status': 15,
+    'productos_top': 60,
+}
+TTL_POR_DEFECTO = 30
+
+
+class DashboardCacheService:
+    """Servicio de caché para las APIs consultadas periódicamente por el dashboard"""
+
+    @staticmethod
+    def schema():
+        return getattr(connection, 'schema_name', 'public')
+
+    @staticmethod
+    def clave_version(schema=None):
+        return f"{PREFIJO}:{schema or DashboardCacheService.schema()}:version"
+
+    @staticmethod
+    def version():
+        clave = DashboardCacheService.clave_version()
+        version = cache.get(clave)
+        if version is None:
+            cache.add(clave, 1, None)
+            version = cache.get(clave) or 1
+        return version
+
+    @staticmethod
+    def clave(nombre, *partes):
+        sufijo = ':'.join(str(parte) for parte in partes)
+        return (
+            f"{PREFIJO}:{DashboardCacheService.schema()}:v{DashboardCacheService.version()}"
+            f":{nombre}:{sufijo}"
+        )
+
+    @staticmethod
+    def contar(nombre, resultado):
+        """Incrementa el contador hit/miss del payload"""
+        clave = f"{PREFIJO}:contador:{nombre}:{resultado}"
+        try:
+            cache.add(clave, 0, None)
+            cache.incr(clave)
+        except ValueError:
+            # La clave fue desalojada entre add() e incr()
+            cache.set(clave, 1, None)
+        except Exception as e:
+            logger.debug(f"No se pudo actualizar el contador '{clave}': {e}")
+
+    @staticmethod
+    def obtener(nombre, calcular, *partes):
+        """
+        Devuelve el payload cacheado o lo calcula con `calcular()` y lo guarda.
+        Si Redis no responde se calcula directamente, sin cachear.
+        """
+        try:
+            clave = DashboardCacheService.clave(nombre, *partes)
+            payload = cache.get(clave)
+        except Exception as e:
+            logger.warning(f"Caché del dashboard no disponible: {e}")
+            return calcular()
+
+        if payload is not None:
+            DashboardCacheService.contar(nombre, 'hits')
+            return payload
+
+        DashboardCacheService.contar(nombre, 'misses')
+        payload = calcular()
+        try:
+            cache.set(clave, payload, TTLS.get(nombre, TTL_POR_DEFECTO))
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en caché '{nombre}': {e}")
+        return payload
+
+    @staticmethod
+    def invalidar(schema=None):
+        """Invalida todos los payloads del schema incrementando su versión"""
+        clave = DashboardCacheService.clave_version(schema)
+        try:
+            if not cache.add(clave, 2, None):
+                cache.incr(clave)
+        except Exception as e:
+            logger.warning(f"No se pudo invalidar la caché del dashboard: {e}")
+
+    @staticmethod
+    def invalidar_al_confirmar():
+        """
+        Invalida cuando la transacción se confirma; invalidar antes permitiría
+        que otra petición volviera a cachear los datos aún sin confirmar.
+        """
+        schema = DashboardCacheService.schema()
+        transaction.on_commit(lambda: DashboardCacheService.invalidar(schema))
+
+    @staticmethod
+    def estadisticas():
+        """Contadores hit/miss por payload y tasa de aciertos"""
+        resultado = {}
+        for nombre in TTLS:
+            hits = cache.get(f"{PREFIJO}:contador:{nombre}:hits") or 0
+            misses = cache.get(f"{PREFIJO}:contador:{nombre}:misses") or 0
+            total = hits + misses
+            resultado[nombre] = {
+                'hits': hits,
+                'misses': misses,
+                'tasa_aciertos': round(hits * 100 / total, 1) if total else 0,
+                'ttl': TTLS[nombre],
+            }
+        return resultado
+
+    @staticmethod
+    def reiniciar_estadisticas():
+        cache.delete_many([
+            f"{PREFIJO}:contador:{nombre}:{resultado}"
+            for nombre in TTLS for resultado in ('hits', 'misses')
+        ])
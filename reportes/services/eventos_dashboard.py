@@ -0,0 +1,134 @@
+"""
+Service layer para publicar deltas del dashboard por WebSocket
+Los eventos se envían al channel layer cuando la transacción se confirma
+(transaction.on_commit), así los navegadores conectados a DashboardConsumer
+solo reciben cambios que realmente persistieron.
+
+Grupos: los deltas de ventas y caja van al grupo de la sucursal donde cuenta
+el movimiento (`dashboard_{schema}_{sucursal_id}`, como ResumenVentaDiaria) y
+al de todas las sucursales (`dashboard_{schema}`, administradores generales).
+El stock es común a todas las sucursales y va a `dashboard_{schema}_stock`.
+"""
+import logging
+from decimal import Decimal
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+# Campos del resumen diario que son movimientos de caja (métodos de pago)
+CAMPOS_CAJA = ('efectivo', 'tarjeta', 'transferencia', 'cheque', 'credito',
+               'total_reembolsos', 'total_ingresos_extra')
+
+
+def _serializable(valor):
+    if isinstance(valor, Decimal):
+        return float(valor)
+    return valor
+
+
+class EventosDashboardService:
+    """Servicio para notificar cambios de ventas, caja y stock al dashboard"""
+
+    @staticmethod
+    def grupo(schema=None):
+        """Grupo con los movimientos de todas las sucursales"""
+        return f"dashboard_{schema or getattr(connection, 'schema_name', 'public')}"
+
+    @staticmethod
+    def grupo_sucursal(sucursal_id, schema=None):
+        return f"{EventosDashboardService.grupo(schema)}_{sucursal_id or 'sin'}"
+
+    @staticmethod
+    def grupo_stock(schema=None):
+        return f"{EventosDashboardService.grupo(schema)}_stock"
+
+    @staticmethod
+    def grupos_movimiento(sucursal_id, schema=None):
+        """Grupos que reciben un movimiento de ventas/caja de esa sucursal"""
+        return [EventosDashboardService.grupo(schema), EventosDashboardService.grupo_sucursal(sucursal_id, schema)]
+
+    @staticmethod
+    def grupos_usuario(usuario, schema=None):
+        """Grupos de un navegador: todas las sucursales (admin general) o la suya, más el stock"""
+        if usuario.es_admin_general:
+            grupo = EventosDashboardService.grupo(schema)
+        else:
+            grupo = EventosDashboardService.grupo_sucursal(usuario.sucursal_id, schema)
+        return [grupo, EventosDashboardService.grupo_stock(schema)]
+
+    @staticmethod
+    def enviar(grupo, canal, data):
+        """Envía el evento al grupo; un fallo del channel layer no afecta a la venta"""
+        channel_layer = get_channel_layer()
+        if channel_layer is None:
+            return
+        try:
+            async_to_sync(channel_layer.group_send)(grupo, {
+                'type': 'dashboard_delta',
+                'canal': canal,
+                'data': data,
+            })
+        except Exception as e:
+            logger.warning(f"No se pudo publicar el evento '{canal}' del dashboard: {e}")
+
+    @staticmethod
+    def publicar(canal, data, grupos):
+        """Programa el envío a los grupos para cuando la transacción actual se confirme"""
+        data = {clave: _serializable(valor) for clave, valor in data.items()}
+
+        def ejecutar():
+            for grupo in grupos:
+                EventosDashboardService.enviar(grupo, canal, data)
+
+        transaction.on_commit(ejecutar)
+
+    @staticmethod
+    def resumen_actualizado(fecha, deltas, signo=1, origen='venta', sucursal_id=None):
+        """
+        Publica los deltas aplicados al resumen diario de una sucursal: el canal
+        'ventas' lleva los totales y el canal 'caja' el desglose por método de pago.
+        """
+        ventas = {}
+        caja = {}
+        for campo, valor in deltas.items():
+            if not valor:
+                continue
+            destino = caja if campo in CAMPOS_CAJA else ventas
+            destino[campo] = valor * signo
+
+        base = {'fecha': fecha.isoformat(), 'origen': origen, 'sucursal_id': sucursal_id}
+        grupos = EventosDashboardService.grupos_movimiento(sucursal_id)
+        if ventas:
+            EventosDashboardService.publicar('ventas', {**base, **ventas}, grupos)
+        if caja:
+            EventosDashboardService.publicar('caja', {**base, **caja}, grupos)
+
+    @staticmethod
+    def dia_recalculado(fecha, sucursal_ids):
+        """Un día se reconstruyó desde cero: los clientes deben pedir el estado completo"""
+        grupos = [EventosDashboardService.grupo()] + [
+            EventosDashboardService.grupo_sucursal(sucursal_id) for sucursal_id in set(sucursal_ids)
+        ]
+        EventosDashboardService.publicar('recalcular', {'fecha': fecha.isoformat()}, grupos)
+
+    @staticmethod
+    def stock_actualizado(productos):
+        """
+        Publica el nuevo stock de una lista de (producto_id, stock_anterior, stock_nuevo)
+        en un solo mensaje.
+        """
+        cambios = [
+            {
+                'producto_id': producto_id,
+                'stock_anterior': _serializable(anterior),
+                'stock_nuevo': _serializable(nuevo),
+            }
+            for producto_id, anterior, nuevo in productos
+        ]
+        if cambios:
+            EventosDashboardService.publicar(
+                'stock', {'productos': cambios}, [EventosDashboardService.grupo_stock()]
+            )
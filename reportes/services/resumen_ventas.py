@@ -0,0 +1,272 @@
+"""
+Service layer para el resumen diario de ventas (ResumenVentaDiaria)
+Aplica deltas en la misma transacción de la venta, anulación o devolución,
+permite reconstruir rangos completos desde Venta/DetalleVenta/Devolucion y
+ofrece a los reportes los totales por rango y por día leyendo solo el resumen.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import transaction, models
+from django.db.models import Sum, Count, Q, F, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from reportes.models import ResumenVentaDiaria, rango_dia
+from reportes.services.eventos_dashboard import EventosDashboardService
+
+# Venta.tipo_pago -> campo del resumen
+CAMPOS_PAGO = {
+    'EFECTIVO': 'efectivo',
+    'TARJETA': 'tarjeta',
+    'TRANSFERENCIA': 'transferencia',
+    'CHEQUE': 'cheque',
+    'CREDITO': 'credito',
+}
+
+CERO = Decimal('0.00')
+
+CAMPOS_ENTEROS = ('cantidad_ventas', 'cantidad_devoluciones')
+
+
+def _suma(campo, condicion=None):
+    """Sum condicional que devuelve 0 en lugar de NULL"""
+    return Coalesce(
+        Sum(campo, filter=condicion, output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+        Value(CERO)
+    )
+
+
+class ResumenVentasService:
+    """Servicio para mantener el resumen diario de ventas"""
+
+    @staticmethod
+    def fecha_local(fecha_hora):
+        return timezone.localtime(fecha_hora).date()
+
+    @staticmethod
+    def sucursal_id(usuario):
+        """Sucursal en la que cuenta un movimiento: la del usuario que lo registró"""
+        return getattr(usuario, 'sucursal_id', None)
+
+    @staticmethod
+    def agregados_detalles():
+        """
+        Agregados por detalle: productos vs. servicios (mismo criterio que
+        Venta.get_ventas_por_dia: servicio antiguo o servicio con tipo; los
+        ítems manuales sin tipo no cuentan en ninguno) y bases de IVA
+        """
+        return {
+            'total_productos': _suma('total', Q(producto__isnull=False)),
+            'total_servicios': _suma(
+                'total', Q(servicio__isnull=False) | Q(es_servicio=True, tipo_servicio__isnull=False)
+            ),
+            'base_iva': _suma('subtotal', Q(iva_porcentaje__gt=0)),
+            'base_iva_0': _suma('subtotal', Q(iva_porcentaje=0)),
+        }
+
+    @staticmethod
+    def agregados_ventas():
+        """Agregados por venta: totales y desglose por método de pago"""
+        agregados = {
+            'cantidad_ventas': Count('id'),
+            'total_ventas': _suma('total'),
+            'subtotal': _suma('subtotal'),
+            'iva': _suma('iva'),
+            'descuento': _suma('descuento'),
+        }
+        for tipo_pago, campo in CAMPOS_PAGO.items():
+            agregados[campo] = _suma('total', Q(tipo_pago=tipo_pago))
+        return agregados
+
+    @staticmethod
+    def agregados_devoluciones():
+        return {
+            'cantidad_devoluciones': Count('id'),
+            'total_reembolsos': Coalesce(
+                Sum(-F('diferencia'), filter=Q(diferencia__lt=0),
+                    output_field=models.DecimalField(max_digits=14, decimal_places=2)),
+                Value(CERO)
+            ),
+            'total_ingresos_extra': _suma('diferencia', Q(diferencia__gt=0)),
+        }
+
+    @staticmethod
+    def deltas_venta(venta):
+        """Contribución de una venta al resumen (una consulta sobre sus detalles)"""
+        from ventas.models import DetalleVenta
+
+        deltas = DetalleVenta.objects.filter(venta=venta).aggregate(
+            **ResumenVentasService.agregados_detalles()
+        )
+        deltas.update({
+            'cantidad_ventas': 1,
+            'total_ventas': venta.total,
+            'subtotal': venta.subtotal,
+            'iva': venta.iva,
+            'descuento': venta.descuento,
+        })
+        campo_pago = CAMPOS_PAGO.get(venta.tipo_pago)
+        if campo_pago:
+            deltas[campo_pago] = venta.total
+        return deltas
+
+    @staticmethod
+    def aplicar(fecha, deltas, signo=1, origen='venta', sucursal_id=None):
+        """
+        Suma los deltas a la fila del día y sucursal con un UPDATE basado en
+        F(), creando la fila si no existe. Debe ejecutarse dentro de la
+        transacción que modifica la venta; los mismos deltas se publican
+        al dashboard cuando esa transacción se confirma.
+        """
+        cambios = {
+            campo: F(campo) + valor * signo
+            for campo, valor in deltas.items() if valor
+        }
+        if not cambios:
+            return
+        ResumenVentaDiaria.objects.get_or_create(fecha=fecha, sucursal_id=sucursal_id)
+        ResumenVentaDiaria.objects.filter(fecha=fecha, sucursal_id=sucursal_id).update(
+            fecha_actualizacion=timezone.now(), **cambios
+        )
+        EventosDashboardService.resumen_actualizado(fecha, deltas, signo, origen, sucursal_id)
+
+    @staticmethod
+    def registrar_venta(venta):
+        """Suma una venta COMPLETADA al resumen de su día"""
+        if venta.estado != 'COMPLETADA':
+            return
+        ResumenVentasService.aplicar(
+            ResumenVentasService.fecha_local(venta.fecha_hora),
+            ResumenVentasService.deltas_venta(venta),
+            sucursal_id=ResumenVentasService.sucursal_id(venta.usuario)
+        )
+
+    @staticmethod
+    def registrar_anulacion(venta):
+        """Resta del resumen una venta que se acaba de anular"""
+        ResumenVentasService.aplicar(
+            ResumenVentasService.fecha_local(venta.fecha_hora),
+            ResumenVentasService.deltas_venta(venta),
+            signo=-1,
+            origen='anulacion',
+            sucursal_id=ResumenVentasService.sucursal_id(venta.usuario)
+        )
+
+    @staticmethod
+    def registrar_devolucion(devolucion):
+        """Suma una devolución/cambio al resumen de su día"""
+        diferencia = devolucion.diferencia
+        ResumenVentasService.aplicar(
+            ResumenVentasService.fecha_local(devolucion.fecha_hora),
+            {
+                'cantidad_devoluciones': 1,
+                'total_reembolsos': -diferencia if diferencia < 0 else CERO,
+                'total_ingresos_extra': diferencia if diferencia > 0 else CERO,
+            },
+            origen='devolucion',
+            sucursal_id=ResumenVentasService.sucursal_id(devolucion.usuario)
+        )
+
+    @staticmethod
+    def campos():
+        """Campos numéricos del resumen"""
+        return [
+            *ResumenVentasService.agregados_ventas(),
+            *ResumenVentasService.agregados_detalles(),
+            *ResumenVentasService.agregados_devoluciones(),
+        ]
+
+    @staticmethod
+    def totales(desde, hasta, **filtros):
+        """Suma de las filas del rango (todas las sucursales salvo que se filtre) en una consulta"""
+        return ResumenVentaDiaria.objects.filter(fecha__range=(desde, hasta), **filtros).aggregate(**{
+            campo: Coalesce(Sum(campo), Value(0)) if campo in CAMPOS_ENTEROS else _suma(campo)
+            for campo in ResumenVentasService.campos()
+        })
+
+    @staticmethod
+    def por_dia(desde, hasta, **filtros):
+        """Total y cantidad de ventas por día del rango (solo días con movimiento)"""
+        return ResumenVentaDiaria.objects.filter(fecha__range=(desde, hasta), **filtros).values(
+            dia=F('fecha')
+        ).annotate(
+            total=Sum('total_ventas'), cantidad=Sum('cantidad_ventas')
+        ).order_by('dia')
+
+    @staticmethod
+    def recalcular_dia(fecha):
+        """
+        Recalcula un día desde los datos crudos. Se usa en los flujos que
+        editan ventas ya creadas (formularios), donde no hay un delta simple.
+        """
+        if isinstance(fecha, datetime.datetime):
+            fecha = ResumenVentasService.fecha_local(fecha)
+        dias = ResumenVentasService.reconstruir(fecha, fecha)
+        EventosDashboardService.dia_recalculado(
+            fecha, ResumenVentaDiaria.objects.filter(fecha=fecha).values_list('sucursal_id', flat=True)
+        )
+        return dias
+
+    @staticmethod
+    @transaction.atomic
+    def reconstruir(desde, hasta):
+        """
+        Reconstruye el resumen entre dos fechas (inclusive) con tres consultas
+        agrupadas por día y sucursal. Devuelve el número de filas con movimiento.
+        Las filas existentes se bloquean antes de leer los datos crudos y se
+        actualizan en su lugar: un aplicar() concurrente espera y suma su delta
+        sobre el valor reconstruido en vez de perderse.
+        """
+        from ventas.models import Venta, DetalleVenta, Devolucion
+
+        inicio, _ = rango_dia(desde)
+        _, fin = rango_dia(hasta)
+
+        existentes = {
+            (resumen.fecha, resumen.sucursal_id): resumen
+            for resumen in ResumenVentaDiaria.objects.select_for_update().filter(fecha__range=(desde, hasta))
+        }
+        campos = ResumenVentasService.campos()
+        filas = {}
+
+        def acumular(queryset, campo_fecha, campo_sucursal, agregados):
+            # Alias con prefijo: annotate() no admite alias iguales a campos del modelo
+            registros = queryset.annotate(
+                dia=TruncDate(campo_fecha), suc=F(campo_sucursal)
+            ).values('dia', 'suc').annotate(
+                **{f'r_{campo}': expresion for campo, expresion in agregados.items()}
+            ).order_by()
+            for registro in registros:
+                clave = (registro.pop('dia'), registro.pop('suc'))
+                resumen = filas.setdefault(clave, ResumenVentaDiaria(fecha=clave[0], sucursal_id=clave[1]))
+                for alias, valor in registro.items():
+                    setattr(resumen, alias[2:], valor)
+
+        acumular(
+            Venta.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin, estado='COMPLETADA'),
+            'fecha_hora', 'usuario__sucursal', ResumenVentasService.agregados_ventas()
+        )
+        acumular(
+            DetalleVenta.objects.filter(
+                venta__fecha_hora__gte=inicio, venta__fecha_hora__lt=fin, venta__estado='COMPLETADA'
+            ),
+            'venta__fecha_hora', 'venta__usuario__sucursal', ResumenVentasService.agregados_detalles()
+        )
+        acumular(
+            Devolucion.objects.filter(fecha_hora__gte=inicio, fecha_hora__lt=fin, estado='COMPLETADA'),
+            'fecha_hora', 'usuario__sucursal', ResumenVentasService.agregados_devoluciones()
+        )
+
+        ahora = timezone.now()
+        for clave, resumen in existentes.items():
+            nuevo = filas.get(clave)
+            # Un día que ya no tiene movimiento queda en cero
+            for campo in campos:
+                setattr(resumen, campo, getattr(nuevo, campo) if nuevo else 0)
+            resumen.fecha_actualizacion = ahora
+        ResumenVentaDiaria.objects.bulk_update(existentes.values(), campos + ['fecha_actualizacion'])
+        ResumenVentaDiaria.objects.bulk_create([
+            resumen for clave, resumen in filas.items() if clave not in existentes
+        ])
+        return len(filas)
@@ -0,0 +1,128 @@
+"""
+Service layer para series temporales de ventas (gráficos del dashboard y reportes)
+Agrupa por día, semana o mes con una sola consulta sobre ResumenVentaDiaria
+(días ya en hora local) o, si se pasa un queryset de ventas, sobre fecha_hora en
+hora local (America/Guayaquil), y rellena en Python los periodos sin ventas.
+"""
+import datetime
+import zoneinfo
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import DateField, F, Sum, Count
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth
+
+from reportes.models import ResumenVentaDiaria, rango_dia
+
+TRUNCADORES = {
+    'dia': TruncDay,
+    'semana': TruncWeek,
+    'mes': TruncMonth,
+}
+
+DIAS_SEMANA = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+MESES = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+# Límite de seguridad para rangos pedidos por la API (5 años)
+MAX_DIAS = 1830
+
+
+class SerieVentasService:
+    """Servicio para construir series temporales de ventas completadas"""
+
+    @staticmethod
+    def zona_horaria():
+        return zoneinfo.ZoneInfo(settings.TIME_ZONE)
+
+    @staticmethod
+    def granularidad_para(dias):
+        """Granularidad por defecto según la longitud del rango"""
+        if dias <= 14:
+            return 'dia'
+        if dias <= 60:
+            return 'semana'
+        return 'mes'
+
+    @staticmethod
+    def inicio_periodo(fecha, granularidad):
+        if granularidad == 'semana':
+            return fecha - datetime.timedelta(days=fecha.weekday())
+        if granularidad == 'mes':
+            return fecha.replace(day=1)
+        return fecha
+
+    @staticmethod
+    def siguiente_periodo(fecha, granularidad):
+        if granularidad == 'semana':
+            return fecha + datetime.timedelta(days=7)
+        if granularidad == 'mes':
+            if fecha.month == 12:
+                return fecha.replace(year=fecha.year + 1, month=1)
+            return fecha.replace(month=fecha.month + 1)
+        return fecha + datetime.timedelta(days=1)
+
+    @staticmethod
+    def periodos(desde, hasta, granularidad):
+        """Inicio de cada periodo que toca el rango [desde, hasta]"""
+        fecha = SerieVentasService.inicio_periodo(desde, granularidad)
+        while fecha <= hasta:
+            yield fecha
+            fecha = SerieVentasService.siguiente_periodo(fecha, granularidad)
+
+    @staticmethod
+    def etiqueta(fecha, granularidad):
+        if granularidad == 'semana':
+            return f"Sem {fecha.strftime('%d/%m')}"
+        if granularidad == 'mes':
+            return f"{MESES[fecha.month - 1]} {fecha.year}"
+        return DIAS_SEMANA[fecha.weekday()]
+
+    @staticmethod
+    def serie(desde, hasta, granularidad='dia', queryset=None):
+        """
+        Devuelve una lista ordenada de periodos con 'fecha' (inicio del periodo),
+        'periodo' (etiqueta), 'total' y 'cantidad', incluyendo los periodos sin ventas.
+        El primer y el último periodo solo cuentan las ventas dentro del rango.
+        Sin queryset lee el resumen diario (todas las sucursales).
+        """
+        if granularidad not in TRUNCADORES:
+            raise ValueError(f'Granularidad no soportada: {granularidad}')
+
+        truncador = TRUNCADORES[granularidad]
+        if queryset is None:
+            periodo = F('fecha') if granularidad == 'dia' else truncador('fecha', output_field=DateField())
+            registros = ResumenVentaDiaria.objects.filter(
+                fecha__range=(desde, hasta)
+            ).annotate(periodo_inicio=periodo).values('periodo_inicio').annotate(
+                s_total=Sum('total_ventas'),
+                s_cantidad=Sum('cantidad_ventas')
+            ).order_by()
+        else:
+            inicio, _ = rango_dia(desde)
+            _, fin = rango_dia(hasta)
+            registros = queryset.filter(
+                fecha_hora__gte=inicio, fecha_hora__lt=fin
+            ).annotate(
+                periodo_inicio=truncador('fecha_hora', tzinfo=SerieVentasService.zona_horaria())
+            ).values('periodo_inicio').annotate(
+                s_total=Sum('total'),
+                s_cantidad=Count('id')
+            ).order_by()
+
+        agrupados = {}
+        for registro in registros:
+            fecha = registro['periodo_inicio']
+            if isinstance(fecha, datetime.datetime):
+                fecha = fecha.date()
+            agrupados[fecha] = registro
+
+        datos = []
+        for fecha in SerieVentasService.periodos(desde, hasta, granularidad):
+            registro = agrupados.get(fecha, {})
+            datos.append({
+                'fecha': fecha,
+                'periodo': SerieVentasService.etiqueta(fecha, granularidad),
+                'total': registro.get('s_total') or Decimal('0.00'),
+                'cantidad': registro.get('s_cantidad') or 0,
+            })
+        return datos
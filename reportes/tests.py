@@ -1,3 +1,355 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from clientes.models import Cliente
+from core.models import Sucursal
+from inventario.models import CategoriaProducto, Marca, Producto
+from taller.models import CategoriaServicio, TipoServicio
+from usuarios.models import Usuario
+from ventas.models import DetalleVenta, Devolucion, Venta
+from ventas.services.checkout_service import CheckoutService
+from .management.commands.benchmark_cierre import calcular_totales_anterior
+from .consumers import DashboardConsumer
+from .models import CierreDiario, ResumenMensual, ResumenVentaDiaria
+from .services.cache_dashboard import DashboardCacheService
+from .services.eventos_dashboard import EventosDashboardService
+from .services.resumen_ventas import ResumenVentasService
+from .services.series_ventas import SerieVentasService
+
+CAMPOS_COMPARADOS = [
+    'cantidad_ventas', 'total_ventas', 'subtotal', 'iva', 'descuento',
+    'total_productos', 'total_servicios', 'base_iva', 'base_iva_0',
+    'efectivo', 'tarjeta', 'transferencia', 'cheque', 'credito',
+    'cantidad_devoluciones', 'total_reembolsos', 'total_ingresos_extra',
+]
+
+
+class VentasPosMixin:
+    """Crea ventas reales del POS a través de CheckoutService"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'cajero', 'cajero@example.com', 'testpass123',
+            nombre='Caja', apellido='Uno'
+        )
+        self.cliente = Cliente.get_consumidor_final()
+
+    def vender(self, precio, tipo_pago='EFECTIVO'):
+        return CheckoutService.procesar_venta(self.usuario, self.cliente, {
+            'subtotal': precio,
+            'tax_amount': '0.00',
+            'total_amount': precio,
+            'payment_method': tipo_pago,
+            'items': [{
+                'type': 'manual',
+                'name': 'Mano de obra',
+                'quantity': '1',
+                'unit_price': precio,
+                'subtotal': precio,
+            }],
+        })
+
+
+class ResumenVentaDiariaTest(VentasPosMixin, TestCase):
+    """El resumen incremental debe coincidir con la reconstrucción desde cero"""
+
+    def snapshot(self):
+        resumen = ResumenVentaDiaria.objects.get(fecha=timezone.localdate())
+        return {campo: getattr(resumen, campo) for campo in CAMPOS_COMPARADOS}
+
+    def test_incremental_coincide_con_reconstruccion(self):
+        self.vender('20.00')
+        self.vender('35.50', tipo_pago='TARJETA')
+        anulada = self.vender('10.00')
+        anulada.anular()
+        Devolucion.objects.create(
+            venta=anulada, usuario=self.usuario,
+            total_devuelto=Decimal('10.00'), total_nuevo=Decimal('4.00')
+        )
+
+        incremental = self.snapshot()
+        self.assertEqual(incremental['cantidad_ventas'], 2)
+        self.assertEqual(incremental['total_ventas'], Decimal('55.50'))
+        self.assertEqual(incremental['tarjeta'], Decimal('35.50'))
+        self.assertEqual(incremental['total_reembolsos'], Decimal('6.00'))
+
+        # La fila se actualiza en su lugar, no se borra y se vuelve a crear
+        hoy = timezone.localdate()
+        fila = ResumenVentaDiaria.objects.get(fecha=hoy).pk
+        ResumenVentasService.reconstruir(hoy, hoy)
+        self.assertEqual(self.snapshot(), incremental)
+        self.assertEqual(ResumenVentaDiaria.objects.get(fecha=hoy).pk, fila)
+
+    def test_una_fila_por_sucursal(self):
+        sucursal = Sucursal.objects.create(
+            codigo='CAYAMBE', nombre='Cayambe', nombre_corto='Cayambe', direccion='Av. Natalia Jarrín',
+            ciudad='Cayambe', provincia='Pichincha', fecha_apertura=datetime.date(2024, 1, 1),
+        )
+        self.vender('20.00')
+        self.usuario = Usuario.objects.create_user('cajero2', 'cajero2@example.com', 'testpass123',
+                                                   nombre='Caja', apellido='Dos', sucursal=sucursal)
+        self.vender('7.00')
+        self.vender('3.00', tipo_pago='TARJETA')
+
+        hoy = timezone.localdate()
+        filas = lambda: sorted(ResumenVentaDiaria.objects.filter(fecha=hoy).values_list(
+            'sucursal_id', 'cantidad_ventas', 'total_ventas', 'tarjeta'), key=lambda f: f[0] or 0)
+        incremental = filas()
+        self.assertEqual(incremental, [(None, 1, Decimal('20.00'), Decimal('0.00')),
+                                       (sucursal.id, 2, Decimal('10.00'), Decimal('3.00'))])
+        self.assertEqual(ResumenVentasService.reconstruir(hoy, hoy), 2)
+        self.assertEqual(filas(), incremental)
+
+
+    def test_desglose_productos_servicios_con_items_manuales(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        producto = Producto.objects.create(
+            categoria=CategoriaProducto.objects.create(nombre='Repuestos', codigo='REP',
+                                                       porcentaje_ganancia=Decimal('30.00')),
+            marca=Marca.objects.create(nombre='Genérica'), codigo_unico='REP-1', nombre='Repuesto',
+            precio_compra=Decimal('5.00'), precio_venta=Decimal('10.00'),
+        )
+        tipo = TipoServicio.objects.create(
+            categoria=CategoriaServicio.objects.create(nombre='Mecánica', codigo='MEC'),
+            nombre='Afinamiento', codigo='AFI', precio=Decimal('25.00'),
+        )
+        venta = Venta.objects.create(usuario=self.usuario, cliente=self.cliente, subtotal=0, iva=0,
+                                     total=0, tipo_pago='EFECTIVO')
+        for datos in [
+            {'producto': producto, 'precio_unitario': Decimal('10.00')},
+            {'nombre_personalizado': 'Mano de obra', 'es_servicio': True, 'precio_unitario': Decimal('7.00')},
+            {'tipo_servicio': tipo, 'es_servicio': True, 'precio_unitario': Decimal('25.00')},
+            # Servicio antiguo guardado sin es_servicio
+            {'servicio': tipo, 'precio_unitario': Decimal('4.00')},
+        ]:
+            DetalleVenta.objects.create(venta=venta, cantidad=1, **datos)
+        ResumenVentasService.registrar_venta(venta)
+
+        detalles = DetalleVenta.objects.filter(venta=venta)
+        crudo = {
+            'total_productos': sum(d.total for d in detalles.filter(producto__isnull=False)),
+            'total_servicios': sum(d.total for d in detalles.filter(servicio__isnull=False))
+            + sum(d.total for d in detalles.filter(es_servicio=True, tipo_servicio__isnull=False)),
+        }
+        # El ítem manual (7.00) no cuenta; el servicio antiguo lleva IVA al no ser es_servicio
+        self.assertEqual(crudo['total_servicios'], Decimal('29.60'))
+        self.assertEqual({campo: self.snapshot()[campo] for campo in crudo}, crudo)
+
+        hoy = timezone.localdate()
+        ResumenVentasService.reconstruir(hoy, hoy)
+        self.assertEqual({campo: self.snapshot()[campo] for campo in crudo}, crudo)
+
+
+class CierreDiarioTotalesTest(VentasPosMixin, TestCase):
+    """La agregación en una pasada debe dar lo mismo que el cálculo anterior, campo por campo"""
+
+    def test_coincide_con_calculo_anterior(self):
+        for precio, tipo_pago in [('20.00', 'EFECTIVO'), ('35.50', 'TARJETA'), ('12.25', 'TRANSFERENCIA'),
+                                  ('40.00', 'CREDITO'), ('8.00', 'CHEQUE'), ('15.00', 'EFECTIVO')]:
+            self.vender(precio, tipo_pago=tipo_pago)
+        # Un detalle como producto para cubrir los dos lados del desglose
+        DetalleVenta.objects.filter(venta__total=Decimal('35.50')).update(es_servicio=False)
+        anulada = self.vender('10.00')
+        anulada.anular()
+        Devolucion.objects.create(
+            venta=anulada, usuario=self.usuario,
+            total_devuelto=Decimal('10.00'), total_nuevo=Decimal('4.00')
+        )
+
+        hoy = timezone.localdate()
+        anterior = calcular_totales_anterior(hoy)
+        cierre = CierreDiario(fecha=hoy)
+        with CaptureQueriesContext(connection) as consultas:
+            cierre.calcular_totales()
+
+        self.assertEqual(len(consultas), 4)
+        self.assertEqual(cierre.cantidad_ventas, anterior['cantidad_ventas'])
+        self.assertEqual(cierre.total_iva_cobrado, anterior['iva'])
+        self.assertEqual(cierre.total_ventas_productos, anterior['productos'])
+        self.assertEqual(cierre.total_ventas_servicios, anterior['servicios'])
+        self.assertEqual(cierre.efectivo_ventas, anterior['EFECTIVO'])
+        self.assertEqual(cierre.tarjeta_ventas, anterior['TARJETA'])
+        self.assertEqual(cierre.transferencia_ventas, anterior['TRANSFERENCIA'])
+        self.assertEqual(cierre.credito_ventas, anterior['CREDITO'])
+        self.assertEqual(cierre.total_ventas_online, anterior['online'])
+        self.assertEqual(cierre.total_ordenes_taller, anterior['taller'])
+        self.assertEqual(cierre.total_ingresos, anterior['total'] + anterior['online'] + anterior['taller'])
+
+        # La venta anulada no cuenta y los valores no son triviales
+        self.assertEqual(cierre.cantidad_ventas, 6)
+        self.assertEqual(cierre.efectivo_ventas, Decimal('35.00'))
+        self.assertEqual(cierre.total_ventas_productos, Decimal('35.50'))
+
+
+class VentasEnFechaMixin:
+    """Ventas en días y horas concretos, con el resumen diario reconstruido"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'analista', 'analista@example.com', 'testpass123',
+            nombre='Ana', apellido='Lista'
+        )
+
+    def venta_en(self, fecha, hora, total):
+        venta = Venta.objects.create(
+            usuario=self.usuario, subtotal=total, iva=Decimal('0.00'),
+            tipo_pago='EFECTIVO', total=total
+        )
+        # fecha_hora es auto_now_add: se corrige después de crear y se rehace el resumen de ese día
+        Venta.objects.filter(pk=venta.pk).update(
+            fecha_hora=timezone.make_aware(datetime.datetime.combine(fecha, hora))
+        )
+        ResumenVentasService.reconstruir(fecha, fecha)
+
+
+class SerieVentasTest(VentasEnFechaMixin, TestCase):
+    """Series agrupadas en hora local y con periodos vacíos rellenados"""
+
+    def test_serie_diaria_rellena_huecos_en_hora_local(self):
+        lunes = datetime.date(2025, 3, 3)
+        # 23:30 en Guayaquil ya es el día siguiente en UTC
+        self.venta_en(lunes, datetime.time(23, 30), Decimal('40.00'))
+        self.venta_en(lunes + datetime.timedelta(days=2), datetime.time(9), Decimal('10.00'))
+
+        serie = SerieVentasService.serie(lunes, lunes + datetime.timedelta(days=6), 'dia')
+
+        self.assertEqual(len(serie), 7)
+        self.assertEqual(serie[0]['total'], Decimal('40.00'))
+        self.assertEqual(serie[0]['periodo'], 'Lun')
+        self.assertEqual(serie[1]['cantidad'], 0)
+        self.assertEqual(serie[2]['total'], Decimal('10.00'))
+
+    def test_serie_mensual_de_un_anio(self):
+        self.venta_en(datetime.date(2025, 1, 31), datetime.time(22), Decimal('5.00'))
+        self.venta_en(datetime.date(2025, 12, 1), datetime.time(8), Decimal('7.00'))
+
+        serie = SerieVentasService.serie(datetime.date(2025, 1, 15), datetime.date(2025, 12, 31), 'mes')
+
+        self.assertEqual(len(serie), 12)
+        self.assertEqual(serie[0]['fecha'], datetime.date(2025, 1, 1))
+        self.assertEqual(serie[0]['total'], Decimal('5.00'))
+        self.assertEqual(serie[-1]['periodo'], 'Dic 2025')
+        self.assertEqual(serie[-1]['total'], Decimal('7.00'))
+
+
+class ResumenMensualTest(VentasEnFechaMixin, TestCase):
+    """El resumen mensual usa la misma base (días cerrados) para ventas y promedios"""
+
+    def test_solo_dias_cerrados(self):
+        cerrado, abierto = datetime.date(2025, 3, 3), datetime.date(2025, 3, 4)
+        self.venta_en(cerrado, datetime.time(10), Decimal('40.00'))
+        self.venta_en(abierto, datetime.time(10), Decimal('25.00'))
+        CierreDiario.objects.create(fecha=cerrado, estado='CERRADO', usuario_cierre=self.usuario,
+                                    total_ventas_online=Decimal('5.00'))
+        CierreDiario.objects.create(fecha=abierto, usuario_cierre=self.usuario)
+
+        resumen = ResumenMensual(año=2025, mes=3)
+        resumen.calcular_resumen()
+
+        # Ventas y divisor sobre la misma base: el día abierto no cuenta en ninguno
+        self.assertEqual((resumen.cantidad_ventas, resumen.dias_operacion), (1, 1))
+        self.assertEqual(resumen.total_ventas, Decimal('45.00'))
+        self.assertEqual(resumen.promedio_venta_dia, Decimal('45.00'))
+
+
+class DashboardCacheTest(TestCase):
+    """Los payloads se sirven desde caché hasta que una venta los invalida"""
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            'gerente', 'gerente@example.com', 'testpass123',
+            nombre='Ge', apellido='Rente'
+        )
+        self.calculos = 0
+
+    def calcular(self):
+        self.calculos += 1
+        return {'ventas': Venta.objects.filter(estado='COMPLETADA').count()}
+
+    def test_hit_miss_e_invalidacion_por_senal(self):
+        hoy = timezone.localdate()
+        self.assertEqual(DashboardCacheService.obtener('stats', self.calcular, hoy), {'ventas': 0})
+        DashboardCacheService.obtener('stats', self.calcular, hoy)
+        self.assertEqual(self.calculos, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Venta.objects.create(
+                usuario=self.usuario, subtotal=Decimal('5.00'), iva=Decimal('0.00'),
+                tipo_pago='EFECTIVO', total=Decimal('5.00')
+            )
+
+        self.assertEqual(DashboardCacheService.obtener('stats', self.calcular, hoy), {'ventas': 1})
+        self.assertEqual(self.calculos, 2)
+
+        estadisticas = DashboardCacheService.estadisticas()['stats']
+        self.assertEqual(estadisticas['hits'], 1)
+        self.assertEqual(estadisticas['misses'], 2)
+
+
+class EventosDashboardTest(VentasPosMixin, TestCase):
+    """Las ventas publican sus deltas al dashboard solo al confirmarse"""
+
+    def test_venta_publica_deltas_de_ventas_y_caja(self):
+        layer = get_channel_layer()
+        canales = {}
+        for nombre, grupo in [('todas', EventosDashboardService.grupo()),
+                              ('propia', EventosDashboardService.grupo_sucursal(None)),
+                              ('otra', EventosDashboardService.grupo_sucursal(999))]:
+            canales[nombre] = async_to_sync(layer.new_channel)()
+            async_to_sync(layer.group_add)(grupo, canales[nombre])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vender('20.00')
+
+        for nombre in ('todas', 'propia'):
+            mensajes = {}
+            for _ in range(2):
+                mensaje = async_to_sync(layer.receive)(canales[nombre])
+                mensajes[mensaje['canal']] = mensaje['data']
+
+            self.assertEqual(mensajes['ventas']['cantidad_ventas'], 1)
+            self.assertEqual(mensajes['ventas']['total_ventas'], 20.0)
+            self.assertEqual(mensajes['ventas']['sucursal_id'], None)
+            self.assertEqual(mensajes['caja']['efectivo'], 20.0)
+
+        # El dashboard de otra sucursal no recibe la venta
+        with self.assertRaises(asyncio.TimeoutError):
+            async_to_sync(asyncio.wait_for)(layer.receive(canales['otra']), 0.1)
+
+    async def conversar(self):
+        socket = WebsocketCommunicator(DashboardConsumer.as_asgi(), '/ws/dashboard/')
+        socket.scope['user'] = self.usuario
+        await socket.connect()
+        await socket.receive_json_from()
+        capa = get_channel_layer()
+        recibidos = []
+        for grupo in (EventosDashboardService.grupo_sucursal(999), EventosDashboardService.grupo(),
+                      EventosDashboardService.grupo_sucursal(None)):
+            await capa.group_send(grupo, {'type': 'dashboard_delta', 'canal': 'ventas', 'data': {'grupo': grupo}})
+            if not await socket.receive_nothing():
+                recibidos.append((await socket.receive_json_from())['data']['grupo'])
+        await socket.disconnect()
+        return recibidos
+
+    def test_socket_del_cajero_solo_recibe_su_sucursal(self):
+        self.assertFalse(self.usuario.es_admin_general)
+        self.assertEqual(async_to_sync(self.conversar)(), [EventosDashboardService.grupo_sucursal(None)])
@@ -47,6 +47,7 @@ urlpatterns = [
     # ── APIs JSON ─────────────────────────────────────────────────
     path('api/dashboard-data/', views.api_dashboard_data, name='api_dashboard_data'),
     path('api/caja-status/', views.api_caja_status, name='api_caja_status'),
+    path('api/cache-dashboard/', views.api_cache_dashboard, name='api_cache_dashboard'),
 
     # ── Exportar ──────────────────────────────────────────────────
     path('exportar/', views.exportar_reporte, name='exportar_reporte'),
@@ -22,6 +22,9 @@ from .forms import (
     CategoriaGastoForm, FiltroReporteProductosForm
 )
 from ventas.models import Venta, DetalleVenta
+from .services.cache_dashboard import DashboardCacheService
+from .services.resumen_ventas import ResumenVentasService
+from .services.series_ventas import SerieVentasService
 
 try:
     from taller.models import OrdenTrabajo, ServicioOrden, Tecnico, TipoServicio
@@ -58,12 +61,18 @@ def _rango_periodo(tipo, fecha_ref=None):
 
 
 def _ventas_pos(fecha_inicio, fecha_fin):
+    """Ventas POS del rango, para listados y desgloses; los totales salen de _resumen_pos"""
     return Venta.objects.filter(
         fecha_hora__date__range=[fecha_inicio, fecha_fin],
         estado='COMPLETADA'
     )
 
 
+def _resumen_pos(fecha_inicio, fecha_fin):
+    """Totales POS del rango desde ResumenVentaDiaria, sin recorrer las ventas"""
+    return ResumenVentasService.totales(fecha_inicio, fecha_fin)
+
+
 def _pedidos_online(fecha_inicio, fecha_fin):
     if not ONLINE_DISPONIBLE:
         return PedidoOnline.objects.none() if ONLINE_DISPONIBLE else []
@@ -92,8 +101,8 @@ def dashboard_reportes(request):
     cierre_hoy = CierreDiario.get_o_crear_hoy(request.user)
 
     # ── Hoy ───────────────────────────────────────────────────────
-    ventas_pos_hoy = _ventas_pos(hoy, hoy)
-    total_pos_hoy = ventas_pos_hoy.aggregate(t=Sum('total'))['t'] or Decimal('0')
+    resumen_hoy = _resumen_pos(hoy, hoy)
+    total_pos_hoy = resumen_hoy['total_ventas']
 
     total_online_hoy = Decimal('0')
     if ONLINE_DISPONIBLE:
@@ -118,18 +127,18 @@ def dashboard_reportes(request):
         'total_taller': total_taller_hoy,
         'total_ingresos': total_pos_hoy + total_online_hoy + total_taller_hoy,
         'total_gastos': total_gastos_hoy,
-        'cantidad_ventas': ventas_pos_hoy.count(),
-        'efectivo': ventas_pos_hoy.filter(tipo_pago='EFECTIVO').aggregate(t=Sum('total'))['t'] or Decimal('0'),
-        'tarjeta': ventas_pos_hoy.filter(tipo_pago='TARJETA').aggregate(t=Sum('total'))['t'] or Decimal('0'),
-        'transferencia': ventas_pos_hoy.filter(tipo_pago='TRANSFERENCIA').aggregate(t=Sum('total'))['t'] or Decimal('0'),
+        'cantidad_ventas': resumen_hoy['cantidad_ventas'],
+        'efectivo': resumen_hoy['efectivo'],
+        'tarjeta': resumen_hoy['tarjeta'],
+        'transferencia': resumen_hoy['transferencia'],
     }
 
     # ── Semana ────────────────────────────────────────────────────
     inicio_sem, fin_sem = _rango_periodo('semana', hoy)
-    ventas_sem = _ventas_pos(inicio_sem, fin_sem)
+    resumen_sem = _resumen_pos(inicio_sem, fin_sem)
     stats_semana = {
-        'total_ventas': ventas_sem.aggregate(t=Sum('total'))['t'] or Decimal('0'),
-        'cantidad_ventas': ventas_sem.count(),
+        'total_ventas': resumen_sem['total_ventas'],
+        'cantidad_ventas': resumen_sem['cantidad_ventas'],
         'total_gastos': GastoDiario.objects.filter(
             fecha__range=[inicio_sem, fin_sem], aprobado=True
         ).aggregate(t=Sum('monto'))['t'] or Decimal('0'),
@@ -137,20 +146,18 @@ def dashboard_reportes(request):
 
     # ── Mes ───────────────────────────────────────────────────────
     inicio_mes, fin_mes = _rango_periodo('mes', hoy)
-    ventas_mes = _ventas_pos(inicio_mes, fin_mes)
+    resumen_mes = _resumen_pos(inicio_mes, fin_mes)
     stats_mes = {
-        'total_ventas': ventas_mes.aggregate(t=Sum('total'))['t'] or Decimal('0'),
-        'cantidad_ventas': ventas_mes.count(),
+        'total_ventas': resumen_mes['total_ventas'],
+        'cantidad_ventas': resumen_mes['cantidad_ventas'],
         'total_gastos': GastoDiario.objects.filter(
             fecha__range=[inicio_mes, fin_mes], aprobado=True
         ).aggregate(t=Sum('monto'))['t'] or Decimal('0'),
     }
 
     # ── Top 5 días con más ventas del mes ─────────────────────────
-    top_dias = ventas_mes.extra(
-        select={'dia': 'DATE(fecha_hora)'}
-    ).values('dia').annotate(
-        total_dia=Sum('total'), cantidad=Count('id')
+    top_dias = ResumenVentasService.por_dia(inicio_mes, fin_mes).annotate(
+        total_dia=F('total')
     ).order_by('-total_dia')[:5]
 
     # ── Gastos pendientes ─────────────────────────────────────────
@@ -200,23 +207,15 @@ def reporte_ventas_completo(request):
 
     # ── Ventas POS ────────────────────────────────────────────────
     ventas_pos = _ventas_pos(fecha_inicio, fecha_fin)
-    aggs_pos = ventas_pos.aggregate(
-        total_suma=Sum('total'),
-        subtotal_suma=Sum('subtotal'),
-        iva_suma=Sum('iva'),
-        cantidad_suma=Count('id'),
-        efectivo_suma=Sum('total', filter=Q(tipo_pago='EFECTIVO')),
-        tarjeta_suma=Sum('total', filter=Q(tipo_pago='TARJETA')),
-        transferencia_suma=Sum('total', filter=Q(tipo_pago='TRANSFERENCIA')),
-    )
+    resumen_pos = _resumen_pos(fecha_inicio, fecha_fin)
     stats_pos = {
-        'total': aggs_pos['total_suma'],
-        'subtotal': aggs_pos['subtotal_suma'],
-        'iva': aggs_pos['iva_suma'],
-        'cantidad': aggs_pos['cantidad_suma'],
-        'efectivo': aggs_pos['efectivo_suma'],
-        'tarjeta': aggs_pos['tarjeta_suma'],
-        'transferencia': aggs_pos['transferencia_suma'],
+        'total': resumen_pos['total_ventas'],
+        'subtotal': resumen_pos['subtotal'],
+        'iva': resumen_pos['iva'],
+        'cantidad': resumen_pos['cantidad_ventas'],
+        'efectivo': resumen_pos['efectivo'],
+        'tarjeta': resumen_pos['tarjeta'],
+        'transferencia': resumen_pos['transferencia'],
     }
 
     detalles_productos = DetalleVenta.objects.filter(
@@ -263,11 +262,7 @@ def reporte_ventas_completo(request):
     )
 
     # ── Ventas POS por día (para gráfico) ─────────────────────────
-    ventas_por_dia = ventas_pos.extra(
-        select={'dia': 'DATE(fecha_hora)'}
-    ).values('dia').annotate(
-        total=Sum('total'), cantidad=Count('id')
-    ).order_by('dia')
+    ventas_por_dia = ResumenVentasService.por_dia(fecha_inicio, fecha_fin)
 
     # ── Top productos vendidos ────────────────────────────────────
     top_productos = DetalleVenta.objects.filter(
@@ -1049,10 +1044,11 @@ def estadisticas_ventas(request):
             pass
 
     ventas = _ventas_pos(fecha_inicio, fecha_fin)
+    resumen = _resumen_pos(fecha_inicio, fecha_fin)
 
     stats = {
-        'total_ventas': ventas.aggregate(t=Sum('total'))['t'] or Decimal('0'),
-        'cantidad_ventas': ventas.count(),
+        'total_ventas': resumen['total_ventas'],
+        'cantidad_ventas': resumen['cantidad_ventas'],
         'promedio_venta': Decimal('0'),
         'venta_mayor': ventas.aggregate(m=Sum('total'))['m'] or Decimal('0'),
     }
@@ -1063,17 +1059,29 @@ def estadisticas_ventas(request):
         total=Sum('total'), cantidad=Count('id')
     ).order_by('-total')
 
-    ventas_por_dia = ventas.extra(
-        select={'dia': 'DATE(fecha_hora)'}
-    ).values('dia').annotate(
-        total=Sum('total'), cantidad=Count('id')
-    ).order_by('dia')
+    serie_diaria = SerieVentasService.serie(fecha_inicio, fecha_fin, 'dia')
+    ventas_por_dia = [
+        {'dia': punto['fecha'], 'total': punto['total'], 'cantidad': punto['cantidad']}
+        for punto in serie_diaria
+    ]
+
+    agrupacion = request.GET.get('agrupacion', 'dia')
+    if agrupacion not in ('dia', 'semana', 'mes'):
+        agrupacion = 'dia'
+    if agrupacion == 'dia':
+        ventas_agrupadas = [
+            dict(punto, periodo=punto['fecha'].strftime('%d/%m')) for punto in serie_diaria
+        ]
+    else:
+        ventas_agrupadas = SerieVentasService.serie(fecha_inicio, fecha_fin, agrupacion)
 
     context = {
         'active_page': 'reportes',
         'stats': stats,
         'ventas_por_metodo': ventas_por_metodo,
-        'ventas_por_dia': list(ventas_por_dia),
+        'ventas_por_dia': ventas_por_dia,
+        'ventas_agrupadas': ventas_agrupadas,
+        'agrupacion': agrupacion,
         'fecha_inicio': fecha_inicio,
         'fecha_fin': fecha_fin,
     }
@@ -1193,16 +1201,13 @@ def api_crear_categoria_gasto(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
-@login_required
-def api_dashboard_data(request):
+def calcular_dashboard_data():
+    """Gráficos del dashboard de reportes (payload cacheable)"""
     hoy = timezone.localdate()
-    ventas_7_dias = []
-    for i in range(6, -1, -1):
-        fecha = hoy - timedelta(days=i)
-        total = Venta.objects.filter(
-            fecha_hora__date=fecha, estado='COMPLETADA'
-        ).aggregate(t=Sum('total'))['t'] or Decimal('0')
-        ventas_7_dias.append({'fecha': fecha.strftime('%d/%m'), 'total': float(total)})
+    ventas_7_dias = [
+        {'fecha': punto['fecha'].strftime('%d/%m'), 'total': float(punto['total'])}
+        for punto in SerieVentasService.serie(hoy - timedelta(days=6), hoy, 'dia')
+    ]
 
     inicio_mes, fin_mes = _rango_periodo('mes', hoy)
     productos_mes = DetalleVenta.objects.filter(
@@ -1215,30 +1220,57 @@ def api_dashboard_data(request):
         venta__estado='COMPLETADA', es_servicio=True
     ).aggregate(t=Sum('subtotal'))['t'] or Decimal('0')
 
-    return JsonResponse({
+    return {
         'ventas_7_dias': ventas_7_dias,
         'productos_vs_servicios': {
             'productos': float(productos_mes),
             'servicios': float(servicios_mes),
         }
-    })
+    }
 
 
 @login_required
-def api_caja_status(request):
-    hoy = timezone.localdate()
+def api_dashboard_data(request):
+    return JsonResponse(DashboardCacheService.obtener(
+        'dashboard_data', calcular_dashboard_data, timezone.localdate()
+    ))
+
+
+def calcular_caja_status(hoy):
     try:
         cierre = CierreDiario.objects.get(fecha=hoy)
-        return JsonResponse({
+        return {
             'existe': True,
             'estado': cierre.estado,
             'total_ingresos': float(cierre.total_ingresos),
             'total_gastos': float(cierre.total_egresos),
             'saldo_final': float(cierre.saldo_final),
             'puede_cerrar': cierre.estado == 'ABIERTO',
-        })
+        }
     except CierreDiario.DoesNotExist:
-        return JsonResponse({'existe': False, 'puede_cerrar': False})
+        return {'existe': False, 'puede_cerrar': False}
+
+
+@login_required
+def api_caja_status(request):
+    hoy = timezone.localdate()
+    return JsonResponse(DashboardCacheService.obtener(
+        'caja_status', lambda: calcular_caja_status(hoy), hoy
+    ))
+
+
+@login_required
+def api_cache_dashboard(request):
+    """Contadores hit/miss de la caché del dashboard (solo superusuarios)"""
+    if not request.user.is_superuser:
+        return JsonResponse({'success': False, 'error': 'Sin permisos'}, status=403)
+    if request.method == 'POST' and request.POST.get('reiniciar'):
+        DashboardCacheService.reiniciar_estadisticas()
+    return JsonResponse({
+        'success': True,
+        'version': DashboardCacheService.version(),
+        'estadisticas': DashboardCacheService.estadisticas(),
+    })
 
 
 @login_required
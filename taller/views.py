@@ -34,6 +34,7 @@ from .forms import (
 )
 from clientes.models import Cliente, Moto
 from inventario.models import Producto
+from inventario.services.busqueda_productos import BusquedaProductosService
 
 # ================== HELPERS ==================
 
@@ -1572,26 +1573,21 @@ def buscar_producto_ajax(request):
     if len(query) < 2:
         return JsonResponse([], safe=False)
     
-    # Buscar productos por código, nombre o descripción
-    productos = Producto.objects.filter(
-        Q(codigo__icontains=query) |
-        Q(nombre__icontains=query) |
-        Q(descripcion__icontains=query)
-    ).filter(
-        activo=True,
-        stock_actual__gt=0  # Solo productos con stock
+    # Buscar productos por código, nombre o descripción (solo con stock)
+    productos = BusquedaProductosService.buscar(
+        query, Producto.objects.filter(activo=True, stock_actual__gt=0)
     )[:10]
     
     data = []
     for producto in productos:
         data.append({
             'id': producto.id,
-            'codigo': producto.codigo,
+            'codigo': producto.codigo_unico,
             'nombre': producto.nombre,
             'descripcion': producto.descripcion or '',
             'precio_venta': float(producto.precio_venta),
             'stock_actual': producto.stock_actual,
-            'text': f"{producto.codigo} - {producto.nombre} (Stock: {producto.stock_actual})"
+            'text': f"{producto.codigo_unico} - {producto.nombre} (Stock: {producto.stock_actual})"
         })
     
     return JsonResponse(data, safe=False)
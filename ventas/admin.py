@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Venta, DetalleVenta, CierreCaja
+from .models import Venta, DetalleVenta, CierreCaja, SecuenciaFactura, BloqueNumeracion
 
 class DetalleVentaInline(admin.TabularInline):
     model = DetalleVenta
@@ -37,4 +37,15 @@ class CierreCajaAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if not change:  # Si es un nuevo objeto
             obj.usuario = request.user
-        super().save_model(request, obj, form, change)
\ No newline at end of file
+        super().save_model(request, obj, form, change)
+
+@admin.register(SecuenciaFactura)
+class SecuenciaFacturaAdmin(admin.ModelAdmin):
+    list_display = ('serie', 'ultimo_numero', 'fecha_actualizacion')
+    readonly_fields = ('fecha_actualizacion',)
+
+@admin.register(BloqueNumeracion)
+class BloqueNumeracionAdmin(admin.ModelAdmin):
+    list_display = ('serie', 'terminal', 'inicio', 'fin', 'siguiente', 'fecha_reserva')
+    list_filter = ('serie', 'terminal')
+    readonly_fields = ('fecha_reserva',)
@@ -54,6 +54,13 @@ class VentasConsumer(AsyncWebsocketConsumer):
             'data': event['data']
         }))
 
+    async def print_jobs_batch(self, event):
+        """Notifica varios cambios de la cola en un solo mensaje (reserva en bloque del agente)"""
+        await self.send(text_data=json.dumps({
+            'type': 'print_jobs_batch',
+            'data': event['data']
+        }))
+
     async def printer_status_update(self, event):
         """Notifica cambios en el estado de una impresora"""
         await self.send(text_data=json.dumps({
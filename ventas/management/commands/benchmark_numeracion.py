@@ -0,0 +1,79 @@
+"""
+Benchmark de concurrencia para la numeración de facturas.
+
+Lanza N ventas simuladas en paralelo (hilos con su propia conexión) que
+piden número dentro de una transacción y la mantienen abierta unos
+milisegundos, como hace el checkout real. Verifica que no haya números
+duplicados y reporta el throughput con contador global vs. bloques por terminal.
+
+Uso:
+    python manage.py benchmark_numeracion --ventas 500 --hilos 16 --latencia-ms 20
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from ventas.models import SecuenciaFactura, BloqueNumeracion
+from ventas.services.numeracion_service import NumeracionFacturaService
+
+SERIE_BENCH = 'BENCH'
+
+
+class Command(BaseCommand):
+    help = 'Mide la asignación concurrente de números de factura (no toca la serie FAC)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ventas', type=int, default=200, help='Ventas simuladas por escenario')
+        parser.add_argument('--hilos', type=int, default=8, help='Cajas en paralelo')
+        parser.add_argument('--latencia-ms', type=int, default=10,
+                            help='Tiempo que la venta mantiene la transacción abierta')
+        parser.add_argument('--tamano-bloque', type=int, default=50)
+
+    def handle(self, *args, **options):
+        self._limpiar()
+        try:
+            for modo in ('global', 'bloques'):
+                self._escenario(modo, options)
+        finally:
+            self._limpiar()
+
+    def _limpiar(self):
+        SecuenciaFactura.objects.filter(serie=SERIE_BENCH).delete()
+        BloqueNumeracion.objects.filter(serie=SERIE_BENCH).delete()
+
+    def _escenario(self, modo, options):
+        ventas = options['ventas']
+        hilos = options['hilos']
+        latencia = options['latencia_ms'] / 1000.0
+        tamano_bloque = options['tamano_bloque']
+
+        def vender(indice):
+            terminal = f"CAJA-{indice % hilos:02d}" if modo == 'bloques' else None
+            try:
+                with transaction.atomic():
+                    numero = NumeracionFacturaService.siguiente_numero(
+                        serie=SERIE_BENCH, terminal=terminal, tamano_bloque=tamano_bloque
+                    )
+                    # Simula el resto de la venta (detalles, stock) con la transacción abierta
+                    time.sleep(latencia)
+                return numero
+            finally:
+                connection.close()
+
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=hilos) as executor:
+            numeros = list(executor.map(vender, range(ventas)))
+        duracion = time.perf_counter() - inicio
+
+        duplicados = len(numeros) - len(set(numeros))
+        self.stdout.write(
+            f"[{modo}] {ventas} ventas, {hilos} hilos: {duracion:.2f}s "
+            f"({ventas / duracion:.1f} ventas/s), duplicados: {duplicados}"
+        )
+        if duplicados:
+            self.stdout.write(self.style.ERROR('Se detectaron números duplicados'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Sin duplicados'))
+        self._limpiar()
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0006_detalleventa_descuento_porcentaje'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SecuenciaFactura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=10, unique=True)),
+                ('ultimo_numero', models.PositiveIntegerField(default=0)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Secuencia de Facturas',
+                'verbose_name_plural': 'Secuencias de Facturas',
+            },
+        ),
+        migrations.CreateModel(
+            name='BloqueNumeracion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('serie', models.CharField(max_length=10)),
+                ('terminal', models.CharField(max_length=50)),
+                ('inicio', models.PositiveIntegerField()),
+                ('fin', models.PositiveIntegerField()),
+                ('siguiente', models.PositiveIntegerField()),
+                ('fecha_reserva', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Bloque de Numeración',
+                'verbose_name_plural': 'Bloques de Numeración',
+                'ordering': ['serie', 'inicio'],
+                'indexes': [models.Index(fields=['serie', 'terminal'], name='ventas_bloq_serie_b46412_idx')],
+            },
+        ),
+    ]
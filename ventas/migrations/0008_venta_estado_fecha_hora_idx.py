@@ -0,0 +1,17 @@
+# Generated by Django 5.2.1 on 2026-10-17 04:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ventas', '0007_secuenciafactura_bloquenumeracion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venta',
+            index=models.Index(fields=['estado', 'fecha_hora'], name='ventas_vent_estado_d69a9d_idx'),
+        ),
+    ]
@@ -1,6 +1,6 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Sum, F, ExpressionWrapper, DecimalField
 from django.conf import settings
 from django.utils import timezone
@@ -54,6 +54,9 @@ class Venta(models.Model):
         verbose_name = _('Venta')
         verbose_name_plural = _('Ventas')
         ordering = ['-fecha_hora']
+        indexes = [
+            models.Index(fields=['estado', 'fecha_hora']),
+        ]
     
     def __str__(self):
         return f"Factura #{self.numero_factura}"
@@ -68,8 +71,9 @@ class Venta(models.Model):
         
         super().save(*args, **kwargs)
     
+    @transaction.atomic
     def anular(self):
-        """Anula la venta y revierte el inventario"""
+        """Anula la venta, revierte el inventario y la descuenta del resumen diario"""
         if self.estado == 'COMPLETADA':
             # Revertir inventario
             for detalle in self.detalleventa_set.filter(producto__isnull=False):
@@ -81,6 +85,9 @@ class Venta(models.Model):
             # Cambiar estado de la venta
             self.estado = 'ANULADA'
             self.save()
+            
+            from reportes.services.resumen_ventas import ResumenVentasService
+            ResumenVentasService.registrar_anulacion(self)
             return True
         return False
     
@@ -125,77 +132,37 @@ class Venta(models.Model):
         )['res'] or Decimal('0.00')
     
     @staticmethod
-    def generar_numero_factura():
-        """Genera un número único de factura"""
-        ultimo_num = Venta.objects.order_by('-id').first()
-        
-        if ultimo_num:
-            try:
-                # Extraer el número y aumentarlo en 1
-                numero = int(ultimo_num.numero_factura.split('-')[1])
-                nuevo_numero = numero + 1
-            except (ValueError, IndexError):
-                # Si hay error, generar un nuevo número
-                nuevo_numero = 1
-        else:
-            nuevo_numero = 1
-            
-        # Formatear con ceros a la izquierda (ej. FAC-000001)
-        return f"FAC-{nuevo_numero:06d}"
+    def generar_numero_factura(terminal=None):
+        """
+        Genera un número único de factura (ej. FAC-000001) desde el contador
+        atómico SecuenciaFactura. Con terminal se usa el bloque reservado
+        para esa caja y no se toca la fila global del contador.
+        """
+        from .services.numeracion_service import NumeracionFacturaService
+        return NumeracionFacturaService.siguiente_numero(terminal=terminal)
     
     @staticmethod
     def get_ventas_por_dia(fecha=None):
-        """Obtiene el total de ventas por día, incluyendo impacto de devoluciones"""
-        from datetime import datetime, time
+        """
+        Obtiene el total de ventas por día, incluyendo impacto de devoluciones.
+        Lee las filas del día en ResumenVentaDiaria (una por sucursal) con una
+        sola consulta, sin importar cuántas ventas tenga el día.
+        """
+        from reportes.services.resumen_ventas import ResumenVentasService
         if fecha is None:
             fecha = timezone.localdate()
-            
-        # Filtrar ventas por fecha (usando rangos para evitar problemas de tz locales en DB)
-        start_dt = timezone.make_aware(datetime.combine(fecha, time.min))
-        end_dt = timezone.make_aware(datetime.combine(fecha, time.max))
-        
-        ventas = Venta.objects.filter(
-            fecha_hora__range=(start_dt, end_dt),
-            estado='COMPLETADA'
-        )
-        
-        # Calcular totales
-        total_productos = sum(
-            detalle.total for venta in ventas 
-            for detalle in venta.detalleventa_set.filter(producto__isnull=False)
-        )
-        
-        total_servicios = sum(
-            detalle.total for venta in ventas 
-            for detalle in venta.detalleventa_set.filter(servicio__isnull=False)
-        )
-        
-        # Incluir servicios nuevos (es_servicio=True)
-        total_servicios_nuevos = sum(
-            detalle.total for venta in ventas 
-            for detalle in venta.detalleventa_set.filter(es_servicio=True, tipo_servicio__isnull=False)
-        )
-        total_servicios += total_servicios_nuevos
-        
-        total_ventas = sum(venta.total for venta in ventas)
-        
-        # Devoluciones del día
-        from django.apps import apps
-        Devolucion = apps.get_model('ventas', 'Devolucion')
-        devoluciones = Devolucion.objects.filter(
-            fecha_hora__range=(start_dt, end_dt),
-            estado='COMPLETADA'
-        )
-        
-        total_reembolsos = sum(abs(d.diferencia) for d in devoluciones if d.diferencia < 0)
-        total_ingresos_extra = sum(d.diferencia for d in devoluciones if d.diferencia > 0)
+
+        resumen = ResumenVentasService.totales(fecha, fecha)
+        total_ventas = resumen['total_ventas']
+        total_reembolsos = resumen['total_reembolsos']
+        total_ingresos_extra = resumen['total_ingresos_extra']
         
         return {
             'fecha': fecha,
-            'total_productos': total_productos,
-            'total_servicios': total_servicios,
+            'total_productos': resumen['total_productos'],
+            'total_servicios': resumen['total_servicios'],
             'total_ventas': total_ventas,
-            'num_ventas': ventas.count(),
+            'num_ventas': resumen['cantidad_ventas'],
             'total_reembolsos': total_reembolsos,
             'total_ingresos_extra': total_ingresos_extra,
             'ventas_netas': total_ventas + total_ingresos_extra - total_reembolsos
@@ -203,6 +170,48 @@ class Venta(models.Model):
 
     
 
+class SecuenciaFactura(models.Model):
+    """Contador de numeración de facturas (una fila por serie, ej. FAC)"""
+    serie = models.CharField(max_length=10, unique=True)
+    ultimo_numero = models.PositiveIntegerField(default=0)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Secuencia de Facturas')
+        verbose_name_plural = _('Secuencias de Facturas')
+    
+    def __str__(self):
+        return f"{self.serie}: {self.ultimo_numero}"
+
+
+class BloqueNumeracion(models.Model):
+    """
+    Rango de números de factura reservado para una terminal POS.
+    La terminal consume su bloque sin bloquear la fila global de SecuenciaFactura.
+    """
+    serie = models.CharField(max_length=10)
+    terminal = models.CharField(max_length=50)
+    inicio = models.PositiveIntegerField()
+    fin = models.PositiveIntegerField()
+    siguiente = models.PositiveIntegerField()
+    fecha_reserva = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('Bloque de Numeración')
+        verbose_name_plural = _('Bloques de Numeración')
+        ordering = ['serie', 'inicio']
+        indexes = [
+            models.Index(fields=['serie', 'terminal']),
+        ]
+    
+    def __str__(self):
+        return f"{self.serie} {self.terminal}: {self.inicio}-{self.fin} (siguiente {self.siguiente})"
+    
+    @property
+    def agotado(self):
+        return self.siguiente > self.fin
+
+
 class DetalleVenta(models.Model):
     """Detalle de los productos o servicios vendidos"""
     venta = models.ForeignKey(Venta, on_delete=models.CASCADE)
@@ -265,6 +274,14 @@ class DetalleVenta(models.Model):
         return f"Detalle {self.id}"
     
     def save(self, *args, **kwargs):
+        self.calcular_importes()
+        super().save(*args, **kwargs)
+    
+    def calcular_importes(self):
+        """
+        Calcula subtotal, IVA y total de la línea.
+        Se usa desde save() y antes de bulk_create (que no llama a save()).
+        """
         # Calcular subtotal
         self.subtotal = self.cantidad * self.precio_unitario
         
@@ -292,8 +309,6 @@ class DetalleVenta(models.Model):
                 self.iva = self.subtotal * (self.iva_porcentaje / 100)
             
             self.total = self.subtotal + self.iva - self.descuento
-        
-        super().save(*args, **kwargs)
     
     def get_nombre_item(self):
         """Devuelve el nombre del producto o servicio"""
@@ -444,3 +459,4 @@ class DetalleDevolucion(models.Model):
     def save(self, *args, **kwargs):
         self.subtotal = self.cantidad * self.precio_unitario
         super().save(*args, **kwargs)
+
@@ -0,0 +1,227 @@
+"""
+Service layer para el checkout del POS
+Procesa el carrito completo con un número fijo de consultas:
+bloqueo de productos en una sola consulta, detalles con bulk_create
+y descuento de stock con un único UPDATE basado en F()
+"""
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import transaction, models
+from django.db.models import Case, When, F
+from django.utils import timezone
+
+from inventario.models import Producto, MovimientoInventario
+from inventario.services.lookup_codigos import CodigoProductoService
+from reportes.services.eventos_dashboard import EventosDashboardService
+from reportes.services.resumen_ventas import ResumenVentasService
+from taller.models import TipoServicio, Tecnico
+from ventas.models import Venta, DetalleVenta
+
+
+def _decimal(valor, default='0.00'):
+    """Convierte valores del JSON del POS a Decimal sin pasar por float"""
+    if valor is None or valor == '':
+        valor = default
+    return Decimal(str(valor))
+
+
+class CheckoutService:
+    """Servicio para procesar ventas del POS en bloque"""
+
+    @staticmethod
+    def agrupar_cantidades_productos(items):
+        """
+        Suma las cantidades por producto (un mismo producto puede venir
+        en varias líneas del carrito)
+        """
+        cantidades = OrderedDict()
+        for item in items:
+            if item.get('type') != 'product':
+                continue
+            producto_id = int(item['id'])
+            cantidades[producto_id] = cantidades.get(producto_id, Decimal('0')) + _decimal(item['quantity'])
+        return cantidades
+
+    @staticmethod
+    def bloquear_productos(producto_ids):
+        """
+        Carga y bloquea (SELECT ... FOR UPDATE) todos los productos del carrito
+        en una sola consulta. Se ordena por id para que dos cajas que venden
+        los mismos productos tomen los bloqueos en el mismo orden.
+        """
+        if not producto_ids:
+            return {}
+        productos = Producto.objects.select_for_update().filter(
+            id__in=producto_ids
+        ).order_by('id')
+        return {producto.id: producto for producto in productos}
+
+    @staticmethod
+    def validar_stock(productos, cantidades):
+        """
+        Valida en memoria que existan todos los productos y que el stock
+        alcance. Devuelve la lista de errores (vacía si todo está bien).
+        """
+        errores = []
+        for producto_id, cantidad in cantidades.items():
+            producto = productos.get(producto_id)
+            if producto is None:
+                errores.append(f'Producto ID {producto_id} no encontrado')
+            elif producto.stock_actual < cantidad:
+                errores.append(
+                    f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}'
+                )
+        return errores
+
+    @staticmethod
+    def construir_detalles(venta, items, productos, servicios, tecnicos):
+        """Construye (sin guardar) las líneas DetalleVenta del carrito"""
+        detalles = []
+        for item in items:
+            tipo = item.get('type')
+            descuento = _decimal(item.get('discount'))
+            cantidad = _decimal(item['quantity'])
+            precio_unitario = _decimal(item['unit_price'])
+
+            if tipo == 'product':
+                producto = productos[int(item['id'])]
+                detalle = DetalleVenta(
+                    venta=venta,
+                    producto=producto,
+                    nombre_personalizado=item.get('name') if producto.es_editable else None,
+                    cantidad=cantidad,
+                    precio_unitario=precio_unitario,
+                    descuento=descuento,
+                )
+            elif tipo == 'service':
+                tecnico_id = item.get('technician_id')
+                detalle = DetalleVenta(
+                    venta=venta,
+                    tipo_servicio=servicios[int(item['id'])],
+                    nombre_personalizado=item.get('name', ''),
+                    tecnico=tecnicos[int(tecnico_id)] if tecnico_id else None,
+                    cantidad=cantidad,
+                    precio_unitario=precio_unitario,
+                    descuento=descuento,
+                    es_servicio=True,
+                )
+            elif tipo == 'manual':
+                # Item personalizado/genérico sin catálogo
+                detalle = DetalleVenta(
+                    venta=venta,
+                    nombre_personalizado=item.get('name', 'Servicio Manual'),
+                    cantidad=cantidad,
+                    precio_unitario=precio_unitario,
+                    descuento=descuento,
+                    es_servicio=True,
+                )
+            else:
+                continue
+
+            # bulk_create no llama a save(), calculamos los importes aquí
+            detalle.calcular_importes()
+            detalles.append(detalle)
+        return detalles
+
+    @staticmethod
+    def descontar_stock(venta, usuario, productos, cantidades):
+        """
+        Descuenta el stock de todos los productos con un único UPDATE
+        y registra los movimientos de inventario con bulk_create.
+        Los productos deben estar bloqueados por bloquear_productos().
+        """
+        if not cantidades:
+            return
+
+        Producto.objects.filter(id__in=list(cantidades)).update(
+            stock_actual=Case(
+                *[When(id=producto_id, then=F('stock_actual') - cantidad)
+                  for producto_id, cantidad in cantidades.items()],
+                default=F('stock_actual'),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            fecha_actualizacion=timezone.now(),
+        )
+
+        movimientos = []
+        for producto_id, cantidad in cantidades.items():
+            producto = productos[producto_id]
+            stock_anterior = producto.stock_actual
+            # Mantener la instancia en memoria coherente con la base de datos
+            producto.stock_actual = stock_anterior - cantidad
+            movimientos.append(MovimientoInventario(
+                producto=producto,
+                usuario=usuario,
+                tipo_movimiento='SALIDA',
+                cantidad=cantidad,
+                stock_anterior=stock_anterior,
+                stock_nuevo=producto.stock_actual,
+                precio_unitario=producto.precio_venta,
+                motivo=f'Venta #{venta.numero_factura}',
+                referencia=venta.numero_factura,
+                venta=venta,
+            ))
+        MovimientoInventario.objects.bulk_create(movimientos)
+        # El UPDATE masivo no dispara las señales de Producto: se publica aquí
+        CodigoProductoService.ajustar_stock({
+            producto_id: -cantidad for producto_id, cantidad in cantidades.items()
+        })
+        EventosDashboardService.stock_actualizado([
+            (movimiento.producto_id, movimiento.stock_anterior, movimiento.stock_nuevo)
+            for movimiento in movimientos
+        ])
+
+    @staticmethod
+    @transaction.atomic
+    def procesar_venta(usuario, cliente, data):
+        """
+        Crea la venta del POS con todas sus líneas.
+        Lanza ValidationError (y revierte todo) si falta stock o algún
+        producto, servicio o técnico no existe.
+        """
+        items = data['items']
+        cantidades = CheckoutService.agrupar_cantidades_productos(items)
+
+        productos = CheckoutService.bloquear_productos(list(cantidades))
+        errores = CheckoutService.validar_stock(productos, cantidades)
+
+        servicio_ids = {int(item['id']) for item in items if item.get('type') == 'service'}
+        tecnico_ids = {
+            int(item['technician_id']) for item in items
+            if item.get('type') == 'service' and item.get('technician_id')
+        }
+        servicios = TipoServicio.objects.in_bulk(servicio_ids) if servicio_ids else {}
+        tecnicos = Tecnico.objects.in_bulk(tecnico_ids) if tecnico_ids else {}
+
+        for servicio_id in servicio_ids - set(servicios):
+            errores.append(f'Servicio ID {servicio_id} no encontrado')
+        for tecnico_id in tecnico_ids - set(tecnicos):
+            errores.append(f'Técnico ID {tecnico_id} no encontrado')
+
+        if errores:
+            raise ValidationError(errores)
+
+        venta = Venta.objects.create(
+            # Con terminal_id la caja consume su propio bloque de numeración
+            numero_factura=Venta.generar_numero_factura(terminal=data.get('terminal_id')),
+            cliente=cliente,
+            usuario=usuario,
+            subtotal=_decimal(data.get('subtotal')),
+            iva=_decimal(data.get('tax_amount')),
+            descuento=_decimal(data.get('discount_amount')),
+            total=_decimal(data.get('total_amount')),
+            tipo_pago=data.get('payment_method') or 'EFECTIVO',
+            observaciones=data.get('observaciones') or ''
+        )
+
+        detalles = CheckoutService.construir_detalles(venta, items, productos, servicios, tecnicos)
+        DetalleVenta.objects.bulk_create(detalles)
+
+        CheckoutService.descontar_stock(venta, usuario, productos, cantidades)
+
+        # Resumen diario en la misma transacción de la venta
+        ResumenVentasService.registrar_venta(venta)
+
+        return venta
@@ -0,0 +1,119 @@
+"""
+Service layer para la numeración de facturas
+Entrega números consecutivos desde un contador en base de datos
+(SecuenciaFactura) en lugar de leer la última venta, así dos cajas
+nunca obtienen el mismo número.
+"""
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.db.models.functions import Length
+
+from ventas.models import Venta, SecuenciaFactura, BloqueNumeracion
+
+SERIE_DEFAULT = 'FAC'
+TAMANO_BLOQUE_DEFAULT = 50
+
+
+class NumeracionFacturaService:
+    """Servicio para asignar números de factura de forma atómica"""
+
+    @staticmethod
+    def formatear(numero, serie=SERIE_DEFAULT):
+        """Formatea con ceros a la izquierda (ej. FAC-000001)"""
+        return f"{serie}-{numero:06d}"
+
+    @staticmethod
+    def ultimo_numero_existente(serie=SERIE_DEFAULT):
+        """
+        Obtiene el mayor número ya emitido en Venta para la serie.
+        Solo se usa la primera vez, para inicializar el contador.
+        """
+        ultima = Venta.objects.filter(
+            numero_factura__startswith=f"{serie}-"
+        ).order_by(Length('numero_factura').desc(), '-numero_factura').first()
+
+        if not ultima:
+            return 0
+        try:
+            return int(ultima.numero_factura.split('-')[1])
+        except (ValueError, IndexError):
+            return 0
+
+    @staticmethod
+    def obtener_secuencia_bloqueada(serie=SERIE_DEFAULT):
+        """
+        Devuelve la fila del contador bloqueada (SELECT ... FOR UPDATE).
+        Si aún no existe se crea a partir de las facturas ya emitidas.
+        Debe llamarse dentro de una transacción.
+        """
+        try:
+            return SecuenciaFactura.objects.select_for_update().get(serie=serie)
+        except SecuenciaFactura.DoesNotExist:
+            pass
+
+        try:
+            with transaction.atomic():
+                SecuenciaFactura.objects.create(
+                    serie=serie,
+                    ultimo_numero=NumeracionFacturaService.ultimo_numero_existente(serie)
+                )
+        except IntegrityError:
+            # Otra caja la creó al mismo tiempo
+            pass
+        return SecuenciaFactura.objects.select_for_update().get(serie=serie)
+
+    @staticmethod
+    @transaction.atomic
+    def reservar_numeros(cantidad=1, serie=SERIE_DEFAULT):
+        """
+        Incrementa el contador en `cantidad` y devuelve (inicio, fin).
+        El bloqueo se mantiene hasta que termine la transacción que llama,
+        así, si la venta se revierte, el número vuelve al contador (sin huecos).
+        """
+        secuencia = NumeracionFacturaService.obtener_secuencia_bloqueada(serie)
+        inicio = secuencia.ultimo_numero + 1
+        secuencia.ultimo_numero += cantidad
+        secuencia.save(update_fields=['ultimo_numero', 'fecha_actualizacion'])
+        return inicio, secuencia.ultimo_numero
+
+    @staticmethod
+    @transaction.atomic
+    def reservar_bloque(terminal, tamano=TAMANO_BLOQUE_DEFAULT, serie=SERIE_DEFAULT):
+        """Reserva un bloque de números para una terminal POS"""
+        inicio, fin = NumeracionFacturaService.reservar_numeros(tamano, serie)
+        return BloqueNumeracion.objects.create(
+            serie=serie,
+            terminal=terminal,
+            inicio=inicio,
+            fin=fin,
+            siguiente=inicio
+        )
+
+    @staticmethod
+    @transaction.atomic
+    def siguiente_numero(serie=SERIE_DEFAULT, terminal=None, tamano_bloque=TAMANO_BLOQUE_DEFAULT):
+        """
+        Devuelve el siguiente número de factura formateado.
+
+        Sin terminal se incrementa el contador global (una fila por serie).
+        Con terminal se consume el bloque reservado de esa caja; solo cuando
+        se agota se vuelve a tocar el contador global. Los números de un
+        bloque que nunca se consuma (terminal dada de baja) quedan sin usar.
+        """
+        if not terminal:
+            numero, _ = NumeracionFacturaService.reservar_numeros(1, serie)
+            return NumeracionFacturaService.formatear(numero, serie)
+
+        bloque = BloqueNumeracion.objects.select_for_update().filter(
+            serie=serie,
+            terminal=terminal,
+            siguiente__lte=F('fin')
+        ).order_by('inicio').first()
+
+        if bloque is None:
+            bloque = NumeracionFacturaService.reservar_bloque(terminal, tamano_bloque, serie)
+
+        numero = bloque.siguiente
+        bloque.siguiente += 1
+        bloque.save(update_fields=['siguiente'])
+        return NumeracionFacturaService.formatear(numero, serie)
@@ -316,22 +316,20 @@ class TicketThermalService:
             if db_printer or printer_name:
                 from hardware_integration.api.agente_views import crear_trabajo_impresion
                 
-                # Convertir contenido a HEX (formato que espera el agente)
+                # Comandos en binario para el agente
                 # ESC @ (inicializar) + Contenido + GS V (corte)
                 config = cls.THERMAL_PRINTERS.get(printer_type, cls.THERMAL_PRINTERS['GENERIC_80MM'])
                 commands = b'\x1B\x40' + content.encode('utf-8', errors='ignore') + config['cut_command']
                 if open_drawer:
                     commands += config['drawer_command']
                 
-                comandos_hex = commands.hex()
-                
                 # Si no hay db_printer, usamos el printer_name tal cual
                 p_name = (db_printer.nombre_driver or db_printer.nombre) if db_printer else printer_name
                 
                 job_id = crear_trabajo_impresion(
                     usuario=user or venta.usuario,
                     impresora_nombre=p_name,
-                    comandos_hex=comandos_hex,
+                    comandos=commands,
                     tipo='TICKET',
                     prioridad=1,
                     abrir_gaveta=open_drawer
@@ -502,7 +500,7 @@ class TicketThermalService:
                 job_id = crear_trabajo_impresion(
                     usuario=user,
                     impresora_nombre=db_printer.nombre_driver or db_printer.nombre,
-                    comandos_hex=commands.hex(),
+                    comandos=commands,
                     tipo='OTRO',
                     prioridad=0
                 )
@@ -1,3 +1,274 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import datetime, time
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from clientes.models import Cliente
+from inventario.models import Producto, CategoriaProducto, Marca, MovimientoInventario
+from inventario.services.lookup_codigos import CodigoProductoService
+from taller.models import CategoriaServicio, TipoServicio
+from usuarios.models import Usuario
+from reportes.services.resumen_ventas import ResumenVentasService
+from .models import Venta, DetalleVenta, BloqueNumeracion, Devolucion
+from .services.checkout_service import CheckoutService
+from .services.numeracion_service import NumeracionFacturaService
+
+MEDIA_ROOT_TEST = tempfile.mkdtemp()
+
+
+def ventas_por_dia_anterior(fecha):
+    """Cálculo original de Venta.get_ventas_por_dia (venta por venta), como referencia"""
+    inicio = timezone.make_aware(datetime.combine(fecha, time.min))
+    fin = timezone.make_aware(datetime.combine(fecha, time.max))
+    ventas = Venta.objects.filter(fecha_hora__range=(inicio, fin), estado='COMPLETADA')
+    total_productos = sum(
+        detalle.total for venta in ventas
+        for detalle in venta.detalleventa_set.filter(producto__isnull=False)
+    )
+    total_servicios = sum(
+        detalle.total for venta in ventas
+        for detalle in venta.detalleventa_set.filter(servicio__isnull=False)
+    ) + sum(
+        detalle.total for venta in ventas
+        for detalle in venta.detalleventa_set.filter(es_servicio=True, tipo_servicio__isnull=False)
+    )
+    total_ventas = sum(venta.total for venta in ventas)
+    devoluciones = Devolucion.objects.filter(fecha_hora__range=(inicio, fin), estado='COMPLETADA')
+    total_reembolsos = sum(abs(d.diferencia) for d in devoluciones if d.diferencia < 0)
+    total_ingresos_extra = sum(d.diferencia for d in devoluciones if d.diferencia > 0)
+    return {
+        'fecha': fecha,
+        'total_productos': total_productos,
+        'total_servicios': total_servicios,
+        'total_ventas': total_ventas,
+        'num_ventas': ventas.count(),
+        'total_reembolsos': total_reembolsos,
+        'total_ingresos_extra': total_ingresos_extra,
+        'ventas_netas': total_ventas + total_ingresos_extra - total_reembolsos
+    }
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT_TEST)
+class CheckoutServiceTest(TestCase):
+    """Pruebas para el checkout en bloque del POS"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT_TEST, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.usuario = Usuario.objects.create_user(
+            'cajero', 'cajero@example.com', 'testpass123',
+            nombre='Caja', apellido='Uno'
+        )
+        self.cliente = Cliente.get_consumidor_final()
+        self.categoria = CategoriaProducto.objects.create(
+            nombre='Repuestos', codigo='REP', porcentaje_ganancia=Decimal('30.00')
+        )
+        self.marca = Marca.objects.create(nombre='Genérica')
+
+    def crear_producto(self, codigo, stock=Decimal('10.00'), precio=Decimal('5.00')):
+        return Producto.objects.create(
+            categoria=self.categoria,
+            marca=self.marca,
+            codigo_unico=codigo,
+            nombre=f'Producto {codigo}',
+            precio_compra=precio / 2,
+            precio_venta=precio,
+            stock_actual=stock,
+        )
+
+    def datos_carrito(self, productos, cantidad='1'):
+        return {
+            'subtotal': '0.00',
+            'tax_amount': '0.00',
+            'total_amount': '0.00',
+            'payment_method': 'EFECTIVO',
+            'items': [
+                {
+                    'type': 'product',
+                    'id': producto.id,
+                    'quantity': cantidad,
+                    'unit_price': str(producto.precio_venta),
+                    'subtotal': str(producto.precio_venta),
+                }
+                for producto in productos
+            ],
+        }
+
+    def test_descuenta_stock_y_crea_detalles(self):
+        producto = self.crear_producto('P001')
+        data = self.datos_carrito([producto], cantidad='3')
+        # Misma referencia en dos líneas: se suman las cantidades
+        data['items'].append(dict(data['items'][0], quantity='2'))
+        # Contador de stock del escaneo ya cargado
+        self.assertEqual(CodigoProductoService.stock(producto.pk), 10.0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            venta = CheckoutService.procesar_venta(self.usuario, self.cliente, data)
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, Decimal('5.00'))
+        self.assertEqual(CodigoProductoService.stock(producto.pk), 5.0)
+        self.assertEqual(DetalleVenta.objects.filter(venta=venta).count(), 2)
+        detalle = DetalleVenta.objects.filter(venta=venta).first()
+        self.assertEqual(detalle.subtotal, detalle.cantidad * detalle.precio_unitario)
+
+        movimiento = MovimientoInventario.objects.get(venta=venta)
+        self.assertEqual(movimiento.cantidad, Decimal('5.00'))
+        self.assertEqual(movimiento.stock_anterior, Decimal('10.00'))
+        self.assertEqual(movimiento.stock_nuevo, Decimal('5.00'))
+
+    def test_stock_insuficiente_revierte_la_venta(self):
+        producto = self.crear_producto('P002', stock=Decimal('1.00'))
+
+        with self.assertRaises(ValidationError):
+            CheckoutService.procesar_venta(
+                self.usuario, self.cliente, self.datos_carrito([producto], cantidad='2')
+            )
+
+        producto.refresh_from_db()
+        self.assertEqual(producto.stock_actual, Decimal('1.00'))
+        self.assertFalse(Venta.objects.exists())
+
+    def test_numero_de_consultas_no_crece_con_el_carrito(self):
+        """El costo del checkout no depende del número de líneas"""
+        pequeno = [self.crear_producto(f'A{i:03d}') for i in range(2)]
+        grande = [self.crear_producto(f'B{i:03d}') for i in range(40)]
+        # Primera venta para que los get_or_create de las señales ya existan
+        CheckoutService.procesar_venta(self.usuario, self.cliente, self.datos_carrito(pequeno))
+
+        with CaptureQueriesContext(connection) as consultas_pequeno:
+            CheckoutService.procesar_venta(self.usuario, self.cliente, self.datos_carrito(pequeno))
+        with CaptureQueriesContext(connection) as consultas_grande:
+            CheckoutService.procesar_venta(self.usuario, self.cliente, self.datos_carrito(grande))
+
+        self.assertEqual(len(consultas_pequeno), len(consultas_grande))
+
+
+class NumeracionFacturaServiceTest(TestCase):
+    """Pruebas para el contador de numeración de facturas"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'cajero', 'cajero@example.com', 'testpass123',
+            nombre='Caja', apellido='Uno'
+        )
+
+    def test_continua_desde_la_ultima_factura_emitida(self):
+        Venta.objects.create(
+            usuario=self.usuario, numero_factura='FAC-000041',
+            subtotal=Decimal('0'), iva=Decimal('0'), total=Decimal('0'), tipo_pago='EFECTIVO'
+        )
+        self.assertEqual(Venta.generar_numero_factura(), 'FAC-000042')
+        self.assertEqual(Venta.generar_numero_factura(), 'FAC-000043')
+
+    def test_bloques_por_terminal_no_se_solapan(self):
+        caja_1 = [NumeracionFacturaService.siguiente_numero(terminal='CAJA-1', tamano_bloque=3) for _ in range(4)]
+        caja_2 = [NumeracionFacturaService.siguiente_numero(terminal='CAJA-2', tamano_bloque=3) for _ in range(2)]
+        global_ = NumeracionFacturaService.siguiente_numero()
+
+        self.assertEqual(caja_1, ['FAC-000001', 'FAC-000002', 'FAC-000003', 'FAC-000004'])
+        self.assertEqual(caja_2, ['FAC-000007', 'FAC-000008'])
+        self.assertEqual(global_, 'FAC-000010')
+        self.assertEqual(BloqueNumeracion.objects.filter(terminal='CAJA-1').count(), 2)
+
+
+class VentasPorDiaTest(TestCase):
+    """Pruebas para el resumen del día de Venta.get_ventas_por_dia"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            'cajero', 'cajero@example.com', 'testpass123',
+            nombre='Caja', apellido='Uno'
+        )
+
+    def crear_venta(self, total):
+        venta = Venta.objects.create(
+            usuario=self.usuario, subtotal=total, iva=Decimal('0.00'), tipo_pago='EFECTIVO', total=total
+        )
+        DetalleVenta.objects.create(
+            venta=venta, nombre_personalizado='Mano de obra', cantidad=Decimal('1'),
+            precio_unitario=total, iva_porcentaje=Decimal('0.00'), es_servicio=True
+        )
+        # Como en CheckoutService: la venta se suma al resumen del día
+        ResumenVentasService.registrar_venta(venta)
+        return venta
+
+    def test_consultas_constantes_con_mas_ventas(self):
+        self.crear_venta(Decimal('10.00'))
+        with CaptureQueriesContext(connection) as pocas:
+            Venta.get_ventas_por_dia()
+
+        for _ in range(15):
+            venta = self.crear_venta(Decimal('10.00'))
+        Devolucion.objects.create(
+            venta=venta, usuario=self.usuario,
+            total_devuelto=Decimal('10.00'), total_nuevo=Decimal('4.00')
+        )
+        with CaptureQueriesContext(connection) as muchas:
+            resumen = Venta.get_ventas_por_dia()
+
+        self.assertEqual(len(pocas), len(muchas))
+        self.assertEqual(resumen['num_ventas'], 16)
+        self.assertEqual(resumen['total_ventas'], Decimal('160.00'))
+        self.assertEqual(resumen['total_reembolsos'], Decimal('6.00'))
+        self.assertEqual(resumen['ventas_netas'], Decimal('154.00'))
+
+    def test_igual_al_calculo_anterior(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        ajustes = override_settings(MEDIA_ROOT=media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+
+        producto = Producto.objects.create(
+            categoria=CategoriaProducto.objects.create(nombre='Repuestos', codigo='REP',
+                                                       porcentaje_ganancia=Decimal('30.00')),
+            marca=Marca.objects.create(nombre='Genérica'), codigo_unico='REP-1', nombre='Repuesto',
+            precio_compra=Decimal('5.00'), precio_venta=Decimal('10.00'),
+        )
+        tipo = TipoServicio.objects.create(
+            categoria=CategoriaServicio.objects.create(nombre='Mecánica', codigo='MEC'),
+            nombre='Afinamiento', codigo='AFI', precio=Decimal('25.00'),
+        )
+        lineas = [
+            {'producto': producto, 'cantidad': 2, 'precio_unitario': Decimal('10.00')},
+            {'nombre_personalizado': 'Mano de obra', 'es_servicio': True, 'precio_unitario': Decimal('7.00')},
+            {'tipo_servicio': tipo, 'es_servicio': True, 'precio_unitario': Decimal('25.00')},
+            {'servicio': tipo, 'precio_unitario': Decimal('4.00')},
+        ]
+        # Solo datos crudos: el resumen se obtiene reconstruyendo el día
+        for numero, (total, tipo_pago) in enumerate([(Decimal('48.00'), 'EFECTIVO'), (Decimal('30.00'), 'TARJETA'),
+                                                     (Decimal('12.00'), 'EFECTIVO')]):
+            venta = Venta.objects.create(usuario=self.usuario, subtotal=total, iva=Decimal('0.00'),
+                                         tipo_pago=tipo_pago, total=total)
+            for datos in lineas[numero:]:
+                DetalleVenta.objects.create(venta=venta, **{'cantidad': 1, **datos})
+        Venta.objects.filter(pk=venta.pk).update(estado='ANULADA')
+        Devolucion.objects.create(venta=venta, usuario=self.usuario,
+                                  total_devuelto=Decimal('10.00'), total_nuevo=Decimal('4.00'))
+        Devolucion.objects.create(venta=venta, usuario=self.usuario,
+                                  total_devuelto=Decimal('3.00'), total_nuevo=Decimal('5.50'))
+
+        hoy = timezone.localdate()
+        ResumenVentasService.reconstruir(hoy, hoy)
+        resumen = Venta.get_ventas_por_dia()
+        anterior = ventas_por_dia_anterior(hoy)
+
+        self.assertEqual(resumen, anterior)
+        self.assertEqual(set(resumen), set(anterior))
+        # Valores no triviales en cada lado del desglose
+        self.assertEqual((resumen['num_ventas'], resumen['total_ventas']), (2, Decimal('78.00')))
+        self.assertNotEqual(resumen['total_productos'], 0)
+        self.assertNotEqual(resumen['total_servicios'], 0)
+        self.assertNotEqual(resumen['total_ingresos_extra'], 0)
@@ -4,6 +4,7 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib import messages
+from django.core.exceptions import ValidationError
 from django.db import transaction, models
 from django.db.models import Q, Sum, Count, Avg
 from django.utils import timezone
@@ -20,11 +21,17 @@ import datetime as dt_module
 from datetime import datetime, timedelta, time
 from decimal import Decimal
 from .services.ticket_service import TicketThermalService
+from .services.checkout_service import CheckoutService
+from reportes.services.resumen_ventas import ResumenVentasService
+from reportes.services.cache_dashboard import DashboardCacheService
+from reportes.services.series_ventas import SerieVentasService, MAX_DIAS as MAX_DIAS_SERIE
 from .models import Venta, DetalleVenta, CierreCaja
 from .forms import VentaForm, DetalleVentaFormSet, CierreCajaForm, AgregarProductoForm
 # from .services.factura_service import FacturaService  # ← COMENTADO PARA EVITAR ERROR AL INICIAR
 from clientes.models import Cliente, PedidoOnline, DetallePedidoOnline
 from inventario.models import Producto
+from inventario.services.busqueda_productos import BusquedaProductosService
+from inventario.services.lookup_codigos import CodigoProductoService
 from inventario.views import requiere_token_api
 from taller.models import TipoServicio, OrdenTrabajo, Tecnico
 from .models import Devolucion, DetalleDevolucion
@@ -184,31 +191,19 @@ def lista_ventas(request):
     # ========== GRÁFICO DE VENTAS DE LOS ÚLTIMOS 7 DÍAS ==========
     
     grafico_ventas = []
-    dias_semana = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
+    max_ingresos = float(ingresos_hoy) if ingresos_hoy > 0 else 1000
     
-    for i in range(7):
-        fecha = today - timedelta(days=6-i)
-        
-        ventas_dia = Venta.objects.filter(
-            fecha_hora__date=fecha,
-            estado='COMPLETADA'
-        ).aggregate(
-            total=Sum('total'),
-            cantidad=Count('id')
-        )
-        
-        total_dia = float(ventas_dia['total'] or 0)
-        cantidad_dia = ventas_dia['cantidad'] or 0
+    for punto in SerieVentasService.serie(today - timedelta(days=6), today, 'dia'):
+        total_dia = float(punto['total'])
         
         # Calcular altura para el gráfico (máximo 180px)
-        max_ingresos = float(ingresos_hoy) if ingresos_hoy > 0 else 1000
         altura = min((total_dia / max_ingresos) * 180, 180) if total_dia > 0 else 5
         
         grafico_ventas.append({
-            'fecha': fecha.strftime('%Y-%m-%d'),
-            'dia': dias_semana[fecha.weekday()],
+            'fecha': punto['fecha'].strftime('%Y-%m-%d'),
+            'dia': punto['periodo'],
             'total': total_dia,
-            'cantidad': cantidad_dia,
+            'cantidad': punto['cantidad'],
             'altura': altura
         })
     
@@ -302,6 +297,7 @@ def crear_venta(request):
             venta.iva = Decimal('0.00')
             venta.total = Decimal('0.00')
             venta.save()
+            ResumenVentasService.recalcular_dia(venta.fecha_hora)
             
             messages.success(request, "Venta creada correctamente. Agregue productos o servicios.")
             return redirect('ventas:editar_venta', venta_id=venta.id)
@@ -347,6 +343,8 @@ def editar_venta(request, venta_id):
             for detalle in detalles:
                 detalle.save()
             
+            ResumenVentasService.recalcular_dia(venta.fecha_hora)
+            
             messages.success(request, "Venta actualizada correctamente.")
             return redirect('ventas:detalle_venta', venta_id=venta.id)
     else:
@@ -442,6 +440,7 @@ def agregar_producto(request, venta_id):
             venta.iva = detalles_iva['total'] or Decimal('0.00')
             venta.total = venta.subtotal + venta.iva - venta.descuento
             venta.save()
+            ResumenVentasService.recalcular_dia(venta.fecha_hora)
             
         except Producto.DoesNotExist:
             messages.error(request, "Producto no encontrado")
@@ -654,25 +653,13 @@ def api_buscar_producto(request):
         return JsonResponse({'success': False, 'message': 'Código requerido'})
     
     try:
-        producto = Producto.objects.filter(
-            Q(codigo_unico=codigo) | Q(codigo_barras=codigo),
-            activo=True
-        ).first()
+        # Código único o alterno (EAN), resuelto desde la caché LRU/Redis
+        producto = CodigoProductoService.buscar(codigo)
         
         if producto:
             return JsonResponse({
                 'success': True,
-                'producto': {
-                    'id': producto.id,
-                    'codigo': producto.codigo_unico or producto.codigo_barras,
-                    'nombre': producto.nombre,
-                    'precio': float(producto.precio_venta),
-                    'stock': float(producto.stock_actual),
-                    'categoria': producto.categoria.nombre if producto.categoria else None,
-                    'activo': producto.activo,
-                    'incluye_iva': producto.incluye_iva,
-                    'es_editable': producto.es_editable
-                }
+                'producto': producto
             })
         else:
             return JsonResponse({'success': False, 'message': 'Producto no encontrado'})
@@ -686,14 +673,9 @@ def api_productos(request):
     search = request.GET.get('q', '').strip()
     limit = int(request.GET.get('limit', 50))
     
-    productos = Producto.objects.filter(activo=True)
-    
-    if search:
-        productos = productos.filter(
-            Q(nombre__icontains=search) |
-            Q(codigo_unico__icontains=search) |
-            Q(codigo_barras__icontains=search)
-        )
+    productos = BusquedaProductosService.buscar(
+        search, Producto.objects.filter(activo=True), descripcion=False
+    )
     
     productos = productos.select_related('categoria')[:limit]
     
@@ -1121,105 +1103,8 @@ def api_procesar_venta_pos_mejorado(request):
         else:
             cliente = Cliente.get_consumidor_final()
         
-        # Crear la venta
-        venta = Venta.objects.create(
-            cliente=cliente,
-            usuario=request.user,
-            subtotal=Decimal(str(data.get('subtotal', '0.00'))),
-            iva=Decimal(str(data.get('tax_amount', '0.00'))),
-            descuento=Decimal(str(data.get('discount_amount', '0.00'))),
-            total=Decimal(str(data.get('total_amount', '0.00'))),
-            tipo_pago=data.get('payment_method') or 'EFECTIVO',
-            observaciones=data.get('observaciones') or ''
-
-        )
-        
-        # Procesar items de la venta
-        for item in data['items']:
-            discount_item = Decimal(str(item.get('discount', '0.00')))
-            
-            if item['type'] == 'product':
-                try:
-                    producto = Producto.objects.get(id=item['id'])
-                    cantidad = Decimal(str(item['quantity']))
-                    
-                    if producto.stock_actual < cantidad:
-                        raise Exception(f'Stock insuficiente para {producto.nombre}. Disponible: {producto.stock_actual}')
-                    
-                    subtotal_item = Decimal(str(item['subtotal']))
-                    iva_item = Decimal(str(item.get('iva', subtotal_item * Decimal('0.15'))))
-                    total_item = subtotal_item + iva_item - discount_item
-                    
-                    nombre_item = item.get('name', producto.nombre)
-                    nombre_personalizado = item.get('name') if producto.es_editable else None
-                    
-                    DetalleVenta.objects.create(
-                        venta=venta,
-                        producto=producto,
-                        nombre_personalizado=nombre_personalizado,
-                        cantidad=cantidad,
-                        precio_unitario=Decimal(str(item['unit_price'])),
-                        subtotal=subtotal_item,
-                        iva_porcentaje=Decimal('15.00'),
-                        iva=iva_item,
-                        descuento=discount_item,
-                        total=total_item
-                    )
-                    
-                    producto.stock_actual -= cantidad
-                    producto.save()
-                    
-                except Producto.DoesNotExist:
-                    raise Exception(f'Producto ID {item["id"]} no encontrado')
-            
-            elif item['type'] == 'service':
-                try:
-                    tipo_servicio = TipoServicio.objects.get(id=item['id'])
-                    tecnico = None
-                    
-                    if item.get('technician_id'):
-                        tecnico = Tecnico.objects.get(id=item['technician_id'])
-                    
-                    subtotal_item = Decimal(str(item['subtotal']))
-                    iva_item = Decimal(str(item.get('iva', '0.00')))
-                    total_item = subtotal_item + iva_item - discount_item
-                    
-                    DetalleVenta.objects.create(
-                        venta=venta,
-                        tipo_servicio=tipo_servicio,
-                        nombre_personalizado=item.get('name', ''),
-                        tecnico=tecnico,
-                        cantidad=Decimal(str(item['quantity'])),
-                        precio_unitario=Decimal(str(item['unit_price'])),
-                        subtotal=subtotal_item,
-                        iva_porcentaje=Decimal('15.00' if iva_item > 0 else '0.00'),
-                        iva=iva_item,
-                        descuento=discount_item,
-                        total=total_item,
-                        es_servicio=True
-                    )
-                    
-                except (TipoServicio.DoesNotExist, Tecnico.DoesNotExist) as e:
-                    raise Exception(f'Servicio o técnico no encontrado: {str(e)}')
-            
-            elif item['type'] == 'manual':
-                # Item personalizado/genérico sin catálogo
-                subtotal_item = Decimal(str(item['subtotal']))
-                iva_item = Decimal(str(item.get('iva', '0.00')))
-                total_item = subtotal_item + iva_item - discount_item
-                
-                DetalleVenta.objects.create(
-                    venta=venta,
-                    nombre_personalizado=item.get('name', 'Servicio Manual'),
-                    cantidad=Decimal(str(item['quantity'])),
-                    precio_unitario=Decimal(str(item['unit_price'])),
-                    subtotal=subtotal_item,
-                    iva_porcentaje=Decimal('15.00' if iva_item > 0 else '0.00'),
-                    iva=iva_item,
-                    descuento=discount_item,
-                    total=total_item,
-                    es_servicio=True
-                )
+        # Crear la venta con todas sus líneas (bloqueo de stock + bulk_create)
+        venta = CheckoutService.procesar_venta(request.user, cliente, data)
         
         # Manejar orden de trabajo si existe
         if data.get('order_id'):
@@ -1329,6 +1214,8 @@ def api_procesar_venta_pos_mejorado(request):
             'email_sent': email_sent
         })
         
+    except ValidationError as e:
+        return JsonResponse({'success': False, 'message': ' '.join(e.messages)})
     except Exception as e:
         import traceback
         logger.error(f"Error procesando venta POS: {str(e)}")
@@ -1676,73 +1563,91 @@ def crear_cierre(request):
         'ventas_dia': ventas_dia
     })
 
-@login_required
-def api_dashboard_stats(request):
-    """API para obtener estadísticas actualizadas del dashboard"""
+def calcular_dashboard_stats(**filtros_venta):
+    """
+    Estadísticas del dashboard de ventas (payload cacheable). Con filtros_venta
+    (p. ej. usuario__sucursal_id) las ventas se limitan a una sucursal.
+    """
     today = timezone.localdate()
     yesterday = today - timedelta(days=1)
     
+    hoy_start = timezone.make_aware(datetime.combine(today, time.min))
+    hoy_end = timezone.make_aware(datetime.combine(today, time.max))
+    ayer_start = timezone.make_aware(datetime.combine(yesterday, time.min))
+    ayer_end = timezone.make_aware(datetime.combine(yesterday, time.max))
+    
+    # Ventas de hoy
+    ventas_hoy = Venta.objects.filter(
+        fecha_hora__range=(hoy_start, hoy_end),
+        estado='COMPLETADA',
+        **filtros_venta
+    )
+    
+    ventas_ayer = Venta.objects.filter(
+        fecha_hora__range=(ayer_start, ayer_end),
+        estado='COMPLETADA',
+        **filtros_venta
+    )
+    
+    total_ventas_hoy = ventas_hoy.count()
+    total_ventas_ayer = ventas_ayer.count()
+    
+    ingresos_hoy = ventas_hoy.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    ingresos_ayer = ventas_ayer.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
+    
+    # Cálculo de crecimiento
+    crecimiento_ventas = 0
+    if total_ventas_ayer > 0:
+        crecimiento_ventas = ((total_ventas_hoy - total_ventas_ayer) / total_ventas_ayer) * 100
+    
+    crecimiento_ingresos = 0
+    if ingresos_ayer > 0:
+        crecimiento_ingresos = ((float(ingresos_hoy) - float(ingresos_ayer)) / float(ingresos_ayer)) * 100
+    
+    # Órdenes pendientes
+    ordenes_pendientes = OrdenTrabajo.objects.filter(
+        estado='PENDIENTE',
+        facturado=False
+    ).count()
+    
+    # Productos bajo stock
+    productos_bajo_stock = Producto.objects.filter(
+        stock_actual__lte=5,
+        activo=True
+    ).count()
+    
+    # Ticket promedio
+    ticket_promedio = 0
+    if total_ventas_hoy > 0:
+        ticket_promedio = float(ingresos_hoy) / total_ventas_hoy
+    
+    return {
+        'success': True,
+        'stats': {
+            'ventas_hoy': total_ventas_hoy,
+            'ingresos_hoy': float(ingresos_hoy),
+            'ordenes_pendientes': ordenes_pendientes,
+            'productos_bajo_stock': productos_bajo_stock,
+            'ticket_promedio': ticket_promedio,
+            'crecimiento_ventas': crecimiento_ventas,
+            'crecimiento_ingresos': crecimiento_ingresos,
+        }
+    }
+
+@login_required
+def api_dashboard_stats(request):
+    """API para obtener estadísticas actualizadas del dashboard"""
     try:
-        hoy_start = timezone.make_aware(datetime.combine(today, time.min))
-        hoy_end = timezone.make_aware(datetime.combine(today, time.max))
-        ayer_start = timezone.make_aware(datetime.combine(yesterday, time.min))
-        ayer_end = timezone.make_aware(datetime.combine(yesterday, time.max))
-        
-        # Ventas de hoy
-        ventas_hoy = Venta.objects.filter(
-            fecha_hora__range=(hoy_start, hoy_end),
-            estado='COMPLETADA'
-        )
-        
-        ventas_ayer = Venta.objects.filter(
-            fecha_hora__range=(ayer_start, ayer_end),
-            estado='COMPLETADA'
-        )
-        
-        total_ventas_hoy = ventas_hoy.count()
-        total_ventas_ayer = ventas_ayer.count()
-        
-        ingresos_hoy = ventas_hoy.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-        ingresos_ayer = ventas_ayer.aggregate(total=Sum('total'))['total'] or Decimal('0.00')
-        
-        # Cálculo de crecimiento
-        crecimiento_ventas = 0
-        if total_ventas_ayer > 0:
-            crecimiento_ventas = ((total_ventas_hoy - total_ventas_ayer) / total_ventas_ayer) * 100
-        
-        crecimiento_ingresos = 0
-        if ingresos_ayer > 0:
-            crecimiento_ingresos = ((float(ingresos_hoy) - float(ingresos_ayer)) / float(ingresos_ayer)) * 100
-        
-        # Órdenes pendientes
-        ordenes_pendientes = OrdenTrabajo.objects.filter(
-            estado='PENDIENTE',
-            facturado=False
-        ).count()
-        
-        # Productos bajo stock
-        productos_bajo_stock = Producto.objects.filter(
-            stock_actual__lte=5,
-            activo=True
-        ).count()
-        
-        # Ticket promedio
-        ticket_promedio = 0
-        if total_ventas_hoy > 0:
-            ticket_promedio = float(ingresos_hoy) / total_ventas_hoy
-        
-        return JsonResponse({
-            'success': True,
-            'stats': {
-                'ventas_hoy': total_ventas_hoy,
-                'ingresos_hoy': float(ingresos_hoy),
-                'ordenes_pendientes': ordenes_pendientes,
-                'productos_bajo_stock': productos_bajo_stock,
-                'ticket_promedio': ticket_promedio,
-                'crecimiento_ventas': crecimiento_ventas,
-                'crecimiento_ingresos': crecimiento_ingresos,
-            }
-        })
+        # Misma sucursal que los deltas del WebSocket (EventosDashboardService.grupos_usuario)
+        if request.user.es_admin_general:
+            alcance, filtros = 'todas', {}
+        else:
+            alcance = request.user.sucursal_id or 'sin'
+            filtros = {'usuario__sucursal_id': request.user.sucursal_id}
+        # La fecha forma parte de la clave para no servir el día anterior tras medianoche
+        return JsonResponse(DashboardCacheService.obtener(
+            'stats', lambda: calcular_dashboard_stats(**filtros), timezone.localdate(), alcance
+        ))
         
     except Exception as e:
         return JsonResponse({
@@ -1812,91 +1717,44 @@ def api_todas_ventas(request):
 
 @login_required
 def api_grafico_ventas(request):
-    """API para obtener datos del gráfico de ventas por período"""
+    """
+    API para obtener datos del gráfico de ventas por período.
+    Acepta periodos arbitrarios ('7d', '30d', '365d') y una agrupación
+    opcional (dia/semana/mes); por defecto se elige según la longitud.
+    """
     try:
         periodo = request.GET.get('periodo', '7d')
-        today = timezone.localdate()
-        
-        if periodo == '7d':
-            dias = 7
-            labels = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
-        elif periodo == '30d':
-            dias = 30
-            labels = ['Sem 1', 'Sem 2', 'Sem 3', 'Sem 4']
-        elif periodo == '90d':
-            dias = 90
-            labels = ['Mes 1', 'Mes 2', 'Mes 3']
-        else:
+        try:
+            dias = int(periodo.rstrip('d'))
+        except ValueError:
             dias = 7
-            labels = ['Lun', 'Mar', 'Mié', 'Jue', 'Vie', 'Sáb', 'Dom']
-        
+        dias = min(max(dias, 1), MAX_DIAS_SERIE)
+        periodo = f'{dias}d'
+
+        granularidad = request.GET.get('agrupacion') or SerieVentasService.granularidad_para(dias)
+        if granularidad not in ('dia', 'semana', 'mes'):
+            granularidad = SerieVentasService.granularidad_para(dias)
+
+        today = timezone.localdate()
+        serie = SerieVentasService.serie(today - timedelta(days=dias - 1), today, granularidad)
+
         datos = []
-        
-        if periodo == '7d':
-            # Datos diarios
-            for i in range(7):
-                fecha = today - timedelta(days=6-i)
-                ventas_dia = Venta.objects.filter(
-                    fecha_hora__date=fecha,
-                    estado='COMPLETADA'
-                ).aggregate(
-                    total=Sum('total'),
-                    cantidad=Count('id')
-                )
-                
-                datos.append({
-                    'fecha': fecha.strftime('%Y-%m-%d'),
-                    'dia': labels[i],
-                    'total': float(ventas_dia['total'] or 0),
-                    'cantidad': ventas_dia['cantidad'] or 0
-                })
-        
-        elif periodo == '30d':
-            # Datos semanales
-            for i in range(4):
-                fecha_fin = today - timedelta(days=i*7)
-                fecha_inicio = fecha_fin - timedelta(days=6)
-                
-                ventas_semana = Venta.objects.filter(
-                    fecha_hora__date__range=[fecha_inicio, fecha_fin],
-                    estado='COMPLETADA'
-                ).aggregate(
-                    total=Sum('total'),
-                    cantidad=Count('id')
-                )
-                
-                datos.append({
-                    'fecha': fecha_fin.strftime('%Y-%m-%d'),
-                    'periodo': labels[3-i],
-                    'total': float(ventas_semana['total'] or 0),
-                    'cantidad': ventas_semana['cantidad'] or 0
-                })
-        
-        elif periodo == '90d':
-            # Datos mensuales
-            for i in range(3):
-                fecha_fin = today - timedelta(days=i*30)
-                fecha_inicio = fecha_fin - timedelta(days=29)
-                
-                ventas_mes = Venta.objects.filter(
-                    fecha_hora__date__range=[fecha_inicio, fecha_fin],
-                    estado='COMPLETADA'
-                ).aggregate(
-                    total=Sum('total'),
-                    cantidad=Count('id')
-                )
-                
-                datos.append({
-                    'fecha': fecha_fin.strftime('%Y-%m-%d'),
-                    'periodo': labels[2-i],
-                    'total': float(ventas_mes['total'] or 0),
-                    'cantidad': ventas_mes['cantidad'] or 0
-                })
+        for punto in serie:
+            dato = {
+                'fecha': punto['fecha'].strftime('%Y-%m-%d'),
+                'periodo': punto['periodo'],
+                'total': float(punto['total']),
+                'cantidad': punto['cantidad']
+            }
+            if granularidad == 'dia':
+                dato['dia'] = punto['periodo']
+            datos.append(dato)
         
         return JsonResponse({
             'success': True,
             'datos': datos,
-            'periodo': periodo
+            'periodo': periodo,
+            'agrupacion': granularidad
         })
         
     except Exception as e:
@@ -1905,6 +1763,38 @@ def api_grafico_ventas(request):
             'message': f'Error: {str(e)}'
         })
 
+def calcular_productos_top(fecha_inicio):
+    """Top 10 de productos vendidos desde una fecha (payload cacheable)"""
+    productos = DetalleVenta.objects.filter(
+        venta__fecha_hora__date__gte=fecha_inicio,
+        venta__estado='COMPLETADA',
+        producto__isnull=False
+    ).values(
+        'producto__id',
+        'producto__nombre',
+        'producto__codigo_unico'
+    ).annotate(
+        total_vendido=Sum('cantidad'),
+        ingresos=Sum('total'),
+        veces_vendido=Count('venta', distinct=True)
+    ).order_by('-total_vendido')[:10]
+    
+    productos_data = []
+    for producto in productos:
+        productos_data.append({
+            'id': producto['producto__id'],
+            'nombre': producto['producto__nombre'],
+            'codigo': producto['producto__codigo_unico'],
+            'total_vendido': float(producto['total_vendido']),
+            'ingresos': float(producto['ingresos']),
+            'veces_vendido': producto['veces_vendido']
+        })
+    
+    return {
+        'success': True,
+        'productos': productos_data
+    }
+
 @login_required
 def api_productos_top(request):
     """API para obtener productos más vendidos"""
@@ -1912,35 +1802,9 @@ def api_productos_top(request):
         periodo_dias = int(request.GET.get('dias', 7))
         fecha_inicio = timezone.localdate() - timedelta(days=periodo_dias)
         
-        productos = DetalleVenta.objects.filter(
-            venta__fecha_hora__date__gte=fecha_inicio,
-            venta__estado='COMPLETADA',
-            producto__isnull=False
-        ).values(
-            'producto__id',
-            'producto__nombre',
-            'producto__codigo_unico'
-        ).annotate(
-            total_vendido=Sum('cantidad'),
-            ingresos=Sum('total'),
-            veces_vendido=Count('venta', distinct=True)
-        ).order_by('-total_vendido')[:10]
-        
-        productos_data = []
-        for producto in productos:
-            productos_data.append({
-                'id': producto['producto__id'],
-                'nombre': producto['producto__nombre'],
-                'codigo': producto['producto__codigo_unico'],
-                'total_vendido': float(producto['total_vendido']),
-                'ingresos': float(producto['ingresos']),
-                'veces_vendido': producto['veces_vendido']
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'productos': productos_data
-        })
+        return JsonResponse(DashboardCacheService.obtener(
+            'productos_top', lambda: calcular_productos_top(fecha_inicio), fecha_inicio
+        ))
         
     except Exception as e:
         return JsonResponse({
@@ -1955,30 +1819,25 @@ def api_resumen_mensual(request):
         today = timezone.localdate()
         primer_dia_mes = today.replace(day=1)
         
-        # Ventas del mes actual
-        ventas_mes = Venta.objects.filter(
-            fecha_hora__date__gte=primer_dia_mes,
-            estado='COMPLETADA'
-        ).aggregate(
-            total_ventas=Count('id'),
-            total_ingresos=Sum('total'),
-            ticket_promedio=Avg('total')
-        )
-        
         # Ventas del mes anterior para comparación
         if primer_dia_mes.month == 1:
             mes_anterior = primer_dia_mes.replace(year=primer_dia_mes.year-1, month=12)
         else:
             mes_anterior = primer_dia_mes.replace(month=primer_dia_mes.month-1)
         
-        ventas_mes_anterior = Venta.objects.filter(
-            fecha_hora__date__gte=mes_anterior,
-            fecha_hora__date__lt=primer_dia_mes,
-            estado='COMPLETADA'
-        ).aggregate(
-            total_ventas=Count('id'),
-            total_ingresos=Sum('total')
-        )
+        # Mes anterior y mes actual en una sola consulta agrupada por mes
+        serie = SerieVentasService.serie(mes_anterior, today, 'mes')
+        anterior, actual = serie[0], serie[-1]
+        
+        ventas_mes = {
+            'total_ventas': actual['cantidad'],
+            'total_ingresos': actual['total'],
+            'ticket_promedio': actual['total'] / actual['cantidad'] if actual['cantidad'] else 0,
+        }
+        ventas_mes_anterior = {
+            'total_ventas': anterior['cantidad'],
+            'total_ingresos': anterior['total'],
+        }
         
         # Calcular crecimiento
         crecimiento_ventas = 0
@@ -2529,6 +2388,8 @@ def procesar_venta_desde_pedido(request, pedido_id):
             total=detalle.total,
         )
 
+    ResumenVentasService.registrar_venta(venta)
+
     # Vincular pedido con venta
     pedido.venta = venta
     pedido.estado_pago = 'PAGADO'
@@ -67,6 +67,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'widget_tweaks',
     'core.apps.CoreConfig',
     'usuarios.apps.UsuariosConfig',
@@ -294,6 +295,21 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60  # 30 minutos
+# El RIDE (WeasyPrint) va en su propia cola para no frenar el envío/autorización SRI
+CELERY_TASK_ROUTES = {
+    'electronic_invoicing.tasks.generar_ride': {'queue': 'ride'},
+}
+# Tareas periódicas: requieren celery beat (o el worker con -B)
+CELERY_BEAT_SCHEDULE = {
+    'liberar-trabajos-impresion-vencidos': {
+        'task': 'hardware_integration.tasks.liberar_trabajos_vencidos',
+        'schedule': 30.0,
+    },
+    'recuperar-envios-sri-vencidos': {
+        'task': 'electronic_invoicing.tasks.recuperar_envios_vencidos',
+        'schedule': 300.0,
+    },
+}
 
 # ============================================================
 # EMAIL CONFIGURATION (RESEND)